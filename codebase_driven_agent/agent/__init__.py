@@ -2,6 +2,9 @@
 from codebase_driven_agent.agent.utils import (
     get_tools,
     create_llm,
+    get_llm,
+    prewarm_llm,
+    close_llm_clients,
 )
 from codebase_driven_agent.agent.memory import AgentMemory
 from codebase_driven_agent.agent.prompt import generate_system_prompt
@@ -11,6 +14,9 @@ from codebase_driven_agent.agent.output_parser import OutputParser
 __all__ = [
     "get_tools",
     "create_llm",
+    "get_llm",
+    "prewarm_llm",
+    "close_llm_clients",
     "AgentMemory",
     "generate_system_prompt",
     "InputParser",
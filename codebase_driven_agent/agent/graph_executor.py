@@ -3,13 +3,16 @@
 import asyncio
 import json
 import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import TypedDict, Annotated, Sequence, Dict, Any, Optional, List, AsyncGenerator
 from langgraph.graph import StateGraph, END
 from langgraph.prebuilt import ToolNode
 import operator
 
-from codebase_driven_agent.agent.utils import create_llm, get_tools
+from codebase_driven_agent.agent.utils import get_llm, get_tools
 from codebase_driven_agent.agent.prompt import generate_system_prompt
+from codebase_driven_agent.agent.prefetch import SpeculativePrefetcher
 from codebase_driven_agent.agent.session_manager import get_session_manager
 from codebase_driven_agent.utils.logger import setup_logger
 from codebase_driven_agent.utils.database import get_schema_info, format_schema_info
@@ -17,6 +20,30 @@ from codebase_driven_agent.config import settings
 
 logger = setup_logger("codebase_driven_agent.agent.graph_executor")
 
+# 执行计划步骤的共享线程池（工具调用是阻塞的，所有执行器共用同一个线程池）
+_step_executor: Optional[ThreadPoolExecutor] = None
+_step_executor_lock = threading.Lock()
+
+
+def get_step_executor() -> ThreadPoolExecutor:
+    """获取执行计划步骤的共享线程池（首次调用时创建）"""
+    global _step_executor
+    with _step_executor_lock:
+        if _step_executor is None:
+            workers = max(1, settings.agent_step_workers)
+            _step_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="agent-step")
+            logger.info(f"Agent step thread pool started with {workers} workers")
+        return _step_executor
+
+
+def shutdown_step_executor() -> None:
+    """关闭共享线程池（应用关闭时调用）"""
+    global _step_executor
+    with _step_executor_lock:
+        if _step_executor is not None:
+            _step_executor.shutdown(wait=False, cancel_futures=True)
+            _step_executor = None
+
 
 class AgentState(TypedDict, total=False):
     """Agent 状态定义"""
@@ -45,12 +72,16 @@ class GraphExecutor:
     """
 
     def __init__(self, callbacks=None, message_queue: Optional[queue.Queue] = None, event_loop: Optional[asyncio.AbstractEventLoop] = None):
-        self.llm = create_llm()
+        self.llm = get_llm()
         self.tools = get_tools()
         self.callbacks = callbacks or []
         self.tool_node = ToolNode(self.tools)
         self.message_queue = message_queue  # 使用线程安全的 queue.Queue
         self.event_loop = event_loop  # 保存事件循环引用
+        # LLM 决策期间预取可能的下一步工具调用结果
+        self.prefetcher = SpeculativePrefetcher(
+            self._call_tool_directly, [tool.name for tool in self.tools], get_step_executor
+        )
         self.graph = self._build_graph()
 
     def _build_graph(self) -> StateGraph:
@@ -58,6 +89,9 @@ class GraphExecutor:
 
         图结构：
         plan -> execute_step -> decide -> (execute_step | synthesize | adjust_plan) -> end
+
+        plan、decide、synthesize 是异步节点，直接 await LLM 调用；
+        execute_step 每次执行一批互不依赖的步骤，阻塞的工具调用放到共享线程池中并发执行。
         """
         graph = StateGraph(AgentState)
 
@@ -101,10 +135,11 @@ class GraphExecutor:
 
         return graph.compile()
 
-    def _plan_node(self, state: AgentState) -> Dict[str, Any]:
+    async def _plan_node(self, state: AgentState) -> Dict[str, Any]:
         """计划节点：生成或调整分析计划
 
-        首次执行时生成初始计划，后续执行时根据结果调整计划
+        首次执行时生成初始计划，后续执行时根据结果调整计划。
+        LLM 调用是异步的，等待响应期间不占用事件循环和线程。
         """
         logger.info("Plan node: Generating or adjusting analysis plan")
 
@@ -135,7 +170,7 @@ class GraphExecutor:
             logger.warning(f"Plan node: Messages too long ({total_length} chars), forcing synthesize")
             return {"should_continue": False}
 
-        response = self.llm.invoke(messages)
+        response = await self.llm.ainvoke(messages)
         messages.append(AIMessage(content=response.content))
 
         # 首次生成计划时，检查是否需要用户输入
@@ -173,6 +208,7 @@ class GraphExecutor:
         
         # 解析生成的计划
         new_plan = self._parse_plan(response.content)
+        self._normalize_step_batches(new_plan, 0)
 
         # 更新状态
         if not state["plan_steps"] or current_step == 0:
@@ -217,10 +253,12 @@ class GraphExecutor:
             "current_step": 0 if not state["plan_steps"] else current_step,
         }
 
-    def _execute_step_node(self, state: AgentState) -> Dict[str, Any]:
-        """执行步骤节点：根据当前步骤选择工具并执行
+    async def _execute_step_node(self, state: AgentState) -> Dict[str, Any]:
+        """执行步骤节点：执行当前批次的步骤
 
-        根据 plan_steps[current_step] 的 action 和 target 选择合适的工具
+        从 plan_steps[current_step] 开始取出一批互不依赖的步骤（batch 相同的连续步骤），
+        在共享线程池中并发执行（每批并发数受 AGENT_MAX_PARALLEL_STEPS 限制），
+        每个步骤完成时立即发送 step_execution 事件，整批完成后只进行一次决策。
         """
         plan_steps = state["plan_steps"]
         current_step = state["current_step"]
@@ -231,29 +269,30 @@ class GraphExecutor:
             )
             return {"should_continue": False}
 
-        step = plan_steps[current_step]
+        batch = self._get_step_batch(plan_steps, current_step)
         logger.info(
-            f"Execute step node: Step {current_step + 1}/{len(plan_steps)} - {step.get('action')}"
+            f"Execute step node: Steps {current_step + 1}-{current_step + len(batch)}/{len(plan_steps)} "
+            f"- {[plan_steps[i].get('action') for i in batch]}"
         )
 
         # 使用大模型直接提供的工具名称和参数（必须由 LLM 提供，不再支持代码推断）
-        if "tool_name" not in step or "tool_params" not in step:
-            error_msg = (
-                f"计划步骤缺少 tool_name 或 tool_params 字段。步骤内容: {step}。\n"
-                f"请确保计划中的每个步骤都包含 tool_name 和 tool_params 字段。\n"
-                f"示例格式：\n"
-                f'{{"step": 1, "action": "...", "tool_name": "read", "tool_params": {{"file_path": "..."}}}}'
-            )
-            logger.error(error_msg)
-            raise ValueError(error_msg)
+        for index in batch:
+            step = plan_steps[index]
+            if "tool_name" not in step or "tool_params" not in step:
+                error_msg = (
+                    f"计划步骤缺少 tool_name 或 tool_params 字段。步骤内容: {step}。\n"
+                    f"请确保计划中的每个步骤都包含 tool_name 和 tool_params 字段。\n"
+                    f"示例格式：\n"
+                    f'{{"step": 1, "action": "...", "tool_name": "read", "tool_params": {{"file_path": "..."}}}}'
+                )
+                logger.error(error_msg)
+                raise ValueError(error_msg)
         
-        tool_name = step["tool_name"]
-        tool_input = step["tool_params"]
-        logger.info(f"Using tool_name and tool_params from plan: {tool_name}, params: {tool_input}")
-
-        # 检查是否是用户交互步骤
-        if tool_name == "user_input":
+        # 检查是否是用户交互步骤（用户交互步骤不会和其他步骤组成批次）
+        step = plan_steps[current_step]
+        if step["tool_name"] == "user_input":
             # 用户交互步骤：跳转到 request_user_input 节点
+            tool_input = step["tool_params"]
             logger.info(f"Execute step node: Step {current_step + 1} is user input step, skipping tool execution")
             # 返回状态，让图执行跳转到 request_user_input 节点
             return {
@@ -264,20 +303,93 @@ class GraphExecutor:
                 "user_input_context": tool_input.get("context", ""),
             }
 
-        # 执行工具调用
+        # 并发执行批次中的步骤，结果按计划顺序保存
+        semaphore = asyncio.Semaphore(max(1, settings.agent_max_parallel_steps))
+        step_results = await asyncio.gather(
+            *(self._run_plan_step(plan_steps, index, semaphore) for index in batch)
+        )
+        
+        return {
+            "step_results": state["step_results"] + list(step_results),
+            "current_step": current_step + len(batch),
+        }
+    
+    def _normalize_step_batches(self, steps: List[Dict[str, Any]], first_index: int) -> None:
+        """把 LLM 给出的 batch 编号转换为计划内唯一的编号（批次第一个步骤的序号）
+        
+        不同轮次的 LLM 响应可能使用相同的 batch 编号，转换后新增的步骤不会和之前未执行的步骤合并为一批。
+        
+        Args:
+            steps: 计划步骤列表，从 first_index 开始是本轮新增的步骤（原地修改）
+            first_index: 本轮新增步骤的起始索引
+        """
+        batch_ids = {}
+        for index in range(first_index, len(steps)):
+            raw_batch = steps[index].get("batch")
+            if raw_batch is None:
+                continue
+            if not isinstance(raw_batch, (int, str)):
+                steps[index].pop("batch")
+                continue
+            steps[index]["batch"] = batch_ids.setdefault(raw_batch, index + 1)
+    
+    def _get_step_batch(self, plan_steps: List[Dict[str, Any]], start: int) -> List[int]:
+        """获取从 start 开始可以并发执行的步骤索引
+        
+        batch 字段相同的连续步骤组成一个批次；没有 batch 字段的步骤和用户交互步骤单独执行。
+        """
+        batch_id = plan_steps[start].get("batch")
+        if batch_id is None or plan_steps[start].get("tool_name") == "user_input":
+            return [start]
+        
+        indexes = [start]
+        for index in range(start + 1, len(plan_steps)):
+            step = plan_steps[index]
+            if step.get("batch") != batch_id or step.get("tool_name") == "user_input":
+                break
+            indexes.append(index)
+        return indexes
+    
+    async def _run_plan_step(
+        self, plan_steps: List[Dict[str, Any]], index: int, semaphore: asyncio.Semaphore
+    ) -> Dict[str, Any]:
+        """在共享线程池中执行单个计划步骤，完成后立即发送进度和步骤执行结果
+        
+        Args:
+            plan_steps: 计划步骤列表
+            index: 步骤索引
+            semaphore: 限制批次内并发数的信号量
+            
+        Returns:
+            步骤结果
+        """
+        step = plan_steps[index]
+        tool_name = step["tool_name"]
+        tool_input = step["tool_params"]
+        logger.info(f"Using tool_name and tool_params from plan: {tool_name}, params: {tool_input}")
+        
+        # 执行工具调用（决策期间已经预取的调用直接复用结果）
         try:
-            tool_result = self._call_tool_directly(tool_name, tool_input)
+            prefetched = self.prefetcher.take(tool_name, tool_input)
+            if prefetched is not None:
+                tool_result = await asyncio.wrap_future(prefetched)
+            else:
+                async with semaphore:
+                    loop = asyncio.get_running_loop()
+                    tool_result = await loop.run_in_executor(
+                        get_step_executor(), self._call_tool_directly, tool_name, tool_input
+                    )
 
             # 保存结果
             step_result = {
-                "step": current_step,
+                "step": index,
                 "action": step.get("action"),
                 "target": step.get("target"),
                 "status": "completed",
                 "result": tool_result,
             }
 
-            logger.info(f"Execute step node: Step {current_step + 1} completed")
+            logger.info(f"Execute step node: Step {index + 1} completed")
 
             # 立即通过消息队列发送进度更新和步骤执行结果
             if self.message_queue:
@@ -286,20 +398,20 @@ class GraphExecutor:
                     progress_msg = {
                         "event": "progress",
                         "data": {
-                            "message": f"执行步骤 {current_step + 1}/{total_steps}",
-                            "progress": (current_step + 1) / total_steps if total_steps > 0 else 0.5,
+                            "message": f"执行步骤 {index + 1}/{total_steps}",
+                            "progress": (index + 1) / total_steps if total_steps > 0 else 0.5,
                             "step": "graph_execution",
                         }
                     }
                     # queue.Queue 是线程安全的
                     self.message_queue.put_nowait(progress_msg)
-                    logger.info(f"Progress message queued: step {current_step + 1}/{total_steps}")
+                    logger.info(f"Progress message queued: step {index + 1}/{total_steps}")
                     
                     # 发送步骤执行结果
                     step_execution_msg = {
                         "event": "step_execution",
                         "data": {
-                            "step": current_step + 1,
+                            "step": index + 1,
                             "action": step.get("action"),
                             "target": step.get("target"),
                             "status": "completed",
@@ -308,21 +420,18 @@ class GraphExecutor:
                         }
                     }
                     self.message_queue.put_nowait(step_execution_msg)
-                    logger.info(f"Step execution result queued: step {current_step + 1}")
+                    logger.info(f"Step execution result queued: step {index + 1}")
                 except Exception as e:
                     logger.error(f"Failed to queue progress/step_execution message: {e}", exc_info=True)
 
-            return {
-                "step_results": state["step_results"] + [step_result],
-                "current_step": current_step + 1,
-            }
+            return step_result
         except Exception as e:
             error_msg = str(e)
-            logger.error(f"Execute step node: Step {current_step + 1} failed: {error_msg}", exc_info=True)
+            logger.error(f"Execute step node: Step {index + 1} failed: {error_msg}", exc_info=True)
 
             # 保存失败结果（包含详细的错误信息，让 AI 能够分析失败原因）
             step_result = {
-                "step": current_step,
+                "step": index,
                 "action": step.get("action"),
                 "target": step.get("target"),
                 "status": "failed",
@@ -332,7 +441,7 @@ class GraphExecutor:
             }
 
             # 即使工具调用失败，也继续执行流程，让 AI 决策下一步
-            logger.info(f"Execute step node: Step {current_step + 1} failed, but continuing to decision node")
+            logger.info(f"Execute step node: Step {index + 1} failed, but continuing to decision node")
             
             # 发送失败步骤的执行结果
             if self.message_queue:
@@ -340,7 +449,7 @@ class GraphExecutor:
                     step_execution_msg = {
                         "event": "step_execution",
                         "data": {
-                            "step": current_step + 1,
+                            "step": index + 1,
                             "action": step.get("action"),
                             "target": step.get("target"),
                             "status": "failed",
@@ -348,16 +457,13 @@ class GraphExecutor:
                         }
                     }
                     self.message_queue.put_nowait(step_execution_msg)
-                    logger.info(f"Failed step execution result queued: step {current_step + 1}")
+                    logger.info(f"Failed step execution result queued: step {index + 1}")
                 except Exception as e:
                     logger.error(f"Failed to queue failed step_execution message: {e}", exc_info=True)
 
-            return {
-                "step_results": state["step_results"] + [step_result],
-                "current_step": current_step + 1,
-            }
+            return step_result
 
-    def _decision_node(self, state: AgentState) -> Dict[str, Any]:
+    async def _decision_node(self, state: AgentState) -> Dict[str, Any]:
         """决策节点：基于 LLM 判断是否继续、添加新步骤或结束分析
         
         核心自适应逻辑：
@@ -398,12 +504,17 @@ class GraphExecutor:
             logger.warning(f"Decision node: Messages too long ({total_length} chars), forcing synthesize")
             return {"should_continue": False, "messages": messages}
         
+        # 等待 LLM 决策期间预取可能的下一步工具调用
+        self.prefetcher.start(plan_steps, step_results)
+        
         try:
-            response = self.llm.invoke(messages)
+            response = await self.llm.ainvoke(messages)
             messages.append(AIMessage(content=response.content))
             
             # 解析 LLM 的决策
             decision = self._parse_decision(response.content)
+            # 只保留与下一步调用一致的预取
+            self.prefetcher.retain(decision.get("next_steps", []) if decision.get("action") == "continue" else [])
             
             action = decision.get("action", "synthesize")
             reasoning = decision.get("reasoning", "")
@@ -516,12 +627,15 @@ class GraphExecutor:
                         )
                         continue  # 跳过这个步骤
                     
-                    updated_plan_steps.append({
+                    new_step = {
                         "step": step_number,
                         "action": new_step_data.get("action", "未知操作"),
                         "tool_name": tool_name,
                         "tool_params": tool_params,
-                    })
+                    }
+                    if new_step_data.get("batch") is not None:
+                        new_step["batch"] = new_step_data["batch"]
+                    updated_plan_steps.append(new_step)
                 
                 # 检查是否有有效的步骤被添加
                 if len(updated_plan_steps) == len(plan_steps):
@@ -532,6 +646,7 @@ class GraphExecutor:
                     )
                     return {"should_continue": False, "messages": messages}
                 
+                self._normalize_step_batches(updated_plan_steps, len(plan_steps))
                 logger.info(f"Decision node: Plan expanded from {len(plan_steps)} to {len(updated_plan_steps)} steps")
                 
                 # 发送更新后的 plan 和推理原因给前端
@@ -571,6 +686,7 @@ class GraphExecutor:
                 
         except Exception as e:
             logger.error(f"Decision node: Error during LLM decision: {e}", exc_info=True)
+            self.prefetcher.cancel()
             logger.warning("Decision node: Falling back to synthesize due to error")
             return {"should_continue": False}
 
@@ -616,7 +732,7 @@ class GraphExecutor:
             "request_id": request_id,
         }
     
-    def _synthesize_node(self, state: AgentState) -> Dict[str, Any]:
+    async def _synthesize_node(self, state: AgentState) -> Dict[str, Any]:
         """综合节点：整合所有步骤结果，生成最终分析结论
 
         1. 收集所有步骤的结果
@@ -625,6 +741,8 @@ class GraphExecutor:
         4. 提供处理建议
         """
         logger.info("Synthesize node: Generating final analysis")
+        # 分析结束，丢弃未使用的预取
+        self.prefetcher.cancel()
 
         step_results = state["step_results"]
         original_input = state["original_input"]
@@ -645,7 +763,7 @@ class GraphExecutor:
             logger.warning(f"Synthesize node: Messages too long ({total_length} chars), generating simplified result based on available information")
             
             # 基于已有步骤结果生成简化结论
-            final_result = self._generate_simplified_result(original_input, step_results)
+            final_result = await self._generate_simplified_result(original_input, step_results)
             # 添加一条系统消息说明情况
             from langchain_core.messages import AIMessage
             messages.append(AIMessage(content="由于对话上下文过长，已基于已执行的步骤生成简化分析结果。"))
@@ -665,9 +783,7 @@ class GraphExecutor:
                 except Exception as e:
                     logger.warning(f"Failed to queue progress message: {e}")
             
-            # 直接调用 LLM（调用方已经在线程池中执行此方法，所以这里不需要再次包装）
-            # 这样可以避免双重线程池包装，提高性能
-            response = self.llm.invoke(messages)
+            response = await self.llm.ainvoke(messages)
             
             messages.append(AIMessage(content=response.content))
 
@@ -757,7 +873,7 @@ class GraphExecutor:
 
 **重要决策：**
 - **如果信息不足，无法进行分析** → 回复 "action": "request_input"，并提供 "question" 字段
-- **如果信息足够，可以开始分析** → 回复 "action": "continue"，并提供 "next_steps" 数组（只包含第一步）
+- **如果信息足够，可以开始分析** → 回复 "action": "continue"，并提供 "next_steps" 数组（只包含第一步；如果有几个互不依赖的操作可以同时执行，可以给出这一批步骤，并为它们设置相同的 batch）
 
 用户问题：
 {input_text}
@@ -794,6 +910,7 @@ class GraphExecutor:
 - 如果 action 是 "continue"，next_steps 必须包含至少一个步骤，且每个步骤必须包含：step、action、tool_name、tool_params
 - tool_name 必须是工具列表中的准确名称
 - tool_params 必须是 JSON 对象，包含所有必需参数
+- batch（可选）：batch 相同的连续步骤互不依赖，会并发执行，例如同时搜索两个关键词、同时读取多个文件；后一步依赖前一步结果时不要设置相同的 batch
 - 不要使用 target 字段（已废弃）
 - 格式不正确将导致执行失败！
 
@@ -826,6 +943,7 @@ class GraphExecutor:
 2. `action`（必需）：操作描述（中文）
 3. `tool_name`（必需）：工具名称，必须是以下之一：code_search、read、grep、glob、bash、log_search、database_query、websearch、webfetch
 4. `tool_params`（必需）：工具参数对象，必须包含该工具的所有必需参数
+5. `batch`（可选）：批次编号，batch 相同的连续步骤互不依赖，会并发执行
 
 **严格禁止：**
 - 不要使用 target 字段（旧格式，已废弃）
@@ -1009,6 +1127,7 @@ class GraphExecutor:
   2. `action`（必需）：操作描述（中文）
   3. `tool_name`（必需）：工具名称，必须是以下之一：code_search、read、grep、glob、bash、log_search、database_query、websearch、webfetch
   4. `tool_params`（必需）：工具参数对象，必须包含该工具的所有必需参数
+  5. `batch`（可选）：批次编号。多个互不依赖的操作（如同时读取多个文件、同时搜索代码和日志）设置相同的 batch 会并发执行，整批完成后再决策下一步；后一步依赖前一步结果时不要设置相同的 batch
 
 **如果 action 是 "synthesize"：**
 - `next_steps` 可以为空数组 `[]` 或省略
@@ -1171,7 +1290,8 @@ class GraphExecutor:
             # 尝试提取完整的 JSON 对象（包含 next_steps）
             json_match = re.search(r'\{[\s\S]*"next_steps"[\s\S]*?\}', plan_text)
             if json_match:
-                parsed = json.loads(json_match.group(0))
+                # 非贪婪匹配会在嵌套的 tool_params 处截断，从匹配起点解码完整的 JSON 对象
+                parsed, _ = json.JSONDecoder().raw_decode(plan_text, json_match.start())
                 if "next_steps" in parsed and isinstance(parsed["next_steps"], list):
                     for step_data in parsed["next_steps"]:
                         if isinstance(step_data, dict):
@@ -1204,6 +1324,8 @@ class GraphExecutor:
                                 
                                 step_dict["tool_name"] = tool_name
                                 step_dict["tool_params"] = tool_params
+                                if step_data.get("batch") is not None:
+                                    step_dict["batch"] = step_data["batch"]
                                 steps.append(step_dict)
                             else:
                                 # 如果缺少 tool_name 或 tool_params，记录详细错误并跳过该步骤
@@ -1519,7 +1641,7 @@ class GraphExecutor:
             "related_logs": [],
         }
     
-    def _generate_simplified_result(self, input_text: str, step_results: List[Dict]) -> Dict[str, Any]:
+    async def _generate_simplified_result(self, input_text: str, step_results: List[Dict]) -> Dict[str, Any]:
         """当 prompt 超长时，基于已有步骤结果生成简化结论
         
         即使上下文过长，也尝试调用 LLM 进行总结，而不是直接拼接工具输出。
@@ -1587,7 +1709,7 @@ class GraphExecutor:
             # 尝试调用 LLM 进行总结（使用简短的 prompt）
             from langchain_core.messages import HumanMessage
             messages = [HumanMessage(content=simplified_prompt)]
-            response = self.llm.invoke(messages)
+            response = await self.llm.ainvoke(messages)
             
             # 解析 LLM 响应
             final_result = self._parse_synthesis_result(response.content)
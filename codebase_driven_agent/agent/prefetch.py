@@ -0,0 +1,228 @@
+"""推测预取：在 LLM 决策期间提前执行可能的下一步工具调用
+
+LLM 决策通常需要数秒，这段时间工具层是空闲的。很多后续操作是可以预测的：
+- code_search / grep 返回文件列表后，Agent 几乎总会 read 排在前面的文件
+- log_search 返回部分结果后，Agent 经常按提示的 offset 读取下一页
+
+预取结果保存在请求级缓存中，下一步工具调用的名称和参数完全一致时直接复用。
+只预取只读工具，决策完成后取消与新步骤无关的预取。
+"""
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from codebase_driven_agent.config import settings
+from codebase_driven_agent.utils.logger import setup_logger
+from codebase_driven_agent.utils.metrics import get_metrics_collector
+
+logger = setup_logger("codebase_driven_agent.agent.prefetch")
+
+# 搜索结果中出现的文件会被预读
+SEARCH_TOOLS = ("code_search", "grep")
+# 结果中类似文件路径的片段（包含扩展名）
+FILE_PATH_PATTERN = re.compile(r"[\w./-]+\.[A-Za-z0-9]{1,10}")
+# log_search 结果中的翻页提示
+LOG_NEXT_PAGE_PATTERN = re.compile(r"use offset=(\d+) to get next page")
+
+# 进程级累计统计（用于计算命中率）
+_totals_lock = threading.Lock()
+_totals = {"issued": 0, "hits": 0}
+
+
+def _record(issued: int = 0, hits: int = 0) -> None:
+    """累计预取统计并更新命中率"""
+    with _totals_lock:
+        _totals["issued"] += issued
+        _totals["hits"] += hits
+        hit_rate = _totals["hits"] / _totals["issued"] if _totals["issued"] else 0.0
+    get_metrics_collector().set_gauge("agent_prefetch_hit_rate", hit_rate)
+
+
+def make_key(tool_name: str, tool_input: Dict[str, Any]) -> Tuple[str, str]:
+    """工具调用的缓存键（参数按键排序序列化）"""
+    return tool_name, json.dumps(tool_input, sort_keys=True, ensure_ascii=False, default=str)
+
+
+class SpeculativePrefetcher:
+    """请求级的推测预取缓存（每个 GraphExecutor 一个）"""
+    
+    def __init__(
+        self,
+        call_tool: Callable[[str, Dict[str, Any]], str],
+        tool_names: List[str],
+        executor_factory: Callable[[], Executor],
+        repo_path: Optional[str] = None,
+    ):
+        """
+        Args:
+            call_tool: 执行工具调用的函数 (tool_name, tool_input) -> 结果文本
+            tool_names: 可用的工具名称
+            executor_factory: 返回执行预取的线程池
+            repo_path: 代码仓库路径（用于验证结果中的文件路径），默认使用配置
+        """
+        self.call_tool = call_tool
+        self.tool_names = set(tool_names)
+        self.executor_factory = executor_factory
+        self.repo_path = repo_path or settings.code_repo_path
+        self.enabled = settings.agent_prefetch_enabled and settings.agent_prefetch_max_calls > 0
+        self._lock = threading.Lock()
+        # 缓存键 -> (Future, 提交时间)
+        self._pending: Dict[Tuple[str, str], Tuple[Future, float]] = {}
+        # 缓存键 -> 预取完成时间
+        self._finished_at: Dict[Tuple[str, str], float] = {}
+        # 已经分析过的步骤结果数量
+        self._seen_results = 0
+        # 已经执行或预取过的调用，不再重复预取
+        self._issued_keys = set()
+    
+    def predict(self, plan_steps: List[Dict[str, Any]], step_results: List[Dict[str, Any]]) -> List[Tuple[str, Dict[str, Any]]]:
+        """根据上次预测之后新完成的步骤结果预测下一步可能的工具调用
+        
+        Args:
+            plan_steps: 计划步骤列表
+            step_results: 步骤结果列表
+            
+        Returns:
+            [(工具名称, 工具参数)]，按可能性排序
+        """
+        predictions = []
+        new_results = step_results[self._seen_results:]
+        self._seen_results = len(step_results)
+        
+        for result in new_results:
+            index = result.get("step")
+            if result.get("status") != "completed" or not isinstance(index, int) or index >= len(plan_steps):
+                continue
+            step = plan_steps[index]
+            tool_name = step.get("tool_name")
+            tool_params = step.get("tool_params") or {}
+            self._issued_keys.add(make_key(tool_name, tool_params))
+            text = str(result.get("result", ""))
+            
+            if tool_name in SEARCH_TOOLS and "read" in self.tool_names:
+                for file_path in self._extract_file_paths(text):
+                    predictions.append(("read", {"file_path": file_path}))
+            elif tool_name == "log_search":
+                match = LOG_NEXT_PAGE_PATTERN.search(text)
+                if match:
+                    predictions.append(("log_search", {**tool_params, "offset": int(match.group(1))}))
+        
+        return predictions
+    
+    def _extract_file_paths(self, text: str) -> List[str]:
+        """按出现顺序提取结果中存在于代码仓库的文件路径"""
+        if not self.repo_path:
+            return []
+        paths = []
+        seen = set()
+        for candidate in FILE_PATH_PATTERN.findall(text):
+            while candidate.startswith("./"):
+                candidate = candidate[2:]
+            if candidate in seen or candidate.startswith(("/", "..")) or "/../" in candidate:
+                continue
+            seen.add(candidate)
+            if os.path.isfile(os.path.join(self.repo_path, candidate)):
+                paths.append(candidate)
+        return paths
+    
+    def start(self, plan_steps: List[Dict[str, Any]], step_results: List[Dict[str, Any]]) -> int:
+        """预测并提交预取任务（不超过 AGENT_PREFETCH_MAX_CALLS 个）
+        
+        Returns:
+            本次提交的预取数量
+        """
+        if not self.enabled:
+            return 0
+        
+        predictions = self.predict(plan_steps, step_results)
+        executor = None
+        issued = 0
+        with self._lock:
+            for tool_name, tool_input in predictions:
+                if issued >= settings.agent_prefetch_max_calls:
+                    break
+                if tool_name not in self.tool_names:
+                    continue
+                key = make_key(tool_name, tool_input)
+                if key in self._issued_keys:
+                    continue
+                executor = executor or self.executor_factory()
+                self._pending[key] = (executor.submit(self._call, key, tool_name, tool_input), time.time())
+                self._issued_keys.add(key)
+                issued += 1
+        
+        if issued:
+            logger.info(f"Prefetch: issued {issued} speculative tool calls")
+            get_metrics_collector().increment("agent_prefetch_issued_total", issued)
+            _record(issued=issued)
+        return issued
+    
+    def _call(self, key: Tuple[str, str], tool_name: str, tool_input: Dict[str, Any]) -> str:
+        """在线程池中执行预取，记录完成时间"""
+        try:
+            return self.call_tool(tool_name, tool_input)
+        finally:
+            self._finished_at[key] = time.time()
+    
+    def take(self, tool_name: str, tool_input: Dict[str, Any]) -> Optional[Future]:
+        """取出与工具调用完全一致的预取任务（命中时从缓存中移除）
+        
+        Returns:
+            预取任务的 Future，未命中时返回 None
+        """
+        key = make_key(tool_name, tool_input)
+        with self._lock:
+            self._issued_keys.add(key)
+            entry = self._pending.pop(key, None)
+        collector = get_metrics_collector()
+        if entry is None or entry[0].cancelled():
+            if self.enabled:
+                collector.increment("agent_prefetch_misses_total", labels={"tool": tool_name})
+            return None
+        
+        future, submitted_at = entry
+        # 预取在决策期间已经运行的时间即为节省的等待时间
+        saved = self._finished_at.pop(key, time.time()) - submitted_at
+        collector.increment("agent_prefetch_hits_total", labels={"tool": tool_name})
+        collector.record_duration("agent_prefetch_saved_seconds", saved)
+        _record(hits=1)
+        logger.info(f"Prefetch hit: {tool_name} {tool_input}")
+        return future
+    
+    def retain(self, next_steps: List[Dict[str, Any]]) -> None:
+        """决策完成后只保留与下一步调用一致的预取，取消其余预取"""
+        keep = {
+            make_key(step.get("tool_name"), step.get("tool_params") or {})
+            for step in next_steps
+            if isinstance(step, dict)
+        }
+        self._discard(lambda key: key not in keep)
+    
+    def cancel(self) -> None:
+        """取消所有未使用的预取（分析结束时调用）"""
+        self._discard(lambda key: True)
+    
+    def _discard(self, predicate: Callable[[Tuple[str, str]], bool]) -> None:
+        """丢弃满足条件的预取：尚未开始的取消执行，正在执行的结果被丢弃"""
+        with self._lock:
+            keys = [key for key in self._pending if predicate(key)]
+            entries = [self._pending.pop(key) for key in keys]
+            for key in keys:
+                self._finished_at.pop(key, None)
+        if not entries:
+            return
+        cancelled = sum(1 for future, _ in entries if future.cancel())
+        get_metrics_collector().increment("agent_prefetch_wasted_total", len(entries))
+        logger.info(f"Prefetch: discarded {len(entries)} unused results ({cancelled} cancelled before start)")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取当前请求的预取状态"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "pending": len(self._pending),
+            }
@@ -1,13 +1,26 @@
 """Agent 会话状态管理模块
 
 用于管理暂停的 Agent 执行会话，支持用户交互后的恢复。
+
+本 worker 暂停的会话保存在内存中（包含执行器和原始 SSE 流的消息队列），同时把序列化的状态
+写入会话存储（见 session_store）。回复请求被分配到其他 worker 时，从存储恢复会话并创建新的执行器，
+执行事件通过发布/订阅通道转发回原始 SSE 流所在的 worker。
 """
 import uuid
 import time
 import threading
-from typing import Dict, Optional, Any, TYPE_CHECKING
+import weakref
+from typing import Callable, Dict, Optional, Any, TYPE_CHECKING
 from datetime import datetime, timedelta
 
+from codebase_driven_agent.agent.session_store import (
+    SessionEventRelay,
+    SessionStore,
+    create_session_store,
+    deserialize_state,
+    serialize_state,
+)
+from codebase_driven_agent.config import settings
 from codebase_driven_agent.utils.logger import setup_logger
 
 if TYPE_CHECKING:
@@ -18,11 +31,13 @@ logger = setup_logger("codebase_driven_agent.agent.session_manager")
 
 class SessionInfo:
     """会话信息"""
-    def __init__(self, request_id: str, state: "AgentState", executor: Any, message_queue: Any):
+    def __init__(self, request_id: str, state: "AgentState", executor: Any, message_queue: Any, stream_id: Optional[str] = None):
         self.request_id = request_id
         self.state = state
         self.executor = executor  # GraphExecutor 实例
         self.message_queue = message_queue  # 消息队列
+        self.stream_id = stream_id  # 原始 SSE 流的事件通道
+        self.persisted = False  # 是否已经保存到会话存储
         self.created_at = datetime.now()
         self.last_updated = datetime.now()
     
@@ -35,15 +50,54 @@ class SessionInfo:
 class SessionManager:
     """会话管理器（线程安全）"""
     
-    def __init__(self, timeout_minutes: int = 30):
+    def __init__(
+        self,
+        timeout_minutes: int = 30,
+        store: Optional[SessionStore] = None,
+        executor_factory: Optional[Callable[[Any], Any]] = None,
+    ):
+        """
+        Args:
+            timeout_minutes: 会话过期时间（分钟）
+            store: 会话存储，默认根据 SESSION_STORAGE_TYPE 创建
+            executor_factory: 恢复其他 worker 的会话时创建执行器的函数（参数为消息队列），默认创建 GraphExecutor
+        """
         self._sessions: Dict[str, SessionInfo] = {}
         self._lock = threading.Lock()
         self._timeout_minutes = timeout_minutes
+        self._store = store
+        self._store_lock = threading.Lock()
+        self._executor_factory = executor_factory
+        # 本 worker 订阅的 SSE 流通道：stream_id -> 最后活跃时间
+        self._subscriptions: Dict[str, float] = {}
+        # 没有 stream_id 属性的消息队列对应的通道
+        self._stream_ids: "weakref.WeakKeyDictionary[Any, str]" = weakref.WeakKeyDictionary()
+    
+    @property
+    def store(self) -> SessionStore:
+        """会话存储（第一次使用时创建）"""
+        if self._store is None:
+            with self._store_lock:
+                if self._store is None:
+                    self._store = create_session_store()
+        return self._store
+    
+    def _get_stream_id(self, message_queue: Any) -> str:
+        """获取消息队列对应的事件通道"""
+        stream_id = getattr(message_queue, "stream_id", None)
+        if isinstance(stream_id, str):
+            return stream_id
+        with self._lock:
+            stream_id = self._stream_ids.get(message_queue)
+            if stream_id is None:
+                stream_id = uuid.uuid4().hex
+                self._stream_ids[message_queue] = stream_id
+            return stream_id
     
     def create_session(
-        self, 
-        state: "AgentState", 
-        executor: Any, 
+        self,
+        state: "AgentState",
+        executor: Any,
         message_queue: Any,
         request_id: Optional[str] = None
     ) -> str:
@@ -54,41 +108,136 @@ class SessionManager:
             executor: GraphExecutor 实例
             message_queue: 消息队列
             request_id: 可选的请求 ID（如果不提供则自动生成）
-        
+            
         Returns:
             会话的 request_id
         """
         if request_id is None:
             request_id = str(uuid.uuid4())
         
-        session = SessionInfo(request_id, state, executor, message_queue)
+        stream_id = self._get_stream_id(message_queue) if message_queue is not None else None
+        session = SessionInfo(request_id, state, executor, message_queue, stream_id)
         
         with self._lock:
             self._sessions[request_id] = session
             logger.info(f"Created session: {request_id}")
         
+        # 保存到会话存储，其他 worker 可以恢复这个会话
+        try:
+            self.store.save(
+                request_id,
+                {"state": serialize_state(state), "stream_id": stream_id},
+                self._timeout_minutes * 60,
+            )
+            session.persisted = True
+        except Exception as e:
+            logger.warning(f"Failed to persist session {request_id}, it can only be resumed on this worker: {str(e)}")
+        
+        # 原始 SSE 流在本 worker 上，订阅它的通道接收其他 worker 转发的事件
+        if message_queue is not None and not isinstance(message_queue, SessionEventRelay):
+            self._subscribe(stream_id, message_queue)
+        
         return request_id
     
+    def _subscribe(self, stream_id: str, message_queue: Any) -> None:
+        """把通道中的事件转发到本地消息队列（直到收到 done 事件）"""
+        with self._lock:
+            is_new = stream_id not in self._subscriptions
+            self._subscriptions[stream_id] = time.time()
+        if not is_new:
+            return
+        
+        def relay(event: Dict[str, Any]) -> None:
+            message_queue.put_nowait(event)
+            if event.get("event") == "done":
+                self._unsubscribe(stream_id)
+        
+        try:
+            self.store.subscribe(stream_id, relay)
+        except Exception as e:
+            logger.warning(f"Failed to subscribe session events for stream {stream_id}: {str(e)}")
+            with self._lock:
+                self._subscriptions.pop(stream_id, None)
+    
+    def _unsubscribe(self, stream_id: str) -> None:
+        """取消订阅通道"""
+        with self._lock:
+            if self._subscriptions.pop(stream_id, None) is None:
+                return
+        try:
+            self.store.unsubscribe(stream_id)
+        except Exception as e:
+            logger.debug(f"Failed to unsubscribe session events for stream {stream_id}: {str(e)}")
+    
     def get_session(self, request_id: str) -> Optional[SessionInfo]:
-        """获取会话信息"""
+        """获取会话信息（本 worker 没有时从会话存储恢复）"""
         with self._lock:
             session = self._sessions.get(request_id)
             if session and session.is_expired(self._timeout_minutes):
                 logger.warning(f"Session {request_id} expired, removing")
                 del self._sessions[request_id]
                 return None
-            if session:
-                session.last_updated = datetime.now()
-            return session
+        
+        if session is None:
+            return self._restore_session(request_id)
+        
+        # 会话可能已经被其他 worker 恢复并结束
+        if session.persisted and not self._is_stored(request_id):
+            logger.info(f"Session {request_id} was completed on another worker, removing")
+            with self._lock:
+                self._sessions.pop(request_id, None)
+            return None
+        
+        session.last_updated = datetime.now()
+        return session
+    
+    def _is_stored(self, request_id: str) -> bool:
+        """会话是否仍在会话存储中（存储不可用时视为存在）"""
+        try:
+            return self.store.load(request_id) is not None
+        except Exception as e:
+            logger.debug(f"Failed to check session {request_id} in session store: {str(e)}")
+            return True
+    
+    def _restore_session(self, request_id: str) -> Optional[SessionInfo]:
+        """从会话存储恢复其他 worker 暂停的会话"""
+        try:
+            data = self.store.load(request_id)
+        except Exception as e:
+            logger.error(f"Failed to load session {request_id} from session store: {str(e)}")
+            return None
+        if data is None:
+            return None
+        
+        stream_id = data.get("stream_id")
+        message_queue = SessionEventRelay(self.store, stream_id) if stream_id else None
+        executor = self._create_executor(message_queue)
+        session = SessionInfo(request_id, deserialize_state(data["state"]), executor, message_queue, stream_id)
+        session.persisted = True
+        
+        with self._lock:
+            self._sessions[request_id] = session
+        logger.info(f"Restored session {request_id} from session store, relaying events to stream {stream_id}")
+        return session
+    
+    def _create_executor(self, message_queue: Any) -> Any:
+        """为恢复的会话创建执行器"""
+        if self._executor_factory is not None:
+            return self._executor_factory(message_queue)
+        from codebase_driven_agent.agent.graph_executor import GraphExecutor
+        return GraphExecutor(message_queue=message_queue)
     
     def remove_session(self, request_id: str) -> bool:
         """删除会话"""
         with self._lock:
-            if request_id in self._sessions:
-                del self._sessions[request_id]
-                logger.info(f"Removed session: {request_id}")
-                return True
-            return False
+            removed = self._sessions.pop(request_id, None) is not None
+        try:
+            removed = self.store.delete(request_id) or removed
+        except Exception as e:
+            logger.warning(f"Failed to delete session {request_id} from session store: {str(e)}")
+        if removed:
+            logger.info(f"Removed session: {request_id}")
+        return removed
     
     def cleanup_expired_sessions(self) -> int:
         """清理过期会话，返回清理的数量"""
@@ -100,16 +249,33 @@ class SessionManager:
             for req_id in expired_ids:
                 del self._sessions[req_id]
                 logger.info(f"Cleaned up expired session: {req_id}")
-            return len(expired_ids)
+            # 会话过期后不会再有转发的事件
+            expire_before = time.time() - self._timeout_minutes * 60
+            stale_streams = [
+                stream_id for stream_id, last_active in self._subscriptions.items()
+                if last_active < expire_before
+            ]
+        for stream_id in stale_streams:
+            self._unsubscribe(stream_id)
+        return len(expired_ids)
     
     def get_all_sessions(self) -> Dict[str, SessionInfo]:
         """获取所有会话（用于调试）"""
         with self._lock:
             return dict(self._sessions)
+    
+    def close(self) -> None:
+        """关闭会话存储（服务器关闭时调用）"""
+        with self._store_lock:
+            store, self._store = self._store, None
+        with self._lock:
+            self._subscriptions.clear()
+        if store is not None:
+            store.close()
 
 
 # 全局会话管理器实例
-_session_manager = SessionManager()
+_session_manager = SessionManager(timeout_minutes=settings.session_timeout_minutes)
 
 
 def get_session_manager() -> SessionManager:
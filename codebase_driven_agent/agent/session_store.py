@@ -0,0 +1,354 @@
+"""暂停会话的持久化存储和事件转发
+
+等待用户回复的会话需要在任意 worker 上恢复：会话的 AgentState 序列化后保存到共享存储，
+处理回复的 worker 恢复执行后，通过发布/订阅通道把事件转发回原始 SSE 流所在的 worker。
+
+支持三种存储（由 SESSION_STORAGE_TYPE 选择）：
+- memory：进程内存储，只适用于单 worker
+- sqlite：会话和待转发事件保存在本机的 SQLite 文件中，同一台机器上的多个 worker 共享，
+  订阅方按 SESSION_RELAY_POLL_INTERVAL 轮询事件表（只在有订阅时轮询）
+- redis：会话使用带过期时间的键，事件通过 Redis PUBLISH/SUBSCRIBE 转发，适用于多台机器
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
+
+from codebase_driven_agent.config import settings
+from codebase_driven_agent.utils.logger import setup_logger
+
+logger = setup_logger("codebase_driven_agent.agent.session_store")
+
+# Redis 中会话数据和事件通道的键前缀
+REDIS_SESSION_PREFIX = "codebase_agent:session:"
+REDIS_CHANNEL_PREFIX = "codebase_agent:stream:"
+
+EventHandler = Callable[[Dict[str, Any]], None]
+
+
+def serialize_state(state: Dict[str, Any]) -> Dict[str, Any]:
+    """将 AgentState 转换为可以 JSON 序列化的字典（消息历史使用 LangChain 的消息字典格式）"""
+    data = dict(state)
+    messages = [m for m in data.get("messages") or [] if isinstance(m, BaseMessage)]
+    data["messages"] = messages_to_dict(messages)
+    return json.loads(json.dumps(data, ensure_ascii=False, default=str))
+
+
+def deserialize_state(data: Dict[str, Any]) -> Dict[str, Any]:
+    """从 serialize_state 的结果恢复 AgentState"""
+    state = dict(data)
+    state["messages"] = messages_from_dict(state.get("messages") or [])
+    return state
+
+
+class SessionStore(ABC):
+    """会话存储接口：保存序列化的会话，并提供按通道发布/订阅事件"""
+    
+    @abstractmethod
+    def save(self, request_id: str, data: Dict[str, Any], ttl: int) -> None:
+        """保存会话数据（ttl 秒后过期）"""
+        pass
+    
+    @abstractmethod
+    def load(self, request_id: str) -> Optional[Dict[str, Any]]:
+        """读取会话数据，不存在或已过期时返回 None"""
+        pass
+    
+    @abstractmethod
+    def delete(self, request_id: str) -> bool:
+        """删除会话，返回是否存在"""
+        pass
+    
+    @abstractmethod
+    def publish(self, channel: str, event: Dict[str, Any]) -> None:
+        """向通道发布事件"""
+        pass
+    
+    @abstractmethod
+    def subscribe(self, channel: str, handler: EventHandler) -> None:
+        """订阅通道，事件在后台线程中交给 handler 处理（每个通道只有一个订阅者）"""
+        pass
+    
+    @abstractmethod
+    def unsubscribe(self, channel: str) -> None:
+        """取消订阅通道"""
+        pass
+    
+    def close(self) -> None:
+        """释放存储占用的资源"""
+        pass
+
+
+class MemorySessionStore(SessionStore):
+    """进程内会话存储（单 worker）"""
+    
+    def __init__(self):
+        self._sessions: Dict[str, tuple] = {}
+        self._handlers: Dict[str, EventHandler] = {}
+        self._lock = threading.Lock()
+    
+    def save(self, request_id: str, data: Dict[str, Any], ttl: int) -> None:
+        with self._lock:
+            self._sessions[request_id] = (json.dumps(data, ensure_ascii=False), time.time() + ttl)
+    
+    def load(self, request_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._sessions.get(request_id)
+            if entry is None:
+                return None
+            if entry[1] < time.time():
+                del self._sessions[request_id]
+                return None
+            return json.loads(entry[0])
+    
+    def delete(self, request_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(request_id, None) is not None
+    
+    def publish(self, channel: str, event: Dict[str, Any]) -> None:
+        handler = self._handlers.get(channel)
+        if handler:
+            handler(event)
+    
+    def subscribe(self, channel: str, handler: EventHandler) -> None:
+        self._handlers[channel] = handler
+    
+    def unsubscribe(self, channel: str) -> None:
+        self._handlers.pop(channel, None)
+
+
+class SqliteSessionStore(SessionStore):
+    """SQLite 会话存储（同一台机器上的多个 worker 共享）"""
+    
+    def __init__(self, db_path: str, poll_interval: float = 0.2):
+        """
+        Args:
+            db_path: 数据库文件路径
+            poll_interval: 订阅方轮询事件表的间隔（秒）
+        """
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=10, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "request_id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_events ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, "
+            "payload TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_session_events_channel ON session_events (channel, id)")
+        self._lock = threading.Lock()
+        self._handlers: Dict[str, EventHandler] = {}
+        self._poller: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+    
+    def _execute(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+    
+    def save(self, request_id: str, data: Dict[str, Any], ttl: int) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE expires_at < ?", (now,))
+            # 没有被订阅方取走的事件（原始 SSE 流已经断开）随会话一起过期
+            self._conn.execute("DELETE FROM session_events WHERE created_at < ?", (now - ttl,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (request_id, data, expires_at) VALUES (?, ?, ?)",
+                (request_id, json.dumps(data, ensure_ascii=False), now + ttl),
+            )
+    
+    def load(self, request_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._execute(
+            "SELECT data FROM sessions WHERE request_id = ? AND expires_at >= ?",
+            (request_id, time.time()),
+        )
+        return json.loads(rows[0][0]) if rows else None
+    
+    def delete(self, request_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute("DELETE FROM sessions WHERE request_id = ?", (request_id,)).rowcount > 0
+    
+    def publish(self, channel: str, event: Dict[str, Any]) -> None:
+        self._execute(
+            "INSERT INTO session_events (channel, payload, created_at) VALUES (?, ?, ?)",
+            (channel, json.dumps(event, ensure_ascii=False, default=str), time.time()),
+        )
+    
+    def subscribe(self, channel: str, handler: EventHandler) -> None:
+        with self._lock:
+            self._handlers[channel] = handler
+            if self._poller is None or not self._poller.is_alive():
+                self._stop_event.clear()
+                self._poller = threading.Thread(target=self._poll_events, name="session-relay", daemon=True)
+                self._poller.start()
+    
+    def unsubscribe(self, channel: str) -> None:
+        with self._lock:
+            self._handlers.pop(channel, None)
+    
+    def _poll_events(self) -> None:
+        """把订阅通道的事件交给处理函数（没有订阅时线程退出）"""
+        while not self._stop_event.is_set():
+            with self._lock:
+                channels = list(self._handlers)
+                if not channels:
+                    self._poller = None
+                    return
+                placeholders = ",".join("?" * len(channels))
+                rows = self._conn.execute(
+                    f"SELECT id, channel, payload FROM session_events WHERE channel IN ({placeholders}) ORDER BY id",
+                    channels,
+                ).fetchall()
+                if rows:
+                    self._conn.execute(
+                        f"DELETE FROM session_events WHERE id IN ({','.join('?' * len(rows))})",
+                        [row[0] for row in rows],
+                    )
+            for _, channel, payload in rows:
+                handler = self._handlers.get(channel)
+                if handler is None:
+                    continue
+                try:
+                    handler(json.loads(payload))
+                except Exception as e:
+                    logger.error(f"Failed to relay session event on {channel}: {str(e)}", exc_info=True)
+            self._stop_event.wait(self.poll_interval)
+    
+    def close(self) -> None:
+        self._stop_event.set()
+        poller = self._poller
+        if poller is not None:
+            poller.join(timeout=self.poll_interval * 5)
+        self._conn.close()
+
+
+class RedisSessionStore(SessionStore):
+    """Redis 会话存储（多台机器上的 worker 共享）"""
+    
+    def __init__(self, client: Any = None, redis_url: Optional[str] = None):
+        """
+        Args:
+            client: Redis 客户端（不提供时根据 redis_url 创建）
+            redis_url: Redis 连接 URL，默认使用配置
+        """
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(
+                redis_url or settings.redis_url,
+                decode_responses=True,
+                socket_connect_timeout=5,
+            )
+        self.client = client
+        self._pubsub = None
+        self._pubsub_thread = None
+        self._lock = threading.Lock()
+    
+    def save(self, request_id: str, data: Dict[str, Any], ttl: int) -> None:
+        self.client.set(REDIS_SESSION_PREFIX + request_id, json.dumps(data, ensure_ascii=False), ex=ttl)
+    
+    def load(self, request_id: str) -> Optional[Dict[str, Any]]:
+        raw = self.client.get(REDIS_SESSION_PREFIX + request_id)
+        return json.loads(raw) if raw is not None else None
+    
+    def delete(self, request_id: str) -> bool:
+        return self.client.delete(REDIS_SESSION_PREFIX + request_id) > 0
+    
+    def publish(self, channel: str, event: Dict[str, Any]) -> None:
+        self.client.publish(REDIS_CHANNEL_PREFIX + channel, json.dumps(event, ensure_ascii=False, default=str))
+    
+    def subscribe(self, channel: str, handler: EventHandler) -> None:
+        def on_message(message):
+            try:
+                handler(json.loads(message["data"]))
+            except Exception as e:
+                logger.error(f"Failed to relay session event on {channel}: {str(e)}", exc_info=True)
+        
+        with self._lock:
+            if self._pubsub is None:
+                self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(**{REDIS_CHANNEL_PREFIX + channel: on_message})
+            if self._pubsub_thread is None:
+                self._pubsub_thread = self._pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+    
+    def unsubscribe(self, channel: str) -> None:
+        with self._lock:
+            if self._pubsub is not None:
+                self._pubsub.unsubscribe(REDIS_CHANNEL_PREFIX + channel)
+    
+    def close(self) -> None:
+        with self._lock:
+            if self._pubsub_thread is not None:
+                self._pubsub_thread.stop()
+                self._pubsub_thread = None
+            if self._pubsub is not None:
+                self._pubsub.close()
+                self._pubsub = None
+        self.client.close()
+
+
+class SessionEventRelay:
+    """恢复到其他 worker 的会话使用的消息队列：事件发布到原始 SSE 流的通道
+    
+    提供执行器和回复接口用到的 queue.Queue 方法子集。
+    """
+    
+    def __init__(self, store: SessionStore, stream_id: str):
+        self.store = store
+        self.stream_id = stream_id
+        self._published = 0
+    
+    def put_nowait(self, item: Dict[str, Any]) -> None:
+        self.store.publish(self.stream_id, item)
+        self._published += 1
+    
+    put = put_nowait
+    
+    def qsize(self) -> int:
+        """中继不缓存消息，返回已经转发的消息数（用于判断是否已经发送过事件）"""
+        return self._published
+    
+    def empty(self) -> bool:
+        return self._published == 0
+
+
+def _default_db_path() -> str:
+    """SQLite 会话数据库的默认路径"""
+    return os.path.join(Path.home(), ".cache", "codebase_driven_agent", "sessions.db")
+
+
+def create_session_store() -> SessionStore:
+    """根据配置创建会话存储（sqlite/redis 不可用时回退到内存存储）"""
+    storage_type = settings.session_storage_type.lower()
+    
+    try:
+        if storage_type == "sqlite":
+            store = SqliteSessionStore(
+                settings.session_db_path or _default_db_path(),
+                poll_interval=settings.session_relay_poll_interval,
+            )
+            logger.info(f"Using SQLite session store: {store.db_path}")
+            return store
+        if storage_type == "redis":
+            if not settings.redis_url:
+                logger.warning("SESSION_STORAGE_TYPE=redis but REDIS_URL is not set, using memory session store")
+            else:
+                store = RedisSessionStore()
+                store.client.ping()
+                logger.info("Using Redis session store")
+                return store
+        elif storage_type != "memory":
+            logger.warning(f"Unknown session storage type: {storage_type}, defaulting to memory")
+    except Exception as e:
+        logger.error(f"Failed to create {storage_type} session store, using memory session store: {str(e)}")
+    
+    return MemorySessionStore()
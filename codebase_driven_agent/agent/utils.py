@@ -1,5 +1,8 @@
 """Agent 工具函数"""
-from typing import List
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
 
@@ -14,9 +17,74 @@ import logging
 openai_logger = logging.getLogger("openai")
 openai_logger.setLevel(logging.DEBUG)
 
+# LLM 请求超时（秒）
+LLM_TIMEOUT = 60.0
+# 预热连接的超时（秒），预热失败不影响服务启动
+LLM_PREWARM_TIMEOUT = 10.0
+
+# 进程级共享的 LLM 实例和 HTTP 连接池
+_llm_lock = threading.RLock()
+_llm_instances: Dict[Tuple, Any] = {}
+_http_clients: Optional[Tuple[httpx.Client, httpx.AsyncClient]] = None
+
+
+def _get_http_limits() -> httpx.Limits:
+    """根据配置构建 HTTP 连接池限制"""
+    return httpx.Limits(
+        max_connections=settings.llm_max_connections,
+        max_keepalive_connections=settings.llm_max_keepalive_connections,
+        keepalive_expiry=settings.llm_keepalive_expiry,
+    )
+
+
+def get_llm_http_clients() -> Tuple[httpx.Client, httpx.AsyncClient]:
+    """获取进程级共享的 HTTP 客户端（同步、异步各一个）
+    
+    所有 LLM 实例共用同一个连接池，保持长连接，避免每次请求重新建立 TCP/TLS 连接。
+    
+    Returns:
+        (同步客户端, 异步客户端)
+    """
+    global _http_clients
+    with _llm_lock:
+        if _http_clients is None:
+            limits = _get_http_limits()
+            timeout = httpx.Timeout(LLM_TIMEOUT)
+            _http_clients = (
+                httpx.Client(limits=limits, timeout=timeout),
+                httpx.AsyncClient(limits=limits, timeout=timeout),
+            )
+        return _http_clients
+
+
+def _llm_config_key() -> Tuple:
+    """当前 LLM 配置的缓存键（配置变化时创建新的 LLM 实例）"""
+    return (
+        settings.llm_base_url,
+        settings.llm_api_key,
+        settings.openai_base_url,
+        settings.openai_api_key,
+        settings.anthropic_api_key,
+        settings.llm_model,
+        settings.llm_temperature,
+        settings.llm_max_tokens,
+    )
+
+
+def _get_llm_base_url() -> Optional[str]:
+    """获取当前配置使用的 LLM API Base URL（Anthropic 返回 None）"""
+    if settings.llm_base_url and settings.llm_api_key:
+        return settings.llm_base_url
+    if settings.openai_api_key:
+        return settings.openai_base_url or "https://api.openai.com/v1"
+    return None
+
 
 def create_llm():
-    """创建 LLM 实例"""
+    """创建 LLM 实例
+    
+    OpenAI 兼容接口使用进程级共享的 HTTP 连接池；通常应使用 get_llm() 复用实例。
+    """
     logger.info("Creating LLM instance...")
     logger.info("=" * 80)
     logger.info("Checking LLM Configuration:")
@@ -39,14 +107,17 @@ def create_llm():
         logger.info(f"  Temperature: {settings.llm_temperature}")
         logger.info(f"  Max Tokens: {settings.llm_max_tokens}")
         logger.info("=" * 80)
+        http_client, http_async_client = get_llm_http_clients()
         llm = ChatOpenAI(
             model_name=settings.llm_model,
             temperature=settings.llm_temperature,
             max_tokens=settings.llm_max_tokens,
             api_key=settings.llm_api_key,
             base_url=settings.llm_base_url,
-            timeout=60.0,  # 设置超时时间为 60 秒
+            timeout=LLM_TIMEOUT,  # 设置超时时间为 60 秒
             max_retries=3,  # 设置最大重试次数为 3 次
+            http_client=http_client,
+            http_async_client=http_async_client,
         )
         # 打印实际使用的配置和完整的 API URL
         logger.info(f"  Actual Base URL (from client): {llm.openai_api_base if hasattr(llm, 'openai_api_base') else settings.llm_base_url}")
@@ -69,14 +140,17 @@ def create_llm():
         logger.info(f"  Temperature: {settings.llm_temperature}")
         logger.info(f"  Max Tokens: {settings.llm_max_tokens}")
         logger.info("=" * 80)
+        http_client, http_async_client = get_llm_http_clients()
         llm = ChatOpenAI(
             model_name=settings.llm_model,
             temperature=settings.llm_temperature,
             max_tokens=settings.llm_max_tokens,
             api_key=settings.openai_api_key,
             base_url=base_url,  # 如果设置了自定义 Base URL，使用它
-            timeout=60.0,  # 设置超时时间为 60 秒
+            timeout=LLM_TIMEOUT,  # 设置超时时间为 60 秒
             max_retries=3,  # 设置最大重试次数为 3 次
+            http_client=http_client,
+            http_async_client=http_async_client,
         )
         # 打印实际使用的配置
         logger.info(f"  Actual Base URL (from client): {llm.openai_api_base if hasattr(llm, 'openai_api_base') else base_url}")
@@ -107,6 +181,71 @@ def create_llm():
         )
 
 
+def get_llm():
+    """获取进程级共享的 LLM 实例
+    
+    LLM 实例是无状态的，可以在多个执行器和并发请求之间复用；配置变化时重新创建。
+    
+    Returns:
+        LLM 实例
+    """
+    key = _llm_config_key()
+    llm = _llm_instances.get(key)
+    if llm is not None:
+        return llm
+    with _llm_lock:
+        # 并发请求只创建一次实例
+        llm = _llm_instances.get(key)
+        if llm is None:
+            llm = create_llm()
+            # 配置已变化的旧实例不再使用
+            _llm_instances.clear()
+            _llm_instances[key] = llm
+    return llm
+
+
+def prewarm_llm() -> bool:
+    """预热 LLM 客户端：创建共享实例并提前建立到 LLM 服务的长连接
+    
+    Returns:
+        是否成功建立连接（未配置 LLM 或连接失败时返回 False）
+    """
+    try:
+        get_llm()
+    except ValueError as e:
+        logger.warning(f"Skip LLM prewarm: {str(e)}")
+        return False
+    
+    base_url = _get_llm_base_url()
+    if not base_url:
+        # ChatAnthropic 使用 langchain_anthropic 内部缓存的 HTTP 客户端，只预先创建实例
+        return True
+    
+    http_client, _ = get_llm_http_clients()
+    try:
+        # 任意响应（包括 401/404）都说明连接已建立，连接会保留在连接池中
+        response = http_client.get(base_url, timeout=LLM_PREWARM_TIMEOUT)
+        logger.info(f"LLM connection prewarmed: {base_url} (status {response.status_code})")
+        return True
+    except httpx.HTTPError as e:
+        logger.warning(f"Failed to prewarm LLM connection to {base_url}: {str(e)}")
+        return False
+
+
+async def close_llm_clients():
+    """关闭共享的 HTTP 连接池并清空 LLM 实例缓存"""
+    global _http_clients
+    with _llm_lock:
+        clients = _http_clients
+        _http_clients = None
+        _llm_instances.clear()
+    if clients is None:
+        return
+    sync_client, async_client = clients
+    sync_client.close()
+    await async_client.aclose()
+
+
 def get_tools() -> List:
     """获取所有工具列表（支持动态注册）"""
     logger.info("get_tools() called")
@@ -1,4 +1,5 @@
 """API 请求/响应模型"""
+from datetime import datetime
 from typing import List, Optional
 from pydantic import BaseModel, Field, ConfigDict
 
@@ -48,6 +49,14 @@ class AnalysisResult(BaseModel):
     related_data: Optional[List[dict]] = Field(None, description="相关数据库查询结果")
 
 
+class CacheInfo(BaseModel):
+    """缓存命中信息（结果来自缓存时返回）"""
+    match_type: str = Field(..., description="匹配方式：'exact'（输入相同）、'normalized'（去掉时间戳、ID 等易变内容后相同）、'similar'（近似重复）")
+    similarity: float = Field(..., ge=0.0, le=1.0, description="与缓存条目输入的相似度（0-1）")
+    cached_at: datetime = Field(..., description="缓存结果的生成时间")
+    cached_input: Optional[str] = Field(None, description="缓存条目对应的原始输入（截断）")
+
+
 class AnalyzeResponse(BaseModel):
     """分析响应模型"""
     task_id: Optional[str] = Field(None, description="任务ID（异步请求时返回）")
@@ -55,6 +64,8 @@ class AnalyzeResponse(BaseModel):
     result: Optional[AnalysisResult] = Field(None, description="分析结果（完成时返回）")
     error: Optional[str] = Field(None, description="错误信息（失败时返回）")
     execution_time: Optional[float] = Field(None, description="执行时间（秒）")
+    cache: Optional[CacheInfo] = Field(None, description="缓存命中信息（结果来自缓存时返回）")
+    coalesced: bool = Field(False, description="是否复用了正在执行的相同请求的结果（没有单独执行分析）")
 
 
 class AsyncTaskResponse(BaseModel):
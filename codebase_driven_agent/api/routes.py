@@ -1,9 +1,9 @@
 """API 路由实现"""
+import asyncio
 import uuid
 import time
-import threading
-from typing import Dict, Optional, List
 from datetime import datetime
+from typing import Dict, Optional, List, Tuple
 from fastapi import APIRouter, HTTPException, BackgroundTasks
 
 from codebase_driven_agent.api.models import (
@@ -11,6 +11,7 @@ from codebase_driven_agent.api.models import (
     AnalyzeResponse,
     AsyncTaskResponse,
     AnalysisResult,
+    CacheInfo,
     ContextFile,
     UserReplyRequest,
     UserReplyResponse,
@@ -19,16 +20,15 @@ from codebase_driven_agent.api.models import (
 )
 from codebase_driven_agent.config import settings
 from codebase_driven_agent.utils.logger import setup_logger
+from codebase_driven_agent.utils.single_flight import SingleFlight
+from codebase_driven_agent.utils.task_store import get_task_store
 
 logger = setup_logger("codebase_driven_agent.api")
 
 router = APIRouter(prefix="/api/v1", tags=["analysis"])
 
-# 任务存储（内存存储，线程安全）
-# TODO: 后续可以替换为 Redis
-_tasks: Dict[str, Dict] = {}
-_task_lock = threading.Lock()  # 线程锁，保证线程安全
-
+# 正在执行的分析（/analyze 和 /analyze/async 共用，相同请求只执行一次）
+_analysis_flights = SingleFlight()
 
 def _generate_task_id() -> str:
     """生成任务ID"""
@@ -36,69 +36,23 @@ def _generate_task_id() -> str:
 
 
 def _create_task(task_id: str, status: str = "pending") -> Dict:
-    """创建任务（线程安全）"""
-    with _task_lock:
-        task = {
-            "task_id": task_id,
-            "status": status,
-            "created_at": datetime.now(),
-            "updated_at": datetime.now(),
-            "result": None,
-            "error": None,
-            "execution_time": None,
-        }
-        _tasks[task_id] = task
-        return task
+    """创建任务（存储由 TASK_STORAGE_TYPE 决定，多 worker 部署时使用 Redis 共享）"""
+    return get_task_store().create(task_id, status)
 
 
 def _update_task(task_id: str, **kwargs) -> Optional[Dict]:
-    """更新任务状态（线程安全）"""
-    with _task_lock:
-        if task_id not in _tasks:
-            return None
-        
-        task = _tasks[task_id]
-        task.update(kwargs)
-        task["updated_at"] = datetime.now()
-        return task
+    """更新任务状态"""
+    return get_task_store().update(task_id, **kwargs)
 
 
 def _get_task(task_id: str) -> Optional[Dict]:
-    """获取任务（线程安全）"""
-    with _task_lock:
-        return _tasks.get(task_id)
+    """获取任务"""
+    return get_task_store().get(task_id)
 
 
 def _cleanup_expired_tasks():
-    """清理过期任务（线程安全）"""
-    with _task_lock:
-        now = datetime.now()
-        expired_task_ids = []
-        
-        for task_id, task in _tasks.items():
-            # 检查任务是否过期
-            if task.get("updated_at"):
-                age = now - task["updated_at"]
-                if age.total_seconds() > settings.task_ttl:
-                    expired_task_ids.append(task_id)
-        
-        # 删除过期任务
-        for task_id in expired_task_ids:
-            del _tasks[task_id]
-            logger.info(f"Cleaned up expired task: {task_id}")
-        
-        # 限制最大任务数量
-        if len(_tasks) > settings.max_tasks:
-            # 按更新时间排序，删除最旧的任务
-            sorted_tasks = sorted(
-                _tasks.items(),
-                key=lambda x: x[1].get("updated_at", datetime.min)
-            )
-            excess_count = len(_tasks) - settings.max_tasks
-            for i in range(excess_count):
-                task_id = sorted_tasks[i][0]
-                del _tasks[task_id]
-                logger.info(f"Removed excess task: {task_id}")
+    """清理过期任务和超出 MAX_TASKS 的任务"""
+    get_task_store().cleanup()
 
 
 def _parse_context_files(context_files: Optional[List[ContextFile]]) -> Dict:
@@ -134,6 +88,23 @@ def _parse_context_files(context_files: Optional[List[ContextFile]]) -> Dict:
     }
 
 
+def _build_request_data(request: AnalyzeRequest) -> Dict:
+    """构建用于生成缓存键的请求数据"""
+    return {
+        "input": request.input,
+        "context_files": [
+            {
+                "type": ctx.type,
+                "path": ctx.path,
+                "content": ctx.content,
+                "line_start": ctx.line_start,
+                "line_end": ctx.line_end,
+            }
+            for ctx in (request.context_files or [])
+        ],
+    }
+
+
 async def _execute_analysis(request: AnalyzeRequest) -> AnalysisResult:
     """执行分析（集成 Agent）- 使用 GraphExecutorWrapper"""
     from codebase_driven_agent.agent.graph_executor import GraphExecutorWrapper
@@ -189,6 +160,40 @@ async def _execute_analysis(request: AnalyzeRequest) -> AnalysisResult:
         )
 
 
+async def _execute_and_cache(request: AnalyzeRequest) -> AnalysisResult:
+    """执行分析，成功的结果写入请求缓存"""
+    from codebase_driven_agent.utils.cache import get_request_cache
+    
+    result = await _execute_analysis(request)
+    
+    # 缓存结果（仅缓存成功的结果）
+    cache = get_request_cache()
+    if cache is not None and result and result.confidence > 0:
+        # 规范化和 MinHash 签名是纯 Python 计算，在线程中执行，不阻塞事件循环
+        await asyncio.to_thread(cache.set, _build_request_data(request), result)
+    return result
+
+
+async def _run_analysis_once(request: AnalyzeRequest, endpoint: str) -> Tuple[AnalysisResult, bool]:
+    """
+    执行分析；相同请求（RequestCache 缓存键相同）正在执行时等待它的结果，不重复执行
+    
+    Args:
+        request: 分析请求
+        endpoint: 发起请求的接口（用于日志和指标）
+        
+    Returns:
+        (分析结果, 是否复用了其他请求发起的执行)
+    """
+    if not settings.request_coalescing_enabled:
+        return await _execute_and_cache(request), False
+    
+    from codebase_driven_agent.utils.cache import request_cache_key
+    
+    key = request_cache_key(_build_request_data(request))
+    return await _analysis_flights.run(key, lambda: _execute_and_cache(request), endpoint=endpoint)
+
+
 @router.post("/analyze", response_model=AnalyzeResponse)
 async def analyze_sync(request: AnalyzeRequest):
     """
@@ -198,8 +203,12 @@ async def analyze_sync(request: AnalyzeRequest):
     
     支持请求缓存和去重：
     - 相同输入（包括 context_files）的请求会返回缓存结果
+    - 启用 CACHE_SIMILARITY_ENABLED 时，只有时间戳、请求 ID 等易变内容不同的近似重复请求也会命中，
+      响应的 cache 字段给出匹配方式和相似度
     - 缓存默认保留 1 小时
     - 可以通过配置 CACHE_TTL 和 CACHE_MAX_SIZE 调整缓存参数
+    - 相同的请求正在执行时（包括 /analyze/async 发起的执行）不重复执行，等待并返回同一个结果，
+      响应的 coalesced 为 true（REQUEST_COALESCING_ENABLED=false 时关闭）
     """
     start_time = time.time()
     
@@ -208,58 +217,32 @@ async def analyze_sync(request: AnalyzeRequest):
         from codebase_driven_agent.utils.cache import get_request_cache
         cache = get_request_cache()
         
-        if cache:
-            # 构建请求数据用于缓存键生成
-            request_data = {
-                "input": request.input,
-                "context_files": [
-                    {
-                        "type": ctx.type,
-                        "path": ctx.path,
-                        "content": ctx.content,
-                        "line_start": ctx.line_start,
-                        "line_end": ctx.line_end,
-                    }
-                    for ctx in (request.context_files or [])
-                ],
-            }
-            
-            # 尝试从缓存获取结果
-            cached_result = cache.get(request_data)
-            if cached_result:
-                logger.info("Returning cached result")
+        if cache is not None:
+            # 尝试从缓存获取结果（包括近似重复的请求），签名计算在线程中执行
+            cache_hit = await asyncio.to_thread(cache.lookup, _build_request_data(request))
+            if cache_hit:
+                logger.info(f"Returning cached result ({cache_hit.match_type}, similarity={cache_hit.similarity:.2f})")
                 execution_time = time.time() - start_time
                 return AnalyzeResponse(
                     task_id=None,
                     status="completed",
-                    result=cached_result,
+                    result=cache_hit.result,
                     error=None,
                     execution_time=execution_time,
+                    cache=CacheInfo(
+                        match_type=cache_hit.match_type,
+                        similarity=cache_hit.similarity,
+                        cached_at=datetime.fromtimestamp(cache_hit.cached_at),
+                        cached_input=cache_hit.input_preview,
+                    ),
                 )
         
         # 解析 context_files
         _parse_context_files(request.context_files)
         logger.info(f"Received analysis request with {len(request.context_files or [])} context files")
         
-        # 执行分析
-        result = await _execute_analysis(request)
-        
-        # 缓存结果（仅缓存成功的结果）
-        if cache and result and result.confidence > 0:
-            request_data = {
-                "input": request.input,
-                "context_files": [
-                    {
-                        "type": ctx.type,
-                        "path": ctx.path,
-                        "content": ctx.content,
-                        "line_start": ctx.line_start,
-                        "line_end": ctx.line_end,
-                    }
-                    for ctx in (request.context_files or [])
-                ],
-            }
-            cache.set(request_data, result)
+        # 执行分析（相同请求正在执行时等待它的结果），成功的结果写入缓存
+        result, coalesced = await _run_analysis_once(request, "analyze")
         
         execution_time = time.time() - start_time
         
@@ -269,6 +252,7 @@ async def analyze_sync(request: AnalyzeRequest):
             result=result,
             error=None,
             execution_time=execution_time,
+            coalesced=coalesced,
         )
     
     except Exception as e:
@@ -293,10 +277,12 @@ async def _execute_analysis_async(task_id: str, request: AnalyzeRequest):
         context_data = _parse_context_files(request.context_files)
         logger.info(f"Task {task_id}: Starting analysis with {len(request.context_files or [])} context files")
         
-        # 执行分析
+        # 执行分析（相同请求正在执行时等待它的结果）
         start_time = time.time()
-        result = await _execute_analysis(request)
+        result, coalesced = await _run_analysis_once(request, "analyze_async")
         execution_time = time.time() - start_time
+        if coalesced:
+            logger.info(f"Task {task_id}: Reused result of an identical in-flight analysis")
         
         # 更新任务状态
         _update_task(
@@ -325,6 +311,7 @@ async def analyze_async(request: AnalyzeRequest, background_tasks: BackgroundTas
     异步分析接口
     
     接收用户输入和可选的 context_files，创建异步任务并立即返回任务ID。
+    相同的请求正在执行时，任务等待已有的执行完成并使用同一个结果。
     """
     # 清理过期任务
     _cleanup_expired_tasks()
@@ -501,11 +488,7 @@ async def reply_to_agent(reply_request: UserReplyRequest):
                     if current_step < len(plan_steps):
                         logger.info(f"User reply: Executing next step {current_step + 1}/{len(plan_steps)}")
                         # 执行下一个步骤
-                        import asyncio
-                        step_result = await asyncio.to_thread(
-                            graph_executor._execute_step_node,
-                            updated_state
-                        )
+                        step_result = await graph_executor._execute_step_node(updated_state)
                         updated_state.update(step_result)
                         session.state = updated_state
                         
@@ -514,7 +497,7 @@ async def reply_to_agent(reply_request: UserReplyRequest):
                     
                     # 如果没有更多步骤，执行决策节点（基于用户回复和已有结果重新决策）
                     logger.info("User reply: No more steps, executing decision node")
-                    decision_result = graph_executor._decision_node(updated_state)
+                    decision_result = await graph_executor._decision_node(updated_state)
                     updated_state.update(decision_result)
                     session.state = updated_state
                     
@@ -525,12 +508,7 @@ async def reply_to_agent(reply_request: UserReplyRequest):
                     if next_action == "synthesize":
                         # 生成最终结果
                         logger.info("User reply: Executing synthesize node")
-                        # 在线程池中执行同步的 _synthesize_node，避免阻塞事件循环
-                        import asyncio
-                        synthesize_result = await asyncio.to_thread(
-                            graph_executor._synthesize_node,
-                            updated_state
-                        )
+                        synthesize_result = await graph_executor._synthesize_node(updated_state)
                         updated_state.update(synthesize_result)
                         session.state = updated_state
                         # _synthesize_node 会自动发送 result 和 done 事件到消息队列
@@ -577,35 +555,20 @@ async def reply_to_agent(reply_request: UserReplyRequest):
                     elif next_action == "continue":
                         # "continue" 表示应该执行 execute_step 节点
                         logger.info("User reply: Action is 'continue', executing step node")
-                        # 在线程池中执行同步的 _execute_step_node，避免阻塞事件循环
-                        import asyncio
-                        step_result = await asyncio.to_thread(
-                            graph_executor._execute_step_node,
-                            updated_state
-                        )
+                        step_result = await graph_executor._execute_step_node(updated_state)
                         updated_state.update(step_result)
                         session.state = updated_state
                         # 执行步骤后，继续循环进行决策
                     elif next_action == "execute_step":
                         # 继续执行步骤（这个分支实际上不应该被 _should_continue 返回，但保留以防万一）
                         logger.info("User reply: Action is 'execute_step', executing step node")
-                        # 在线程池中执行同步的 _execute_step_node，避免阻塞事件循环
-                        import asyncio
-                        step_result = await asyncio.to_thread(
-                            graph_executor._execute_step_node,
-                            updated_state
-                        )
+                        step_result = await graph_executor._execute_step_node(updated_state)
                         updated_state.update(step_result)
                         session.state = updated_state
                     elif next_action == "plan" or next_action == "adjust_plan":
                         # 调整计划
                         logger.info(f"User reply: Action is '{next_action}', executing plan node")
-                        # 在线程池中执行同步的 _plan_node，避免阻塞事件循环
-                        import asyncio
-                        plan_result = await asyncio.to_thread(
-                            graph_executor._plan_node,
-                            updated_state
-                        )
+                        plan_result = await graph_executor._plan_node(updated_state)
                         updated_state.update(plan_result)
                         session.state = updated_state
                     elif next_action == "end":
@@ -726,12 +689,7 @@ async def skip_user_input(skip_request: SkipUserInputRequest):
                 
                 # 直接执行 synthesize 节点，基于已有信息得出结论
                 logger.info("Skip user input: Executing synthesize node directly")
-                # 在线程池中执行同步的 _synthesize_node，避免阻塞事件循环
-                import asyncio
-                synthesize_result = await asyncio.to_thread(
-                    graph_executor._synthesize_node,
-                    updated_state
-                )
+                synthesize_result = await graph_executor._synthesize_node(updated_state)
                 updated_state.update(synthesize_result)
                 session.state = updated_state
                 # _synthesize_node 会自动发送 result 和 done 事件到消息队列
@@ -3,17 +3,24 @@
 import json
 import asyncio
 import queue
+import threading
+import uuid
 from typing import AsyncGenerator, Optional, Set, List, Dict, Any
 from fastapi import APIRouter, Request
 from sse_starlette.sse import EventSourceResponse
 
 from codebase_driven_agent.api.models import AnalyzeRequest, AnalysisResult
+from codebase_driven_agent.config import settings
 from codebase_driven_agent.utils.logger import setup_logger
+from codebase_driven_agent.utils.metrics import get_metrics_collector
 
 logger = setup_logger("codebase_driven_agent.api.sse")
 
 router = APIRouter(prefix="/api/v1", tags=["streaming"])
 
+# 没有新消息时发送心跳的间隔（秒）
+HEARTBEAT_INTERVAL = 2.0
+
 # 全局 agent 任务注册表，用于在服务器关闭时取消所有任务
 _active_agent_tasks: Set[asyncio.Task] = set()
 _tasks_lock = asyncio.Lock()
@@ -64,6 +71,153 @@ async def cancel_all_agent_tasks():
         _active_agent_tasks.clear()
 
 
+class SSEMessageQueue(queue.Queue):
+    """可以在事件循环中等待的线程安全消息队列
+
+    生产者（图节点、线程池中的工具调用、用户回复接口）仍然使用 queue.Queue 的 put_nowait，
+    每次入队都通过 loop.call_soon_threadsafe 唤醒在事件循环中等待的 SSE 流，
+    SSE 流不再需要定时轮询队列。
+    """
+
+    def __init__(self, maxsize: int = 0):
+        super().__init__(maxsize)
+        # (事件循环, 事件循环所在线程 ID, 唤醒事件)，由消费者在第一次等待时绑定
+        self._waker: Optional[tuple] = None
+
+    def _put(self, item):
+        super()._put(item)
+        self._wakeup()
+
+    def _wakeup(self):
+        """唤醒等待中的消费者（可以从任意线程调用）"""
+        waker = self._waker
+        if waker is None:
+            return
+        loop, thread_id, event = waker
+        if thread_id == threading.get_ident():
+            event.set()
+            return
+        try:
+            loop.call_soon_threadsafe(event.set)
+        except RuntimeError:
+            # 事件循环已关闭，消费者不会再等待
+            pass
+
+    def _bind_loop(self) -> asyncio.Event:
+        """绑定当前事件循环，返回唤醒事件"""
+        loop = asyncio.get_running_loop()
+        waker = self._waker
+        if waker is None or waker[0] is not loop:
+            waker = (loop, threading.get_ident(), asyncio.Event())
+            self._waker = waker
+        return waker[2]
+
+    async def get_async(self, timeout: Optional[float] = None) -> Any:
+        """
+        在事件循环中等待并取出一条消息
+
+        Args:
+            timeout: 最长等待时间（秒），None 表示一直等待
+
+        Returns:
+            队列中的消息
+
+        Raises:
+            TimeoutError: 超时仍然没有消息
+        """
+        event = self._bind_loop()
+        async with asyncio.timeout(timeout):
+            while True:
+                try:
+                    return self.get_nowait()
+                except queue.Empty:
+                    pass
+                # 检查队列和清除事件之间没有让出事件循环，其他线程的唤醒不会丢失
+                event.clear()
+                await event.wait()
+
+
+class StreamFlight:
+    """正在执行的流式分析：记录已经发出的事件，并转发给所有订阅的 SSE 流
+
+    作为执行器的消息队列使用，提供执行器和回复接口用到的 queue.Queue 方法子集。
+    相同请求后到的 SSE 流订阅时先收到已经发出的事件，再继续接收新的事件。
+    """
+
+    def __init__(self):
+        # 所有订阅者共用一个事件通道（会话恢复到其他 worker 时事件发布到这个通道）
+        self.stream_id = uuid.uuid4().hex
+        self.task: Optional[asyncio.Task] = None
+        self.finished = False
+        self._events: List[Dict[str, Any]] = []
+        self._subscribers: List[SSEMessageQueue] = []
+        self._lock = threading.Lock()
+
+    def put_nowait(self, item: Dict[str, Any]) -> None:
+        # 在锁内转发，保证所有订阅者（包括正在订阅的）看到的事件顺序和历史记录一致
+        with self._lock:
+            self._events.append(item)
+            if isinstance(item, dict) and item.get("event") == "done":
+                self.finished = True
+            for subscriber in self._subscribers:
+                subscriber.put_nowait(item)
+
+    put = put_nowait
+
+    def qsize(self) -> int:
+        """已经发出的事件数（用于判断是否已经发送过事件）"""
+        return len(self._events)
+
+    def empty(self) -> bool:
+        return not self._events
+
+    def subscribe(self, message_queue: Optional[SSEMessageQueue] = None) -> SSEMessageQueue:
+        """
+        订阅事件：先放入已经发出的事件，之后的事件实时转发
+
+        Args:
+            message_queue: 接收事件的队列，为 None 时新建
+
+        Returns:
+            接收事件的队列
+        """
+        if message_queue is None:
+            message_queue = SSEMessageQueue()
+        with self._lock:
+            for item in self._events:
+                message_queue.put_nowait(item)
+            self._subscribers.append(message_queue)
+        return message_queue
+
+    def unsubscribe(self, message_queue: SSEMessageQueue) -> None:
+        """取消订阅（SSE 流结束时调用）"""
+        with self._lock:
+            self._subscribers = [q for q in self._subscribers if q is not message_queue]
+
+
+# 正在执行的流式分析（RequestCache 缓存键 -> StreamFlight），相同请求订阅已有的事件流
+_stream_flights: Dict[str, StreamFlight] = {}
+
+
+def _get_stream_flight(key: str) -> Optional[StreamFlight]:
+    """获取可以加入的流式分析（Agent 任务仍在运行且还没有发出 done 事件）"""
+    flight = _stream_flights.get(key)
+    if flight is None or flight.finished or flight.task is None or flight.task.done():
+        return None
+    return flight
+
+
+def _register_stream_flight(key: str, flight: StreamFlight) -> None:
+    """登记流式分析，Agent 任务结束后删除登记"""
+    _stream_flights[key] = flight
+
+    def discard(_task: asyncio.Task) -> None:
+        if _stream_flights.get(key) is flight:
+            del _stream_flights[key]
+
+    flight.task.add_done_callback(discard)
+
+
 class SSEMessage:
     """SSE 消息格式"""
 
@@ -157,9 +311,35 @@ async def _run_graph_executor_stream(
         message_queue.put_nowait({"event": "done", "data": {"message": "Analysis failed", "error": str(e)}})
 
 
+def _create_stream_executor(message_queue: Any) -> Any:
+    """为新的流式分析重置请求级状态并创建 GraphExecutor"""
+    from codebase_driven_agent.agent.graph_executor import GraphExecutorWrapper
+
+    # 清空日志查询缓存（确保缓存仅在当次请求生效）
+    from codebase_driven_agent.utils.log_query import get_log_query_instance
+
+    log_query_instance = get_log_query_instance()
+    if hasattr(log_query_instance, "clear_cache"):
+        log_query_instance.clear_cache()
+        logger.debug("Log query cache cleared for new analysis request")
+
+    # 重置全局取消标志（确保每次新请求开始时都是未取消状态）
+    try:
+        from codebase_driven_agent.tools.code_tool import _cancellation_event
+
+        _cancellation_event.clear()
+        logger.debug("Global cancellation event cleared for new analysis request")
+    except Exception as e:
+        logger.debug(f"Failed to clear global cancellation event: {e}")
+
+    # 创建 GraphExecutor（新的图式执行器）
+    event_loop = asyncio.get_event_loop()
+    return GraphExecutorWrapper(callbacks=None, message_queue=message_queue, event_loop=event_loop)
+
+
 async def _execute_analysis_stream(
     request: AnalyzeRequest,
-    message_queue: Optional[queue.Queue] = None,
+    message_queue: Optional[SSEMessageQueue] = None,
     request_obj: Optional[Request] = None,
 ) -> AsyncGenerator[str, None]:
     """
@@ -169,8 +349,12 @@ async def _execute_analysis_stream(
 
     Args:
         request: 分析请求
-        message_queue: SSE 消息队列（使用线程安全的 queue.Queue）
+        message_queue: SSE 消息队列（SSEMessageQueue，生产者可以从任意线程 put_nowait）
+
+    相同的分析（RequestCache 缓存键相同）正在执行时不启动新的 Agent，
+    而是订阅它的事件流：先收到已经发出的事件，再继续接收实时事件。
     """
+    flight: Optional[StreamFlight] = None
     try:
         # 发送开始消息（立即发送，确保用户看到反馈）
         yield SSEMessage.progress("开始分析...", progress=0.0, step="initializing")
@@ -188,10 +372,6 @@ async def _execute_analysis_stream(
             )
             await asyncio.sleep(0.1)
 
-        # 创建消息队列（使用线程安全的 queue.Queue）
-        if message_queue is None:
-            message_queue = queue.Queue()
-
         # 解析 context_files
         context_files = None
         if request.context_files:
@@ -206,37 +386,36 @@ async def _execute_analysis_stream(
                 for ctx in request.context_files
             ]
 
-        # 执行 Agent 分析（使用 GraphExecutor）
-        from codebase_driven_agent.agent.graph_executor import GraphExecutorWrapper
-        from codebase_driven_agent.agent.output_parser import OutputParser
-        from codebase_driven_agent.utils.extractors import extract_from_intermediate_steps
-
-        # 清空日志查询缓存（确保缓存仅在当次请求生效）
-        from codebase_driven_agent.utils.log_query import get_log_query_instance
-
-        log_query_instance = get_log_query_instance()
-        if hasattr(log_query_instance, "clear_cache"):
-            log_query_instance.clear_cache()
-            logger.debug("Log query cache cleared for new analysis request")
+        # 相同的分析正在执行时订阅它的事件流（先重放已经发出的事件），不重复执行
+        flight_key = None
+        if settings.request_coalescing_enabled:
+            from codebase_driven_agent.utils.cache import request_cache_key
+
+            flight_key = request_cache_key({"input": request.input, "context_files": context_files or []})
+            flight = _get_stream_flight(flight_key)
+        joined = flight is not None
+        if joined:
+            logger.info(f"Attached to in-flight stream analysis {flight_key[:8]}...")
+            get_metrics_collector().increment("analysis_coalesced_total", labels={"endpoint": "analyze_stream"})
+        else:
+            flight = StreamFlight()
 
-        # 重置全局取消标志（确保每次新请求开始时都是未取消状态）
-        try:
-            from codebase_driven_agent.tools.code_tool import _cancellation_event
+        # 创建消息队列（线程安全，并且可以在事件循环中等待），执行器的事件经过 StreamFlight 转发
+        message_queue = flight.subscribe(message_queue)
 
-            _cancellation_event.clear()
-            logger.debug("Global cancellation event cleared for new analysis request")
-        except Exception as e:
-            logger.debug(f"Failed to clear global cancellation event: {e}")
-
-        # 创建 GraphExecutor（新的图式执行器）
-        event_loop = asyncio.get_event_loop()
-        executor = GraphExecutorWrapper(callbacks=None, message_queue=message_queue, event_loop=event_loop)
+        # 执行 Agent 分析（使用 GraphExecutor）
+        executor = None if joined else _create_stream_executor(flight)
 
         # 发送 Agent 启动消息
         try:
-            yield SSEMessage.progress(
-                "Agent 已启动，正在分析问题...", progress=0.1, step="agent_started"
-            )
+            if joined:
+                yield SSEMessage.progress(
+                    "相同的分析正在进行，已加入并同步进度...", progress=0.1, step="joined"
+                )
+            else:
+                yield SSEMessage.progress(
+                    "Agent 已启动，正在分析问题...", progress=0.1, step="agent_started"
+                )
         except GeneratorExit:
             logger.info(
                 "Client disconnected after agent started, agent task continues in background"
@@ -255,17 +434,24 @@ async def _execute_analysis_stream(
         agent_task = None
 
         try:
-            # GraphExecutor.run() 是异步生成器，直接使用即可
-            agent_task = asyncio.create_task(
-                _run_graph_executor_stream(executor, request.input, context_files, message_queue)
-            )
-            # 注册 agent 任务，用于服务器关闭时取消
-            await register_agent_task(agent_task)
+            if joined:
+                # 等待已有的执行，不启动新的 Agent
+                agent_task = flight.task
+            else:
+                # GraphExecutor.run() 是异步生成器，直接使用即可
+                agent_task = asyncio.create_task(
+                    _run_graph_executor_stream(executor, request.input, context_files, flight)
+                )
+                flight.task = agent_task
+                if flight_key is not None:
+                    _register_stream_flight(flight_key, flight)
+                # 注册 agent 任务，用于服务器关闭时取消
+                await register_agent_task(agent_task)
 
             # 处理消息队列
             loop = asyncio.get_event_loop()
             last_progress_time = loop.time()
-            heartbeat_interval = 2.0  # 每 2 秒发送一次心跳
+            heartbeat_interval = HEARTBEAT_INTERVAL
 
             logger.info("Entering message processing loop...")
             # 无限等待，直到 SSE 连接断开（客户端离开）
@@ -281,31 +467,27 @@ async def _execute_analysis_stream(
                         agent_completed = True
                         logger.info("Agent task completed, continuing to process messages...")
                     
-                    # 从线程安全的 queue.Queue 中非阻塞地获取消息
+                    # 等待新消息（由入队操作唤醒，不轮询），到下一次心跳时间仍没有消息则发送心跳
                     try:
-                        msg = message_queue.get_nowait()
+                        timeout = max(0.0, last_progress_time + heartbeat_interval - loop.time())
+                        msg = await message_queue.get_async(timeout)
                         logger.info(f"Got message from queue: {msg.get('event', 'unknown')}, queue size after get: {message_queue.qsize()}")
-                    except queue.Empty:
-                        # 队列为空，等待一小段时间后继续检查
+                    except TimeoutError:
+                        # 发送心跳（保持连接活跃）
                         # 如果客户端断开连接，yield 会抛出 GeneratorExit
-                        await asyncio.sleep(0.01)  # 进一步减少等待时间到 0.01s，提高响应速度
-                        
-                        # 检查是否需要发送心跳（保持连接活跃）
-                        current_time = loop.time()
-                        if current_time - last_progress_time > heartbeat_interval:
-                            try:
-                                yield SSEMessage.progress(
-                                    "等待中...", progress=0.5, step="waiting"
-                                )
-                                last_progress_time = current_time
-                                logger.debug("Heartbeat sent")
-                            except GeneratorExit:
-                                # 客户端断开连接，正常退出
-                                logger.info("Client disconnected, exiting message processing loop")
-                                raise
-                            except asyncio.CancelledError:
-                                logger.info("Task cancelled during heartbeat")
-                                break
+                        try:
+                            yield SSEMessage.progress(
+                                "等待中...", progress=0.5, step="waiting"
+                            )
+                            last_progress_time = loop.time()
+                            logger.debug("Heartbeat sent")
+                        except GeneratorExit:
+                            # 客户端断开连接，正常退出
+                            logger.info("Client disconnected, exiting message processing loop")
+                            raise
+                        except asyncio.CancelledError:
+                            logger.info("Task cancelled during heartbeat")
+                            break
                         continue
                     
                     if msg:
@@ -495,6 +677,10 @@ async def _execute_analysis_stream(
         # 其他错误
         logger.error(f"Error in _execute_analysis_stream: {e}", exc_info=True)
         yield SSEMessage.error(str(e))
+    finally:
+        # SSE 流结束后不再接收事件（Agent 任务和其他订阅者不受影响）
+        if flight is not None and message_queue is not None:
+            flight.unsubscribe(message_queue)
 
 
 @router.post("/analyze/stream")
@@ -509,6 +695,8 @@ async def analyze_stream(request: AnalyzeRequest, request_obj: Request):
     - event: result - 分析结果
     - event: error - 错误信息
     - event: done - 分析完成
+
+    相同的请求正在执行时，后到的连接先收到已经发出的事件，再继续接收同一个分析的实时事件。
     """
 
     async def event_generator():
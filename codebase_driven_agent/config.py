@@ -1,6 +1,6 @@
 """配置管理模块"""
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import Optional
+from typing import Dict, Optional
 
 
 class Settings(BaseSettings):
@@ -26,6 +26,10 @@ class Settings(BaseSettings):
     llm_model: str = "gpt-4"
     llm_temperature: float = 0.0
     llm_max_tokens: int = 4000
+    llm_max_connections: int = 100  # LLM HTTP 连接池最大连接数（所有执行器共享）
+    llm_max_keepalive_connections: int = 20  # 保持长连接的最大空闲连接数
+    llm_keepalive_expiry: float = 60.0  # 空闲长连接的过期时间（秒）
+    llm_prewarm: bool = True  # 服务启动时预热 LLM 客户端和连接
     
     # 日志易配置
     logyi_base_url: Optional[str] = None
@@ -36,6 +40,12 @@ class Settings(BaseSettings):
     # 文件日志配置
     log_file_base_path: Optional[str] = None
     log_query_type: str = "logyi"  # "logyi" 或 "file"
+    log_index_enabled: bool = True  # 是否为文件日志建立持久化倒排索引和时间范围索引
+    log_index_dir: Optional[str] = None  # 日志索引目录，默认与符号索引相同
+    log_index_refresh_interval: int = 5  # 后台增量更新日志索引的间隔（秒），查询时也按此间隔刷新
+    log_scan_workers: int = 8  # 并行扫描日志文件的线程数，1 表示串行
+    log_format: str = "auto"  # 日志格式：auto（按文件自动识别）、json、logfmt、java、python、nginx、generic 或自定义格式名
+    log_format_patterns: Dict[str, str] = {}  # 自定义 grok 风格的日志格式（JSON），如 {"myapp": "%{TIMESTAMP_ISO8601:timestamp} %{LOGLEVEL:level} %{GREEDYDATA:message}"}
     
     # 数据库配置
     database_url: Optional[str] = None
@@ -43,6 +53,10 @@ class Settings(BaseSettings):
     # Agent 配置
     agent_max_iterations: int = 15
     agent_max_execution_time: int = 300  # 秒
+    agent_max_parallel_steps: int = 4  # 同一批次中并发执行的最大步骤数
+    agent_step_workers: int = 16  # 执行计划步骤的共享线程池大小（所有请求共用）
+    agent_prefetch_enabled: bool = True  # LLM 决策期间是否预取可能的下一步工具调用
+    agent_prefetch_max_calls: int = 3  # 每次决策最多预取的工具调用数
     
     # 任务管理配置
     task_storage_type: str = "memory"  # "memory" 或 "redis"
@@ -50,13 +64,49 @@ class Settings(BaseSettings):
     task_ttl: int = 3600  # 任务过期时间（秒）
     max_tasks: int = 1000  # 最大任务数
     
+    # 会话存储配置（等待用户回复的交互式分析）
+    session_storage_type: str = "memory"  # "memory"、"sqlite" 或 "redis"，多 worker 部署时使用 sqlite（单机）或 redis
+    session_db_path: Optional[str] = None  # sqlite 会话数据库路径，默认 ~/.cache/codebase_driven_agent/sessions.db
+    session_timeout_minutes: int = 30  # 会话过期时间（分钟）
+    session_relay_poll_interval: float = 0.2  # sqlite 存储转发事件的轮询间隔（秒）
+    
     # 代码仓库配置
     code_repo_path: Optional[str] = None
     
+    # 符号索引配置
+    symbol_index_enabled: bool = True  # 是否使用持久化符号索引加速 AST 搜索
+    symbol_index_dir: Optional[str] = None  # 索引文件目录，默认 ~/.cache/codebase_driven_agent/index
+    symbol_index_refresh_interval: int = 60  # 查询时增量刷新索引的最小间隔（秒）
+    ast_tree_cache_max_bytes: int = 64 * 1024 * 1024  # AST 解析树缓存上限（按源码字节数计算）
+    
+    # 文件扫描配置（ripgrep 不可用时的回退搜索）
+    file_scan_workers: int = 0  # 并行扫描进程数，0 表示按 CPU 核数自动选择，1 表示串行
+    
+    # 文件目录配置（内置工具共享的常驻内存文件列表）
+    file_catalog_refresh_interval: int = 10  # 查询时增量刷新文件列表的最小间隔（秒）
+    
+    # 代码仓库变更监听配置
+    repo_watch_enabled: bool = True  # 是否在服务启动时监听代码仓库变更，及时刷新文件目录和符号索引
+    repo_watch_debounce: float = 0.5  # 去抖时间（秒），事件停止这么久后统一分发失效通知
+    repo_watch_poll_interval: float = 2.0  # 轮询（watchdog 不可用时）和 Git HEAD 检测间隔（秒）
+    
     # 缓存配置
     cache_ttl: int = 3600  # 缓存过期时间（秒），默认 1 小时
-    cache_max_size: int = 1000  # 最大缓存条目数
+    cache_max_size: int = 1000  # 最大缓存条目数（0 表示只按字节数限制）
+    cache_max_bytes: int = 256 * 1024 * 1024  # 缓存结果的总字节数上限（按序列化后的 JSON 计算）
+    cache_shards: int = 16  # 缓存分片数（每个分片一把锁）
+    cache_similarity_enabled: bool = False  # 精确匹配未命中时，是否按规范化后的输入查找近似重复的请求
+    cache_similarity_threshold: float = 0.85  # 判定为近似重复的最低相似度（MinHash 估算的 Jaccard 相似度）
+    cache_similarity_num_perm: int = 128  # MinHash 签名长度
+    cache_similarity_bands: int = 32  # LSH 分段数（必须能整除签名长度）
     cache_enabled: bool = True  # 是否启用缓存
+    cache_disk_enabled: bool = False  # 是否在内存缓存之后增加本地 SQLite 磁盘层（重启后保留，同一台机器上的 worker 共享）
+    cache_disk_path: Optional[str] = None  # 磁盘缓存数据库路径，默认 ~/.cache/codebase_driven_agent/request_cache.db
+    cache_disk_max_bytes: int = 1024 * 1024 * 1024  # 磁盘缓存的总字节数上限（压缩后），超出时删除最久未使用的条目
+    request_coalescing_enabled: bool = True  # 合并并发的相同分析请求（只执行一次，后到的请求等待同一个结果或事件流）
+    tool_cache_enabled: bool = True  # 是否跨请求缓存工具结果（code_search、grep、read、数据库 schema 等）
+    tool_cache_policies: Dict[str, Dict[str, int]] = {}  # 按工具覆盖缓存策略（JSON），如 {"read": {"ttl": 600}, "log_search": {"ttl": 0}}
+    tool_cache_log_bucket: int = 60  # 日志查询结果的时间桶（秒），同一时间桶内的相同查询复用结果
     
     # 日志配置
     log_level: str = "INFO"  # 日志级别：DEBUG, INFO, WARNING, ERROR, CRITICAL
@@ -2,6 +2,7 @@
 import asyncio
 import threading
 from contextlib import asynccontextmanager
+from typing import Optional
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -43,6 +44,10 @@ def print_configuration():
     logger.info(f"  LLM_MODEL: {settings.llm_model}")
     logger.info(f"  LLM_TEMPERATURE: {settings.llm_temperature}")
     logger.info(f"  LLM_MAX_TOKENS: {settings.llm_max_tokens}")
+    logger.info(f"  LLM_MAX_CONNECTIONS: {settings.llm_max_connections}")
+    logger.info(f"  LLM_MAX_KEEPALIVE_CONNECTIONS: {settings.llm_max_keepalive_connections}")
+    logger.info(f"  LLM_KEEPALIVE_EXPIRY: {settings.llm_keepalive_expiry}")
+    logger.info(f"  LLM_PREWARM: {settings.llm_prewarm}")
     
     # 日志查询配置
     logger.info("Log Query Configuration:")
@@ -52,6 +57,14 @@ def print_configuration():
     logger.info(f"  LOGYI_APIKEY: {'***' if settings.logyi_apikey else 'None'}")
     logger.info(f"  LOGYI_APPNAME: {settings.logyi_appname}")
     logger.info(f"  LOG_FILE_BASE_PATH: {settings.log_file_base_path}")
+    logger.info(f"  LOG_INDEX_ENABLED: {settings.log_index_enabled}")
+    if settings.log_index_enabled:
+        logger.info(f"  LOG_INDEX_DIR: {settings.log_index_dir or '(default)'}")
+        logger.info(f"  LOG_INDEX_REFRESH_INTERVAL: {settings.log_index_refresh_interval}")
+    logger.info(f"  LOG_SCAN_WORKERS: {settings.log_scan_workers}")
+    logger.info(f"  LOG_FORMAT: {settings.log_format}")
+    if settings.log_format_patterns:
+        logger.info(f"  LOG_FORMAT_PATTERNS: {', '.join(settings.log_format_patterns)}")
     
     # 数据库配置
     logger.info("Database Configuration:")
@@ -61,16 +74,55 @@ def print_configuration():
     logger.info("Agent Configuration:")
     logger.info(f"  AGENT_MAX_ITERATIONS: {settings.agent_max_iterations}")
     logger.info(f"  AGENT_MAX_EXECUTION_TIME: {settings.agent_max_execution_time}")
+    logger.info(f"  AGENT_MAX_PARALLEL_STEPS: {settings.agent_max_parallel_steps}")
+    logger.info(f"  AGENT_STEP_WORKERS: {settings.agent_step_workers}")
+    logger.info(f"  AGENT_PREFETCH_ENABLED: {settings.agent_prefetch_enabled}")
+    logger.info(f"  AGENT_PREFETCH_MAX_CALLS: {settings.agent_prefetch_max_calls}")
+    
+    # 任务存储配置
+    logger.info("Task Storage Configuration:")
+    logger.info(f"  TASK_STORAGE_TYPE: {settings.task_storage_type}")
+    logger.info(f"  REDIS_URL: {'***' if settings.redis_url else 'None'}")
+    logger.info(f"  TASK_TTL: {settings.task_ttl}")
+    logger.info(f"  MAX_TASKS: {settings.max_tasks}")
+    
+    # 会话存储配置
+    logger.info("Session Storage Configuration:")
+    logger.info(f"  SESSION_STORAGE_TYPE: {settings.session_storage_type}")
+    logger.info(f"  SESSION_DB_PATH: {settings.session_db_path}")
+    logger.info(f"  SESSION_TIMEOUT_MINUTES: {settings.session_timeout_minutes}")
+    logger.info(f"  SESSION_RELAY_POLL_INTERVAL: {settings.session_relay_poll_interval}")
     
     # 代码仓库配置
     logger.info("Code Repository Configuration:")
     logger.info(f"  CODE_REPO_PATH: {settings.code_repo_path}")
     
+    # 代码仓库变更监听配置
+    logger.info("Repository Watch Configuration:")
+    logger.info(f"  REPO_WATCH_ENABLED: {settings.repo_watch_enabled}")
+    logger.info(f"  REPO_WATCH_DEBOUNCE: {settings.repo_watch_debounce}")
+    logger.info(f"  REPO_WATCH_POLL_INTERVAL: {settings.repo_watch_poll_interval}")
+    
     # 缓存配置
     logger.info("Cache Configuration:")
     logger.info(f"  CACHE_ENABLED: {settings.cache_enabled}")
     logger.info(f"  CACHE_TTL: {settings.cache_ttl}")
     logger.info(f"  CACHE_MAX_SIZE: {settings.cache_max_size}")
+    logger.info(f"  CACHE_MAX_BYTES: {settings.cache_max_bytes}")
+    logger.info(f"  CACHE_SHARDS: {settings.cache_shards}")
+    logger.info(f"  CACHE_SIMILARITY_ENABLED: {settings.cache_similarity_enabled}")
+    if settings.cache_similarity_enabled:
+        logger.info(f"  CACHE_SIMILARITY_THRESHOLD: {settings.cache_similarity_threshold}")
+        logger.info(f"  CACHE_SIMILARITY_NUM_PERM: {settings.cache_similarity_num_perm}")
+        logger.info(f"  CACHE_SIMILARITY_BANDS: {settings.cache_similarity_bands}")
+    logger.info(f"  CACHE_DISK_ENABLED: {settings.cache_disk_enabled}")
+    if settings.cache_disk_enabled:
+        logger.info(f"  CACHE_DISK_PATH: {settings.cache_disk_path or '(default)'}")
+        logger.info(f"  CACHE_DISK_MAX_BYTES: {settings.cache_disk_max_bytes}")
+    logger.info(f"  REQUEST_COALESCING_ENABLED: {settings.request_coalescing_enabled}")
+    logger.info(f"  TOOL_CACHE_ENABLED: {settings.tool_cache_enabled}")
+    logger.info(f"  TOOL_CACHE_POLICIES: {settings.tool_cache_policies or '(defaults)'}")
+    logger.info(f"  TOOL_CACHE_LOG_BUCKET: {settings.tool_cache_log_bucket}")
     
     # 日志配置
     logger.info("Logging Configuration:")
@@ -79,11 +131,49 @@ def print_configuration():
     logger.info("=" * 80)
 
 
+def _start_repo_watcher():
+    """启动代码仓库变更监听（复用 CodeTool 的 Git 仓库句柄检测 HEAD 变化）"""
+    from codebase_driven_agent.tools.registry import get_tool_registry
+    from codebase_driven_agent.utils.repo_watcher import start_repo_watcher
+    
+    code_tool = get_tool_registry().get_tool("code_search")
+    git_repo = getattr(code_tool, "git_repo", None) if code_tool else None
+    start_repo_watcher(git_repo=git_repo)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
     # 启动时的操作（如果需要）
     logger.info("Application startup")
+    if settings.llm_prewarm:
+        # 预先创建共享的 LLM 实例并建立长连接，避免第一个请求承担连接建立的开销
+        try:
+            from codebase_driven_agent.agent.utils import prewarm_llm
+            await asyncio.to_thread(prewarm_llm)
+        except Exception as e:
+            logger.warning(f"Failed to prewarm LLM client: {str(e)}")
+    if settings.cache_enabled and settings.cache_disk_enabled:
+        # 把磁盘缓存中最近使用的分析结果预加载到内存
+        try:
+            from codebase_driven_agent.utils.cache import warm_request_cache
+            await asyncio.to_thread(warm_request_cache)
+        except Exception as e:
+            logger.warning(f"Failed to warm-load request cache: {str(e)}")
+    if settings.log_query_type.lower() == "file" and settings.log_index_enabled and settings.log_file_base_path:
+        # 后台增量更新文件日志索引，服务关闭时随日志查询的停止标志一起停止
+        try:
+            from codebase_driven_agent.utils.log_index import start_log_indexer
+            from codebase_driven_agent.utils.log_query import _shutdown_event
+            start_log_indexer(_shutdown_event)
+        except Exception as e:
+            logger.warning(f"Failed to start log indexer: {str(e)}")
+    if settings.repo_watch_enabled:
+        # 监听代码仓库变更，及时让文件目录和符号索引失效（注册工具和建立文件监听可能较慢，放到线程中执行）
+        try:
+            await asyncio.to_thread(_start_repo_watcher)
+        except Exception as e:
+            logger.warning(f"Failed to start repository watcher: {str(e)}")
     yield
     # 关闭时的操作
     logger.info("Server shutting down, cancelling all active agent tasks...")
@@ -93,9 +183,43 @@ async def lifespan(app: FastAPI):
         _shutdown_event.set()
         logger.info("Shutdown event set, interrupting all log queries...")
         
+        # 关闭文件扫描进程池（取消尚未开始的扫描任务）
+        from codebase_driven_agent.utils.file_scanner import shutdown_scan_pool
+        shutdown_scan_pool()
+        
+        # 关闭计划步骤线程池（取消尚未开始的工具调用）
+        from codebase_driven_agent.agent.graph_executor import shutdown_step_executor
+        shutdown_step_executor()
+        
+        # 关闭日志扫描线程池（取消尚未开始的文件扫描）
+        from codebase_driven_agent.utils.log_scanner import shutdown_log_scan_executor
+        shutdown_log_scan_executor()
+        
+        # 停止代码仓库变更监听
+        from codebase_driven_agent.utils.repo_watcher import stop_repo_watcher
+        stop_repo_watcher()
+        
+        # 先取消正在执行的分析，再关闭它们使用的共享资源（LLM 连接池、任务存储、缓存、会话存储）
         from codebase_driven_agent.api.sse import cancel_all_agent_tasks
         # 设置超时，避免关闭流程卡住
         await asyncio.wait_for(cancel_all_agent_tasks(), timeout=2.0)
+        
+        # 关闭共享的 LLM HTTP 连接池
+        from codebase_driven_agent.agent.utils import close_llm_clients
+        await close_llm_clients()
+        
+        # 关闭任务存储（释放 Redis 连接）
+        from codebase_driven_agent.utils.task_store import close_task_store
+        close_task_store()
+        
+        # 关闭磁盘缓存的数据库连接
+        from codebase_driven_agent.utils.cache import close_request_cache
+        close_request_cache()
+        
+        # 关闭会话存储（停止事件转发订阅）
+        from codebase_driven_agent.agent.session_manager import get_session_manager
+        get_session_manager().close()
+        
         logger.info("Server shutdown complete")
     except asyncio.TimeoutError:
         logger.warning("Shutdown timeout, forcing exit...")
@@ -172,17 +296,20 @@ async def metrics():
 async def cache_stats():
     """获取缓存统计信息"""
     from codebase_driven_agent.utils.cache import get_request_cache
+    from codebase_driven_agent.utils.tool_cache import get_tool_result_cache
     cache = get_request_cache()
-    if cache:
-        return cache.get_stats()
-    return {"enabled": False}
+    stats = await asyncio.to_thread(cache.get_stats) if cache is not None else {"enabled": False}
+    stats["tool_cache"] = get_tool_result_cache().get_stats() if settings.tool_cache_enabled else {"enabled": False}
+    return stats
 
 
 @app.post("/api/v1/cache/clear")
 async def clear_cache():
     """清空缓存"""
     from codebase_driven_agent.utils.cache import clear_request_cache
-    clear_request_cache()
+    from codebase_driven_agent.utils.tool_cache import get_tool_result_cache
+    await asyncio.to_thread(clear_request_cache)
+    get_tool_result_cache().clear()
     return {"status": "cleared"}
 
 
@@ -220,6 +347,32 @@ async def disable_tool(tool_name: str):
         raise HTTPException(status_code=404, detail=f"Tool {tool_name} not found")
 
 
+@app.get("/api/v1/index/stats")
+async def symbol_index_stats():
+    """获取符号索引统计信息"""
+    from codebase_driven_agent.tools.symbol_index import get_symbol_index
+    index = get_symbol_index()
+    return await asyncio.to_thread(index.get_stats)
+
+
+@app.post("/api/v1/index/build")
+async def build_symbol_index(full: bool = False):
+    """构建或增量更新符号索引（full=true 时完全重建）"""
+    from codebase_driven_agent.tools.symbol_index import get_symbol_index
+    index = get_symbol_index()
+    stats = await asyncio.to_thread(index.build, full)
+    return {"status": "completed", "stats": stats}
+
+
+@app.get("/api/v1/index/symbols")
+async def lookup_symbols(name: str, kind: Optional[str] = None, limit: int = 100):
+    """按名称查询符号索引（kind: definition/call/reference/class/import）"""
+    from codebase_driven_agent.tools.symbol_index import get_symbol_index
+    index = get_symbol_index()
+    kinds = [kind] if kind else None
+    return await asyncio.to_thread(index.lookup, name, kinds, None, limit)
+
+
 def _start_cache_cleanup_task():
     """启动缓存清理后台任务"""
     def cleanup_loop():
@@ -230,7 +383,7 @@ def _start_cache_cleanup_task():
             try:
                 time.sleep(300)  # 每 5 分钟清理一次
                 cache = get_request_cache()
-                if cache:
+                if cache is not None:
                     cache.cleanup_expired()
             except KeyboardInterrupt:
                 logger.info("Cache cleanup task interrupted")
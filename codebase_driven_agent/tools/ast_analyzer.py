@@ -1,5 +1,7 @@
 """AST 代码分析器"""
-from typing import List, Optional, Dict, Tuple, Any
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Dict, Tuple, Any, Iterable
 from pathlib import Path
 from codebase_driven_agent.tools.ast_parser import get_ast_config, AST_AVAILABLE
 from codebase_driven_agent.utils.logger import setup_logger
@@ -18,11 +20,59 @@ class ASTCodeAnalyzer:
     - 函数调用关系图构建
     - 类继承关系分析
     - 模块依赖关系分析
+    
+    每棵语法树只用 TreeCursor 迭代遍历一次，按节点类型收集所有分析需要的节点，
+    同一棵树上的后续分析直接复用收集结果。
     """
     
+    # 各语言单次遍历需要收集的节点类型
+    NODE_TYPES_OF_INTEREST = {
+        'python': frozenset({
+            'function_definition', 'call', 'identifier', 'class_definition',
+            'import_statement', 'import_from_statement',
+        }),
+        'javascript': frozenset({
+            'function_declaration', 'method_definition', 'call_expression', 'identifier',
+            'class_declaration', 'import_statement',
+        }),
+        'typescript': frozenset({
+            'function_declaration', 'method_definition', 'call_expression', 'identifier',
+            'class_declaration', 'import_statement',
+        }),
+        'cpp': frozenset({
+            'function_definition', 'call_expression', 'identifier', 'class_specifier',
+            'preproc_include',
+        }),
+        'java': frozenset({
+            'method_declaration', 'constructor_declaration', 'method_invocation', 'identifier',
+            'class_declaration', 'import_declaration',
+        }),
+    }
+    
+    # 各语言的函数定义节点类型（按输出顺序）
+    DEFINITION_NODE_TYPES = {
+        'python': ('function_definition',),
+        'javascript': ('function_declaration', 'method_definition'),
+        'typescript': ('function_declaration', 'method_definition'),
+        'cpp': ('function_definition',),
+        'java': ('method_declaration', 'constructor_declaration'),
+    }
+    
+    # obj.method() 形式的调用中，被调用对象所在的节点类型
+    MEMBER_NODE_TYPES = frozenset({'attribute', 'member_expression', 'field_expression', 'member_select'})
+    
+    # 可作为函数名的标识符节点类型
+    NAME_NODE_TYPES = frozenset({'identifier', 'property_identifier', 'field_identifier'})
+    
+    # 节点收集结果缓存的语法树数量上限
+    NODE_INDEX_CACHE_SIZE = 32
+    
     def __init__(self):
         """初始化 AST 代码分析器"""
         self.config = get_ast_config()
+        # id(tree) -> (tree, {节点类型: [(节点, 行号, 列号)]})，保存 tree 引用保证 id 不被复用
+        self._node_index_cache: "OrderedDict[int, Tuple[Any, Dict[str, List[Tuple]]]]" = OrderedDict()
+        self._node_index_lock = threading.Lock()
         if not AST_AVAILABLE:
             logger.warning("tree-sitter not available, AST features will be disabled")
     
@@ -36,12 +86,51 @@ class ASTCodeAnalyzer:
         Returns:
             str: 节点对应的源代码文本
         """
+        # start_byte/end_byte 是 UTF-8 字节偏移，源码包含非 ASCII 字符时不能直接切片字符串
+        node_text = node.text
+        if node_text is not None:
+            return node_text.decode('utf-8', errors='ignore')
         start_byte = node.start_byte
         end_byte = node.end_byte
-        return source_code[start_byte:end_byte]
+        return source_code.encode('utf-8')[start_byte:end_byte].decode('utf-8', errors='ignore')
+    
+    def _collect_nodes(self, node, node_types: Iterable[str]) -> Dict[str, List[Tuple]]:
+        """使用 TreeCursor 迭代遍历一次子树，按类型收集节点
+        
+        遍历顺序与先序深度优先一致，不使用递归，深度嵌套的文件也不会触发递归上限。
+        
+        Args:
+            node: 遍历的起始节点
+            node_types: 需要收集的节点类型
+            
+        Returns:
+            Dict[str, List[Tuple]]: 节点类型 -> (节点, 行号, 列号) 列表
+        """
+        collected: Dict[str, List[Tuple]] = {node_type: [] for node_type in node_types}
+        cursor = node.walk()
+        retracing = False
+        
+        while True:
+            if not retracing:
+                current = cursor.node
+                bucket = collected.get(current.type)
+                if bucket is not None:
+                    start_point = current.start_point
+                    bucket.append((current, start_point[0] + 1, start_point[1] + 1))
+                if cursor.goto_first_child():
+                    continue
+            
+            if cursor.goto_next_sibling():
+                retracing = False
+            elif cursor.goto_parent():
+                retracing = True
+            else:
+                break
+        
+        return collected
     
     def _find_nodes_by_type(self, node, node_type: str, source_code: str) -> List[Tuple]:
-        """递归查找指定类型的节点
+        """查找指定类型的节点
         
         Args:
             node: AST 根节点
@@ -51,19 +140,108 @@ class ASTCodeAnalyzer:
         Returns:
             List[Tuple]: (节点, 行号, 列号) 列表
         """
-        results = []
+        return self._collect_nodes(node, (node_type,))[node_type]
+    
+    def _get_node_index(self, tree, language: str) -> Dict[str, List[Tuple]]:
+        """获取语法树的节点收集结果，同一棵树只遍历一次
         
-        def traverse(n):
-            if n.type == node_type:
-                # 获取行号和列号
-                start_point = n.start_point
-                results.append((n, start_point[0] + 1, start_point[1] + 1))
+        Args:
+            tree: 语法树
+            language: 编程语言
             
-            for child in n.children:
-                traverse(child)
+        Returns:
+            Dict[str, List[Tuple]]: 节点类型 -> (节点, 行号, 列号) 列表
+        """
+        key = id(tree)
+        with self._node_index_lock:
+            entry = self._node_index_cache.get(key)
+            if entry is not None and entry[0] is tree:
+                self._node_index_cache.move_to_end(key)
+                return entry[1]
+        
+        index = self._collect_nodes(tree.root_node, self.NODE_TYPES_OF_INTEREST.get(language, ()))
+        
+        with self._node_index_lock:
+            self._node_index_cache[key] = (tree, index)
+            self._node_index_cache.move_to_end(key)
+            while len(self._node_index_cache) > self.NODE_INDEX_CACHE_SIZE:
+                self._node_index_cache.popitem(last=False)
+        
+        return index
+    
+    def _parse_nodes(self, file_path: str, source_code: str) -> Tuple[Optional[str], Optional[Dict[str, List[Tuple]]]]:
+        """解析文件并返回语言和节点收集结果
         
-        traverse(node)
-        return results
+        Args:
+            file_path: 文件路径
+            source_code: 源代码内容
+            
+        Returns:
+            Tuple: (语言, 节点收集结果)，不支持或解析失败时为 (None, None)
+        """
+        if not AST_AVAILABLE:
+            return None, None
+        
+        language = self.config.get_language_from_file(file_path)
+        if not language or not self.config.is_language_supported(language):
+            return None, None
+        
+        tree = self.config.parse_file(file_path, source_code)
+        if not tree:
+            return None, None
+        
+        return language, self._get_node_index(tree, language)
+    
+    def _first_descendant(self, node, node_types: frozenset):
+        """先序（从左到右）查找第一个指定类型的节点，包括节点自身"""
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if current.type in node_types:
+                return current
+            stack.extend(reversed(current.children))
+        return None
+    
+    def _last_descendant(self, node, node_types: frozenset):
+        """先序（从右到左）查找第一个指定类型的节点，即最靠后的同类节点"""
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if current.type in node_types:
+                return current
+            stack.extend(current.children)
+        return None
+    
+    def _get_definition_name(self, node, language: str, source_code: str) -> Optional[str]:
+        """获取函数定义节点的函数名
+        
+        Args:
+            node: 函数定义节点
+            language: 编程语言
+            source_code: 源代码内容
+            
+        Returns:
+            Optional[str]: 函数名，如果无法提取则返回 None
+        """
+        if language == 'cpp':
+            # declarator -> function_declarator -> identifier
+            name_node = self._first_descendant(node, frozenset({'identifier'}))
+            return self._get_node_text(name_node, source_code) if name_node else None
+        
+        for child in node.children:
+            if child.type == 'identifier':
+                return self._get_node_text(child, source_code)
+            if child.type == 'property_identifier' and node.type == 'method_definition':
+                return self._get_node_text(child, source_code)
+            if child.type == 'property_name':
+                name_node = child.children[0] if child.children else None
+                if name_node and name_node.type == 'identifier':
+                    return self._get_node_text(name_node, source_code)
+            if child.type == 'method_declarator':
+                for subchild in child.children:
+                    if subchild.type == 'identifier':
+                        return self._get_node_text(subchild, source_code)
+        return None
     
     def find_function_definition(self, file_path: str, source_code: str, function_name: str) -> List[Dict]:
         """查找函数定义
@@ -81,154 +259,24 @@ class ASTCodeAnalyzer:
                 - column: 列号
                 - code: 函数代码
         """
-        if not AST_AVAILABLE:
+        language, nodes = self._parse_nodes(file_path, source_code)
+        if nodes is None:
             return []
         
-        language = self.config.get_language_from_file(file_path)
-        if not language or not self.config.is_language_supported(language):
-            return []
-        
-        tree = self.config.parse_file(file_path, source_code)
-        if not tree:
-            return []
-        
-        results = []
-        
         # Python: function_definition
         # JavaScript/TypeScript: function_declaration, method_definition
         # C++: function_definition
         # Java: method_declaration, constructor_declaration
-        if language == 'python':
-            function_nodes = self._find_nodes_by_type(tree.root_node, 'function_definition', source_code)
-            for node, line, column in function_nodes:
-                # 查找函数名节点
-                for child in node.children:
-                    if child.type == 'identifier':
-                        name = self._get_node_text(child, source_code)
-                        if name == function_name:
-                            code = self._get_node_text(node, source_code)
-                            results.append({
-                                'file_path': file_path,
-                                'name': name,
-                                'line': line,
-                                'column': column,
-                                'code': code
-                            })
-                            break
-        
-        elif language in ['javascript', 'typescript']:
-            # 查找 function_declaration
-            function_nodes = self._find_nodes_by_type(tree.root_node, 'function_declaration', source_code)
-            for node, line, column in function_nodes:
-                for child in node.children:
-                    if child.type == 'identifier':
-                        name = self._get_node_text(child, source_code)
-                        if name == function_name:
-                            code = self._get_node_text(node, source_code)
-                            results.append({
-                                'file_path': file_path,
-                                'name': name,
-                                'line': line,
-                                'column': column,
-                                'code': code
-                            })
-                            break
-            
-            # 查找 method_definition (类方法)
-            method_nodes = self._find_nodes_by_type(tree.root_node, 'method_definition', source_code)
-            for node, line, column in method_nodes:
-                for child in node.children:
-                    if child.type == 'property_name':
-                        name_node = child.children[0] if child.children else None
-                        if name_node and name_node.type == 'identifier':
-                            name = self._get_node_text(name_node, source_code)
-                            if name == function_name:
-                                code = self._get_node_text(node, source_code)
-                                results.append({
-                                    'file_path': file_path,
-                                    'name': name,
-                                    'line': line,
-                                    'column': column,
-                                    'code': code
-                                })
-                                break
-        
-        elif language == 'cpp':
-            # C++: function_definition
-            function_nodes = self._find_nodes_by_type(tree.root_node, 'function_definition', source_code)
-            for node, line, column in function_nodes:
-                # 查找函数名（declarator -> function_declarator -> identifier）
-                def find_function_name(n):
-                    if n.type == 'identifier':
-                        return self._get_node_text(n, source_code)
-                    for child in n.children:
-                        result = find_function_name(child)
-                        if result:
-                            return result
-                    return None
-                
-                name = find_function_name(node)
-                if name == function_name:
-                    code = self._get_node_text(node, source_code)
-                    results.append({
-                        'file_path': file_path,
-                        'name': name,
-                        'line': line,
-                        'column': column,
-                        'code': code
-                    })
-        
-        elif language == 'java':
-            # Java: method_declaration
-            method_nodes = self._find_nodes_by_type(tree.root_node, 'method_declaration', source_code)
-            for node, line, column in method_nodes:
-                # 查找方法名（identifier 在 declarator 中）
-                for child in node.children:
-                    if child.type == 'identifier':
-                        name = self._get_node_text(child, source_code)
-                        if name == function_name:
-                            code = self._get_node_text(node, source_code)
-                            results.append({
-                                'file_path': file_path,
-                                'name': name,
-                                'line': line,
-                                'column': column,
-                                'code': code
-                            })
-                            break
-                    elif child.type == 'method_declarator':
-                        # 方法声明器中查找标识符
-                        for subchild in child.children:
-                            if subchild.type == 'identifier':
-                                name = self._get_node_text(subchild, source_code)
-                                if name == function_name:
-                                    code = self._get_node_text(node, source_code)
-                                    results.append({
-                                        'file_path': file_path,
-                                        'name': name,
-                                        'line': line,
-                                        'column': column,
-                                        'code': code
-                                    })
-                                    break
-            
-            # Java: constructor_declaration
-            constructor_nodes = self._find_nodes_by_type(tree.root_node, 'constructor_declaration', source_code)
-            for node, line, column in constructor_nodes:
-                # 构造函数名就是类名
-                for child in node.children:
-                    if child.type == 'identifier':
-                        name = self._get_node_text(child, source_code)
-                        if name == function_name:
-                            code = self._get_node_text(node, source_code)
-                            results.append({
-                                'file_path': file_path,
-                                'name': name,
-                                'line': line,
-                                'column': column,
-                                'code': code
-                            })
-                            break
+        results = []
+        for node, name, line, column in self._collect_function_definitions(nodes, language, source_code):
+            if name == function_name:
+                results.append({
+                    'file_path': file_path,
+                    'name': name,
+                    'line': line,
+                    'column': column,
+                    'code': self._get_node_text(node, source_code)
+                })
         
         return results
     
@@ -248,75 +296,24 @@ class ASTCodeAnalyzer:
                 - column: 列号
                 - code: 调用代码
         """
-        if not AST_AVAILABLE:
-            return []
-        
-        language = self.config.get_language_from_file(file_path)
-        if not language or not self.config.is_language_supported(language):
+        language, nodes = self._parse_nodes(file_path, source_code)
+        if nodes is None:
             return []
         
-        tree = self.config.parse_file(file_path, source_code)
-        if not tree:
-            return []
-        
-        results = []
-        
-        # 查找 call 节点
-        # Python/JavaScript: call
-        # C++: call_expression
+        # Python: call
+        # JavaScript/TypeScript/C++: call_expression
         # Java: method_invocation
-        if language in ['python', 'javascript', 'typescript']:
-            call_nodes = self._find_nodes_by_type(tree.root_node, 'call', source_code)
-        elif language == 'cpp':
-            call_nodes = self._find_nodes_by_type(tree.root_node, 'call_expression', source_code)
-        elif language == 'java':
-            call_nodes = self._find_nodes_by_type(tree.root_node, 'method_invocation', source_code)
-        else:
-            call_nodes = []
-        
-        for node, line, column in call_nodes:
-            # 查找被调用的函数名
-            function_node = node.children[0] if node.children else None
-            if function_node:
-                # Python: identifier 或 attribute (如 obj.method)
-                # JavaScript: identifier 或 member_expression (如 obj.method)
-                # C++: identifier 或 field_expression (如 obj.method)
-                # Java: identifier 或 member_select (如 obj.method)
-                if function_node.type == 'identifier':
-                    name = self._get_node_text(function_node, source_code)
-                    if name == function_name:
-                        code = self._get_node_text(node, source_code)
-                        results.append({
-                            'file_path': file_path,
-                            'name': name,
-                            'line': line,
-                            'column': column,
-                            'code': code
-                        })
-                elif function_node.type in ['attribute', 'member_expression', 'field_expression', 'member_select']:
-                    # 处理 obj.method() 的情况
-                    # 查找最后一个 identifier
-                    def find_last_identifier(n):
-                        if n.type == 'identifier':
-                            return n
-                        for child in reversed(n.children):
-                            result = find_last_identifier(child)
-                            if result:
-                                return result
-                        return None
-                    
-                    identifier_node = find_last_identifier(function_node)
-                    if identifier_node:
-                        name = self._get_node_text(identifier_node, source_code)
-                        if name == function_name:
-                            code = self._get_node_text(node, source_code)
-                            results.append({
-                                'file_path': file_path,
-                                'name': name,
-                                'line': line,
-                                'column': column,
-                                'code': code
-                            })
+        results = []
+        for node, line, column in nodes.get(self._get_call_node_type(language), []):
+            name = self._extract_function_name_from_call(node, source_code, language)
+            if name == function_name:
+                results.append({
+                    'file_path': file_path,
+                    'name': name,
+                    'line': line,
+                    'column': column,
+                    'code': self._get_node_text(node, source_code)
+                })
         
         return results
     
@@ -388,23 +385,13 @@ class ASTCodeAnalyzer:
                 - column: 列号
                 - code: 使用代码片段
         """
-        if not AST_AVAILABLE:
-            return []
-        
-        language = self.config.get_language_from_file(file_path)
-        if not language or not self.config.is_language_supported(language):
-            return []
-        
-        tree = self.config.parse_file(file_path, source_code)
-        if not tree:
+        language, nodes = self._parse_nodes(file_path, source_code)
+        if nodes is None:
             return []
         
         results = []
         
-        # 查找所有 identifier 节点
-        identifier_nodes = self._find_nodes_by_type(tree.root_node, 'identifier', source_code)
-        
-        for node, line, column in identifier_nodes:
+        for node, line, column in nodes.get('identifier', []):
             name = self._get_node_text(node, source_code)
             if name == variable_name:
                 # 获取包含该标识符的父节点代码（如赋值、调用等）
@@ -435,141 +422,172 @@ class ASTCodeAnalyzer:
         if not call_node.children:
             return None
         
+        # Java: method_invocation 的方法名在 name 字段，children[0] 可能是调用对象
+        if call_node.type == 'method_invocation':
+            name_node = call_node.child_by_field_name('name')
+            return self._get_node_text(name_node, source_code) if name_node else None
+        
         function_node = call_node.children[0]
         
         if function_node.type == 'identifier':
             return self._get_node_text(function_node, source_code)
-        elif function_node.type in ['attribute', 'member_expression', 'field_expression', 'member_select']:
-            # 处理 obj.method() 的情况，提取最后一个 identifier
-            def find_last_identifier(n):
-                if n.type == 'identifier':
-                    return self._get_node_text(n, source_code)
-                for child in reversed(n.children):
-                    result = find_last_identifier(child)
-                    if result:
-                        return result
-                return None
-            
-            return find_last_identifier(function_node)
+        elif function_node.type in self.MEMBER_NODE_TYPES:
+            # 处理 obj.method() 的情况，提取最后一个标识符
+            name_node = self._last_descendant(function_node, self.NAME_NODE_TYPES)
+            return self._get_node_text(name_node, source_code) if name_node else None
         
         return None
     
-    def _extract_all_functions(self, file_path: str, source_code: str) -> List[Dict]:
-        """提取文件中的所有函数定义
+    def _get_call_node_type(self, language: str) -> Optional[str]:
+        """获取语言对应的函数调用节点类型"""
+        if language == 'python':
+            return 'call'
+        elif language in ['javascript', 'typescript', 'cpp']:
+            return 'call_expression'
+        elif language == 'java':
+            return 'method_invocation'
+        return None
+    
+    def _collect_function_definitions(self, nodes: Dict[str, List[Tuple]], language: str, source_code: str) -> List[Tuple]:
+        """收集文件中的所有函数定义节点（包括类方法和 Java 构造函数）
         
         Args:
-            file_path: 文件路径
+            nodes: 节点收集结果（见 _get_node_index）
+            language: 编程语言
             source_code: 源代码内容
             
         Returns:
-            List[Dict]: 函数定义列表，每个字典包含 name, line, column, file_path
+            List[Tuple]: (节点, 函数名, 行号, 列号) 列表
         """
-        if not AST_AVAILABLE:
-            return []
+        definitions = []
+        for node_type in self.DEFINITION_NODE_TYPES.get(language, ()):
+            for node, line, column in nodes.get(node_type, []):
+                name = self._get_definition_name(node, language, source_code)
+                if name:
+                    definitions.append((node, name, line, column))
+        return definitions
+    
+    def _build_containing_map(self, definitions: List[Tuple]) -> Dict[Tuple, str]:
+        """根据函数定义构建 (起始字节, 结束字节, 节点类型) -> 函数名 的映射"""
+        return {(node.start_byte, node.end_byte, node.type): name for node, name, _, _ in definitions}
+    
+    def _find_containing_function(self, node, containing_map: Dict[Tuple, str]) -> Optional[str]:
+        """向上查找包含该节点的函数定义，返回函数名"""
+        current = node.parent
+        while current:
+            name = containing_map.get((current.start_byte, current.end_byte, current.type))
+            if name:
+                return name
+            current = current.parent
+        return None
+    
+    def extract_symbols(self, file_path: str, source_code: str) -> Dict[str, List[Dict]]:
+        """提取文件中的全部符号记录（供符号索引使用）
         
-        language = self.config.get_language_from_file(file_path)
-        if not language or not self.config.is_language_supported(language):
-            return []
+        与 find_function_definition / find_function_calls / find_variable_usage 的匹配语义一致，
+        区别在于不按名称过滤，一次返回文件内的所有记录。
         
-        tree = self.config.parse_file(file_path, source_code)
-        if not tree:
-            return []
+        Args:
+            file_path: 文件路径
+            source_code: 源代码内容
+            
+        Returns:
+            Dict[str, List[Dict]]: 按类别分组的符号记录，类别包括：
+                - definitions: 函数/方法定义
+                - calls: 函数调用
+                - references: 标识符引用（变量使用）
+                - classes: 类定义（含父类）
+                - imports: 导入语句
+                每条记录包含 name, line, column, code（首行代码片段）
+        """
+        symbols = {'definitions': [], 'calls': [], 'references': [], 'classes': [], 'imports': []}
+        language, nodes = self._parse_nodes(file_path, source_code)
+        if nodes is None:
+            return symbols
+        
+        def first_line(text: str, limit: int = 200) -> str:
+            return text.split('\n', 1)[0][:limit]
+        
+        definitions = self._collect_function_definitions(nodes, language, source_code)
+        for node, name, line, column in definitions:
+            symbols['definitions'].append({
+                'name': name,
+                'line': line,
+                'column': column,
+                'code': first_line(self._get_node_text(node, source_code)),
+            })
+        
+        # 调用记录附带调用者（包含该调用的函数，模块级调用为 None），用于构建跨文件调用关系图
+        containing_map = self._build_containing_map(definitions)
+        for node, line, column in nodes.get(self._get_call_node_type(language), []):
+            name = self._extract_function_name_from_call(node, source_code, language)
+            if name:
+                symbols['calls'].append({
+                    'name': name,
+                    'line': line,
+                    'column': column,
+                    'code': first_line(self._get_node_text(node, source_code)),
+                    'caller': self._find_containing_function(node, containing_map),
+                })
         
-        functions = []
+        for node, line, column in nodes.get('identifier', []):
+            if node.parent:
+                symbols['references'].append({
+                    'name': self._get_node_text(node, source_code),
+                    'line': line,
+                    'column': column,
+                    'code': first_line(self._get_node_text(node.parent, source_code)),
+                })
         
-        # 根据语言类型查找函数定义节点
-        if language == 'python':
-            function_nodes = self._find_nodes_by_type(tree.root_node, 'function_definition', source_code)
-            for node, line, column in function_nodes:
-                for child in node.children:
-                    if child.type == 'identifier':
-                        name = self._get_node_text(child, source_code)
-                        functions.append({
-                            'name': name,
-                            'line': line,
-                            'column': column,
-                            'file_path': file_path
-                        })
-                        break
+        lines = source_code.split('\n')
+        
+        # 以下分析命中解析树缓存和节点收集结果，不会再次遍历语法树
+        for cls in self.analyze_class_inheritance(file_path, source_code):
+            symbols['classes'].append({
+                'name': cls['class_name'],
+                'line': cls['line'],
+                'column': cls['column'],
+                'code': first_line(lines[cls['line'] - 1]).strip() if cls['line'] <= len(lines) else '',
+                'parents': cls['parent_classes'],
+            })
+        
+        for dep in self.analyze_module_dependencies(file_path, source_code):
+            symbols['imports'].append({
+                'name': dep['module_name'],
+                'line': dep['line'],
+                'column': dep['column'],
+                'code': first_line(lines[dep['line'] - 1]).strip() if dep['line'] <= len(lines) else '',
+                'import_type': dep['import_type'],
+                'imported_items': dep['imported_items'],
+            })
+        
+        return symbols
+    
+    def _extract_all_functions(self, file_path: str, source_code: str) -> List[Dict]:
+        """提取文件中的所有函数定义
         
-        elif language in ['javascript', 'typescript']:
-            # function_declaration
-            function_nodes = self._find_nodes_by_type(tree.root_node, 'function_declaration', source_code)
-            for node, line, column in function_nodes:
-                for child in node.children:
-                    if child.type == 'identifier':
-                        name = self._get_node_text(child, source_code)
-                        functions.append({
-                            'name': name,
-                            'line': line,
-                            'column': column,
-                            'file_path': file_path
-                        })
-                        break
+        Args:
+            file_path: 文件路径
+            source_code: 源代码内容
             
-            # method_definition
-            method_nodes = self._find_nodes_by_type(tree.root_node, 'method_definition', source_code)
-            for node, line, column in method_nodes:
-                for child in node.children:
-                    if child.type == 'property_name':
-                        name_node = child.children[0] if child.children else None
-                        if name_node and name_node.type == 'identifier':
-                            name = self._get_node_text(name_node, source_code)
-                            functions.append({
-                                'name': name,
-                                'line': line,
-                                'column': column,
-                                'file_path': file_path
-                            })
-                            break
-        
-        elif language == 'cpp':
-            function_nodes = self._find_nodes_by_type(tree.root_node, 'function_definition', source_code)
-            for node, line, column in function_nodes:
-                def find_function_name(n):
-                    if n.type == 'identifier':
-                        return self._get_node_text(n, source_code)
-                    for child in n.children:
-                        result = find_function_name(child)
-                        if result:
-                            return result
-                    return None
-                
-                name = find_function_name(node)
-                if name:
-                    functions.append({
-                        'name': name,
-                        'line': line,
-                        'column': column,
-                        'file_path': file_path
-                    })
+        Returns:
+            List[Dict]: 函数定义列表，每个字典包含 name, line, column, file_path
+        """
+        language, nodes = self._parse_nodes(file_path, source_code)
+        if nodes is None:
+            return []
         
-        elif language == 'java':
-            method_nodes = self._find_nodes_by_type(tree.root_node, 'method_declaration', source_code)
-            for node, line, column in method_nodes:
-                for child in node.children:
-                    if child.type == 'identifier':
-                        name = self._get_node_text(child, source_code)
-                        functions.append({
-                            'name': name,
-                            'line': line,
-                            'column': column,
-                            'file_path': file_path
-                        })
-                        break
-                    elif child.type == 'method_declarator':
-                        for subchild in child.children:
-                            if subchild.type == 'identifier':
-                                name = self._get_node_text(subchild, source_code)
-                                functions.append({
-                                    'name': name,
-                                    'line': line,
-                                    'column': column,
-                                    'file_path': file_path
-                                })
-                                break
-        
-        return functions
+        return [
+            {
+                'name': name,
+                'line': line,
+                'column': column,
+                'file_path': file_path
+            }
+            for node, name, line, column in self._collect_function_definitions(nodes, language, source_code)
+            # Java 构造函数不作为调用关系图节点
+            if node.type != 'constructor_declaration'
+        ]
     
     def build_call_graph(self, file_path: str, source_code: str) -> Dict[str, Any]:
         """构建函数调用关系图
@@ -583,95 +601,49 @@ class ASTCodeAnalyzer:
                 - nodes: 节点列表（函数定义）
                 - edges: 边列表（函数调用关系）
                 每个节点包含：name, line, column, file_path
-                每条边包含：from_function, to_function, line, column
+                每条边包含：from_function, to_function, file_path, line, column
         """
-        if not AST_AVAILABLE:
+        language, nodes = self._parse_nodes(file_path, source_code)
+        if nodes is None:
             return {'nodes': [], 'edges': []}
         
-        language = self.config.get_language_from_file(file_path)
-        if not language or not self.config.is_language_supported(language):
-            return {'nodes': [], 'edges': []}
-        
-        tree = self.config.parse_file(file_path, source_code)
-        if not tree:
-            return {'nodes': [], 'edges': []}
-        
-        # 提取所有函数定义作为节点
-        nodes = self._extract_all_functions(file_path, source_code)
+        # 提取所有函数定义作为节点（Java 构造函数除外）
+        definitions = [
+            definition
+            for definition in self._collect_function_definitions(nodes, language, source_code)
+            if definition[0].type != 'constructor_declaration'
+        ]
+        function_nodes = [
+            {
+                'name': name,
+                'line': line,
+                'column': column,
+                'file_path': file_path
+            }
+            for node, name, line, column in definitions
+        ]
+        containing_map = self._build_containing_map(definitions)
         
         # 构建函数名到函数信息的映射
-        function_map = {func['name']: func for func in nodes}
+        function_map = {func['name']: func for func in function_nodes}
         
         # 查找所有函数调用作为边
         edges = []
-        
-        # 根据语言类型查找调用节点
-        if language in ['python', 'javascript', 'typescript']:
-            call_nodes = self._find_nodes_by_type(tree.root_node, 'call', source_code)
-        elif language == 'cpp':
-            call_nodes = self._find_nodes_by_type(tree.root_node, 'call_expression', source_code)
-        elif language == 'java':
-            call_nodes = self._find_nodes_by_type(tree.root_node, 'method_invocation', source_code)
-        else:
-            call_nodes = []
-        
-        # 需要找到包含调用的函数（调用者）
-        def find_containing_function(node):
-            """查找包含该节点的函数定义"""
-            current = node.parent
-            while current:
-                if language == 'python' and current.type == 'function_definition':
-                    for child in current.children:
-                        if child.type == 'identifier':
-                            return self._get_node_text(child, source_code)
-                elif language in ['javascript', 'typescript']:
-                    if current.type == 'function_declaration':
-                        for child in current.children:
-                            if child.type == 'identifier':
-                                return self._get_node_text(child, source_code)
-                    elif current.type == 'method_definition':
-                        for child in current.children:
-                            if child.type == 'property_name':
-                                name_node = child.children[0] if child.children else None
-                                if name_node and name_node.type == 'identifier':
-                                    return self._get_node_text(name_node, source_code)
-                elif language == 'cpp' and current.type == 'function_definition':
-                    def find_function_name(n):
-                        if n.type == 'identifier':
-                            return self._get_node_text(n, source_code)
-                        for child in n.children:
-                            result = find_function_name(child)
-                            if result:
-                                return result
-                        return None
-                    return find_function_name(current)
-                elif language == 'java':
-                    if current.type == 'method_declaration':
-                        for child in current.children:
-                            if child.type == 'identifier':
-                                return self._get_node_text(child, source_code)
-                            elif child.type == 'method_declarator':
-                                for subchild in child.children:
-                                    if subchild.type == 'identifier':
-                                        return self._get_node_text(subchild, source_code)
-                
-                current = current.parent
-            return None
-        
-        for call_node, line, column in call_nodes:
+        for call_node, line, column in nodes.get(self._get_call_node_type(language), []):
             called_function = self._extract_function_name_from_call(call_node, source_code, language)
             if called_function and called_function in function_map:
-                caller_function = find_containing_function(call_node)
+                caller_function = self._find_containing_function(call_node, containing_map)
                 if caller_function and caller_function in function_map:
                     edges.append({
                         'from_function': caller_function,
                         'to_function': called_function,
+                        'file_path': file_path,
                         'line': line,
                         'column': column
                     })
         
         return {
-            'nodes': nodes,
+            'nodes': function_nodes,
             'edges': edges
         }
     
@@ -690,21 +662,14 @@ class ASTCodeAnalyzer:
                 - column: 列号
                 - file_path: 文件路径
         """
-        if not AST_AVAILABLE:
-            return []
-        
-        language = self.config.get_language_from_file(file_path)
-        if not language or not self.config.is_language_supported(language):
-            return []
-        
-        tree = self.config.parse_file(file_path, source_code)
-        if not tree:
+        language, nodes = self._parse_nodes(file_path, source_code)
+        if nodes is None:
             return []
         
         results = []
         
         if language == 'python':
-            class_nodes = self._find_nodes_by_type(tree.root_node, 'class_definition', source_code)
+            class_nodes = nodes.get('class_definition', [])
             for node, line, column in class_nodes:
                 class_name = None
                 parent_classes = []
@@ -733,7 +698,7 @@ class ASTCodeAnalyzer:
                     })
         
         elif language in ['javascript', 'typescript']:
-            class_nodes = self._find_nodes_by_type(tree.root_node, 'class_declaration', source_code)
+            class_nodes = nodes.get('class_declaration', [])
             for node, line, column in class_nodes:
                 class_name = None
                 parent_classes = []
@@ -760,7 +725,7 @@ class ASTCodeAnalyzer:
                     })
         
         elif language == 'cpp':
-            class_nodes = self._find_nodes_by_type(tree.root_node, 'class_specifier', source_code)
+            class_nodes = nodes.get('class_specifier', [])
             for node, line, column in class_nodes:
                 class_name = None
                 parent_classes = []
@@ -786,7 +751,7 @@ class ASTCodeAnalyzer:
                     })
         
         elif language == 'java':
-            class_nodes = self._find_nodes_by_type(tree.root_node, 'class_declaration', source_code)
+            class_nodes = nodes.get('class_declaration', [])
             for node, line, column in class_nodes:
                 class_name = None
                 parent_classes = []
@@ -832,41 +797,28 @@ class ASTCodeAnalyzer:
                 - column: 列号
                 - file_path: 文件路径
         """
-        if not AST_AVAILABLE:
-            return []
-        
-        language = self.config.get_language_from_file(file_path)
-        if not language or not self.config.is_language_supported(language):
-            return []
-        
-        tree = self.config.parse_file(file_path, source_code)
-        if not tree:
+        language, nodes = self._parse_nodes(file_path, source_code)
+        if nodes is None:
             return []
         
         results = []
         
         if language == 'python':
-            # import_statement 和 import_from_statement
-            import_nodes = self._find_nodes_by_type(tree.root_node, 'import_statement', source_code)
+            # import a.b, c as d：每个被导入的模块一条记录
+            import_nodes = nodes.get('import_statement', [])
             for node, line, column in import_nodes:
-                module_name = None
-                imported_items = []
-                
-                for child in node.children:
-                    if child.type == 'dotted_name':
-                        module_name = self._get_node_text(child, source_code)
-                    elif child.type == 'import_list':
-                        for item in child.children:
-                            if item.type == 'dotted_as_name':
-                                imported_items.append(self._get_node_text(item, source_code))
-                            elif item.type == 'aliased_import':
-                                for alias_child in item.children:
-                                    if alias_child.type == 'dotted_name':
-                                        imported_items.append(self._get_node_text(alias_child, source_code))
-                
-                if module_name:
+                for name_node in node.children_by_field_name('name'):
+                    if name_node.type == 'aliased_import':
+                        alias_node = name_node.child_by_field_name('alias')
+                        imported_items = [self._get_node_text(alias_node, source_code)] if alias_node else []
+                        name_node = name_node.child_by_field_name('name')
+                    else:
+                        imported_items = []
+                    if name_node is None:
+                        continue
+                    
                     results.append({
-                        'module_name': module_name,
+                        'module_name': self._get_node_text(name_node, source_code),
                         'import_type': 'import',
                         'imported_items': imported_items,
                         'line': line,
@@ -874,39 +826,34 @@ class ASTCodeAnalyzer:
                         'file_path': file_path
                     })
             
-            # from ... import ...
-            from_nodes = self._find_nodes_by_type(tree.root_node, 'import_from_statement', source_code)
+            # from ... import ...（模块名可能是相对导入，如 '.'、'..pkg'）
+            from_nodes = nodes.get('import_from_statement', [])
             for node, line, column in from_nodes:
-                module_name = None
-                imported_items = []
+                module_node = node.child_by_field_name('module_name')
+                if module_node is None:
+                    continue
                 
-                for child in node.children:
-                    if child.type == 'module_name' or child.type == 'dotted_name':
-                        module_name = self._get_node_text(child, source_code)
-                    elif child.type == 'import_list':
-                        for item in child.children:
-                            if item.type == 'dotted_as_name':
-                                imported_items.append(self._get_node_text(item, source_code))
-                            elif item.type == 'aliased_import':
-                                for alias_child in item.children:
-                                    if alias_child.type == 'dotted_name':
-                                        imported_items.append(self._get_node_text(alias_child, source_code))
-                            elif item.type == 'identifier':
-                                imported_items.append(self._get_node_text(item, source_code))
+                imported_items = []
+                for item in node.children_by_field_name('name'):
+                    if item.type == 'aliased_import':
+                        item = item.child_by_field_name('name')
+                    if item is not None:
+                        imported_items.append(self._get_node_text(item, source_code))
+                if any(child.type == 'wildcard_import' for child in node.children):
+                    imported_items.append('*')
                 
-                if module_name:
-                    results.append({
-                        'module_name': module_name,
-                        'import_type': 'from',
-                        'imported_items': imported_items,
-                        'line': line,
-                        'column': column,
-                        'file_path': file_path
-                    })
+                results.append({
+                    'module_name': self._get_node_text(module_node, source_code),
+                    'import_type': 'from',
+                    'imported_items': imported_items,
+                    'line': line,
+                    'column': column,
+                    'file_path': file_path
+                })
         
         elif language in ['javascript', 'typescript']:
             # import_statement
-            import_nodes = self._find_nodes_by_type(tree.root_node, 'import_statement', source_code)
+            import_nodes = nodes.get('import_statement', [])
             for node, line, column in import_nodes:
                 module_name = None
                 imported_items = []
@@ -939,7 +886,7 @@ class ASTCodeAnalyzer:
                     })
             
             # require() 调用
-            call_nodes = self._find_nodes_by_type(tree.root_node, 'call_expression', source_code)
+            call_nodes = nodes.get('call_expression', [])
             for node, line, column in call_nodes:
                 if node.children:
                     func_node = node.children[0]
@@ -965,7 +912,7 @@ class ASTCodeAnalyzer:
         
         elif language == 'cpp':
             # #include 预处理指令
-            preproc_nodes = self._find_nodes_by_type(tree.root_node, 'preproc_include', source_code)
+            preproc_nodes = nodes.get('preproc_include', [])
             for node, line, column in preproc_nodes:
                 module_name = None
                 
@@ -987,7 +934,7 @@ class ASTCodeAnalyzer:
         
         elif language == 'java':
             # import_declaration
-            import_nodes = self._find_nodes_by_type(tree.root_node, 'import_declaration', source_code)
+            import_nodes = nodes.get('import_declaration', [])
             for node, line, column in import_nodes:
                 module_name = None
                 
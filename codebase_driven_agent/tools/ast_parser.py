@@ -1,8 +1,13 @@
 """AST 解析器配置模块"""
+import hashlib
 import os
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Optional, Dict, Tuple
+from codebase_driven_agent.config import settings
 from codebase_driven_agent.utils.logger import setup_logger
+from codebase_driven_agent.utils.metrics import get_metrics_collector
 
 logger = setup_logger("codebase_driven_agent.tools.ast_parser")
 
@@ -37,10 +42,17 @@ class ASTParserConfig:
         '.cs': 'csharp',
     }
     
-    def __init__(self):
+    def __init__(self, max_cache_bytes: Optional[int] = None):
         self.parsers: Dict[str, Parser] = {}
         self.languages: Dict[str, Language] = {}
         self._initialized = False
+        
+        # 解析树缓存：(文件路径, 内容 hash) -> (AST 树, 源码字节)，按源码字节数做 LRU 淘汰
+        self.max_cache_bytes = max_cache_bytes if max_cache_bytes is not None else settings.ast_tree_cache_max_bytes
+        self._tree_cache: "OrderedDict[Tuple[str, str], Tuple[object, bytes]]" = OrderedDict()
+        self._cache_keys_by_path: Dict[str, Tuple[str, str]] = {}  # 文件路径 -> 最新缓存键（用于增量解析）
+        self._cache_bytes = 0
+        self._cache_lock = threading.Lock()  # Parser 和缓存都不是线程安全的
     
     def initialize(self) -> bool:
         """初始化 AST 解析器
@@ -195,12 +207,129 @@ class ASTParserConfig:
             logger.debug(f"Parser not available for language: {language}")
             return None
         
+        source_bytes = bytes(source_code, 'utf8')
+        content_hash = hashlib.sha1(source_bytes).hexdigest()
+        cache_key = (file_path, content_hash)
+        metrics = get_metrics_collector()
+        
         try:
-            tree = parser.parse(bytes(source_code, 'utf8'))
-            return tree
+            with self._cache_lock:
+                cached = self._tree_cache.get(cache_key)
+                if cached is not None:
+                    self._tree_cache.move_to_end(cache_key)
+                    metrics.increment("ast_tree_cache_hits_total")
+                    return cached[0]
+                
+                metrics.increment("ast_tree_cache_misses_total")
+                
+                # 同一文件的旧版本仍在缓存中时，使用 tree-sitter 增量解析
+                old_tree = None
+                previous_key = self._cache_keys_by_path.get(file_path)
+                if previous_key is not None and previous_key in self._tree_cache:
+                    previous_tree, previous_bytes = self._pop_cache_entry(previous_key)
+                    old_tree = previous_tree.copy()
+                    self._apply_edit(old_tree, previous_bytes, source_bytes)
+                
+                if old_tree is not None:
+                    tree = parser.parse(source_bytes, old_tree)
+                    metrics.increment("ast_tree_cache_incremental_parses_total")
+                else:
+                    tree = parser.parse(source_bytes)
+                
+                self._store_cache_entry(cache_key, tree, source_bytes)
+                return tree
         except Exception as e:
             logger.error(f"Failed to parse file {file_path}: {e}", exc_info=True)
             return None
+    
+    @staticmethod
+    def _byte_to_point(source_bytes: bytes, offset: int) -> Tuple[int, int]:
+        """将字节偏移转换为 tree-sitter 的 (行, 列) 坐标"""
+        row = source_bytes.count(b'\n', 0, offset)
+        line_start = source_bytes.rfind(b'\n', 0, offset) + 1
+        return row, offset - line_start
+    
+    def _apply_edit(self, tree, old_bytes: bytes, new_bytes: bytes) -> None:
+        """根据新旧源码的公共前缀/后缀计算编辑范围，并同步到旧树上"""
+        # 二分查找公共前缀/后缀长度（切片比较在 C 层完成，避免逐字节的 Python 循环）
+        low, high = 0, min(len(old_bytes), len(new_bytes))
+        while low < high:
+            mid = (low + high + 1) // 2
+            if old_bytes[:mid] == new_bytes[:mid]:
+                low = mid
+            else:
+                high = mid - 1
+        start = low
+        
+        low, high = 0, min(len(old_bytes), len(new_bytes)) - start
+        while low < high:
+            mid = (low + high + 1) // 2
+            if old_bytes[len(old_bytes) - mid:] == new_bytes[len(new_bytes) - mid:]:
+                low = mid
+            else:
+                high = mid - 1
+        suffix = low
+        
+        old_end = len(old_bytes) - suffix
+        new_end = len(new_bytes) - suffix
+        tree.edit(
+            start_byte=start,
+            old_end_byte=old_end,
+            new_end_byte=new_end,
+            start_point=self._byte_to_point(old_bytes, start),
+            old_end_point=self._byte_to_point(old_bytes, old_end),
+            new_end_point=self._byte_to_point(new_bytes, new_end),
+        )
+    
+    def _pop_cache_entry(self, cache_key: Tuple[str, str]) -> Tuple[object, bytes]:
+        """从缓存中移除条目（调用方需持有 _cache_lock）"""
+        tree, source_bytes = self._tree_cache.pop(cache_key)
+        self._cache_bytes -= len(source_bytes)
+        if self._cache_keys_by_path.get(cache_key[0]) == cache_key:
+            del self._cache_keys_by_path[cache_key[0]]
+        return tree, source_bytes
+    
+    def _store_cache_entry(self, cache_key: Tuple[str, str], tree, source_bytes: bytes) -> None:
+        """写入缓存并按字节数淘汰最久未使用的条目（调用方需持有 _cache_lock）"""
+        if self.max_cache_bytes <= 0 or len(source_bytes) > self.max_cache_bytes:
+            return
+        
+        self._tree_cache[cache_key] = (tree, source_bytes)
+        self._cache_keys_by_path[cache_key[0]] = cache_key
+        self._cache_bytes += len(source_bytes)
+        
+        while self._cache_bytes > self.max_cache_bytes and self._tree_cache:
+            oldest_key = next(iter(self._tree_cache))
+            self._pop_cache_entry(oldest_key)
+            get_metrics_collector().increment("ast_tree_cache_evictions_total")
+        
+        metrics = get_metrics_collector()
+        metrics.set_gauge("ast_tree_cache_bytes", self._cache_bytes)
+        metrics.set_gauge("ast_tree_cache_entries", len(self._tree_cache))
+    
+    def invalidate_cache(self, file_path: Optional[str] = None) -> None:
+        """清除解析树缓存
+        
+        Args:
+            file_path: 只清除该文件的缓存；为 None 时清空全部缓存
+        """
+        with self._cache_lock:
+            if file_path is None:
+                self._tree_cache.clear()
+                self._cache_keys_by_path.clear()
+                self._cache_bytes = 0
+            else:
+                for cache_key in [k for k in self._tree_cache if k[0] == file_path]:
+                    self._pop_cache_entry(cache_key)
+    
+    def get_cache_stats(self) -> Dict[str, int]:
+        """获取解析树缓存统计信息"""
+        with self._cache_lock:
+            return {
+                "entries": len(self._tree_cache),
+                "bytes": self._cache_bytes,
+                "max_bytes": self.max_cache_bytes,
+            }
 
 
 # 全局 AST 解析器配置实例
@@ -1,9 +1,16 @@
 """LangChain Tools 基础接口规范"""
+import inspect
 from abc import ABC, abstractmethod
-from typing import Any, Optional
+from typing import Any, Dict, Optional
 from langchain_core.tools import BaseTool
 from pydantic import BaseModel, Field
 
+from codebase_driven_agent.config import settings
+from codebase_driven_agent.utils.logger import setup_logger
+from codebase_driven_agent.utils.tool_cache import get_tool_result_cache
+
+logger = setup_logger("codebase_driven_agent.tools.base")
+
 
 class ToolResult(BaseModel):
     """工具执行结果"""
@@ -41,9 +48,14 @@ class BaseCodebaseTool(BaseTool, ABC):
         
         子类应该实现 _execute 方法，而不是直接重写此方法
         """
+        cache_key = self._get_cache_key(args, kwargs)
+        if cache_key is not None:
+            cached = get_tool_result_cache().get(self.name, cache_key)
+            if cached is not None:
+                return cached
         try:
             result = self._execute(*args, **kwargs)
-            return self._format_result(result)
+            return self._cache_result(cache_key, result)
         except KeyboardInterrupt:
             # 任务被取消，重新抛出以便上层处理
             raise
@@ -56,12 +68,57 @@ class BaseCodebaseTool(BaseTool, ABC):
         
         子类应该实现 _execute_async 方法，而不是直接重写此方法
         """
+        cache_key = self._get_cache_key(args, kwargs)
+        if cache_key is not None:
+            cached = get_tool_result_cache().get(self.name, cache_key)
+            if cached is not None:
+                return cached
         try:
             result = await self._execute_async(*args, **kwargs)
-            return self._format_result(result)
+            return self._cache_result(cache_key, result)
         except Exception as e:
             return self._format_error(str(e))
     
+    def _cache_version(self, arguments: Dict[str, Any]) -> Optional[str]:
+        """
+        工具结果依赖的数据版本（用于跨请求缓存）
+        
+        默认返回 None（不缓存），只读且结果可复用的工具重写此方法，
+        返回的版本在数据变化时必须随之变化。
+        
+        Args:
+            arguments: 工具参数（已绑定默认值）
+            
+        Returns:
+            数据版本；返回 None 时本次调用不使用缓存
+        """
+        return None
+    
+    def _get_cache_key(self, args: tuple, kwargs: Dict[str, Any]) -> Optional[str]:
+        """生成工具结果缓存键，不使用缓存时返回 None"""
+        if not settings.tool_cache_enabled or not get_tool_result_cache().is_enabled(self.name):
+            return None
+        try:
+            bound = inspect.signature(self._execute).bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            version = self._cache_version(arguments)
+        except Exception as e:
+            logger.debug(f"Tool cache skipped for {self.name}: {str(e)}")
+            return None
+        if version is None:
+            return None
+        # 输出格式也影响缓存的内容
+        arguments["_output"] = (self.max_output_length, self.enable_truncation)
+        return get_tool_result_cache().make_key(arguments, version)
+    
+    def _cache_result(self, cache_key: Optional[str], result: ToolResult) -> str:
+        """格式化结果，成功的结果写入缓存"""
+        output = self._format_result(result)
+        if cache_key is not None and result.success:
+            get_tool_result_cache().set(self.name, cache_key, output)
+        return output
+    
     @abstractmethod
     def _execute(self, *args, **kwargs) -> ToolResult:
         """
@@ -0,0 +1,325 @@
+"""仓库级函数调用关系图
+
+基于持久化符号索引中的调用边（call_edges）和导入记录构建跨文件调用关系图。
+被调用的函数名按以下优先级解析到具体定义：
+1. 调用所在文件中的同名定义
+2. 调用所在文件导入的模块（analyze_module_dependencies 的结果）中的同名定义
+3. 仓库中唯一的同名定义
+仍无法唯一确定时保留全部候选定义，并将对应的边标记为 ambiguous。
+"""
+import posixpath
+from collections import deque
+from pathlib import Path, PurePath
+from typing import Optional, List, Dict, Any, Set, Tuple
+
+from codebase_driven_agent.tools.symbol_index import SymbolIndex, get_symbol_index
+from codebase_driven_agent.utils.logger import setup_logger
+
+logger = setup_logger("codebase_driven_agent.tools.call_graph")
+
+# JavaScript/TypeScript 相对导入时尝试的文件后缀
+JS_MODULE_SUFFIXES = ('', '.js', '.ts', '.jsx', '.tsx', '/index.js', '/index.ts')
+
+# C++ #include 头文件对应的实现文件后缀
+CPP_SOURCE_SUFFIXES = ('.cpp', '.cc', '.cxx')
+
+
+class _ResolutionContext:
+    """单次查询内的解析上下文（缓存文件列表、定义和导入解析结果）"""
+    
+    def __init__(self, index: SymbolIndex):
+        self.index = index
+        # 统一使用 posix 风格路径进行匹配，映射回索引中的原始路径
+        self.files: Dict[str, str] = {PurePath(p).as_posix(): p for p in index.list_files()}
+        self.files_by_basename: Dict[str, List[str]] = {}
+        for posix_path in self.files:
+            self.files_by_basename.setdefault(posixpath.basename(posix_path), []).append(posix_path)
+        self._definitions: Dict[str, List[Dict[str, Any]]] = {}
+        self._imported_files: Dict[str, Set[str]] = {}
+    
+    def definitions(self, name: str) -> List[Dict[str, Any]]:
+        """获取指定名称的全部函数定义"""
+        if name not in self._definitions:
+            self._definitions[name] = self.index.lookup(name, kinds=["definition"])
+        return self._definitions[name]
+    
+    def imported_files(self, file_path: str) -> Set[str]:
+        """获取文件通过导入语句引用的仓库内文件（原始路径）"""
+        if file_path not in self._imported_files:
+            imported = set()
+            for record in self.index.get_file_symbols(file_path, kinds=["import"]):
+                imported.update(self._resolve_module(file_path, record))
+            if file_path.endswith('.java'):
+                # Java 同一个包（目录）内的类无需导入即可直接使用
+                directory = posixpath.dirname(PurePath(file_path).as_posix())
+                imported.update(
+                    original for posix_path, original in self.files.items()
+                    if posix_path.endswith('.java') and posixpath.dirname(posix_path) == directory
+                )
+            imported.discard(file_path)
+            self._imported_files[file_path] = imported
+        return self._imported_files[file_path]
+    
+    def _match_exact(self, candidates: List[str]) -> List[str]:
+        """按精确路径匹配候选文件"""
+        return [self.files[c] for c in candidates if c in self.files]
+    
+    def _match_suffix(self, candidates: List[str]) -> List[str]:
+        """按路径后缀匹配候选文件（兼容 src/ 等源码根目录）"""
+        matched = []
+        for candidate in candidates:
+            for posix_path in self.files_by_basename.get(posixpath.basename(candidate), []):
+                if posix_path == candidate or posix_path.endswith('/' + candidate):
+                    matched.append(self.files[posix_path])
+        return matched
+    
+    def _resolve_module(self, file_path: str, record: Dict[str, Any]) -> List[str]:
+        """将一条导入记录解析为仓库内的文件"""
+        module = record["name"]
+        items = [item for item in record.get("imported_items") or [] if item != '*']
+        posix_file = PurePath(file_path).as_posix()
+        
+        if posix_file.endswith('.py'):
+            if module.startswith('.'):
+                level = len(module) - len(module.lstrip('.'))
+                base = posixpath.dirname(posix_file)
+                for _ in range(level - 1):
+                    base = posixpath.dirname(base)
+                rest = module[level:].replace('.', '/')
+                module_path = posixpath.join(base, rest) if rest else base
+                match = self._match_exact
+            else:
+                module_path = module.replace('.', '/')
+                match = self._match_suffix
+            candidates = [f"{module_path}.py", f"{module_path}/__init__.py"]
+            # from pkg import submodule
+            candidates.extend(f"{module_path}/{item.replace('.', '/')}.py" for item in items)
+            return match([posixpath.normpath(c) for c in candidates])
+        
+        if posix_file.endswith(('.js', '.ts', '.jsx', '.tsx')):
+            if not module.startswith('.'):
+                # 第三方包不在仓库内
+                return []
+            module_path = posixpath.normpath(posixpath.join(posixpath.dirname(posix_file), module))
+            return self._match_exact([module_path + suffix for suffix in JS_MODULE_SUFFIXES])
+        
+        if posix_file.endswith('.java'):
+            if module.endswith('.*'):
+                package_path = module[:-2].replace('.', '/')
+                return [
+                    original for posix_path, original in self.files.items()
+                    if posix_path.endswith('.java')
+                    and (posixpath.dirname(posix_path) == package_path
+                         or posixpath.dirname(posix_path).endswith('/' + package_path))
+                ]
+            return self._match_suffix([module.replace('.', '/') + '.java'])
+        
+        if posix_file.endswith(CPP_SOURCE_SUFFIXES):
+            stem = posixpath.splitext(module)[0]
+            return self._match_suffix([stem + suffix for suffix in CPP_SOURCE_SUFFIXES])
+        
+        return []
+    
+    def resolve(self, from_file: str, callee: str) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        将调用解析到函数定义
+        
+        Returns:
+            (候选定义列表, 是否有歧义)
+        """
+        definitions = self.definitions(callee)
+        if not definitions:
+            return [], False
+        
+        same_file = [d for d in definitions if d["file"] == from_file]
+        if same_file:
+            return same_file, False
+        
+        imported = self.imported_files(from_file)
+        via_import = [d for d in definitions if d["file"] in imported]
+        if via_import:
+            return via_import, False
+        
+        return definitions, len(definitions) > 1
+
+
+class RepoCallGraph:
+    """仓库级函数调用关系图查询
+    
+    调用边随符号索引一起持久化和增量更新，查询时按导入关系解析被调用函数，
+    按深度限制和扇出上限做广度优先遍历。
+    """
+    
+    # 模块级代码（不在任何函数内）的调用者名称
+    MODULE_CALLER = "<module>"
+    
+    # 单次查询返回的最大节点数，防止深度较大时结果规模指数增长
+    MAX_NODES = 500
+    
+    def __init__(self, index: SymbolIndex):
+        """
+        初始化调用关系图
+        
+        Args:
+            index: 符号索引
+        """
+        self.index = index
+    
+    def callers_of(self, name: str, file_path: Optional[str] = None, max_depth: int = 3, max_fanout: int = 20) -> Dict[str, Any]:
+        """
+        查询调用了指定函数的函数（向上追踪）
+        
+        Args:
+            name: 函数名
+            file_path: 限定函数定义所在文件
+            max_depth: 最大追踪深度
+            max_fanout: 每个函数最多展开的调用者数量
+            
+        Returns:
+            调用关系图，见 _traverse
+        """
+        return self._traverse(name, file_path, "callers", max_depth, max_fanout)
+    
+    def callees_of(self, name: str, file_path: Optional[str] = None, max_depth: int = 3, max_fanout: int = 20) -> Dict[str, Any]:
+        """
+        查询指定函数调用的函数（向下追踪）
+        
+        Args:
+            name: 函数名
+            file_path: 限定函数定义所在文件
+            max_depth: 最大追踪深度
+            max_fanout: 每个函数最多展开的被调用函数数量
+            
+        Returns:
+            调用关系图，见 _traverse
+        """
+        return self._traverse(name, file_path, "callees", max_depth, max_fanout)
+    
+    def _traverse(self, name: str, file_path: Optional[str], direction: str, max_depth: int, max_fanout: int) -> Dict[str, Any]:
+        """
+        广度优先遍历调用关系
+        
+        Returns:
+            Dict[str, Any]: 调用关系图，包含：
+                - root: 起始函数名
+                - direction: callers 或 callees
+                - nodes: 节点列表，每个节点包含 name, file, line, depth
+                - edges: 边列表，每条边包含 from_function, from_file, to_function, to_file,
+                  line, column（调用位置，位于 from_file 中）, depth, ambiguous
+                - truncated: 是否因扇出上限或节点上限截断
+        """
+        context = _ResolutionContext(self.index)
+        max_depth = max(1, max_depth)
+        max_fanout = max(1, max_fanout)
+        
+        roots = context.definitions(name)
+        if file_path:
+            roots = [d for d in roots if PurePath(d["file"]).as_posix() == PurePath(file_path).as_posix()]
+        
+        result: Dict[str, Any] = {
+            "root": name,
+            "direction": direction,
+            "max_depth": max_depth,
+            "nodes": [],
+            "edges": [],
+            "truncated": False,
+        }
+        visited: Set[Tuple[str, str]] = set()
+        queue: deque = deque()
+        
+        def add_node(file: str, function: str, line: Optional[int], depth: int) -> bool:
+            key = (file, function)
+            if key in visited:
+                return False
+            if len(visited) >= self.MAX_NODES:
+                result["truncated"] = True
+                return False
+            visited.add(key)
+            result["nodes"].append({"name": function, "file": file, "line": line, "depth": depth})
+            return True
+        
+        for definition in roots:
+            if add_node(definition["file"], name, definition["line"], 0):
+                queue.append((definition["file"], name, 0))
+        
+        while queue:
+            file, function, depth = queue.popleft()
+            if depth >= max_depth:
+                continue
+            
+            if direction == "callees":
+                neighbours = self._callee_edges(context, file, function)
+            else:
+                neighbours = self._caller_edges(context, file, function)
+            
+            expanded: Set[Tuple[str, str]] = set()
+            for edge in neighbours:
+                target_file, target_function = (
+                    (edge["to_file"], edge["to_function"]) if direction == "callees"
+                    else (edge["from_file"], edge["from_function"])
+                )
+                target = (target_file, target_function)
+                if target not in expanded and len(expanded) >= max_fanout:
+                    result["truncated"] = True
+                    break
+                expanded.add(target)
+                
+                edge["depth"] = depth + 1
+                result["edges"].append(edge)
+                
+                if target_function == self.MODULE_CALLER:
+                    add_node(target_file, target_function, None, depth + 1)
+                    continue
+                target_line = next(
+                    (d["line"] for d in context.definitions(target_function) if d["file"] == target_file),
+                    None,
+                )
+                if add_node(target_file, target_function, target_line, depth + 1):
+                    queue.append((target_file, target_function, depth + 1))
+        
+        return result
+    
+    def _callee_edges(self, context: _ResolutionContext, file: str, function: str) -> List[Dict[str, Any]]:
+        """获取函数调用的仓库内函数（未解析到仓库内定义的调用被忽略）"""
+        edges = []
+        for call in self.index.get_call_edges(caller=function, file_path=file):
+            targets, ambiguous = context.resolve(file, call["callee"])
+            for target in targets:
+                edges.append({
+                    "from_function": function,
+                    "from_file": file,
+                    "to_function": call["callee"],
+                    "to_file": target["file"],
+                    "line": call["line"],
+                    "column": call["column"],
+                    "ambiguous": ambiguous,
+                })
+        return edges
+    
+    def _caller_edges(self, context: _ResolutionContext, file: str, function: str) -> List[Dict[str, Any]]:
+        """获取调用了函数的位置（只保留解析结果包含该定义的调用）"""
+        edges = []
+        for call in self.index.get_call_edges(callee=function):
+            targets, ambiguous = context.resolve(call["file"], function)
+            if not any(target["file"] == file for target in targets):
+                continue
+            edges.append({
+                "from_function": call["caller"] or self.MODULE_CALLER,
+                "from_file": call["file"],
+                "to_function": function,
+                "to_file": file,
+                "line": call["line"],
+                "column": call["column"],
+                "ambiguous": ambiguous,
+            })
+        return edges
+
+
+def get_repo_call_graph(repo_path: Optional[Path] = None) -> RepoCallGraph:
+    """
+    获取仓库的调用关系图（复用仓库对应的符号索引）
+    
+    Args:
+        repo_path: 代码仓库路径，默认读取 CODE_REPO_PATH
+    """
+    return RepoCallGraph(get_symbol_index(repo_path))
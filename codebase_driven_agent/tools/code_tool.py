@@ -1,14 +1,21 @@
 """代码工具实现"""
-import os
+import json
 import re
+import shutil
+import subprocess
 import threading
 from typing import Optional, List, Dict, Any
 from pathlib import Path
 from pydantic import BaseModel, Field
 
 from codebase_driven_agent.tools.base import BaseCodebaseTool, ToolResult
+from codebase_driven_agent.tools.symbol_index import get_symbol_index
+from codebase_driven_agent.tools.call_graph import RepoCallGraph
+from codebase_driven_agent.utils.file_catalog import get_file_catalog
+from codebase_driven_agent.utils.file_scanner import scan_files
 from codebase_driven_agent.config import settings
 from codebase_driven_agent.utils.logger import setup_logger
+from codebase_driven_agent.utils.tool_cache import get_repo_version
 
 # AST 分析器导入（可选）
 try:
@@ -30,12 +37,23 @@ except ImportError:
     GITPYTHON_AVAILABLE = False
     logger.warning("gitpython not available, Git operations will be disabled")
 
-try:
-    from ripgrepy import Ripgrepy
-    RIPGREP_AVAILABLE = True
-except ImportError:
-    RIPGREP_AVAILABLE = False
-    logger.warning("ripgrep-py not available, will use fallback search")
+# ripgrep 可执行文件（直接调用 rg：一次运行传入多个 -e 模式并解析 JSON 输出）
+RG_EXECUTABLE = shutil.which("rg")
+RIPGREP_AVAILABLE = RG_EXECUTABLE is not None
+if not RIPGREP_AVAILABLE:
+    logger.warning("ripgrep (rg) not available, will use fallback search")
+
+# 单次 ripgrep 搜索内各匹配策略的优先级（同一模式内按此顺序排名）
+# 大小写敏感的正则和单词边界匹配的结果分别是忽略大小写正则和忽略大小写字面量结果的子集，
+# 排名时永远不会胜出，因此不再单独列出
+RIPGREP_STRATEGIES = ("literal_fixed_case", "literal_case_insensitive", "regex_case_insensitive")
+
+# ripgrep 结果中跳过的目录
+RIPGREP_SKIP_PARTS = ('.git', '__pycache__', 'node_modules', '.venv')
+
+
+class RipgrepPatternError(RuntimeError):
+    """rg 没有输出任何结果就以退出码 2 结束（通常是正则语法不被 rg 支持，如环视、反向引用、\\Z）"""
 
 # AST 支持（可选）
 try:
@@ -47,6 +65,21 @@ except ImportError:
     logger.debug("tree-sitter not available, AST features will be disabled")
 
 
+# 代码关系分析时，query 以这些后缀结尾视为文件路径
+CODE_FILE_EXTENSIONS = ('.py', '.js', '.ts', '.java', '.cpp', '.c')
+
+
+def _literal_matcher(needle: str, ignore_case: bool = False):
+    """字面量策略的逐行判断函数（忽略大小写时 needle 应为小写）"""
+    if ignore_case:
+        def match(line: str) -> bool:
+            return needle in line.lower()
+    else:
+        def match(line: str) -> bool:
+            return needle in line
+    return match
+
+
 class CodeToolInput(BaseModel):
     """代码工具输入参数"""
     query: str = Field(..., description="要搜索的代码元素（函数名、类名、变量名、字符串字面量等）或文件路径（用于关系分析）")
@@ -57,6 +90,7 @@ class CodeToolInput(BaseModel):
     file_path: Optional[str] = Field(None, description="限制搜索范围到特定文件路径（可选）")
     max_results: int = Field(10, description="返回的最大结果数量")
     include_context: bool = Field(True, description="是否包含代码上下文")
+    max_depth: int = Field(3, description="仓库级调用关系图的最大追踪深度（仅 search_type='call_graph' 且 query 为函数名时使用）")
 
 
 class CodeTool(BaseCodebaseTool):
@@ -81,7 +115,7 @@ class CodeTool(BaseCodebaseTool):
     - 宏定义搜索：查找宏定义（C/C++）
     - 装饰器搜索：查找装饰器使用（Python）
     - 类型别名搜索：查找类型别名定义（TypeScript）
-    - 函数调用关系图：构建文件的函数调用关系图，用于追踪错误传播路径、理解代码执行流程、识别影响范围
+    - 函数调用关系图：构建文件的函数调用关系图，或按函数名查询跨文件的调用者/被调用者，用于追踪错误传播路径、理解代码执行流程、识别影响范围
     - 类继承关系分析：分析类的继承层次结构，用于理解类的设计、识别需要重构的类、分析多态行为
     - 模块依赖关系分析：分析模块的导入和依赖关系，用于理解代码组织结构、识别循环依赖、分析模块间耦合度
     
@@ -116,13 +150,14 @@ class CodeTool(BaseCodebaseTool):
       * "macro"：宏定义（C/C++）
       * "decorator"：装饰器（Python）
       * "type"：类型别名（TypeScript）
-      * "call_graph"：函数调用关系图（需要提供文件路径，分析文件内所有函数的调用关系）
+      * "call_graph"：函数调用关系图（query 为文件路径时分析文件内所有函数的调用关系；query 为函数名时返回跨文件的调用者和被调用者）
       * "inheritance"：类继承关系（需要提供文件路径，分析文件内所有类的继承关系）
       * "dependencies"：模块依赖关系（需要提供文件路径，分析文件的导入和依赖关系）
       * "auto"：自动检测类型（默认）
     - file_path（可选）：限制搜索范围到特定文件路径
     - max_results（可选）：返回的最大结果数量，默认 10
     - include_context（可选）：是否包含代码上下文，默认 True
+    - max_depth（可选）：跨文件调用关系图的最大追踪深度，默认 3；每个函数最多展开 max_results 个调用者/被调用者
     
     使用示例：
     - query: "someFunctionName", search_type: "function" - 搜索名为 someFunctionName 的函数
@@ -135,6 +170,7 @@ class CodeTool(BaseCodebaseTool):
     - query: "string to find", search_type: "string" - 搜索包含该字符串字面量的代码
     - query: "processPayment", search_type: "auto" - 自动检测类型并搜索
     - query: "PaymentService.py", search_type: "call_graph" - 构建 PaymentService.py 文件的函数调用关系图
+    - query: "processPayment", search_type: "call_graph", max_depth: 2 - 查询 processPayment 的跨文件调用者和被调用者（影响范围分析）
     - query: "UserService.java", search_type: "inheritance" - 分析 UserService.java 文件的类继承关系
     - query: "utils.py", search_type: "dependencies" - 分析 utils.py 文件的模块依赖关系
     """
@@ -167,6 +203,10 @@ class CodeTool(BaseCodebaseTool):
                 logger.warning(f"Failed to initialize AST analyzer: {str(e)}")
         object.__setattr__(self, "ast_analyzer", ast_analyzer)
     
+    def _cache_version(self, arguments: Dict[str, Any]) -> Optional[str]:
+        """代码仓库的 HEAD 和变更代数"""
+        return get_repo_version(settings.code_repo_path)
+    
     def _search_files(self, query: str) -> List[Path]:
         """搜索匹配的文件"""
         # 检查是否已取消
@@ -183,26 +223,174 @@ class CodeTool(BaseCodebaseTool):
             if potential_path.exists():
                 return [potential_path]
         
-        # 递归搜索文件
-        for root, dirs, files in os.walk(self.repo_path):
-            # 检查是否已取消
-            if _cancellation_event.is_set():
-                logger.warning("Code search cancelled during file walk")
-                raise KeyboardInterrupt("Code search cancelled")
-            
-            # 跳过隐藏目录和常见忽略目录
-            dirs[:] = [d for d in dirs if not d.startswith('.') and d not in ['__pycache__', 'node_modules', '.git']]
-            
-            for file in files:
-                if query_lower in file.lower():
-                    matches.append(Path(root) / file)
-                    if len(matches) >= 20:  # 限制结果数量
-                        return matches
+        # 在共享的文件目录中按文件名查找
+        catalog = get_file_catalog(self.repo_path)
+        for entry in catalog.files():
+            if query_lower in entry.name.lower():
+                matches.append(catalog.absolute_path(entry))
+                if len(matches) >= 20:  # 限制结果数量
+                    return matches
         
         return matches
     
     def _search_with_ripgrep(self, query: str, max_results: int = 10) -> List[Dict[str, Any]]:
-        """使用 ripgrep 进行快速代码搜索（多策略尝试）"""
+        """使用 ripgrep 进行快速代码搜索（多策略，单次扫描）"""
+        return self._search_with_ripgrep_patterns([query], max_results)
+    
+    def _build_ripgrep_candidates(self, patterns: List[str]) -> List[Dict[str, Any]]:
+        """
+        为每个模式构建匹配策略，按模式优先、策略次之的顺序排列
+        
+        Returns:
+            候选列表，每项包含 pattern, strategy, rg_pattern（传给 rg 的正则）, match（逐行判断函数）
+        """
+        candidates = []
+        for pattern in patterns:
+            if not pattern:
+                continue
+            lowered = pattern.lower()
+            for strategy in RIPGREP_STRATEGIES:
+                if strategy == "literal_fixed_case":
+                    rg_pattern = re.escape(pattern)
+                    match = _literal_matcher(pattern)
+                elif strategy == "literal_case_insensitive":
+                    rg_pattern = re.escape(pattern)
+                    match = _literal_matcher(lowered, ignore_case=True)
+                else:
+                    try:
+                        compiled = re.compile(pattern, re.IGNORECASE)
+                    except re.error:
+                        # 不是合法的正则表达式，只保留字面量策略
+                        continue
+                    rg_pattern = pattern
+                    match = compiled.search
+                candidates.append({
+                    "pattern": pattern,
+                    "strategy": strategy,
+                    "rg_pattern": rg_pattern,
+                    "match": match,
+                })
+        return candidates
+    
+    def _iter_ripgrep_json(self, rg_patterns: List[str]):
+        """
+        运行一次 rg（多个 -e 模式，JSON 输出），逐行产出输出
+        
+        rg 统一以忽略大小写方式搜索全部模式，大小写敏感的策略在排名时再区分。
+        取消时终止 rg 进程。
+        """
+        command = [RG_EXECUTABLE, "--json", "--ignore-case", "--no-messages"]
+        for rg_pattern in rg_patterns:
+            command.extend(["-e", rg_pattern])
+        command.extend(["--", str(self.repo_path)])
+        
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            # --no-messages 下 stderr 只有致命错误（如正则解析失败），内容很少，不会阻塞 stdout
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+        )
+        produced = False
+        try:
+            for line in process.stdout:
+                if _cancellation_event.is_set():
+                    logger.warning("Ripgrep search cancelled during iteration")
+                    raise KeyboardInterrupt("Ripgrep search cancelled")
+                produced = True
+                yield line
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.stdout.close()
+            stderr = process.stderr.read()
+            process.stderr.close()
+            process.wait()
+        if process.returncode == 2 and not produced:
+            raise RipgrepPatternError(stderr.strip())
+    
+    def _rank_ripgrep_matches(self, json_lines, candidates: List[Dict[str, Any]], max_results: int) -> List[Dict[str, Any]]:
+        """
+        解析 rg --json 输出，按命中的策略对结果排名
+        
+        每个文件保留排名最高的一行，文件按排名排序（同排名保持 rg 输出顺序）。
+        
+        Args:
+            json_lines: rg --json 的输出行
+            candidates: _build_ripgrep_candidates 的结果
+            max_results: 最大返回文件数
+            
+        Returns:
+            [{"file": 相对路径, "matches": [{"line": 行号, "content": 行内容}], "strategy": 策略名}]
+        """
+        best: Dict[str, Dict[str, Any]] = {}
+        top_rank_files = 0
+        
+        for raw in json_lines:
+            try:
+                event = json.loads(raw)
+            except ValueError:
+                continue
+            if event.get("type") != "match":
+                continue
+            
+            data = event.get("data", {})
+            file_path = data.get("path", {}).get("text", '')
+            # 非 UTF-8 内容以 bytes 字段返回，无法进行文本匹配，跳过
+            line_text = data.get("lines", {}).get("text")
+            if not file_path or line_text is None:
+                continue
+            if any(skip in file_path for skip in RIPGREP_SKIP_PARTS):
+                continue
+            
+            line_text = line_text.rstrip('\r\n')
+            rank = next((i for i, c in enumerate(candidates) if c["match"](line_text)), None)
+            if rank is None:
+                continue
+            
+            current = best.get(file_path)
+            if current is not None and current["rank"] <= rank:
+                continue
+            if rank == 0 and (current is None or current["rank"] > 0):
+                top_rank_files += 1
+            best[file_path] = {
+                "rank": rank,
+                "order": current["order"] if current else len(best),
+                "line": data.get("line_number", 0),
+                "content": line_text.strip(),
+            }
+            
+            # 最高优先级的结果已经足够，无需等待扫描结束
+            if top_rank_files >= max_results:
+                break
+        
+        ranked = sorted(best.items(), key=lambda item: (item[1]["rank"], item[1]["order"]))
+        results = []
+        for file_path, entry in ranked[:max_results]:
+            try:
+                rel_path = str(Path(file_path).relative_to(self.repo_path))
+            except ValueError:
+                rel_path = file_path
+            results.append({
+                "file": rel_path,
+                "matches": [{"line": entry["line"], "content": entry["content"]}],
+                "strategy": candidates[entry["rank"]]["strategy"],
+            })
+        return results
+    
+    def _search_with_ripgrep_patterns(self, patterns: List[str], max_results: int = 10) -> List[Dict[str, Any]]:
+        """
+        使用一次 ripgrep 扫描搜索多个模式
+        
+        所有模式和策略作为多个 -e 传给同一个 rg 进程，再按（模式顺序, 策略顺序）对结果排名，
+        最坏情况下也只扫描一遍仓库。
+        
+        Args:
+            patterns: 正则模式列表，越靠前优先级越高
+            max_results: 最大返回文件数
+        """
         # 检查是否已取消
         if _cancellation_event.is_set():
             logger.warning("Ripgrep search cancelled before starting")
@@ -211,118 +399,35 @@ class CodeTool(BaseCodebaseTool):
         if not RIPGREP_AVAILABLE:
             return []
         
-        # 定义多种搜索策略（按优先级排序）
-        search_strategies = [
-            {
-                "name": "literal_fixed_case",
-                "query": query,
-                "fixed_strings": True,  # -F: 字面量搜索
-                "case_sensitive": True,
-            },
-            {
-                "name": "literal_case_insensitive",
-                "query": query,
-                "fixed_strings": True,
-                "case_sensitive": False,  # -i: 大小写不敏感
-            },
-            {
-                "name": "regex_case_insensitive",
-                "query": query,
-                "fixed_strings": False,  # 正则表达式
-                "case_sensitive": False,
-            },
-            {
-                "name": "regex_fixed_case",
-                "query": query,
-                "fixed_strings": False,
-                "case_sensitive": True,
-            },
-            {
-                "name": "word_boundary",
-                "query": f"\\b{re.escape(query)}\\b",  # 单词边界
-                "fixed_strings": False,
-                "case_sensitive": False,
-            },
-        ]
-        
-        # 如果查询包含特殊字符，优先尝试字面量搜索
-        has_special_chars = bool(re.search(r'[()[\]{}.*+?^$|\\]', query))
-        if has_special_chars:
-            # 将字面量搜索提前
-            search_strategies.insert(0, {
-                "name": "literal_escaped",
-                "query": re.escape(query),  # 转义特殊字符
-                "fixed_strings": True,
-                "case_sensitive": False,
-            })
+        candidates = self._build_ripgrep_candidates(patterns)
+        if not candidates:
+            return []
+        rg_patterns = list(dict.fromkeys(c["rg_pattern"] for c in candidates))
         
-        # 尝试每种策略，直到找到结果
-        for strategy in search_strategies:
+        try:
+            logger.debug(f"Running ripgrep with {len(rg_patterns)} patterns: {rg_patterns[:5]}")
             try:
-                logger.debug(f"Trying ripgrep strategy: {strategy['name']} with query: {strategy['query'][:100]}")
-                
-                # 构建 ripgrep 命令
-                rg = Ripgrepy(strategy['query'], str(self.repo_path))
-                rg = rg.context(2)  # 包含上下文行
-                rg = rg.max_count(max_results * 5)  # 获取更多结果以便过滤
-                
-                # 设置搜索选项
-                if strategy['fixed_strings']:
-                    rg = rg.fixed_strings()  # -F: 字面量搜索
-                if not strategy['case_sensitive']:
-                    rg = rg.case_insensitive()  # -i: 大小写不敏感
-                
-                results = []
-                seen_files = set()
-                
-                for match in rg.run().as_dict:
-                    # 检查是否已取消
-                    if _cancellation_event.is_set():
-                        logger.warning("Ripgrep search cancelled during iteration")
-                        raise KeyboardInterrupt("Ripgrep search cancelled")
-                    
-                    file_path = match.get('data', {}).get('path', {}).get('text', '')
-                    line_number = match.get('data', {}).get('line_number', 0)
-                    line_text = match.get('data', {}).get('lines', {}).get('text', '').strip()
-                    
-                    if not file_path or file_path in seen_files:
-                        continue
-                    
-                    # 跳过二进制文件和常见忽略目录
-                    if any(skip in file_path for skip in ['.git', '__pycache__', 'node_modules', '.venv']):
-                        continue
-                    
-                    rel_path = str(Path(file_path).relative_to(self.repo_path))
-                    
-                    # 提取匹配行及其上下文
-                    matches = [{
-                        "line": line_number,
-                        "content": line_text
-                    }]
-                    
-                    results.append({
-                        "file": rel_path,
-                        "matches": matches
-                    })
-                    
-                    seen_files.add(file_path)
-                    if len(results) >= max_results:
-                        break
-                
-                # 如果找到结果，返回
-                if results:
-                    logger.info(f"Ripgrep search succeeded with strategy: {strategy['name']}, found {len(results)} results")
-                    return results
-                    
-            except KeyboardInterrupt:
-                raise
-            except Exception as e:
-                logger.debug(f"Ripgrep strategy '{strategy['name']}' failed: {str(e)}, trying next strategy")
-                continue
+                results = self._rank_ripgrep_matches(self._iter_ripgrep_json(rg_patterns), candidates, max_results)
+            except RipgrepPatternError as e:
+                # Python re 能编译但 rg 不支持的正则会让整个 rg 进程失败，去掉正则策略后重新搜索
+                literal_candidates = [c for c in candidates if c["strategy"] != "regex_case_insensitive"]
+                if len(literal_candidates) == len(candidates):
+                    raise
+                logger.warning(f"Ripgrep rejected regex patterns, retrying with literal patterns only: {str(e)}")
+                candidates = literal_candidates
+                rg_patterns = list(dict.fromkeys(c["rg_pattern"] for c in candidates))
+                results = self._rank_ripgrep_matches(self._iter_ripgrep_json(rg_patterns), candidates, max_results)
+        except KeyboardInterrupt:
+            raise
+        except Exception as e:
+            logger.warning(f"Ripgrep search failed: {str(e)}")
+            return []
         
-        # 所有策略都失败
-        logger.warning(f"All ripgrep search strategies failed for query: {query[:100]}")
-        return []
+        if results:
+            logger.info(f"Ripgrep search succeeded with strategy: {results[0]['strategy']}, found {len(results)} results")
+        else:
+            logger.info(f"Ripgrep search found no results for patterns: {patterns[:5]}")
+        return results
     
     def _detect_search_type(self, query: str) -> str:
         """自动检测搜索类型"""
@@ -346,177 +451,79 @@ class CodeTool(BaseCodebaseTool):
         return "variable"
     
     def _search_code_element(self, query: str, search_type: str, max_results: int = 10) -> List[Dict[str, Any]]:
-        """搜索代码元素（函数、类、变量、字符串等）"""
-        results = []
+        """搜索代码元素（函数、类、变量、字符串等）
         
-        # 根据搜索类型选择策略
-        if search_type == "function":
+        各类型的模式按优先级排列，与原始查询（最低优先级）一起在一次 ripgrep 扫描中完成。
+        """
+        q = re.escape(query)
+        patterns_by_type = {
             # 函数名搜索：查找函数定义和调用
-            # 使用 ripgrep 搜索函数定义模式：def function_name, function function_name, void function_name 等
-            patterns = [
-                f"def\\s+{re.escape(query)}",  # Python
-                f"function\\s+{re.escape(query)}",  # JavaScript
-                f"fn\\s+{re.escape(query)}",  # Rust
-                f"func\\s+{re.escape(query)}",  # Go
-                f"{re.escape(query)}\\s*\\(",  # 函数调用
-            ]
-            for pattern in patterns:
-                ripgrep_results = self._search_with_ripgrep(pattern, max_results)
-                if ripgrep_results:
-                    results.extend(ripgrep_results)
-                    break
-        
-        elif search_type == "method":
+            "function": [
+                f"def\\s+{q}",  # Python
+                f"function\\s+{q}",  # JavaScript
+                f"fn\\s+{q}",  # Rust
+                f"func\\s+{q}",  # Go
+                f"{q}\\s*\\(",  # 函数调用
+            ],
             # 方法搜索：查找类方法（类的成员函数）
-            patterns = [
-                f"def\\s+{re.escape(query)}",  # Python 方法
-                f"{re.escape(query)}\\s*\\(",  # 方法调用（如 obj.method()）
-                f"\\b{re.escape(query)}\\s*\\(",  # 方法调用（带单词边界）
-            ]
-            for pattern in patterns:
-                ripgrep_results = self._search_with_ripgrep(pattern, max_results)
-                if ripgrep_results:
-                    results.extend(ripgrep_results)
-                    break
-        
-        elif search_type == "call":
+            "method": [
+                f"def\\s+{q}",  # Python 方法
+                f"{q}\\s*\\(",  # 方法调用（如 obj.method()）
+                f"\\b{q}\\s*\\(",  # 方法调用（带单词边界）
+            ],
             # 函数调用位置搜索：只搜索调用，不搜索定义
-            patterns = [
-                f"{re.escape(query)}\\s*\\(",  # 函数调用
-                f"\\b{re.escape(query)}\\s*\\(",  # 函数调用（带单词边界）
-            ]
-            for pattern in patterns:
-                ripgrep_results = self._search_with_ripgrep(pattern, max_results)
-                if ripgrep_results:
-                    results.extend(ripgrep_results)
-                    break
-        
-        elif search_type == "class":
+            "call": [
+                f"{q}\\s*\\(",  # 函数调用
+                f"\\b{q}\\s*\\(",  # 函数调用（带单词边界）
+            ],
             # 类名搜索：查找类定义
-            patterns = [
-                f"class\\s+{re.escape(query)}",  # Python, JavaScript
-                f"struct\\s+{re.escape(query)}",  # C/C++, Rust
-                f"interface\\s+{re.escape(query)}",  # TypeScript, Java
-            ]
-            for pattern in patterns:
-                ripgrep_results = self._search_with_ripgrep(pattern, max_results)
-                if ripgrep_results:
-                    results.extend(ripgrep_results)
-                    break
-        
-        elif search_type == "interface":
+            "class": [
+                f"class\\s+{q}",  # Python, JavaScript
+                f"struct\\s+{q}",  # C/C++, Rust
+                f"interface\\s+{q}",  # TypeScript, Java
+            ],
             # 接口搜索：查找接口定义（TypeScript/Java）
-            patterns = [
-                f"interface\\s+{re.escape(query)}",  # TypeScript, Java
-            ]
-            for pattern in patterns:
-                ripgrep_results = self._search_with_ripgrep(pattern, max_results)
-                if ripgrep_results:
-                    results.extend(ripgrep_results)
-                    break
-        
-        elif search_type == "enum":
-            # 枚举搜索：查找枚举定义
-            patterns = [
-                f"enum\\s+{re.escape(query)}",  # C/C++, Rust, TypeScript, Java
-            ]
-            for pattern in patterns:
-                ripgrep_results = self._search_with_ripgrep(pattern, max_results)
-                if ripgrep_results:
-                    results.extend(ripgrep_results)
-                    break
-        
-        elif search_type == "namespace":
+            "interface": [f"interface\\s+{q}"],
+            # 枚举搜索：查找枚举定义（C/C++, Rust, TypeScript, Java）
+            "enum": [f"enum\\s+{q}"],
             # 命名空间搜索：查找命名空间定义（C++）
-            patterns = [
-                f"namespace\\s+{re.escape(query)}",  # C++
-            ]
-            for pattern in patterns:
-                ripgrep_results = self._search_with_ripgrep(pattern, max_results)
-                if ripgrep_results:
-                    results.extend(ripgrep_results)
-                    break
-        
-        elif search_type == "macro":
+            "namespace": [f"namespace\\s+{q}"],
             # 宏定义搜索：查找宏定义（C/C++）
-            patterns = [
-                f"#define\\s+{re.escape(query)}",  # C/C++
-            ]
-            for pattern in patterns:
-                ripgrep_results = self._search_with_ripgrep(pattern, max_results)
-                if ripgrep_results:
-                    results.extend(ripgrep_results)
-                    break
-        
-        elif search_type == "decorator":
+            "macro": [f"#define\\s+{q}"],
             # 装饰器搜索：查找装饰器使用（Python）
-            patterns = [
-                f"@{re.escape(query)}",  # Python 装饰器
-            ]
-            for pattern in patterns:
-                ripgrep_results = self._search_with_ripgrep(pattern, max_results)
-                if ripgrep_results:
-                    results.extend(ripgrep_results)
-                    break
-        
-        elif search_type == "import":
+            "decorator": [f"@{q}"],
             # 导入语句搜索：查找导入语句
-            patterns = [
-                f"import\\s+.*{re.escape(query)}",  # Python, JavaScript
-                f"from\\s+.*{re.escape(query)}",  # Python
-                f"#include\\s+.*{re.escape(query)}",  # C/C++
-                f"using\\s+.*{re.escape(query)}",  # C++
-            ]
-            for pattern in patterns:
-                ripgrep_results = self._search_with_ripgrep(pattern, max_results)
-                if ripgrep_results:
-                    results.extend(ripgrep_results)
-                    break
-        
-        elif search_type == "constant":
+            "import": [
+                f"import\\s+.*{q}",  # Python, JavaScript
+                f"from\\s+.*{q}",  # Python
+                f"#include\\s+.*{q}",  # C/C++
+                f"using\\s+.*{q}",  # C++
+            ],
             # 常量搜索：查找常量定义
-            patterns = [
-                f"const\\s+{re.escape(query)}",  # JavaScript, C++
-                f"final\\s+.*{re.escape(query)}",  # Java
-                f"\\b{re.escape(query)}\\s*=",  # 常量赋值（如 MAX_SIZE = 100）
-            ]
-            for pattern in patterns:
-                ripgrep_results = self._search_with_ripgrep(pattern, max_results)
-                if ripgrep_results:
-                    results.extend(ripgrep_results)
-                    break
-        
-        elif search_type == "type":
-            # 类型别名搜索：查找类型别名定义（TypeScript）
-            patterns = [
-                f"type\\s+{re.escape(query)}",  # TypeScript
-                f"typedef\\s+.*{re.escape(query)}",  # C/C++
-            ]
-            for pattern in patterns:
-                ripgrep_results = self._search_with_ripgrep(pattern, max_results)
-                if ripgrep_results:
-                    results.extend(ripgrep_results)
-                    break
-        
-        elif search_type == "variable":
-            # 变量名搜索：查找变量声明和使用
-            # 使用单词边界确保精确匹配
-            pattern = f"\\b{re.escape(query)}\\b"
-            results = self._search_with_ripgrep(pattern, max_results)
-        
-        elif search_type == "string":
-            # 字符串字面量搜索：使用字面量搜索
-            results = self._search_with_ripgrep(query, max_results)
-        
-        else:
-            # 默认使用 ripgrep
-            results = self._search_with_ripgrep(query, max_results)
+            "constant": [
+                f"const\\s+{q}",  # JavaScript, C++
+                f"final\\s+.*{q}",  # Java
+                f"\\b{q}\\s*=",  # 常量赋值（如 MAX_SIZE = 100）
+            ],
+            # 类型别名搜索：查找类型别名定义
+            "type": [
+                f"type\\s+{q}",  # TypeScript
+                f"typedef\\s+.*{q}",  # C/C++
+            ],
+            # 变量名搜索：使用单词边界确保精确匹配
+            "variable": [f"\\b{q}\\b"],
+        }
         
+        # 字符串字面量和其他类型直接使用原始查询；其他类型也以原始查询作为最低优先级的通用搜索
+        patterns = patterns_by_type.get(search_type, []) + [query]
+        results = self._search_with_ripgrep_patterns(patterns, max_results)
         return results[:max_results]
     
     def _search_with_ast(self, query: str, search_type: str = "auto", max_results: int = 10) -> List[Dict[str, Any]]:
         """使用 AST 进行代码搜索（支持函数定义、调用关系等）
         
+        优先查询持久化符号索引；索引不可用时回退到逐文件解析。
+        
         注意：需要先安装并编译 tree-sitter 语言库
         示例：pip install tree-sitter tree-sitter-python tree-sitter-javascript tree-sitter-typescript
         """
@@ -524,102 +531,133 @@ class CodeTool(BaseCodebaseTool):
             logger.debug("AST search not available (tree-sitter not installed or analyzer not initialized)")
             return []
         
+        if settings.symbol_index_enabled:
+            index_results = self._search_with_symbol_index(query, search_type, max_results)
+            if index_results is not None:
+                return index_results
+        
+        return self._search_with_ast_scan(query, search_type, max_results)
+    
+    def _search_with_symbol_index(self, query: str, search_type: str, max_results: int = 10) -> Optional[List[Dict[str, Any]]]:
+        """使用持久化符号索引进行 AST 搜索
+        
+        Returns:
+            搜索结果；索引不可用时返回 None（调用方回退到逐文件解析）
+        """
+        # 搜索类型 -> 符号类别（同一文件内按列表顺序排列）
+        kinds_map = {
+            "function": ["definition", "call"],
+            "method": ["definition"],
+            "call": ["call"],
+            "variable": ["reference"],
+            "class": ["class"],
+        }
+        kinds = kinds_map.get(search_type)
+        if not kinds:
+            # 其他类型目前主要通过 ripgrep 搜索
+            return []
+        
+        try:
+            index = get_symbol_index(self.repo_path)
+            index.ensure_fresh(cancel_event=_cancellation_event)
+            results = index.search(query, kinds, max_results)
+            logger.info(f"Symbol index search found {len(results)} files with matches for '{query}'")
+            return results
+        except KeyboardInterrupt:
+            raise
+        except Exception as e:
+            logger.warning(f"Symbol index search failed: {str(e)}, falling back to AST file scan")
+            return None
+    
+    def _search_with_ast_scan(self, query: str, search_type: str = "auto", max_results: int = 10) -> List[Dict[str, Any]]:
+        """逐文件解析进行 AST 搜索（符号索引不可用时的回退方法）"""
         results = []
         
         try:
             # 支持的代码文件扩展名
             code_extensions = ('.py', '.js', '.ts', '.tsx', '.jsx', '.cpp', '.cc', '.cxx', '.java')
             
-            # 遍历代码文件
-            for root, dirs, files in os.walk(self.repo_path):
-                # 跳过隐藏目录和常见忽略目录
-                dirs[:] = [d for d in dirs if not d.startswith('.') and d not in ['__pycache__', 'node_modules', '.venv', 'build', 'dist']]
+            # 遍历共享文件目录中的代码文件
+            catalog = get_file_catalog(self.repo_path)
+            for entry in catalog.files(extensions=code_extensions, skip_dirs=('build', 'dist')):
+                file_path = catalog.absolute_path(entry)
+                rel_path = Path(entry.path)
                 
-                for file in files:
-                    if not file.endswith(code_extensions):
-                        continue
+                try:
+                    # 读取文件内容
+                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                        source_code = f.read()
                     
-                    file_path = Path(root) / file
-                    rel_path = file_path.relative_to(self.repo_path)
+                    # 根据搜索类型调用不同的 AST 查询方法
+                    matches = []
                     
-                    try:
-                        # 读取文件内容
-                        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                            source_code = f.read()
-                        
-                        # 根据搜索类型调用不同的 AST 查询方法
-                        matches = []
-                        
-                        if search_type == "function":
-                            # 查找函数定义
-                            definitions = self.ast_analyzer.find_function_definition(str(rel_path), source_code, query)
-                            for defn in definitions:
-                                matches.append({
-                                    'line': defn['line'],
-                                    'content': defn['code'].split('\n')[0] if defn['code'] else f"def {query}()"
-                                })
-                            
-                            # 查找函数调用
-                            calls = self.ast_analyzer.find_function_calls(str(rel_path), source_code, query)
-                            for call in calls:
-                                matches.append({
-                                    'line': call['line'],
-                                    'content': call['code'].split('\n')[0] if call['code'] else f"{query}()"
-                                })
-                        
-                        elif search_type == "method":
-                            # 方法搜索：查找类方法（AST 分析器中的 find_function_definition 已经包含 method_definition）
-                            definitions = self.ast_analyzer.find_function_definition(str(rel_path), source_code, query)
-                            for defn in definitions:
-                                matches.append({
-                                    'line': defn['line'],
-                                    'content': defn['code'].split('\n')[0] if defn['code'] else f"def {query}()"
-                                })
-                        
-                        elif search_type == "call":
-                            # 函数调用位置搜索：只搜索调用，不搜索定义
-                            calls = self.ast_analyzer.find_function_calls(str(rel_path), source_code, query)
-                            for call in calls:
-                                matches.append({
-                                    'line': call['line'],
-                                    'content': call['code'].split('\n')[0] if call['code'] else f"{query}()"
-                                })
-                        
-                        elif search_type == "variable":
-                            # 查找变量使用
-                            usages = self.ast_analyzer.find_variable_usage(str(rel_path), source_code, query)
-                            for usage in usages:
-                                matches.append({
-                                    'line': usage['line'],
-                                    'content': usage['code'].split('\n')[0] if usage['code'] else query
-                                })
-                        
-                        elif search_type == "class":
-                            # 类搜索暂时使用 ripgrep（AST 类分析需要更复杂的实现）
-                            logger.debug(f"Class search via AST not yet implemented for {query}, falling back to ripgrep")
-                            return []
-                        
-                        elif search_type in ["import", "constant", "enum", "interface", "namespace", "macro", "decorator", "type"]:
-                            # 这些类型目前主要通过 ripgrep 搜索，AST 支持可以后续扩展
-                            logger.debug(f"{search_type} search via AST not yet implemented for {query}, falling back to ripgrep")
-                            return []
+                    if search_type == "function":
+                        # 查找函数定义
+                        definitions = self.ast_analyzer.find_function_definition(str(rel_path), source_code, query)
+                        for defn in definitions:
+                            matches.append({
+                                'line': defn['line'],
+                                'content': defn['code'].split('\n')[0] if defn['code'] else f"def {query}()"
+                            })
                         
-                        # 如果有匹配结果，添加到结果列表
-                        if matches:
-                            results.append({
-                                'file': str(rel_path),
-                                'matches': matches[:max_results]  # 限制每个文件的匹配数
+                        # 查找函数调用
+                        calls = self.ast_analyzer.find_function_calls(str(rel_path), source_code, query)
+                        for call in calls:
+                            matches.append({
+                                'line': call['line'],
+                                'content': call['code'].split('\n')[0] if call['code'] else f"{query}()"
                             })
-                            
-                            if len(results) >= max_results:
-                                break
                     
-                    except Exception as e:
-                        logger.debug(f"Error processing file {rel_path} with AST: {str(e)}")
-                        continue
+                    elif search_type == "method":
+                        # 方法搜索：查找类方法（AST 分析器中的 find_function_definition 已经包含 method_definition）
+                        definitions = self.ast_analyzer.find_function_definition(str(rel_path), source_code, query)
+                        for defn in definitions:
+                            matches.append({
+                                'line': defn['line'],
+                                'content': defn['code'].split('\n')[0] if defn['code'] else f"def {query}()"
+                            })
+                    
+                    elif search_type == "call":
+                        # 函数调用位置搜索：只搜索调用，不搜索定义
+                        calls = self.ast_analyzer.find_function_calls(str(rel_path), source_code, query)
+                        for call in calls:
+                            matches.append({
+                                'line': call['line'],
+                                'content': call['code'].split('\n')[0] if call['code'] else f"{query}()"
+                            })
+                    
+                    elif search_type == "variable":
+                        # 查找变量使用
+                        usages = self.ast_analyzer.find_variable_usage(str(rel_path), source_code, query)
+                        for usage in usages:
+                            matches.append({
+                                'line': usage['line'],
+                                'content': usage['code'].split('\n')[0] if usage['code'] else query
+                            })
+                    
+                    elif search_type == "class":
+                        # 类搜索暂时使用 ripgrep（AST 类分析需要更复杂的实现）
+                        logger.debug(f"Class search via AST not yet implemented for {query}, falling back to ripgrep")
+                        return []
+                    
+                    elif search_type in ["import", "constant", "enum", "interface", "namespace", "macro", "decorator", "type"]:
+                        # 这些类型目前主要通过 ripgrep 搜索，AST 支持可以后续扩展
+                        logger.debug(f"{search_type} search via AST not yet implemented for {query}, falling back to ripgrep")
+                        return []
+                    
+                    # 如果有匹配结果，添加到结果列表
+                    if matches:
+                        results.append({
+                            'file': str(rel_path),
+                            'matches': matches[:max_results]  # 限制每个文件的匹配数
+                        })
+                        
+                        if len(results) >= max_results:
+                            break
                 
-                if len(results) >= max_results:
-                    break
+                except Exception as e:
+                    logger.debug(f"Error processing file {rel_path} with AST: {str(e)}")
+                    continue
             
             logger.info(f"AST search found {len(results)} files with matches for '{query}'")
             return results[:max_results]
@@ -629,10 +667,7 @@ class CodeTool(BaseCodebaseTool):
             return []
     
     def _search_in_files(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
-        """在文件中搜索关键词（回退方法）"""
-        results = []
-        query_lower = query.lower()
-        
+        """在文件中搜索关键词（回退方法，使用并行文件扫描引擎）"""
         # 支持更多文件类型，包括 C/C++
         code_extensions = (
             '.py', '.js', '.ts', '.jsx', '.tsx', '.java', '.go', '.rs',
@@ -640,40 +675,29 @@ class CodeTool(BaseCodebaseTool):
             '.cs', '.php', '.rb', '.swift', '.kt', '.scala',  # 其他语言
         )
         
-        for root, dirs, files in os.walk(self.repo_path):
-            # 跳过隐藏目录和常见忽略目录
-            dirs[:] = [d for d in dirs if not d.startswith('.') and d not in ['__pycache__', 'node_modules', '.venv', 'build', 'dist']]
-            
-            for file in files:
-                if file.endswith(code_extensions):
-                    file_path = Path(root) / file
-                    try:
-                        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                            content = f.read()
-                            if query_lower in content.lower():
-                                # 提取匹配的行
-                                lines = content.split('\n')
-                                matching_lines = []
-                                for i, line in enumerate(lines, 1):
-                                    if query_lower in line.lower():
-                                        matching_lines.append({
-                                            "line": i,
-                                            "content": line.strip()
-                                        })
-                                        if len(matching_lines) >= 5:
-                                            break
-                                
-                                results.append({
-                                    "file": str(file_path.relative_to(self.repo_path)),
-                                    "matches": matching_lines[:5]
-                                })
-                                
-                                if len(results) >= max_results:
-                                    return results
-                    except Exception:
-                        continue
+        catalog = get_file_catalog(self.repo_path)
+        file_paths = [
+            catalog.absolute_path(entry)
+            for entry in catalog.files(extensions=code_extensions, skip_dirs=('build', 'dist'))
+        ]
         
-        return results
+        scanned = scan_files(
+            file_paths,
+            query,
+            ignore_case=True,
+            max_files=max_results,
+            max_matches_per_file=5,
+            skip_binary=False,
+            cancel_event=_cancellation_event,
+        )
+        
+        return [
+            {
+                "file": str(item["path"].relative_to(self.repo_path)),
+                "matches": [{"line": m["line"], "content": m["content"].strip()} for m in item["matches"]]
+            }
+            for item in scanned
+        ]
     
     def _parse_stack_trace(self, query: str) -> Optional[Dict[str, Any]]:
         """解析堆栈跟踪信息，提取文件路径和行号"""
@@ -763,6 +787,81 @@ class CodeTool(BaseCodebaseTool):
         result.append("=" * 80)
         return "\n".join(result)
     
+    def _execute_repo_call_graph(self, function_name: str, file_path: Optional[str], max_depth: int, max_fanout: int) -> ToolResult:
+        """查询函数的跨文件调用者和被调用者"""
+        if not AST_AVAILABLE or not self.ast_analyzer or not settings.symbol_index_enabled:
+            return ToolResult(
+                success=False,
+                error="仓库级调用关系图需要 tree-sitter 并启用符号索引（SYMBOL_INDEX_ENABLED=true）。也可以将文件路径作为 query 分析单个文件的调用关系。"
+            )
+        
+        try:
+            index = get_symbol_index(self.repo_path)
+            index.ensure_fresh(cancel_event=_cancellation_event)
+            graph = RepoCallGraph(index)
+            logger.info(f"Querying repository call graph for: {function_name} (depth: {max_depth}, fan-out: {max_fanout})")
+            callers = graph.callers_of(function_name, file_path=file_path, max_depth=max_depth, max_fanout=max_fanout)
+            callees = graph.callees_of(function_name, file_path=file_path, max_depth=max_depth, max_fanout=max_fanout)
+        except KeyboardInterrupt:
+            raise
+        except Exception as e:
+            logger.error(f"Error querying repository call graph: {str(e)}", exc_info=True)
+            return ToolResult(
+                success=False,
+                error=f"查询调用关系图时出错: {str(e)}"
+            )
+        
+        if not callers["nodes"]:
+            return ToolResult(
+                success=False,
+                error=f"未找到函数定义: {function_name}" + (f"（文件: {file_path}）" if file_path else "")
+            )
+        
+        result_text = self._format_repo_call_graph(callers, callees)
+        truncated_data, is_truncated = self._truncate_data(result_text)
+        summary = self._create_summary(result_text) if is_truncated else None
+        
+        return ToolResult(
+            success=True,
+            data=truncated_data,
+            truncated=is_truncated,
+            summary=summary
+        )
+    
+    def _format_repo_call_graph(self, callers: Dict[str, Any], callees: Dict[str, Any]) -> str:
+        """格式化仓库级调用关系图输出"""
+        result = []
+        result.append("=" * 80)
+        result.append(f"跨文件调用关系图: {callers['root']}（最大深度 {callers['max_depth']}）")
+        result.append("=" * 80)
+        
+        result.append("函数定义:")
+        for node in callers["nodes"]:
+            if node["depth"] == 0:
+                result.append(f"  - {node['name']} ({node['file']}:{node['line']})")
+        result.append("")
+        
+        for title, graph, arrow in (("调用者（谁调用了它）", callers, "<-"), ("被调用者（它调用了谁）", callees, "->")):
+            result.append(f"{title}:")
+            if not graph["edges"]:
+                result.append("  （无）")
+            for edge in graph["edges"]:
+                indent = "  " * edge["depth"]
+                if arrow == "<-":
+                    target = f"{edge['from_function']} ({edge['from_file']}:{edge['line']})"
+                    current = edge["to_function"]
+                else:
+                    target = f"{edge['to_function']} ({edge['to_file']}, 调用于 {edge['from_file']}:{edge['line']})"
+                    current = edge["from_function"]
+                ambiguous = " [同名定义有多个，未能唯一解析]" if edge["ambiguous"] else ""
+                result.append(f"{indent}{current} {arrow} {target}{ambiguous}")
+            if graph["truncated"]:
+                result.append("  ...（已达到扇出或节点数量上限，部分结果未展开）")
+            result.append("")
+        
+        result.append("=" * 80)
+        return "\n".join(result)
+    
     def _format_inheritance(self, inheritance_list: List[Dict[str, Any]]) -> str:
         """格式化类继承关系输出"""
         if not inheritance_list:
@@ -863,7 +962,8 @@ class CodeTool(BaseCodebaseTool):
         search_type: Optional[str] = "auto",
         file_path: Optional[str] = None,
         max_results: int = 10,
-        include_context: bool = True
+        include_context: bool = True,
+        max_depth: int = 3
     ) -> ToolResult:
         """执行代码元素搜索"""
         # 在执行开始时检查是否已取消
@@ -892,14 +992,17 @@ class CodeTool(BaseCodebaseTool):
             
             result_text = ""
             
+            # query 是函数名时，通过符号索引查询仓库级调用关系图
+            if search_type == "call_graph" and query and not query.endswith(CODE_FILE_EXTENSIONS):
+                return self._execute_repo_call_graph(query, file_path, max_depth, max_results)
+            
             # 处理代码关系分析类型（call_graph, inheritance, dependencies）
             if search_type in ["call_graph", "inheritance", "dependencies"]:
                 # 确定要分析的文件路径
                 target_file = None
                 if file_path:
                     target_file = self.repo_path / file_path
-                elif query and (query.endswith('.py') or query.endswith('.js') or query.endswith('.ts') or 
-                               query.endswith('.java') or query.endswith('.cpp') or query.endswith('.c')):
+                elif query and query.endswith(CODE_FILE_EXTENSIONS):
                     # query 看起来像文件路径
                     target_file = self.repo_path / query
                 
@@ -983,14 +1086,7 @@ class CodeTool(BaseCodebaseTool):
                         if search_results:
                             search_method = f"code_element_{search_type}"
                     
-                    # 策略3: 回退到通用 ripgrep 搜索
-                    if not search_results:
-                        logger.info("Falling back to general ripgrep search...")
-                        search_results = self._search_with_ripgrep(query, max_results)
-                        if search_results:
-                            search_method = "ripgrep"
-                    
-                    # 策略4: 最后回退到文件内容搜索
+                    # 策略3: 回退到文件内容搜索（通用查询已包含在策略2的同一次 ripgrep 扫描中）
                     if not search_results:
                         logger.info("Falling back to file content search...")
                         search_results = self._search_in_files(query, max_results)
@@ -1054,14 +1150,7 @@ class CodeTool(BaseCodebaseTool):
                             if search_results:
                                 search_method = f"code_element_{search_type}"
                         
-                        # 策略3: 回退到通用 ripgrep 搜索
-                        if not search_results:
-                            logger.info("Falling back to general ripgrep search...")
-                            search_results = self._search_with_ripgrep(query, max_results)
-                            if search_results:
-                                search_method = "ripgrep"
-                        
-                        # 策略4: 最后回退到文件内容搜索
+                        # 策略3: 回退到文件内容搜索（通用查询已包含在策略2的同一次 ripgrep 扫描中）
                         if not search_results:
                             logger.info("Falling back to file content search...")
                             search_results = self._search_in_files(query, max_results)
@@ -1,10 +1,11 @@
 """数据库查询工具实现"""
-from typing import Optional
+from typing import Any, Dict, Optional
 from pydantic import BaseModel, Field
 
 from codebase_driven_agent.tools.base import BaseCodebaseTool, ToolResult
 from codebase_driven_agent.utils.database import (
     get_schema_info,
+    get_schema_version,
     format_schema_info,
     execute_query,
     validate_sql,
@@ -61,6 +62,12 @@ class DatabaseTool(BaseCodebaseTool):
         super().__init__(**kwargs)
         self.max_output_length = kwargs.get("max_output_length", 5000)
     
+    def _cache_version(self, arguments: Dict[str, Any]) -> Optional[str]:
+        """只缓存 schema 查询（数据查询的结果随时可能变化），版本为 schema 的版本"""
+        if arguments.get("action") != "schema":
+            return None
+        return get_schema_version()
+    
     def _execute(
         self,
         action: str,
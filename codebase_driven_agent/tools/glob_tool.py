@@ -1,12 +1,13 @@
 """文件匹配工具实现"""
-import glob
 from pathlib import Path
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 from pydantic import BaseModel, Field
 
 from codebase_driven_agent.tools.base import BaseCodebaseTool, ToolResult
 from codebase_driven_agent.config import settings
+from codebase_driven_agent.utils.file_catalog import get_file_catalog
 from codebase_driven_agent.utils.logger import setup_logger
+from codebase_driven_agent.utils.tool_cache import get_repo_version
 
 logger = setup_logger("codebase_driven_agent.tools.glob")
 
@@ -46,6 +47,10 @@ class GlobTool(BaseCodebaseTool):
         super().__init__(**kwargs)
         object.__setattr__(self, "code_repo_path", settings.code_repo_path)
     
+    def _cache_version(self, arguments: Dict[str, Any]) -> Optional[str]:
+        """代码仓库的 HEAD 和变更代数"""
+        return get_repo_version(self.code_repo_path)
+    
     def _execute(self, pattern: str, path: Optional[str] = None) -> ToolResult:
         """
         执行文件匹配
@@ -53,7 +58,7 @@ class GlobTool(BaseCodebaseTool):
         Args:
             pattern: glob 模式
             path: 搜索基础路径
-        
+            
         Returns:
             ToolResult
         """
@@ -84,35 +89,21 @@ class GlobTool(BaseCodebaseTool):
             else:
                 search_path = repo_path
             
-            # 构建完整的 glob 模式
-            if path:
-                full_pattern = str(search_path / pattern)
-            else:
-                full_pattern = str(repo_path / pattern)
-            
-            # 执行 glob 匹配
-            matched_files = glob.glob(full_pattern, recursive=True)
-            
-            # 转换为相对路径
-            matched_relative = []
-            for file_path in matched_files:
-                try:
-                    rel_path = Path(file_path).relative_to(repo_path)
-                    if Path(file_path).is_file():  # 只包含文件，不包含目录
-                        matched_relative.append(str(rel_path))
-                except ValueError:
-                    # 文件不在仓库内，跳过
-                    continue
+            # 在共享的文件目录中匹配（语义与 glob.glob(recursive=True) 一致，只包含文件）
+            catalog = get_file_catalog(repo_path)
+            matched_entries = catalog.glob(pattern, base=path)
             
             # 按修改时间排序（最新的在前）
-            matched_relative.sort(key=lambda p: Path(repo_path / p).stat().st_mtime, reverse=True)
+            matched_entries = sorted(matched_entries, key=lambda entry: entry.mtime_ns, reverse=True)
+            matched_relative = [str(Path(entry.path)) for entry in matched_entries]
             
             # 限制结果数量（避免返回过多文件）
             max_results = 100
-            if len(matched_relative) > max_results:
+            total_matches = len(matched_relative)
+            if total_matches > max_results:
                 matched_relative = matched_relative[:max_results]
                 truncated = True
-                summary = f"找到 {len(glob.glob(full_pattern, recursive=True))} 个文件，显示前 {max_results} 个（按修改时间排序）"
+                summary = f"找到 {total_matches} 个文件，显示前 {max_results} 个（按修改时间排序）"
             else:
                 truncated = False
                 summary = None
@@ -1,13 +1,15 @@
 """内容搜索工具实现"""
 import re
-import os
 from pathlib import Path
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 from pydantic import BaseModel, Field
 
 from codebase_driven_agent.tools.base import BaseCodebaseTool, ToolResult
 from codebase_driven_agent.config import settings
+from codebase_driven_agent.utils.file_catalog import get_file_catalog
+from codebase_driven_agent.utils.file_scanner import scan_files
 from codebase_driven_agent.utils.logger import setup_logger
+from codebase_driven_agent.utils.tool_cache import get_repo_version
 
 logger = setup_logger("codebase_driven_agent.tools.grep")
 
@@ -57,6 +59,10 @@ class GrepTool(BaseCodebaseTool):
         super().__init__(**kwargs)
         object.__setattr__(self, "code_repo_path", settings.code_repo_path)
     
+    def _cache_version(self, arguments: Dict[str, Any]) -> Optional[str]:
+        """代码仓库的 HEAD 和变更代数"""
+        return get_repo_version(self.code_repo_path)
+    
     def _search_with_ripgrep(self, pattern: str, search_path: Path, include: Optional[str] = None) -> List[dict]:
         """使用 ripgrep 搜索"""
         try:
@@ -87,56 +93,38 @@ class GrepTool(BaseCodebaseTool):
             logger.warning(f"ripgrep search failed: {str(e)}, falling back to Python regex")
             return []
     
-    def _search_with_python(self, pattern: str, search_path: Path, include: Optional[str] = None) -> List[dict]:
-        """使用 Python regex 搜索（fallback）"""
-        matches = []
-        compiled_pattern = re.compile(pattern)
+    def _search_with_python(self, pattern: str, search_path: Path, include: Optional[str] = None, max_matches: Optional[int] = None) -> List[dict]:
+        """使用 Python regex 搜索（fallback，使用并行文件扫描引擎）
         
-        # 确定要搜索的文件
-        files_to_search = []
+        文件按相对路径排序后扫描，提前终止时返回的仍是排序后的前 max_matches 个匹配。
+        """
+        repo_path = Path(self.code_repo_path)
         
+        # 确定要搜索的文件
         if search_path.is_file():
             files_to_search = [search_path]
         else:
-            # 递归搜索目录
-            for root, dirs, files in os.walk(search_path):
-                # 跳过隐藏目录和常见忽略目录
-                dirs[:] = [d for d in dirs if not d.startswith('.') and d not in ['__pycache__', 'node_modules', '.git']]
-                
-                for file in files:
-                    file_path = Path(root) / file
-                    
-                    # 文件类型过滤
-                    if include:
-                        if not file_path.match(include):
-                            continue
-                    
-                    # 跳过二进制文件
-                    try:
-                        with open(file_path, 'rb') as f:
-                            chunk = f.read(8192)
-                            if b'\x00' in chunk:
-                                continue
-                    except Exception:
-                        continue
-                    
-                    files_to_search.append(file_path)
+            # 从共享的文件目录中获取（按相对路径排序，与最终结果的 (file, line) 排序保持一致）
+            catalog = get_file_catalog(repo_path)
+            subdir = search_path.relative_to(repo_path).as_posix()
+            files_to_search = [
+                catalog.absolute_path(entry)
+                for entry in catalog.files(subdir=subdir)
+                if not include or Path(entry.path).match(include)
+            ]
         
-        # 搜索每个文件
-        for file_path in files_to_search:
-            try:
-                with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-                    for line_num, line in enumerate(f, 1):
-                        if compiled_pattern.search(line):
-                            rel_path = file_path.relative_to(self.code_repo_path)
-                            matches.append({
-                                'file': str(rel_path),
-                                'line': line_num,
-                                'content': line.rstrip()
-                            })
-            except Exception as e:
-                logger.debug(f"Failed to search file {file_path}: {str(e)}")
-                continue
+        # 二进制文件在扫描时通过同一次读取的内容检测并跳过
+        scanned = scan_files(files_to_search, pattern, regex=True, max_matches=max_matches)
+        
+        matches = []
+        for item in scanned:
+            rel_path = item["path"].relative_to(repo_path)
+            for match in item["matches"]:
+                matches.append({
+                    'file': str(rel_path),
+                    'line': match["line"],
+                    'content': match["content"].rstrip()
+                })
         
         return matches
     
@@ -148,7 +136,7 @@ class GrepTool(BaseCodebaseTool):
             pattern: 正则表达式模式
             path: 搜索路径
             include: 文件类型过滤
-        
+            
         Returns:
             ToolResult
         """
@@ -187,21 +175,22 @@ class GrepTool(BaseCodebaseTool):
                     error=f"无效的正则表达式: {str(e)}"
                 )
             
+            # 限制结果数量（Python 扫描多取一个匹配用于判断是否截断，达到后提前终止）
+            max_results = 50
+            
             # 执行搜索
             if RIPGREP_AVAILABLE and search_path.is_dir():
                 try:
                     matches = self._search_with_ripgrep(pattern, search_path, include)
                 except Exception as e:
                     logger.warning(f"ripgrep search failed: {str(e)}, falling back to Python regex")
-                    matches = self._search_with_python(pattern, search_path, include)
+                    matches = self._search_with_python(pattern, search_path, include, max_matches=max_results + 1)
             else:
-                matches = self._search_with_python(pattern, search_path, include)
+                matches = self._search_with_python(pattern, search_path, include, max_matches=max_results + 1)
             
             # 按文件和行号排序
             matches.sort(key=lambda x: (x['file'], x['line']))
             
-            # 限制结果数量
-            max_results = 50
             truncated = False
             if len(matches) > max_results:
                 matches = matches[:max_results]
@@ -1,5 +1,6 @@
 """日志查询工具实现"""
-from typing import Optional
+import time
+from typing import Any, Dict, Optional
 from datetime import datetime, timedelta
 from pydantic import BaseModel, Field
 
@@ -62,6 +63,20 @@ class LogTool(BaseCodebaseTool):
         object.__setattr__(self, "log_query", get_log_query_instance())
         object.__setattr__(self, "default_appname", settings.logyi_appname)
     
+    def _cache_version(self, arguments: Dict[str, Any]) -> Optional[str]:
+        """
+        日志查询的数据版本：当前时间桶
+        
+        结束时间早于一个时间桶之前的查询只涉及已经写完的日志，结果不再变化，不按时间桶区分。
+        """
+        source = f"{type(self.log_query).__name__}:{id(self.log_query)}"
+        bucket_seconds = max(1, settings.tool_cache_log_bucket)
+        end_dt = self._parse_time(arguments.get("end_time"))
+        if end_dt is not None and arguments.get("start_time"):
+            if end_dt < datetime.now(end_dt.tzinfo) - timedelta(seconds=bucket_seconds):
+                return f"{source}:closed"
+        return f"{source}:{int(time.time() // bucket_seconds)}"
+    
     def _parse_time(self, time_str: Optional[str]) -> Optional[datetime]:
         """解析时间字符串"""
         if not time_str:
@@ -193,8 +208,13 @@ class LogTool(BaseCodebaseTool):
             
             for i, log_entry in enumerate(result.logs, 1):
                 result_text += f"[{i}] {log_entry.get('timestamp', 'N/A')} "
-                result_text += f"[{log_entry.get('level', 'INFO')}] "
+                if log_entry.get('level'):
+                    result_text += f"[{log_entry['level']}] "
+                if log_entry.get('logger'):
+                    result_text += f"{log_entry['logger']} - "
                 result_text += f"{log_entry.get('message', '')}\n"
+                if log_entry.get('trace_id'):
+                    result_text += f"    Trace ID: {log_entry['trace_id']}\n"
                 
                 # 添加文件信息（如果有）
                 if 'file' in log_entry:
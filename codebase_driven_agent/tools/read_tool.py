@@ -1,12 +1,14 @@
 """文件读取工具实现"""
 import os
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, Optional
 from pydantic import BaseModel, Field
 
 from codebase_driven_agent.tools.base import BaseCodebaseTool, ToolResult
 from codebase_driven_agent.config import settings
+from codebase_driven_agent.utils.file_catalog import get_file_catalog
 from codebase_driven_agent.utils.logger import setup_logger
+from codebase_driven_agent.utils.tool_cache import get_file_version
 
 logger = setup_logger("codebase_driven_agent.tools.read")
 
@@ -53,6 +55,12 @@ class ReadTool(BaseCodebaseTool):
         super().__init__(**kwargs)
         object.__setattr__(self, "code_repo_path", settings.code_repo_path)
     
+    def _cache_version(self, arguments: Dict[str, Any]) -> Optional[str]:
+        """文件的修改时间和大小"""
+        if not self.code_repo_path:
+            return None
+        return get_file_version(Path(self.code_repo_path) / arguments["file_path"].strip().lstrip('/\\'))
+    
     def _execute(self, file_path: str, offset: Optional[int] = None, limit: Optional[int] = None) -> ToolResult:
         """
         执行文件读取
@@ -61,7 +69,7 @@ class ReadTool(BaseCodebaseTool):
             file_path: 文件路径
             offset: 起始行号（从1开始）
             limit: 读取的行数
-        
+            
         Returns:
             ToolResult
         """
@@ -118,11 +126,9 @@ class ReadTool(BaseCodebaseTool):
                 # 尝试查找相似的文件
                 possible_files = []
                 if repo_path.exists():
-                    for p in repo_path.rglob(normalized_file_path.split('/')[-1] if '/' in normalized_file_path else normalized_file_path):
-                        if p.is_file():
-                            possible_files.append(str(p.relative_to(repo_path)))
-                            if len(possible_files) >= 5:
-                                break
+                    file_name = normalized_file_path.split('/')[-1] if '/' in normalized_file_path else normalized_file_path
+                    catalog = get_file_catalog(repo_path)
+                    possible_files = [str(Path(entry.path)) for entry in catalog.find_by_name(file_name, limit=5)]
                 
                 error_msg = f"文件不存在: {file_path}"
                 if possible_files:
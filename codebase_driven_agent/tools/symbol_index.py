@@ -0,0 +1,578 @@
+"""代码符号索引（持久化）
+
+将代码仓库中的函数定义、函数调用、标识符引用、类定义和导入语句提取为符号记录，
+持久化到 SQLite 中。索引按文件的 mtime/size 与内容 hash 增量更新，
+CodeTool 的 AST 搜索直接查询索引，而不是每次遍历仓库并重新解析所有文件。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Iterable
+
+from codebase_driven_agent.config import settings
+from codebase_driven_agent.utils.logger import setup_logger
+
+logger = setup_logger("codebase_driven_agent.tools.symbol_index")
+
+# 建立索引的代码文件扩展名（与 CodeTool 的 AST 搜索保持一致）
+INDEXED_EXTENSIONS = ('.py', '.js', '.ts', '.tsx', '.jsx', '.cpp', '.cc', '.cxx', '.java')
+
+# 遍历时跳过的目录（隐藏目录也会被跳过）
+SKIP_DIRS = {'__pycache__', 'node_modules', '.venv', 'build', 'dist'}
+
+# 符号类别（与 ASTCodeAnalyzer.extract_symbols 的返回键对应）
+SYMBOL_KINDS = {
+    'definitions': 'definition',
+    'calls': 'call',
+    'references': 'reference',
+    'classes': 'class',
+    'imports': 'import',
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    language TEXT,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS symbols (
+    file TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    col INTEGER NOT NULL,
+    code TEXT,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS call_edges (
+    file TEXT NOT NULL,
+    caller TEXT,
+    callee TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    col INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_symbols_name_kind ON symbols(name, kind);
+CREATE INDEX IF NOT EXISTS idx_symbols_file ON symbols(file);
+CREATE INDEX IF NOT EXISTS idx_call_edges_callee ON call_edges(callee);
+CREATE INDEX IF NOT EXISTS idx_call_edges_caller ON call_edges(caller, file);
+CREATE INDEX IF NOT EXISTS idx_call_edges_file ON call_edges(file);
+"""
+
+
+def _default_index_dir() -> Path:
+    """获取默认索引目录"""
+    if settings.symbol_index_dir:
+        return Path(settings.symbol_index_dir)
+    return Path.home() / ".cache" / "codebase_driven_agent" / "index"
+
+
+def _index_path_for_repo(repo_path: Path) -> Path:
+    """根据仓库路径生成索引文件路径（不同仓库使用不同的索引文件）"""
+    repo_key = hashlib.sha1(str(repo_path.resolve()).encode('utf-8')).hexdigest()[:16]
+    return _default_index_dir() / f"symbols_{repo_key}.db"
+
+
+class SymbolIndex:
+    """持久化代码符号索引
+    
+    索引以文件为单位增量维护：
+    - mtime/size 未变化的文件直接跳过
+    - mtime 变化但内容 hash 未变化的文件只更新元数据
+    - 内容变化的文件重新解析并替换其全部符号记录
+    - 已删除的文件连同符号记录一起移除
+    """
+    
+    SCHEMA_VERSION = "2"
+    
+    def __init__(self, repo_path: Path, index_path: Optional[Path] = None, analyzer=None):
+        """
+        初始化符号索引
+        
+        Args:
+            repo_path: 代码仓库根目录
+            index_path: 索引文件路径，默认根据仓库路径生成
+            analyzer: ASTCodeAnalyzer 实例，默认延迟创建
+        """
+        self.repo_path = Path(repo_path)
+        self.index_path = Path(index_path) if index_path else _index_path_for_repo(self.repo_path)
+        self._analyzer = analyzer
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._last_refresh: float = 0.0
+        self._dirty_paths: set = set()
+    
+    @property
+    def analyzer(self):
+        """延迟创建 AST 分析器"""
+        if self._analyzer is None:
+            from codebase_driven_agent.tools.ast_analyzer import ASTCodeAnalyzer
+            self._analyzer = ASTCodeAnalyzer()
+        return self._analyzer
+    
+    def _connect(self) -> sqlite3.Connection:
+        """获取（必要时创建）数据库连接"""
+        if self._conn is None:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.index_path), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            
+            row = conn.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+            if row and row[0] != self.SCHEMA_VERSION:
+                # 索引格式变化，丢弃旧数据重新构建
+                logger.info(f"Symbol index schema changed ({row[0]} -> {self.SCHEMA_VERSION}), rebuilding")
+                conn.execute("DELETE FROM symbols")
+                conn.execute("DELETE FROM call_edges")
+                conn.execute("DELETE FROM files")
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('schema_version', ?)",
+                (self.SCHEMA_VERSION,),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('repo_path', ?)",
+                (str(self.repo_path.resolve()),),
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+    
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+    
+    def _iter_source_files(self) -> Iterable[Path]:
+        """遍历仓库中需要建立索引的代码文件"""
+        for root, dirs, files in os.walk(self.repo_path):
+            # 跳过隐藏目录和常见忽略目录
+            dirs[:] = [d for d in dirs if not d.startswith('.') and d not in SKIP_DIRS]
+            for file in files:
+                if file.endswith(INDEXED_EXTENSIONS):
+                    yield Path(root) / file
+    
+    def _index_file(self, conn: sqlite3.Connection, rel_path: str, full_path: Path, stat_result, known: Optional[tuple]) -> str:
+        """
+        索引单个文件
+        
+        Returns:
+            处理结果：'parsed'（重新解析）、'touched'（仅更新元数据）
+        """
+        with open(full_path, 'rb') as f:
+            raw = f.read()
+        content_hash = hashlib.sha1(raw).hexdigest()
+        
+        if known and known[3] == content_hash:
+            conn.execute(
+                "UPDATE files SET mtime_ns = ?, size = ? WHERE path = ?",
+                (stat_result.st_mtime_ns, stat_result.st_size, rel_path),
+            )
+            return 'touched'
+        
+        source_code = raw.decode('utf-8', errors='ignore')
+        symbols = self.analyzer.extract_symbols(rel_path, source_code)
+        
+        conn.execute("DELETE FROM symbols WHERE file = ?", (rel_path,))
+        conn.execute("DELETE FROM call_edges WHERE file = ?", (rel_path,))
+        rows = []
+        for group, kind in SYMBOL_KINDS.items():
+            for item in symbols.get(group, []):
+                extra = {k: v for k, v in item.items() if k not in ('name', 'line', 'column', 'code')}
+                rows.append((
+                    rel_path,
+                    kind,
+                    item['name'],
+                    item['line'],
+                    item['column'],
+                    item.get('code', ''),
+                    json.dumps(extra, ensure_ascii=False) if extra else None,
+                ))
+        if rows:
+            conn.executemany(
+                "INSERT INTO symbols (file, kind, name, line, col, code, extra) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        
+        # 调用边（调用者 -> 被调用函数名），被调用函数在查询时通过导入关系解析到具体文件
+        edges = [
+            (rel_path, item.get('caller'), item['name'], item['line'], item['column'])
+            for item in symbols.get('calls', [])
+        ]
+        if edges:
+            conn.executemany(
+                "INSERT INTO call_edges (file, caller, callee, line, col) VALUES (?, ?, ?, ?, ?)",
+                edges,
+            )
+        
+        conn.execute(
+            "INSERT OR REPLACE INTO files (path, mtime_ns, size, content_hash, language, indexed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                rel_path,
+                stat_result.st_mtime_ns,
+                stat_result.st_size,
+                content_hash,
+                self.analyzer.config.get_language_from_file(rel_path),
+                time.time(),
+            ),
+        )
+        return 'parsed'
+    
+    def _remove_file(self, conn: sqlite3.Connection, rel_path: str) -> None:
+        """从索引中移除文件及其符号记录"""
+        conn.execute("DELETE FROM symbols WHERE file = ?", (rel_path,))
+        conn.execute("DELETE FROM call_edges WHERE file = ?", (rel_path,))
+        conn.execute("DELETE FROM files WHERE path = ?", (rel_path,))
+    
+    def build(self, full: bool = False, cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """
+        构建或增量更新索引
+        
+        Args:
+            full: 是否丢弃现有索引完全重建
+            cancel_event: 取消事件，设置后中断构建（已处理的文件保留在索引中）
+        
+        Returns:
+            构建统计信息
+        """
+        start_time = time.time()
+        stats = {"scanned": 0, "parsed": 0, "touched": 0, "unchanged": 0, "removed": 0, "errors": 0}
+        
+        with self._lock:
+            conn = self._connect()
+            if full:
+                conn.execute("DELETE FROM symbols")
+                conn.execute("DELETE FROM call_edges")
+                conn.execute("DELETE FROM files")
+                conn.commit()
+            
+            known = {
+                row[0]: row
+                for row in conn.execute("SELECT path, mtime_ns, size, content_hash FROM files")
+            }
+            seen = set()
+            pending = 0
+            
+            for full_path in self._iter_source_files():
+                if cancel_event is not None and cancel_event.is_set():
+                    logger.warning("Symbol index build cancelled")
+                    conn.commit()
+                    raise KeyboardInterrupt("Symbol index build cancelled")
+                
+                try:
+                    rel_path = str(full_path.relative_to(self.repo_path))
+                    stat_result = full_path.stat()
+                except (OSError, ValueError):
+                    continue
+                
+                seen.add(rel_path)
+                stats["scanned"] += 1
+                entry = known.get(rel_path)
+                if (
+                    entry
+                    and entry[1] == stat_result.st_mtime_ns
+                    and entry[2] == stat_result.st_size
+                    and rel_path not in self._dirty_paths
+                ):
+                    stats["unchanged"] += 1
+                    continue
+                
+                try:
+                    result = self._index_file(conn, rel_path, full_path, stat_result, entry)
+                    stats[result] += 1
+                except Exception as e:
+                    stats["errors"] += 1
+                    logger.debug(f"Failed to index file {rel_path}: {str(e)}")
+                    continue
+                
+                pending += 1
+                if pending >= 500:
+                    conn.commit()
+                    pending = 0
+            
+            for rel_path in set(known) - seen:
+                self._remove_file(conn, rel_path)
+                stats["removed"] += 1
+            
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('last_build', ?)",
+                (str(time.time()),),
+            )
+            conn.commit()
+            self._dirty_paths.clear()
+            self._last_refresh = time.time()
+        
+        stats["duration_seconds"] = round(time.time() - start_time, 3)
+        logger.info(f"Symbol index updated for {self.repo_path}: {stats}")
+        return stats
+    
+    def update_files(self, rel_paths: Iterable[str]) -> Dict[str, int]:
+        """
+        增量更新指定文件（文件不存在时从索引中移除）
+        
+        Args:
+            rel_paths: 相对于仓库根目录的文件路径
+        
+        Returns:
+            更新统计信息
+        """
+        stats = {"parsed": 0, "touched": 0, "removed": 0, "errors": 0}
+        with self._lock:
+            conn = self._connect()
+            for rel_path in rel_paths:
+                rel_path = str(rel_path)
+                full_path = self.repo_path / rel_path
+                if not full_path.is_file() or not rel_path.endswith(INDEXED_EXTENSIONS):
+                    self._remove_file(conn, rel_path)
+                    stats["removed"] += 1
+                    continue
+                known = conn.execute(
+                    "SELECT path, mtime_ns, size, content_hash FROM files WHERE path = ?",
+                    (rel_path,),
+                ).fetchone()
+                try:
+                    result = self._index_file(conn, rel_path, full_path, full_path.stat(), known)
+                    stats[result] += 1
+                except Exception as e:
+                    stats["errors"] += 1
+                    logger.debug(f"Failed to index file {rel_path}: {str(e)}")
+                self._dirty_paths.discard(rel_path)
+            conn.commit()
+        return stats
+    
+    def invalidate(self, rel_paths: Optional[Iterable[str]] = None) -> None:
+        """
+        标记索引失效，下次查询前会重新检查
+        
+        Args:
+            rel_paths: 失效的文件路径；为 None 时表示整个仓库都需要重新检查
+        """
+        with self._lock:
+            if rel_paths is None:
+                self._last_refresh = 0.0
+            else:
+                self._dirty_paths.update(str(p) for p in rel_paths)
+    
+    def is_empty(self) -> bool:
+        """索引是否为空（尚未构建）"""
+        with self._lock:
+            conn = self._connect()
+            return conn.execute("SELECT 1 FROM files LIMIT 1").fetchone() is None
+    
+    def ensure_fresh(self, max_age: Optional[float] = None, cancel_event: Optional[threading.Event] = None) -> None:
+        """
+        确保索引足够新：索引为空时构建，超过 max_age 未刷新时增量更新
+        
+        Args:
+            max_age: 允许的最大刷新间隔（秒），默认读取 SYMBOL_INDEX_REFRESH_INTERVAL
+            cancel_event: 取消事件
+        """
+        if max_age is None:
+            max_age = settings.symbol_index_refresh_interval
+        with self._lock:
+            if self._dirty_paths:
+                # 个别文件失效时，只更新这些文件
+                self.update_files(list(self._dirty_paths))
+            if self.is_empty() or time.time() - self._last_refresh > max_age:
+                self.build(cancel_event=cancel_event)
+    
+    def lookup(self, name: str, kinds: Optional[List[str]] = None, file_path: Optional[str] = None, limit: int = 1000) -> List[Dict[str, Any]]:
+        """
+        按名称查询符号记录
+        
+        Args:
+            name: 符号名称（精确匹配）
+            kinds: 符号类别过滤（definition/call/reference/class/import）
+            file_path: 限制到特定文件
+            limit: 最大返回记录数
+        
+        Returns:
+            符号记录列表，按文件路径和行号排序
+        """
+        sql = "SELECT file, kind, name, line, col, code, extra FROM symbols WHERE name = ?"
+        params: List[Any] = [name]
+        if kinds:
+            sql += f" AND kind IN ({','.join('?' * len(kinds))})"
+            params.extend(kinds)
+        if file_path:
+            sql += " AND file = ?"
+            params.append(file_path)
+        sql += " ORDER BY file, line, col LIMIT ?"
+        params.append(limit)
+        
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute(sql, params).fetchall()
+        
+        results = []
+        for file, kind, sym_name, line, col, code, extra in rows:
+            record = {
+                "file": file,
+                "kind": kind,
+                "name": sym_name,
+                "line": line,
+                "column": col,
+                "code": code or "",
+            }
+            if extra:
+                record.update(json.loads(extra))
+            results.append(record)
+        return results
+    
+    def search(self, name: str, kinds: List[str], max_results: int = 10) -> List[Dict[str, Any]]:
+        """
+        查询符号并按文件分组（与 CodeTool 搜索结果格式一致）
+        
+        同一文件内按 kinds 的顺序排列（例如先定义后调用），每个文件最多 max_results 个匹配，
+        最多返回 max_results 个文件。
+        
+        Returns:
+            [{"file": ..., "matches": [{"line": ..., "content": ...}]}]
+        """
+        records = self.lookup(name, kinds=kinds, limit=max_results * max_results * len(kinds) + 100)
+        kind_order = {kind: i for i, kind in enumerate(kinds)}
+        
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        for record in records:
+            if record["file"] not in grouped:
+                if len(grouped) >= max_results:
+                    continue
+                grouped[record["file"]] = []
+            grouped[record["file"]].append(record)
+        
+        results = []
+        for file, file_records in grouped.items():
+            file_records.sort(key=lambda r: (kind_order.get(r["kind"], 0), r["line"], r["column"]))
+            results.append({
+                "file": file,
+                "matches": [
+                    {"line": r["line"], "content": r["code"] or name}
+                    for r in file_records[:max_results]
+                ],
+            })
+        return results
+    
+    def list_files(self) -> List[str]:
+        """获取索引中的全部文件路径"""
+        with self._lock:
+            conn = self._connect()
+            return [row[0] for row in conn.execute("SELECT path FROM files")]
+    
+    def get_file_symbols(self, file_path: str, kinds: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        获取单个文件的符号记录
+        
+        Args:
+            file_path: 文件路径（相对于仓库根目录）
+            kinds: 符号类别过滤
+        
+        Returns:
+            符号记录列表，按行号排序
+        """
+        sql = "SELECT name, kind, line, col, code, extra FROM symbols WHERE file = ?"
+        params: List[Any] = [file_path]
+        if kinds:
+            sql += f" AND kind IN ({','.join('?' * len(kinds))})"
+            params.extend(kinds)
+        sql += " ORDER BY line, col"
+        
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute(sql, params).fetchall()
+        
+        results = []
+        for name, kind, line, col, code, extra in rows:
+            record = {"file": file_path, "kind": kind, "name": name, "line": line, "column": col, "code": code or ""}
+            if extra:
+                record.update(json.loads(extra))
+            results.append(record)
+        return results
+    
+    def get_call_edges(self, caller: Optional[str] = None, callee: Optional[str] = None, file_path: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        查询调用边
+        
+        Args:
+            caller: 调用者函数名
+            callee: 被调用函数名
+            file_path: 调用所在文件
+        
+        Returns:
+            调用边列表，每条包含 file, caller, callee, line, column
+        """
+        sql = "SELECT file, caller, callee, line, col FROM call_edges WHERE 1 = 1"
+        params: List[Any] = []
+        if caller is not None:
+            sql += " AND caller = ?"
+            params.append(caller)
+        if callee is not None:
+            sql += " AND callee = ?"
+            params.append(callee)
+        if file_path is not None:
+            sql += " AND file = ?"
+            params.append(file_path)
+        sql += " ORDER BY file, line, col"
+        
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute(sql, params).fetchall()
+        
+        return [
+            {"file": file, "caller": caller_name, "callee": callee_name, "line": line, "column": col}
+            for file, caller_name, callee_name, line, col in rows
+        ]
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取索引统计信息"""
+        with self._lock:
+            conn = self._connect()
+            file_count = conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+            kind_counts = dict(conn.execute("SELECT kind, COUNT(*) FROM symbols GROUP BY kind").fetchall())
+            edge_count = conn.execute("SELECT COUNT(*) FROM call_edges").fetchone()[0]
+            last_build = conn.execute("SELECT value FROM meta WHERE key = 'last_build'").fetchone()
+        
+        return {
+            "repo_path": str(self.repo_path),
+            "index_path": str(self.index_path),
+            "files": file_count,
+            "symbols": kind_counts,
+            "call_edges": edge_count,
+            "last_build": float(last_build[0]) if last_build else None,
+            "dirty_files": len(self._dirty_paths),
+            "index_size_bytes": self.index_path.stat().st_size if self.index_path.exists() else 0,
+        }
+
+
+# 全局符号索引实例（按仓库路径区分）
+_symbol_indexes: Dict[str, SymbolIndex] = {}
+_symbol_index_lock = threading.Lock()
+
+
+def get_symbol_index(repo_path: Optional[Path] = None) -> SymbolIndex:
+    """
+    获取仓库对应的符号索引实例（单例模式）
+    
+    Args:
+        repo_path: 代码仓库路径，默认读取 CODE_REPO_PATH
+    """
+    repo_path = Path(repo_path or settings.code_repo_path or ".")
+    key = str(repo_path.resolve())
+    with _symbol_index_lock:
+        index = _symbol_indexes.get(key)
+        if index is None:
+            index = SymbolIndex(repo_path)
+            _symbol_indexes[key] = index
+        return index
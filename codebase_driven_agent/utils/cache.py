@@ -1,55 +1,200 @@
-"""请求缓存和去重工具"""
+"""请求缓存和去重工具
+
+RequestCache 按请求内容的 hash 分片，每个分片有独立的锁，不同请求的缓存查找互不阻塞：
+- 分片内用 OrderedDict 维护 LRU 顺序，命中时移到末尾，淘汰时从头部弹出，都是 O(1)
+- 过期时间保存在最小堆中，清理过期条目只处理堆顶已经过期的条目
+- 按结果序列化后的字节数计算容量（同时限制条目数），超出时淘汰最久未使用的条目
+
+启用 CACHE_SIMILARITY_ENABLED 时，精确匹配未命中的请求再按规范化后的输入查找近似重复的条目
+（见 request_similarity），命中结果附带匹配方式和相似度。
+
+启用 CACHE_DISK_ENABLED 时，内存 LRU 之后还有一层本地 SQLite 存储（见 cache_store）：
+结果同时写入两层，内存未命中时查找磁盘并把命中的条目提升到内存，重启后和其他 worker 写入的结果仍然可用。
+"""
 import hashlib
+import heapq
 import json
+import os
 import threading
 import time
-from typing import Optional, Dict, Any
-from datetime import datetime, timedelta
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple, TYPE_CHECKING
 
 from codebase_driven_agent.config import settings
 from codebase_driven_agent.utils.logger import setup_logger
 
+if TYPE_CHECKING:
+    from codebase_driven_agent.utils.cache_store import DiskCacheStore
+    from codebase_driven_agent.utils.request_similarity import SimilarityIndex
+
 logger = setup_logger("codebase_driven_agent.utils.cache")
 
 
+def _hit_rate(hits: int, misses: int) -> float:
+    return hits / (hits + misses) if hits + misses else 0.0
+
+
+def _estimate_size(result: Any) -> int:
+    """估算缓存结果占用的字节数（按序列化后的 JSON 长度计算）"""
+    try:
+        if hasattr(result, "model_dump_json"):
+            return len(result.model_dump_json().encode("utf-8"))
+        return len(json.dumps(result, ensure_ascii=False, default=str).encode("utf-8"))
+    except Exception:
+        return len(str(result).encode("utf-8"))
+
+
+class _CacheEntry:
+    """缓存条目"""
+    
+    __slots__ = ("result", "created_at", "expires_at", "size", "input_preview")
+    
+    def __init__(self, result: Any, created_at: float, expires_at: float, size: int, input_preview: str = ""):
+        self.result = result
+        self.created_at = created_at
+        self.expires_at = expires_at
+        self.size = size
+        self.input_preview = input_preview
+
+
+class CacheHit:
+    """缓存命中信息"""
+    
+    def __init__(self, result: Any, cache_key: str, cached_at: float, match_type: str = "exact",
+                 similarity: float = 1.0, input_preview: str = ""):
+        self.result = result
+        self.cache_key = cache_key
+        self.cached_at = cached_at  # 结果写入缓存的时间（时间戳）
+        self.match_type = match_type  # "exact"、"normalized"（规范化后相同）或 "similar"（近似重复）
+        self.similarity = similarity
+        self.input_preview = input_preview  # 命中条目的原始输入（截断）
+
+
+class _CacheShard:
+    """缓存分片（调用方需要持有分片的锁）"""
+    
+    def __init__(self, max_size: int, max_bytes: int):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # 按最近访问排序，头部是最久未使用的条目
+        self.entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        # (过期时间, 缓存键)，条目被覆盖或删除后旧的堆元素在出堆时跳过
+        self.expiry_heap: List[Tuple[float, str]] = []
+        self.bytes = 0
+    
+    def pop(self, cache_key: str) -> None:
+        entry = self.entries.pop(cache_key)
+        self.bytes -= entry.size
+    
+    def put(self, cache_key: str, entry: _CacheEntry) -> List[str]:
+        """写入条目，返回因容量淘汰的缓存键"""
+        if cache_key in self.entries:
+            self.pop(cache_key)
+        self.entries[cache_key] = entry
+        self.bytes += entry.size
+        heapq.heappush(self.expiry_heap, (entry.expires_at, cache_key))
+        
+        evicted = []
+        while len(self.entries) > 1 and (0 < self.max_size < len(self.entries) or self.bytes > self.max_bytes):
+            lru_key = next(iter(self.entries))
+            self.pop(lru_key)
+            evicted.append(lru_key)
+            logger.debug(f"Evicted LRU cache entry: {lru_key[:8]}...")
+        
+        # 覆盖和淘汰会留下无效的堆元素，超过有效条目数的两倍时重建堆
+        if len(self.expiry_heap) > 2 * len(self.entries) + 64:
+            self.expiry_heap = [(e.expires_at, key) for key, e in self.entries.items()]
+            heapq.heapify(self.expiry_heap)
+        return evicted
+    
+    def pop_expired(self, now: float) -> List[str]:
+        """删除已过期的条目，返回删除的缓存键"""
+        removed = []
+        while self.expiry_heap and self.expiry_heap[0][0] <= now:
+            expires_at, cache_key = heapq.heappop(self.expiry_heap)
+            entry = self.entries.get(cache_key)
+            if entry is not None and entry.expires_at == expires_at:
+                self.pop(cache_key)
+                removed.append(cache_key)
+        return removed
+
+
 class RequestCache:
     """请求缓存和去重"""
     
-    def __init__(self, ttl: int = 3600, max_size: int = 1000):
+    def __init__(
+        self,
+        ttl: int = 3600,
+        max_size: int = 1000,
+        max_bytes: int = 256 * 1024 * 1024,
+        shards: int = 16,
+        similarity: Optional["SimilarityIndex"] = None,
+        disk: Optional["DiskCacheStore"] = None,
+    ):
         """
         初始化缓存
         
         Args:
             ttl: 缓存过期时间（秒），默认 1 小时
-            max_size: 最大缓存条目数，默认 1000
+            max_size: 最大缓存条目数，默认 1000（0 表示只按字节数限制）
+            max_bytes: 缓存结果的总字节数上限，默认 256MB
+            shards: 分片数（每个分片一把锁），容量平均分配到各个分片
+            similarity: 近似重复索引，为 None 时只做精确匹配
+            disk: 磁盘层，为 None 时只使用内存
         """
         self.ttl = ttl
         self.max_size = max_size
-        self._cache: Dict[str, Dict[str, Any]] = {}
-        self._lock = threading.Lock()
-        self._access_times: Dict[str, datetime] = {}  # 记录访问时间，用于 LRU
+        self.max_bytes = max_bytes
+        shards = max(1, min(shards, max_size) if max_size > 0 else shards)
+        self._shards = [
+            _CacheShard(-(-max_size // shards) if max_size > 0 else 0, max_bytes // shards)
+            for _ in range(shards)
+        ]
+        self.similarity = similarity
+        self.disk = disk
+        self._stats_lock = threading.Lock()
+        self._hits = 0
+        self._similar_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        # 按层统计：每次按缓存键查找先查内存，内存未命中再查磁盘
+        self._memory_hits = 0
+        self._memory_misses = 0
+        self._disk_hits = 0
+        self._disk_misses = 0
+        self._disk_errors = 0
     
-    def _generate_key(self, request_data: Dict[str, Any]) -> str:
+    @staticmethod
+    def _generate_key(request_data: Dict[str, Any]) -> str:
         """
         生成缓存键
         
         Args:
             request_data: 请求数据（包含 input 和 context_files）
-        
+            
         Returns:
             缓存键（MD5 hash）
         """
         # 规范化请求数据（排序、去除 None 值）
         normalized = {
             "input": request_data.get("input", "").strip(),
-            "context_files": self._normalize_context_files(request_data.get("context_files", [])),
+            "context_files": RequestCache._normalize_context_files(request_data.get("context_files", [])),
         }
         
         # 转换为 JSON 字符串并计算 hash
         json_str = json.dumps(normalized, sort_keys=True, ensure_ascii=False)
         return hashlib.md5(json_str.encode('utf-8')).hexdigest()
     
-    def _normalize_context_files(self, context_files: list) -> list:
+    def _scope_key(self, request_data: Dict[str, Any]) -> str:
+        """近似匹配的范围：context_files 完全相同的请求才互相匹配"""
+        context_files = self._normalize_context_files(request_data.get("context_files", []))
+        json_str = json.dumps(context_files, sort_keys=True, ensure_ascii=False)
+        return hashlib.md5(json_str.encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def _normalize_context_files(context_files: list) -> list:
         """规范化上下文文件（用于生成缓存键）"""
         normalized = []
         for ctx_file in context_files:
@@ -72,37 +217,139 @@ class RequestCache:
                 })
         return normalized
     
-    def get(self, request_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    def _shard(self, cache_key: str) -> _CacheShard:
+        return self._shards[int(cache_key[:8], 16) % len(self._shards)]
+    
+    def _forget(self, cache_keys: List[str]) -> None:
+        """从近似重复索引中删除已经不在缓存中的条目"""
+        if self.similarity is not None:
+            for cache_key in cache_keys:
+                self.similarity.remove(cache_key)
+    
+    def _get_entry(self, cache_key: str) -> Optional[_CacheEntry]:
+        """按缓存键读取未过期的条目并更新 LRU 顺序（内存未命中时查找磁盘层）"""
+        shard = self._shard(cache_key)
+        expired = False
+        with shard.lock:
+            entry = shard.entries.get(cache_key)
+            if entry is not None and entry.expires_at <= time.time():
+                shard.pop(cache_key)
+                logger.debug(f"Cache expired for key: {cache_key[:8]}...")
+                entry, expired = None, True
+            if entry is not None:
+                shard.entries.move_to_end(cache_key)
+        if expired:
+            self._forget([cache_key])
+        with self._stats_lock:
+            if entry is not None:
+                self._memory_hits += 1
+            else:
+                self._memory_misses += 1
+        if entry is None and self.disk is not None:
+            entry = self._get_disk_entry(cache_key)
+        elif entry is not None and self.disk is not None:
+            # 磁盘层按最近访问时间淘汰和预加载，内存命中也要记录，否则最常用的条目最先被淘汰
+            try:
+                self.disk.touch(cache_key)
+            except Exception as e:
+                logger.warning(f"Disk cache touch failed for key {cache_key[:8]}...: {str(e)}")
+                with self._stats_lock:
+                    self._disk_errors += 1
+        return entry
+    
+    def _get_disk_entry(self, cache_key: str) -> Optional[_CacheEntry]:
+        """从磁盘层读取条目并提升到内存"""
+        try:
+            disk_entry = self.disk.get(cache_key)
+        except Exception as e:
+            logger.warning(f"Disk cache lookup failed for key {cache_key[:8]}...: {str(e)}")
+            with self._stats_lock:
+                self._disk_errors += 1
+            return None
+        with self._stats_lock:
+            if disk_entry is not None:
+                self._disk_hits += 1
+            else:
+                self._disk_misses += 1
+        if disk_entry is None:
+            return None
+        logger.debug(f"Disk cache hit for key: {cache_key[:8]}...")
+        return self._put_memory(
+            cache_key, disk_entry.scope, disk_entry.input_text, disk_entry.result,
+            disk_entry.created_at, disk_entry.expires_at,
+        )
+    
+    def _put_memory(self, cache_key: str, scope: str, text: str, result: Any,
+                    created_at: float, expires_at: float) -> Optional[_CacheEntry]:
+        """写入内存层和近似重复索引，返回写入的条目（超过单个分片上限时不写入，返回 None）"""
+        size = _estimate_size(result)
+        shard = self._shard(cache_key)
+        if size > shard.max_bytes:
+            logger.debug(f"Result too large to cache ({size} bytes) for key: {cache_key[:8]}...")
+            return None
+        entry = _CacheEntry(result, created_at, expires_at, size, text[:200])
+        with shard.lock:
+            evicted = shard.put(cache_key, entry)
+        if evicted:
+            with self._stats_lock:
+                self._evictions += len(evicted)
+            self._forget(evicted)
+        if self.similarity is not None:
+            self.similarity.add(cache_key, scope, self.similarity.fingerprint(text))
+        return entry
+    
+    def lookup(self, request_data: Dict[str, Any]) -> Optional[CacheHit]:
         """
-        获取缓存结果
+        查找缓存结果（精确匹配未命中时查找近似重复的请求）
         
         Args:
             request_data: 请求数据
-        
+            
         Returns:
-            缓存的结果，如果不存在或已过期则返回 None
+            命中信息，未命中时返回 None
         """
         cache_key = self._generate_key(request_data)
+        entry = self._get_entry(cache_key)
+        if entry is not None:
+            with self._stats_lock:
+                self._hits += 1
+            logger.debug(f"Cache hit for key: {cache_key[:8]}...")
+            return CacheHit(entry.result, cache_key, entry.created_at, input_preview=entry.input_preview)
         
-        with self._lock:
-            if cache_key not in self._cache:
-                return None
-            
-            cached_item = self._cache[cache_key]
-            
-            # 检查是否过期
-            if datetime.now() - cached_item["created_at"] > timedelta(seconds=self.ttl):
-                del self._cache[cache_key]
-                if cache_key in self._access_times:
-                    del self._access_times[cache_key]
-                logger.debug(f"Cache expired for key: {cache_key[:8]}...")
-                return None
-            
-            # 更新访问时间
-            self._access_times[cache_key] = datetime.now()
+        if self.similarity is not None:
+            fingerprint = self.similarity.fingerprint(request_data.get("input", "").strip())
+            match = self.similarity.query(self._scope_key(request_data), fingerprint)
+            entry = self._get_entry(match.key) if match is not None else None
+            if entry is not None:
+                with self._stats_lock:
+                    self._similar_hits += 1
+                logger.info(
+                    f"Cache {match.match_type} hit for key: {cache_key[:8]}... -> {match.key[:8]}... "
+                    f"(similarity={match.similarity:.2f})"
+                )
+                return CacheHit(
+                    entry.result, match.key, entry.created_at, match.match_type,
+                    match.similarity, entry.input_preview,
+                )
+            if match is not None:
+                self._forget([match.key])
+        
+        with self._stats_lock:
+            self._misses += 1
+        return None
+    
+    def get(self, request_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        获取缓存结果
+        
+        Args:
+            request_data: 请求数据
             
-            logger.debug(f"Cache hit for key: {cache_key[:8]}...")
-            return cached_item["result"]
+        Returns:
+            缓存的结果，如果不存在或已过期则返回 None
+        """
+        hit = self.lookup(request_data)
+        return hit.result if hit is not None else None
     
     def set(self, request_data: Dict[str, Any], result: Dict[str, Any]) -> None:
         """
@@ -113,44 +360,63 @@ class RequestCache:
             result: 结果数据
         """
         cache_key = self._generate_key(request_data)
+        scope = self._scope_key(request_data)
+        text = request_data.get("input", "").strip()
+        now = time.time()
+        self._put_memory(cache_key, scope, text, result, now, now + self.ttl)
         
-        with self._lock:
-            # 检查缓存大小，如果超过限制则删除最旧的条目（LRU）
-            if len(self._cache) >= self.max_size and cache_key not in self._cache:
-                self._evict_lru()
-            
-            self._cache[cache_key] = {
-                "result": result,
-                "created_at": datetime.now(),
-            }
-            self._access_times[cache_key] = datetime.now()
-            
-            logger.debug(f"Cached result for key: {cache_key[:8]}...")
-    
-    def _evict_lru(self):
-        """删除最近最少使用的条目（LRU）"""
-        if not self._access_times:
-            # 如果没有访问时间记录，删除最旧的缓存条目
-            if self._cache:
-                oldest_key = min(
-                    self._cache.keys(),
-                    key=lambda k: self._cache[k]["created_at"]
-                )
-                del self._cache[oldest_key]
-            return
+        # 同时写入磁盘层（磁盘写入失败不影响本次请求）
+        if self.disk is not None:
+            try:
+                self.disk.put(cache_key, scope, text, result, now, now + self.ttl)
+            except Exception as e:
+                logger.warning(f"Failed to write disk cache for key {cache_key[:8]}...: {str(e)}")
+                with self._stats_lock:
+                    self._disk_errors += 1
         
-        # 找到最近最少使用的条目
-        lru_key = min(self._access_times.keys(), key=lambda k: self._access_times[k])
-        del self._cache[lru_key]
-        del self._access_times[lru_key]
-        logger.debug(f"Evicted LRU cache entry: {lru_key[:8]}...")
+        logger.debug(f"Cached result for key: {cache_key[:8]}...")
+    
+    def warm_load(self, limit: Optional[int] = None) -> int:
+        """
+        把磁盘层中最近使用的条目预加载到内存（服务启动时调用）
+        
+        Args:
+            limit: 最多加载的条目数，默认为内存层的条目数上限
+            
+        Returns:
+            加载的条目数
+        """
+        if self.disk is None:
+            return 0
+        limit = limit or self.max_size or 1000
+        try:
+            entries = self.disk.load_recent(limit)
+        except Exception as e:
+            logger.warning(f"Failed to warm-load request cache from disk: {str(e)}")
+            return 0
+        # 从最久未使用的开始写入，最近使用的条目在内存 LRU 的末尾
+        loaded = 0
+        for disk_entry in reversed(entries):
+            if self._put_memory(
+                disk_entry.cache_key, disk_entry.scope, disk_entry.input_text, disk_entry.result,
+                disk_entry.created_at, disk_entry.expires_at,
+            ) is not None:
+                loaded += 1
+        logger.info(f"Warm-loaded {loaded} request cache entries from {self.disk.db_path}")
+        return loaded
     
     def clear(self) -> None:
         """清空缓存"""
-        with self._lock:
-            self._cache.clear()
-            self._access_times.clear()
-            logger.info("Cache cleared")
+        for shard in self._shards:
+            with shard.lock:
+                shard.entries.clear()
+                shard.expiry_heap.clear()
+                shard.bytes = 0
+        if self.similarity is not None:
+            self.similarity.clear()
+        if self.disk is not None:
+            self.disk.clear()
+        logger.info("Cache cleared")
     
     def cleanup_expired(self) -> int:
         """
@@ -159,33 +425,101 @@ class RequestCache:
         Returns:
             清理的条目数
         """
-        now = datetime.now()
-        expired_keys = []
+        now = time.time()
+        removed: List[str] = []
+        for shard in self._shards:
+            with shard.lock:
+                removed.extend(shard.pop_expired(now))
+        self._forget(removed)
         
-        with self._lock:
-            for cache_key, cached_item in self._cache.items():
-                if now - cached_item["created_at"] > timedelta(seconds=self.ttl):
-                    expired_keys.append(cache_key)
-            
-            for cache_key in expired_keys:
-                del self._cache[cache_key]
-                if cache_key in self._access_times:
-                    del self._access_times[cache_key]
+        if removed:
+            logger.info(f"Cleaned up {len(removed)} expired cache entries")
         
-        if expired_keys:
-            logger.info(f"Cleaned up {len(expired_keys)} expired cache entries")
+        if self.disk is not None:
+            try:
+                disk_removed = self.disk.delete_expired()
+                if disk_removed:
+                    logger.info(f"Cleaned up {disk_removed} expired disk cache entries")
+            except Exception as e:
+                logger.warning(f"Failed to clean up disk cache: {str(e)}")
         
-        return len(expired_keys)
+        return len(removed)
+    
+    def __len__(self) -> int:
+        return sum(len(shard.entries) for shard in self._shards)
     
     def get_stats(self) -> Dict[str, Any]:
         """获取缓存统计信息"""
-        with self._lock:
-            return {
-                "size": len(self._cache),
-                "max_size": self.max_size,
-                "ttl": self.ttl,
-                "usage_percent": len(self._cache) / self.max_size * 100 if self.max_size > 0 else 0,
-            }
+        size = 0
+        total_bytes = 0
+        for shard in self._shards:
+            with shard.lock:
+                size += len(shard.entries)
+                total_bytes += shard.bytes
+        with self._stats_lock:
+            hits, similar_hits = self._hits, self._similar_hits
+            misses, evictions = self._misses, self._evictions
+            memory_hits, memory_misses = self._memory_hits, self._memory_misses
+            disk_hits, disk_misses, disk_errors = self._disk_hits, self._disk_misses, self._disk_errors
+        lookups = hits + similar_hits + misses
+        return {
+            "size": size,
+            "max_size": self.max_size,
+            "bytes": total_bytes,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "shards": len(self._shards),
+            "usage_percent": self._usage_percent(size, total_bytes),
+            "hits": hits,
+            "similar_hits": similar_hits,
+            "misses": misses,
+            "hit_rate": (hits + similar_hits) / lookups if lookups else 0.0,
+            "evictions": evictions,
+            "similarity": {
+                "enabled": self.similarity is not None,
+                "threshold": self.similarity.threshold if self.similarity is not None else None,
+                "indexed": len(self.similarity) if self.similarity is not None else 0,
+            },
+            "tiers": {
+                "memory": {
+                    "hits": memory_hits,
+                    "misses": memory_misses,
+                    "hit_rate": _hit_rate(memory_hits, memory_misses),
+                },
+                "disk": self._disk_stats(disk_hits, disk_misses, disk_errors),
+            },
+        }
+    
+    def _disk_stats(self, hits: int, misses: int, errors: int) -> Dict[str, Any]:
+        """磁盘层统计（命中率按内存未命中后查找磁盘的次数计算）"""
+        if self.disk is None:
+            return {"enabled": False}
+        stats: Dict[str, Any] = {"enabled": True}
+        try:
+            stats.update(self.disk.get_stats())
+        except Exception as e:
+            logger.warning(f"Failed to read disk cache stats: {str(e)}")
+        stats.update({"hits": hits, "misses": misses, "errors": errors, "hit_rate": _hit_rate(hits, misses)})
+        return stats
+    
+    def _usage_percent(self, size: int, total_bytes: int) -> float:
+        """容量使用率（条目数和字节数中较高的一个）"""
+        size_usage = size / self.max_size if self.max_size > 0 else 0
+        bytes_usage = total_bytes / self.max_bytes if self.max_bytes > 0 else 0
+        return max(size_usage, bytes_usage) * 100
+
+
+def request_cache_key(request_data: Dict[str, Any]) -> str:
+    """
+    请求的缓存键（未启用缓存时同样可用，例如合并相同的并发请求）
+    
+    Args:
+        request_data: 请求数据（包含 input 和 context_files）
+        
+    Returns:
+        缓存键（MD5 hash）
+    """
+    return RequestCache._generate_key(request_data)
 
 
 # 全局缓存实例
@@ -208,13 +542,61 @@ def get_request_cache() -> Optional[RequestCache]:
                 # 从配置读取缓存参数（如果配置了）
                 cache_ttl = getattr(settings, 'cache_ttl', 3600)
                 cache_max_size = getattr(settings, 'cache_max_size', 1000)
-                _request_cache = RequestCache(ttl=cache_ttl, max_size=cache_max_size)
+                similarity = None
+                if settings.cache_similarity_enabled:
+                    from codebase_driven_agent.utils.request_similarity import SimilarityIndex
+                    similarity = SimilarityIndex(
+                        threshold=settings.cache_similarity_threshold,
+                        num_perm=settings.cache_similarity_num_perm,
+                        bands=settings.cache_similarity_bands,
+                    )
+                _request_cache = RequestCache(
+                    ttl=cache_ttl,
+                    max_size=cache_max_size,
+                    max_bytes=settings.cache_max_bytes,
+                    shards=settings.cache_shards,
+                    similarity=similarity,
+                    disk=_create_disk_store() if settings.cache_disk_enabled else None,
+                )
     
     return _request_cache
 
 
+def _default_disk_path() -> str:
+    """磁盘缓存数据库的默认路径"""
+    return os.path.join(Path.home(), ".cache", "codebase_driven_agent", "request_cache.db")
+
+
+def _create_disk_store() -> Optional["DiskCacheStore"]:
+    """创建磁盘层（打开失败时只使用内存）"""
+    from codebase_driven_agent.utils.cache_store import DiskCacheStore
+    
+    db_path = settings.cache_disk_path or _default_disk_path()
+    try:
+        store = DiskCacheStore(db_path, max_bytes=settings.cache_disk_max_bytes)
+        logger.info(f"Using disk request cache: {db_path}")
+        return store
+    except Exception as e:
+        logger.warning(f"Failed to open disk request cache {db_path}, using memory only: {str(e)}")
+        return None
+
+
+def warm_request_cache() -> int:
+    """服务启动时把磁盘层中最近使用的条目预加载到内存，返回加载的条目数"""
+    cache = get_request_cache()
+    return cache.warm_load() if cache is not None else 0
+
+
 def clear_request_cache() -> None:
-    """清空请求缓存"""
+    """清空请求缓存（包括磁盘层）"""
     cache = get_request_cache()
-    cache.clear()
+    if cache is not None:
+        cache.clear()
+
+
+def close_request_cache() -> None:
+    """关闭磁盘层的数据库连接（服务关闭时调用）"""
+    cache = _request_cache
+    if cache is not None and cache.disk is not None:
+        cache.disk.close()
 
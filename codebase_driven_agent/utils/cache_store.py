@@ -0,0 +1,244 @@
+"""请求缓存的磁盘层（SQLite）
+
+内存中的 RequestCache 在每次部署或重启后丢失，也不能在 uvicorn 的多个 worker 之间共享，
+而缓存的分析结果是最昂贵的 LLM 输出。启用 CACHE_DISK_ENABLED 后，RequestCache 把结果同时写入
+本地 SQLite 数据库（WAL 模式，同一台机器上的多个 worker 共用一个文件）：
+- 内存未命中时查找磁盘，命中的条目提升到内存
+- 启动时把最近使用的条目预加载到内存
+- 内存层命中的条目也批量更新磁盘中的最近访问时间，最常用的条目不会被当作最久未使用
+- 结果序列化为去掉空字段的紧凑 JSON 后用 zlib 压缩；总字节数超过上限时删除最久未使用的条目
+"""
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from codebase_driven_agent.utils.logger import setup_logger
+
+logger = setup_logger("codebase_driven_agent.utils.cache_store")
+
+# 写入多少次后检查一次总字节数
+_PRUNE_INTERVAL = 32
+
+# 内存命中的访问时间攒够这么多条，或距上次写入超过这么多秒时批量写入磁盘
+_TOUCH_BATCH = 64
+_TOUCH_INTERVAL = 30.0
+
+
+def encode_result(result: Any) -> bytes:
+    """
+    把分析结果序列化为紧凑的二进制格式
+    
+    Args:
+        result: AnalysisResult（或其他 Pydantic 模型）、dict 等可以 JSON 序列化的对象
+        
+    Returns:
+        zlib 压缩后的 JSON（[类型, 数据]）
+    """
+    if hasattr(result, "model_dump"):
+        kind, data = type(result).__name__, result.model_dump(mode="json", exclude_none=True)
+    else:
+        kind, data = "json", result
+    raw = json.dumps([kind, data], ensure_ascii=False, separators=(",", ":"), default=str)
+    return zlib.compress(raw.encode("utf-8"), 6)
+
+
+def decode_result(payload: bytes) -> Any:
+    """
+    反序列化 encode_result 的输出
+    
+    Args:
+        payload: 序列化后的结果
+        
+    Returns:
+        AnalysisResult 或原始的 JSON 数据
+    """
+    kind, data = json.loads(zlib.decompress(payload).decode("utf-8"))
+    if kind == "AnalysisResult":
+        from codebase_driven_agent.api.models import AnalysisResult
+        
+        return AnalysisResult.model_validate(data)
+    return data
+
+
+class DiskCacheEntry(NamedTuple):
+    """磁盘中的缓存条目"""
+    cache_key: str
+    scope: str
+    input_text: str
+    result: Any
+    created_at: float
+    expires_at: float
+
+
+class DiskCacheStore:
+    """SQLite 缓存存储（线程安全，同一台机器上的多个 worker 共享）"""
+    
+    def __init__(self, db_path: str, max_bytes: int = 1024 * 1024 * 1024):
+        """
+        Args:
+            db_path: 数据库文件路径
+            max_bytes: 序列化后结果和输入的总字节数上限
+        """
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=10, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS request_cache ("
+            "cache_key TEXT PRIMARY KEY, scope TEXT NOT NULL, input BLOB NOT NULL, payload BLOB NOT NULL, "
+            "size INTEGER NOT NULL, created_at REAL NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_request_cache_expires ON request_cache (expires_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_request_cache_accessed ON request_cache (accessed_at)")
+        self._lock = threading.Lock()
+        self._writes = 0
+        # 尚未写入磁盘的访问时间：缓存键 -> 访问时间
+        self._touches: Dict[str, float] = {}
+        self._touched_at = time.time()
+    
+    @staticmethod
+    def _to_entry(row: tuple) -> DiskCacheEntry:
+        cache_key, scope, input_blob, payload, created_at, expires_at = row
+        return DiskCacheEntry(
+            cache_key, scope, zlib.decompress(input_blob).decode("utf-8"),
+            decode_result(payload), created_at, expires_at,
+        )
+    
+    def get(self, cache_key: str) -> Optional[DiskCacheEntry]:
+        """读取未过期的条目并更新最近访问时间，不存在时返回 None"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT cache_key, scope, input, payload, created_at, expires_at FROM request_cache "
+                "WHERE cache_key = ? AND expires_at > ?",
+                (cache_key, now),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE request_cache SET accessed_at = ? WHERE cache_key = ?", (now, cache_key))
+        try:
+            return self._to_entry(row)
+        except Exception as e:
+            # 无法解析的条目（例如结果模型的字段发生了不兼容的变化）直接删除
+            logger.warning(f"Dropping unreadable disk cache entry {cache_key[:8]}...: {str(e)}")
+            self.delete(cache_key)
+            return None
+    
+    def touch(self, cache_key: str) -> None:
+        """
+        记录一次内存层命中（更新最近访问时间）
+        
+        访问时间先在内存中合并，攒够 _TOUCH_BATCH 条或距上次写入超过 _TOUCH_INTERVAL 秒时批量写入，
+        按最近访问时间淘汰和预加载之前也会先写入。
+        """
+        now = time.time()
+        with self._lock:
+            self._touches[cache_key] = now
+            if len(self._touches) >= _TOUCH_BATCH or now - self._touched_at >= _TOUCH_INTERVAL:
+                self._flush_touches_locked()
+    
+    def _flush_touches_locked(self) -> None:
+        """把合并的访问时间写入磁盘（需要持有锁）"""
+        self._touched_at = time.time()
+        if not self._touches:
+            return
+        touches, self._touches = self._touches, {}
+        # 只会推后访问时间（其他 worker 可能记录了更晚的访问）
+        self._conn.executemany(
+            "UPDATE request_cache SET accessed_at = ? WHERE cache_key = ? AND accessed_at < ?",
+            [(accessed_at, cache_key, accessed_at) for cache_key, accessed_at in touches.items()],
+        )
+    
+    def put(self, cache_key: str, scope: str, input_text: str, result: Any,
+            created_at: float, expires_at: float) -> None:
+        """写入条目（覆盖相同缓存键的旧条目）"""
+        input_blob = zlib.compress(input_text.encode("utf-8"), 6)
+        payload = encode_result(result)
+        size = len(input_blob) + len(payload)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO request_cache "
+                "(cache_key, scope, input, payload, size, created_at, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (cache_key, scope, input_blob, payload, size, created_at, expires_at, created_at),
+            )
+            self._writes += 1
+            if self._writes % _PRUNE_INTERVAL == 0:
+                self._prune_locked()
+    
+    def delete(self, cache_key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM request_cache WHERE cache_key = ?", (cache_key,))
+    
+    def load_recent(self, limit: int) -> List[DiskCacheEntry]:
+        """
+        读取最近使用的未过期条目（用于启动时预加载）
+        
+        Args:
+            limit: 最多读取的条目数
+            
+        Returns:
+            条目列表（最近使用的在前）
+        """
+        with self._lock:
+            self._flush_touches_locked()
+            rows = self._conn.execute(
+                "SELECT cache_key, scope, input, payload, created_at, expires_at FROM request_cache "
+                "WHERE expires_at > ? ORDER BY accessed_at DESC LIMIT ?",
+                (time.time(), limit),
+            ).fetchall()
+        entries = []
+        for row in rows:
+            try:
+                entries.append(self._to_entry(row))
+            except Exception as e:
+                logger.warning(f"Skipping unreadable disk cache entry {row[0][:8]}...: {str(e)}")
+        return entries
+    
+    def delete_expired(self) -> int:
+        """删除已过期的条目，返回删除的条目数"""
+        with self._lock:
+            removed = self._conn.execute("DELETE FROM request_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+            self._prune_locked()
+        return removed
+    
+    def _prune_locked(self) -> None:
+        """总字节数超过上限时删除最久未使用的条目（需要持有锁）"""
+        self._flush_touches_locked()
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM request_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        victims = []
+        for cache_key, size in self._conn.execute("SELECT cache_key, size FROM request_cache ORDER BY accessed_at"):
+            victims.append(cache_key)
+            excess -= size
+            if excess <= 0:
+                break
+        self._conn.executemany("DELETE FROM request_cache WHERE cache_key = ?", [(key,) for key in victims])
+        logger.info(f"Pruned {len(victims)} least recently used disk cache entries")
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._touches.clear()
+            self._conn.execute("DELETE FROM request_cache")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM request_cache").fetchone()
+        return {"path": self.db_path, "entries": entries, "bytes": total, "max_bytes": self.max_bytes}
+    
+    def close(self) -> None:
+        with self._lock:
+            try:
+                self._flush_touches_locked()
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to write disk cache access times: {str(e)}")
+            self._conn.close()
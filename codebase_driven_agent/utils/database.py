@@ -1,4 +1,6 @@
 """数据库工具和 Schema 发现"""
+import hashlib
+import json
 from typing import Dict, List, Optional, Any, Tuple
 from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.engine import Engine
@@ -12,6 +14,8 @@ logger = setup_logger("codebase_driven_agent.utils.database")
 
 # Schema 缓存
 _schema_cache: Dict[str, Dict] = {}
+# Schema 版本（缓存的 Schema 内容的 hash），用于工具结果缓存
+_schema_versions: Dict[str, str] = {}
 
 
 def get_database_engine() -> Optional[Engine]:
@@ -114,6 +118,8 @@ def get_schema_info(database_url: Optional[str] = None, use_cache: bool = True)
         # 缓存结果
         if use_cache:
             _schema_cache[db_url] = schema_info
+            schema_json = json.dumps(schema_info, sort_keys=True, default=str)
+            _schema_versions[db_url] = hashlib.md5(schema_json.encode('utf-8')).hexdigest()
         
         return schema_info
     
@@ -122,6 +128,23 @@ def get_schema_info(database_url: Optional[str] = None, use_cache: bool = True)
         return {}
 
 
+def get_schema_version(database_url: Optional[str] = None) -> Optional[str]:
+    """
+    获取数据库 Schema 版本（Schema 重新加载且内容变化时版本随之变化）
+    
+    Args:
+        database_url: 数据库 URL（可选，默认使用配置）
+    
+    Returns:
+        Schema 版本；未配置数据库或获取 Schema 失败时返回 None
+    """
+    db_url = database_url or settings.database_url
+    if not db_url or not get_schema_info(db_url):
+        return None
+    version = _schema_versions.get(db_url)
+    return f"{db_url}:{version}" if version else None
+
+
 def format_schema_info(schema_info: Dict[str, Any], max_tables: int = 20) -> str:
     """格式化 Schema 信息为字符串（用于 Agent Prompt）"""
     if not schema_info or not schema_info.get("tables"):
@@ -0,0 +1,497 @@
+"""仓库文件目录（常驻内存的文件列表）
+
+glob、grep、read、code_search 等内置工具共享同一份仓库文件列表，避免每次调用都完整遍历目录树：
+- 首次使用时完整扫描一次，记录每个文件的路径、大小、修改时间和语言
+- 之后按刷新间隔做增量刷新：只 stat 已知目录，目录的修改时间变化时才重新列出该目录
+- 文件内容修改不会改变目录的修改时间，文件级变更通过 invalidate() 通知（由文件监听等调用方负责）
+- 二进制标记在首次需要时才读取文件头检测，并缓存到对应条目上
+"""
+import glob as globlib
+import os
+import posixpath
+import re
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Iterable, Set, Tuple
+
+from codebase_driven_agent.config import settings
+from codebase_driven_agent.utils.logger import setup_logger
+
+logger = setup_logger("codebase_driven_agent.utils.file_catalog")
+
+# 不纳入目录的目录（隐藏目录也会被跳过）
+SKIP_DIRS = {'__pycache__', 'node_modules'}
+
+# 二进制文件检测读取的字节数
+BINARY_SNIFF_BYTES = 8192
+
+# 文件扩展名对应的语言
+LANGUAGE_BY_EXTENSION = {
+    '.py': 'python',
+    '.js': 'javascript',
+    '.jsx': 'javascript',
+    '.ts': 'typescript',
+    '.tsx': 'typescript',
+    '.java': 'java',
+    '.go': 'go',
+    '.rs': 'rust',
+    '.cpp': 'cpp',
+    '.cc': 'cpp',
+    '.cxx': 'cpp',
+    '.hpp': 'cpp',
+    '.hxx': 'cpp',
+    '.c': 'c',
+    '.h': 'c',
+    '.cs': 'csharp',
+    '.php': 'php',
+    '.rb': 'ruby',
+    '.swift': 'swift',
+    '.kt': 'kotlin',
+    '.scala': 'scala',
+}
+
+
+@dataclass
+class CatalogEntry:
+    """文件目录中的一个文件"""
+    path: str  # 相对于仓库根目录的 posix 风格路径
+    size: int
+    mtime_ns: int
+    language: Optional[str] = None
+    binary: Optional[bool] = None  # None 表示尚未检测
+    
+    @property
+    def name(self) -> str:
+        """文件名"""
+        return posixpath.basename(self.path)
+
+
+def _is_skipped_dir(name: str) -> bool:
+    """目录是否不纳入文件目录"""
+    return name.startswith('.') or name in SKIP_DIRS
+
+
+def _translate_component(part: str) -> str:
+    """将 glob 模式中的一段（不含 /）转换为正则表达式"""
+    # 与 glob.glob 一致：通配符不匹配以 . 开头的文件名
+    result = '' if part.startswith('.') else r'(?!\.)'
+    i = 0
+    while i < len(part):
+        c = part[i]
+        i += 1
+        if c == '*':
+            result += '[^/]*'
+        elif c == '?':
+            result += '[^/]'
+        elif c == '[':
+            end = part.find(']', i + 1)
+            if end == -1:
+                result += re.escape(c)
+                continue
+            content = part[i:end].replace('\\', '\\\\')
+            if content.startswith('!'):
+                content = '^' + content[1:]
+            result += f'[{content}]'
+            i = end + 1
+        else:
+            result += re.escape(c)
+    return result
+
+
+def glob_to_regex(pattern: str) -> "re.Pattern":
+    """
+    将相对路径的 glob 模式转换为正则表达式（** 匹配零个或多个目录）
+    
+    Args:
+        pattern: posix 风格的 glob 模式，如 'src/**/*.py'
+    """
+    parts = pattern.split('/')
+    regex = ''
+    for i, part in enumerate(parts):
+        last = i == len(parts) - 1
+        if part == '**':
+            regex += r'(?:(?!\.)[^/]+/)*'
+            if last:
+                regex += r'(?!\.)[^/]+'
+            continue
+        regex += _translate_component(part)
+        if not last:
+            regex += '/'
+    return re.compile(regex + r'\Z')
+
+
+class FileCatalog:
+    """仓库文件目录
+    
+    线程安全。查询方法返回按相对路径排序的条目列表（共享快照，调用方不应修改）。
+    """
+    
+    def __init__(self, repo_path: Path):
+        """
+        初始化文件目录（不立即扫描，首次查询时扫描）
+        
+        Args:
+            repo_path: 代码仓库路径
+        """
+        self.repo_path = Path(repo_path)
+        self._lock = threading.RLock()
+        self._dir_mtimes: Dict[str, int] = {}  # 目录相对路径（根目录为 ''） -> 修改时间
+        self._dir_files: Dict[str, Dict[str, CatalogEntry]] = {}  # 目录 -> {文件名: 条目}
+        self._dir_children: Dict[str, Set[str]] = {}  # 目录 -> 子目录相对路径
+        self._dirty_paths: Set[str] = set()
+        self._scanned = False
+        self._last_refresh = 0.0
+        self._snapshot: Optional[List[CatalogEntry]] = None
+        self._by_name: Dict[str, List[CatalogEntry]] = {}
+        self._stats = {"full_scans": 0, "refreshes": 0, "rescanned_dirs": 0}
+    
+    def _abs(self, rel_path: str) -> Path:
+        """相对路径转换为绝对路径"""
+        return self.repo_path / rel_path if rel_path else self.repo_path
+    
+    def _make_entry(self, rel_path: str, stat_result) -> CatalogEntry:
+        """根据 stat 结果创建条目"""
+        return CatalogEntry(
+            path=rel_path,
+            size=stat_result.st_size,
+            mtime_ns=stat_result.st_mtime_ns,
+            language=LANGUAGE_BY_EXTENSION.get(posixpath.splitext(rel_path)[1].lower()),
+        )
+    
+    def _list_dir(self, rel_dir: str) -> bool:
+        """
+        列出单个目录的文件和子目录（不递归），更新目录记录
+        
+        Returns:
+            目录是否存在
+        """
+        try:
+            dir_mtime = os.stat(self._abs(rel_dir)).st_mtime_ns
+            iterator = os.scandir(self._abs(rel_dir))
+        except OSError:
+            return False
+        
+        files: Dict[str, CatalogEntry] = {}
+        children: Set[str] = set()
+        with iterator:
+            for item in iterator:
+                rel_path = f"{rel_dir}/{item.name}" if rel_dir else item.name
+                try:
+                    if item.is_dir(follow_symlinks=False):
+                        if not _is_skipped_dir(item.name):
+                            children.add(rel_path)
+                    elif item.is_file():
+                        files[item.name] = self._make_entry(rel_path, item.stat())
+                except OSError:
+                    continue
+        
+        self._dir_mtimes[rel_dir] = dir_mtime
+        self._dir_files[rel_dir] = files
+        self._dir_children[rel_dir] = children
+        self._stats["rescanned_dirs"] += 1
+        return True
+    
+    def _scan_tree(self, rel_dir: str) -> None:
+        """递归扫描目录（使用显式栈，避免深层目录递归过深）"""
+        stack = [rel_dir]
+        while stack:
+            current = stack.pop()
+            if self._list_dir(current):
+                stack.extend(self._dir_children[current])
+    
+    def _drop_tree(self, rel_dir: str) -> None:
+        """从记录中移除目录及其所有子目录"""
+        stack = [rel_dir]
+        while stack:
+            current = stack.pop()
+            self._dir_mtimes.pop(current, None)
+            self._dir_files.pop(current, None)
+            stack.extend(self._dir_children.pop(current, ()))
+    
+    def _refresh_locked(self, full: bool) -> None:
+        """刷新目录记录（调用方持有锁）"""
+        if full or not self._scanned:
+            self._dir_mtimes.clear()
+            self._dir_files.clear()
+            self._dir_children.clear()
+            self._scan_tree('')
+            self._scanned = True
+            self._stats["full_scans"] += 1
+        else:
+            # 只 stat 已知目录，修改时间变化（增删文件或子目录）时才重新列出
+            for rel_dir in sorted(self._dir_mtimes):
+                if rel_dir not in self._dir_mtimes:
+                    # 已随父目录一起移除
+                    continue
+                try:
+                    dir_mtime = os.stat(self._abs(rel_dir)).st_mtime_ns
+                except OSError:
+                    self._drop_tree(rel_dir)
+                    self._detach(rel_dir)
+                    continue
+                if dir_mtime == self._dir_mtimes[rel_dir]:
+                    continue
+                old_children = self._dir_children.get(rel_dir, set())
+                self._list_dir(rel_dir)
+                new_children = self._dir_children[rel_dir]
+                for removed in old_children - new_children:
+                    self._drop_tree(removed)
+                for added in new_children - old_children:
+                    self._scan_tree(added)
+            self._stats["refreshes"] += 1
+        
+        self._dirty_paths.clear()
+        
+        self._snapshot = None
+        self._last_refresh = time.time()
+    
+    def _detach(self, rel_dir: str) -> None:
+        """从父目录的子目录集合中移除"""
+        parent = posixpath.dirname(rel_dir)
+        if parent in self._dir_children:
+            self._dir_children[parent].discard(rel_dir)
+    
+    def refresh(self, full: bool = False) -> None:
+        """
+        立即刷新文件目录
+        
+        Args:
+            full: 是否丢弃现有记录完全重新扫描
+        """
+        start_time = time.time()
+        with self._lock:
+            self._refresh_locked(full)
+        logger.debug(f"File catalog refreshed for {self.repo_path} in {time.time() - start_time:.3f}s")
+    
+    def ensure_fresh(self, max_age: Optional[float] = None) -> None:
+        """
+        确保文件目录足够新：尚未扫描、有失效记录或超过 max_age 未刷新时刷新
+        
+        Args:
+            max_age: 允许的最大刷新间隔（秒），默认读取 FILE_CATALOG_REFRESH_INTERVAL
+        """
+        if max_age is None:
+            max_age = settings.file_catalog_refresh_interval
+        with self._lock:
+            if not self._scanned or self._dirty_paths or time.time() - self._last_refresh > max_age:
+                self._refresh_locked(full=False)
+    
+    def invalidate(self, rel_paths: Optional[Iterable[str]] = None) -> None:
+        """
+        标记文件目录失效，下次查询前刷新
+        
+        Args:
+            rel_paths: 变更的文件路径（相对于仓库根目录）；为 None 时下次查询前完整重新扫描
+        """
+        with self._lock:
+            if rel_paths is None:
+                self._scanned = False
+                return
+            for rel_path in rel_paths:
+                rel_path = Path(rel_path).as_posix()
+                self._dirty_paths.add(rel_path)
+                # 文件内容修改不会改变目录的修改时间，将最近的已知上级目录标记为需要重新列出
+                rel_dir = posixpath.dirname(rel_path)
+                while rel_dir and rel_dir not in self._dir_mtimes:
+                    rel_dir = posixpath.dirname(rel_dir)
+                if rel_dir in self._dir_mtimes:
+                    self._dir_mtimes[rel_dir] = -1
+    
+    def _entries(self) -> List[CatalogEntry]:
+        """获取按路径排序的全部条目（必要时刷新）"""
+        self.ensure_fresh()
+        with self._lock:
+            if self._snapshot is None:
+                snapshot = sorted(
+                    (entry for files in self._dir_files.values() for entry in files.values()),
+                    key=lambda entry: entry.path,
+                )
+                by_name: Dict[str, List[CatalogEntry]] = {}
+                for entry in snapshot:
+                    by_name.setdefault(entry.name, []).append(entry)
+                self._snapshot = snapshot
+                self._by_name = by_name
+            return self._snapshot
+    
+    def covers(self, rel_path: str, is_dir: bool = False) -> bool:
+        """
+        路径是否在文件目录覆盖范围内（不在隐藏目录或跳过的目录中，且不超出仓库）
+        
+        Args:
+            rel_path: 相对于仓库根目录的文件路径或 glob 模式
+            is_dir: rel_path 是否为目录（目录本身也需要检查）
+        """
+        normalized = posixpath.normpath(Path(rel_path).as_posix()) if rel_path else '.'
+        if normalized == '.':
+            return True
+        if normalized.startswith('/') or normalized == '..' or normalized.startswith('../'):
+            return False
+        parts = normalized.split('/')
+        return not any(_is_skipped_dir(part) for part in (parts if is_dir else parts[:-1]))
+    
+    def files(
+        self,
+        subdir: Optional[str] = None,
+        extensions: Optional[Tuple[str, ...]] = None,
+        skip_dirs: Optional[Iterable[str]] = None,
+    ) -> List[CatalogEntry]:
+        """
+        列出文件（按相对路径排序）
+        
+        Args:
+            subdir: 只列出该目录（相对于仓库根目录）下的文件
+            extensions: 文件扩展名过滤
+            skip_dirs: 额外跳过的目录名（如 build、dist）
+            
+        Returns:
+            文件条目列表
+        """
+        prefix = ''
+        if subdir:
+            normalized = posixpath.normpath(Path(subdir).as_posix())
+            if normalized != '.':
+                if not self.covers(normalized, is_dir=True):
+                    # 显式指定了被跳过的目录，直接遍历（不缓存）
+                    return self._walk_uncached(normalized, extensions, skip_dirs)
+                prefix = normalized + '/'
+        
+        skip = set(skip_dirs or ())
+        results = []
+        for entry in self._entries():
+            if prefix and not entry.path.startswith(prefix):
+                continue
+            if extensions and not entry.path.endswith(extensions):
+                continue
+            if skip and any(part in skip for part in entry.path[len(prefix):].split('/')[:-1]):
+                continue
+            results.append(entry)
+        return results
+    
+    def _walk_uncached(
+        self,
+        rel_dir: str,
+        extensions: Optional[Tuple[str, ...]],
+        skip_dirs: Optional[Iterable[str]],
+    ) -> List[CatalogEntry]:
+        """直接遍历不在覆盖范围内的目录"""
+        skip = set(skip_dirs or ())
+        results = []
+        for root, dirs, files in os.walk(self._abs(rel_dir)):
+            dirs[:] = [d for d in dirs if not _is_skipped_dir(d) and d not in skip]
+            for file in files:
+                full_path = Path(root) / file
+                rel_path = full_path.relative_to(self.repo_path).as_posix()
+                if extensions and not rel_path.endswith(extensions):
+                    continue
+                try:
+                    results.append(self._make_entry(rel_path, full_path.stat()))
+                except OSError:
+                    continue
+        results.sort(key=lambda entry: entry.path)
+        return results
+    
+    def glob(self, pattern: str, base: Optional[str] = None) -> List[CatalogEntry]:
+        """
+        按 glob 模式匹配文件（语义与 glob.glob(recursive=True) 一致，只返回文件）
+        
+        Args:
+            pattern: glob 模式，如 '*.py'、'**/*.ts'
+            base: 模式的基础目录（相对于仓库根目录）
+            
+        Returns:
+            文件条目列表
+        """
+        rel_pattern = Path(pattern).as_posix()
+        if base:
+            rel_pattern = f"{Path(base).as_posix().rstrip('/')}/{rel_pattern}"
+        while rel_pattern.startswith('./'):
+            rel_pattern = rel_pattern[2:]
+        
+        if not self.covers(rel_pattern) or '..' in rel_pattern.split('/'):
+            # 模式指向被跳过的目录或仓库外，交给 glob 模块处理
+            return self._glob_uncached(rel_pattern)
+        
+        regex = glob_to_regex(rel_pattern)
+        return [entry for entry in self._entries() if regex.match(entry.path)]
+    
+    def _glob_uncached(self, rel_pattern: str) -> List[CatalogEntry]:
+        """直接使用 glob 模块匹配（不在覆盖范围内的模式）"""
+        results = []
+        for file_path in globlib.glob(str(self.repo_path / rel_pattern), recursive=True):
+            full_path = Path(file_path)
+            try:
+                rel_path = full_path.relative_to(self.repo_path).as_posix()
+                if full_path.is_file():
+                    results.append(self._make_entry(rel_path, full_path.stat()))
+            except (OSError, ValueError):
+                continue
+        results.sort(key=lambda entry: entry.path)
+        return results
+    
+    def find_by_name(self, name: str, limit: Optional[int] = None) -> List[CatalogEntry]:
+        """
+        按文件名精确查找
+        
+        Args:
+            name: 文件名
+            limit: 最大返回数量
+        """
+        self._entries()
+        with self._lock:
+            matches = list(self._by_name.get(name, []))
+        return matches[:limit] if limit is not None else matches
+    
+    def absolute_path(self, entry: CatalogEntry) -> Path:
+        """获取条目的绝对路径"""
+        return self.repo_path / entry.path
+    
+    def is_binary(self, entry: CatalogEntry) -> bool:
+        """
+        文件是否为二进制文件（前 8KB 含 NUL 字节），结果缓存在条目上
+        
+        Args:
+            entry: 文件条目
+        """
+        if entry.binary is None:
+            try:
+                with open(self.absolute_path(entry), 'rb') as f:
+                    entry.binary = b'\x00' in f.read(BINARY_SNIFF_BYTES)
+            except OSError:
+                return False
+        return entry.binary
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取文件目录统计信息"""
+        with self._lock:
+            return {
+                "repo_path": str(self.repo_path),
+                "files": sum(len(files) for files in self._dir_files.values()),
+                "directories": len(self._dir_mtimes),
+                "last_refresh": self._last_refresh or None,
+                "pending_invalidations": len(self._dirty_paths),
+                **self._stats,
+            }
+
+
+# 全局文件目录实例（按仓库路径区分）
+_file_catalogs: Dict[str, FileCatalog] = {}
+_file_catalog_lock = threading.Lock()
+
+
+def get_file_catalog(repo_path: Optional[Path] = None) -> FileCatalog:
+    """
+    获取仓库对应的文件目录实例（单例模式）
+    
+    Args:
+        repo_path: 代码仓库路径，默认读取 CODE_REPO_PATH
+    """
+    repo_path = Path(repo_path or settings.code_repo_path or ".")
+    key = str(repo_path.resolve())
+    with _file_catalog_lock:
+        catalog = _file_catalogs.get(key)
+        if catalog is None:
+            catalog = FileCatalog(repo_path)
+            _file_catalogs[key] = catalog
+        return catalog
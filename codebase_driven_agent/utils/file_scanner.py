@@ -0,0 +1,312 @@
+"""并行文件内容扫描引擎
+
+供 CodeTool 和 GrepTool 在 ripgrep 不可用时使用：
+- 文件列表按顺序切分为多个块，由进程池并行扫描，结果按原始顺序合并
+- 每个文件只读取一次（二进制检测复用同一份数据），大文件使用 mmap
+- 字面量查询直接在字节上匹配，不对整个文件做解码和 lower()
+- 达到 max_files / max_matches 后提前终止，取消尚未开始的块
+"""
+import mmap
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Sequence, Tuple
+
+from codebase_driven_agent.config import settings
+from codebase_driven_agent.utils.logger import setup_logger
+
+logger = setup_logger("codebase_driven_agent.utils.file_scanner")
+
+# 超过该大小的文件使用 mmap 读取
+MMAP_THRESHOLD = 1024 * 1024
+
+# 二进制文件检测读取的字节数
+BINARY_SNIFF_BYTES = 8192
+
+# 文件数少于该值时直接在当前进程串行扫描（进程间通信的开销大于收益）
+PARALLEL_MIN_FILES = 2000
+
+# 正则元字符，模式中不含这些字符时按字面量处理
+_REGEX_META_CHARS = set('.^$*+?{}[]\\|()')
+
+# 在整个文件上匹配和逐行匹配结果不同的构造：\A、\Z（整个字符串的开头和结尾）和环视（可以看到相邻行）
+_CONTEXT_SENSITIVE = re.compile(r'\\[AZ]|\(\?<?[=!]')
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def get_scan_workers() -> int:
+    """获取扫描进程数（FILE_SCAN_WORKERS，0 表示按 CPU 核数自动选择）"""
+    if settings.file_scan_workers > 0:
+        return settings.file_scan_workers
+    return max(1, min(os.cpu_count() or 1, 8))
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """获取（必要时创建）共享进程池，进程数变化时重建"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            # 服务进程内有多个线程，使用 spawn 避免 fork 继承锁状态
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+            _pool_workers = workers
+            logger.info(f"File scan process pool started with {workers} workers")
+        return _pool
+
+
+def shutdown_scan_pool() -> None:
+    """关闭共享进程池（应用关闭时调用）"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+            _pool_workers = 0
+
+
+def _build_matcher(pattern: str, regex: bool, ignore_case: bool) -> Tuple[str, Any]:
+    """
+    根据查询构建匹配器
+    
+    Returns:
+        (模式, 匹配器)：
+        - ('bytes', (字节串, 是否忽略大小写))：ASCII 字面量，直接在原始字节（或 mmap）上查找
+        - ('text', (逐行正则, 整体预检查正则或 None))：其他情况，解码后逐行匹配
+    """
+    is_literal = not regex or not (_REGEX_META_CHARS & set(pattern))
+    flags = re.IGNORECASE if ignore_case else 0
+    if is_literal and pattern.isascii():
+        needle = pattern.encode('ascii')
+        return 'bytes', (needle.lower() if ignore_case else needle, ignore_case)
+    
+    source = re.escape(pattern) if is_literal else pattern
+    # 整体预检查：逐行能匹配的内容在多行模式下一定能匹配，不匹配的文件无需逐行扫描；
+    # 含 \A、\Z 或环视的模式不满足这一点（例如 foo\Z 逐行匹配每个以 foo 结尾的行），不做预检查
+    if not is_literal and _CONTEXT_SENSITIVE.search(pattern):
+        return 'text', (re.compile(source, flags), None)
+    return 'text', (re.compile(source, flags), re.compile(source, flags | re.MULTILINE))
+
+
+def _line_bounds(data, start: int) -> Tuple[int, int]:
+    """获取 start 所在行的起止位置（不含换行符）"""
+    line_start = data.rfind(b'\n', 0, start) + 1
+    line_end = data.find(b'\n', start)
+    if line_end == -1:
+        line_end = len(data)
+    return line_start, line_end
+
+
+def _decode_line(raw: bytes) -> str:
+    """解码一行内容，去掉行尾的 \\r"""
+    return raw.decode('utf-8', errors='replace').rstrip('\r')
+
+
+def _scan_bytes(data, matcher, max_matches: Optional[int]) -> List[Dict[str, Any]]:
+    """在字节数据上查找字面量，每行最多记录一次"""
+    needle, ignore_case = matcher
+    # bytes.lower() 只转换 ASCII 字母，长度不变，位置可以直接对应回原始数据
+    haystack = data[:].lower() if ignore_case else data
+    pos = haystack.find(needle)
+    if pos == -1:
+        return []
+    
+    matches = []
+    line_no = 1
+    counted_to = 0
+    while pos != -1:
+        # mmap 的 count 不支持区间参数，切片后计数（累计只复制一遍文件内容）
+        line_no += haystack[counted_to:pos].count(b'\n')
+        counted_to = pos
+        line_start, line_end = _line_bounds(haystack, pos)
+        matches.append({"line": line_no, "content": _decode_line(data[line_start:line_end])})
+        if max_matches is not None and len(matches) >= max_matches:
+            break
+        # 跳到下一行继续查找
+        pos = haystack.find(needle, line_end + 1) if line_end < len(haystack) else -1
+    return matches
+
+
+def _scan_text(data, matcher, max_matches: Optional[int]) -> List[Dict[str, Any]]:
+    """解码后逐行匹配（用于正则和非 ASCII 查询）"""
+    line_matcher, prefilter = matcher
+    content = data[:].decode('utf-8', errors='replace')
+    if prefilter is not None and not prefilter.search(content):
+        return []
+    
+    matches = []
+    for line_no, line in enumerate(content.split('\n'), 1):
+        if line_matcher.search(line):
+            matches.append({"line": line_no, "content": line.rstrip('\r')})
+            if max_matches is not None and len(matches) >= max_matches:
+                break
+    return matches
+
+
+def _scan_file(path: str, mode: str, matcher, max_matches_per_file: Optional[int], skip_binary: bool) -> List[Dict[str, Any]]:
+    """扫描单个文件（只打开和读取一次）"""
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return []
+        if size >= MMAP_THRESHOLD:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            data = f.read()
+    
+    try:
+        if skip_binary and b'\x00' in data[:BINARY_SNIFF_BYTES]:
+            return []
+        if mode == 'bytes':
+            return _scan_bytes(data, matcher, max_matches_per_file)
+        return _scan_text(data, matcher, max_matches_per_file)
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
+
+
+def _scan_chunk(
+    paths: Sequence[str],
+    pattern: str,
+    regex: bool,
+    ignore_case: bool,
+    max_matches_per_file: Optional[int],
+    skip_binary: bool,
+    max_files: Optional[int],
+    max_matches: Optional[int],
+) -> List[Tuple[int, List[Dict[str, Any]]]]:
+    """
+    扫描一块文件（进程池任务入口，必须是模块级函数）
+    
+    Returns:
+        [(块内序号, 匹配列表)]，只包含有匹配的文件
+    """
+    mode, matcher = _build_matcher(pattern, regex, ignore_case)
+    results = []
+    total_matches = 0
+    for i, path in enumerate(paths):
+        try:
+            matches = _scan_file(path, mode, matcher, max_matches_per_file, skip_binary)
+        except (OSError, ValueError):
+            continue
+        if not matches:
+            continue
+        results.append((i, matches))
+        total_matches += len(matches)
+        # 块内也提前终止：后续文件在顺序上排在后面，不会进入最终结果
+        if max_files is not None and len(results) >= max_files:
+            break
+        if max_matches is not None and total_matches >= max_matches:
+            break
+    return results
+
+
+def scan_files(
+    file_paths: Sequence[Path],
+    pattern: str,
+    regex: bool = False,
+    ignore_case: bool = False,
+    max_files: Optional[int] = None,
+    max_matches: Optional[int] = None,
+    max_matches_per_file: Optional[int] = None,
+    skip_binary: bool = True,
+    workers: Optional[int] = None,
+    cancel_event: Optional[threading.Event] = None,
+) -> List[Dict[str, Any]]:
+    """
+    扫描文件内容，返回有匹配的文件（保持 file_paths 的顺序）
+    
+    Args:
+        file_paths: 要扫描的文件列表
+        pattern: 查询字符串或正则表达式
+        regex: pattern 是否为正则表达式（不含元字符时仍按字面量快速匹配）
+        ignore_case: 是否忽略大小写
+        max_files: 最多返回的文件数，达到后提前终止
+        max_matches: 最多返回的匹配行数（按文件顺序累计），达到后提前终止
+        max_matches_per_file: 每个文件最多记录的匹配行数
+        skip_binary: 是否跳过二进制文件（前 8KB 含 NUL 字节）
+        workers: 进程数，默认读取 FILE_SCAN_WORKERS；1 表示在当前进程串行扫描
+        cancel_event: 取消事件，设置后停止提交新的扫描块
+        
+    Returns:
+        [{"path": Path, "matches": [{"line": 行号, "content": 行内容}]}]
+    """
+    paths = [str(p) for p in file_paths]
+    if not paths:
+        return []
+    
+    workers = workers or get_scan_workers()
+    options = (pattern, regex, ignore_case, max_matches_per_file, skip_binary, max_files, max_matches)
+    
+    results: List[Dict[str, Any]] = []
+    total_matches = 0
+    
+    def collect(offset: int, chunk_results) -> bool:
+        """按顺序合并块结果，返回是否已达到上限"""
+        nonlocal total_matches
+        for i, matches in chunk_results:
+            results.append({"path": file_paths[offset + i], "matches": matches})
+            total_matches += len(matches)
+            if max_files is not None and len(results) >= max_files:
+                return True
+            if max_matches is not None and total_matches >= max_matches:
+                return True
+        return False
+    
+    if workers <= 1 or len(paths) < PARALLEL_MIN_FILES:
+        # 串行时按较小的块推进，以便及时响应取消
+        for offset in range(0, len(paths), 256):
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            if collect(offset, _scan_chunk(paths[offset:offset + 256], *options)):
+                break
+        return _trim(results, max_matches)
+    
+    chunk_size = max(64, min(1024, len(paths) // (workers * 8) or 64))
+    offsets = list(range(0, len(paths), chunk_size))
+    pool = _get_pool(workers)
+    
+    # 同时最多提交 workers * 2 个块，按顺序消费结果，达到上限后取消剩余的块
+    window = workers * 2
+    futures = {}
+    next_submit = 0
+    try:
+        for index, offset in enumerate(offsets):
+            while next_submit < len(offsets) and next_submit < index + window:
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                submit_offset = offsets[next_submit]
+                futures[next_submit] = pool.submit(
+                    _scan_chunk, paths[submit_offset:submit_offset + chunk_size], *options
+                )
+                next_submit += 1
+            future = futures.pop(index, None)
+            if future is None:
+                break
+            if collect(offset, future.result()):
+                break
+    finally:
+        for future in futures.values():
+            future.cancel()
+    
+    return _trim(results, max_matches)
+
+
+def _trim(results: List[Dict[str, Any]], max_matches: Optional[int]) -> List[Dict[str, Any]]:
+    """将累计匹配行数截断到 max_matches"""
+    if max_matches is None:
+        return results
+    remaining = max_matches
+    trimmed = []
+    for item in results:
+        if remaining <= 0:
+            break
+        trimmed.append({"path": item["path"], "matches": item["matches"][:remaining]})
+        remaining -= len(trimmed[-1]["matches"])
+    return trimmed
@@ -0,0 +1,443 @@
+"""轮转和压缩日志的读取
+
+日志轮转后的文件名形如 app.log.1、app.log.2.gz、app-2026-10-15.log.zst，这里负责：
+- 识别日志文件名（当前文件、轮转编号或日期后缀、压缩后缀）
+- 流式解压 gzip、bz2、xz，安装了 zstandard 时还支持 zstd，不需要先解压到磁盘
+- 为压缩文件建立旁路索引（sidecar）：记录每个压缩成员（member/stream/frame）在压缩文件中的
+  位置、起始行号和时间范围。按时间范围查询时只解压和窗口重叠的成员；时间有序的文件读到窗口
+  结束后立即停止。标准库的解压器只能从成员边界开始解压，gzip 和 logrotate 生成的 .gz 通常只有
+  一个成员，这时仍需从头解压到窗口结束
+- 安装了 indexed_gzip 时，.gz 文件改为建立 zran 风格的检查点（deflate 块边界的位偏移和之前
+  32KB 的解压窗口），旁路索引按解压后的偏移分段，查询时从窗口前最近的检查点开始解压
+
+旁路索引以 JSON 保存在日志索引目录下（不写入日志目录），以文件路径、大小和修改时间为键，
+压缩文件被替换后自动重建；gzip 检查点保存在旁边的 .gzidx 文件中。
+"""
+import bz2
+import hashlib
+import json
+import lzma
+import os
+import re
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from codebase_driven_agent.utils.log_index import block_time_range, default_index_dir, line_timestamp
+from codebase_driven_agent.utils.logger import setup_logger
+
+logger = setup_logger("codebase_driven_agent.utils.log_archive")
+
+# 尝试导入 zstandard（可选依赖）
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    zstandard = None
+    ZSTD_AVAILABLE = False
+    logger.debug("zstandard not available, .zst logs will be skipped")
+
+# 尝试导入 indexed_gzip（可选依赖）
+try:
+    import indexed_gzip
+    GZIP_CHECKPOINTS_AVAILABLE = True
+except ImportError:
+    indexed_gzip = None
+    GZIP_CHECKPOINTS_AVAILABLE = False
+    logger.debug("indexed_gzip not available, .gz logs will be decompressed from member boundaries")
+
+# 每次读取的压缩数据字节数
+READ_BYTES = 256 * 1024
+
+# gzip 检查点的间隔，以及按检查点读取时旁路索引每段的大小（解压后的字节数）
+GZIP_CHECKPOINT_SPACING = 4 * 1024 * 1024
+GZIP_SEGMENT_BYTES = 1024 * 1024
+
+# 压缩后缀 -> 格式
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz", ".zst": "zstd"}
+
+# 日志文件名：.log，可带轮转编号或日期（app.log.1、app.log-20261015），可带压缩后缀
+_LOG_NAME_PATTERN = re.compile(r'\.log(?:[.-]\d[\d-]*)?(?:\.(?:gz|bz2|xz|zst))?$')
+
+SIDECAR_VERSION = 3
+
+_STAMP_PATTERN = re.compile(rb'\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}')
+
+
+def compression_of(path: str) -> Optional[str]:
+    """文件的压缩格式，未压缩时返回 None"""
+    return COMPRESSION_SUFFIXES.get(os.path.splitext(path)[1])
+
+
+def is_log_file(name: str) -> bool:
+    """
+    是否为日志文件（包括轮转和压缩后的文件）
+    
+    Args:
+        name: 文件名或路径
+    """
+    if not _LOG_NAME_PATTERN.search(name):
+        return False
+    return compression_of(name) != "zstd" or ZSTD_AVAILABLE
+
+
+def uses_checkpoints(path: str) -> bool:
+    """是否通过 gzip 检查点随机读取（.gz 文件且安装了 indexed_gzip）"""
+    return GZIP_CHECKPOINTS_AVAILABLE and compression_of(path) == "gzip"
+
+
+def _new_decompressor(kind: str):
+    """创建单个压缩成员的解压器（都提供 decompress()、eof 和 unused_data）"""
+    if kind == "gzip":
+        return zlib.decompressobj(wbits=31)
+    if kind == "bz2":
+        return bz2.BZ2Decompressor()
+    if kind == "xz":
+        return lzma.LZMADecompressor()
+    if kind == "zstd" and ZSTD_AVAILABLE:
+        return zstandard.ZstdDecompressor().decompressobj()
+    raise ValueError(f"Unsupported log compression: {kind}")
+
+
+def _iter_members(f, kind: str, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[bytes, Optional[int]]]:
+    """
+    流式解压 [start, end) 范围内的压缩数据（可以包含多个连续的压缩成员）
+    
+    Yields:
+        (解压后的数据, 成员结束时的压缩文件偏移；成员未结束时为 None)
+    """
+    f.seek(start)
+    position = start
+    decompressor = _new_decompressor(kind)
+    started = False
+    while end is None or position < end:
+        chunk = f.read(READ_BYTES if end is None else min(READ_BYTES, end - position))
+        if not chunk:
+            break
+        position += len(chunk)
+        while chunk:
+            if started is False and not chunk.strip(b"\x00"):
+                # 成员之间或文件末尾的填充字节
+                return
+            output = decompressor.decompress(chunk)
+            started = True
+            if getattr(decompressor, "eof", False):
+                chunk = decompressor.unused_data
+                yield output, position - len(chunk)
+                decompressor = _new_decompressor(kind)
+                started = False
+            else:
+                chunk = b""
+                if output:
+                    yield output, None
+
+
+def _iter_lines(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """把解压后的数据块切分为行（包含换行符）"""
+    pending = b""
+    for chunk in chunks:
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + b"\n"
+    if pending:
+        yield pending
+
+
+def iter_compressed_lines(path: str) -> Iterator[Tuple[int, str]]:
+    """
+    逐行读取整个压缩日志文件
+    
+    Yields:
+        (行号, 行内容)
+    """
+    kind = compression_of(path)
+    with open(path, "rb") as f:
+        for line_no, line in enumerate(_iter_lines(output for output, _ in _iter_members(f, kind)), 1):
+            yield line_no, line.decode("utf-8", errors="ignore")
+
+
+class _StampOrder:
+    """检查依次读到的时间戳是否非递减"""
+    
+    def __init__(self):
+        self.sorted = True
+        self._last = b""
+    
+    def feed(self, data: bytes) -> None:
+        if self.sorted:
+            stamps = _STAMP_PATTERN.findall(data)
+            self.sorted = all(a <= b for a, b in zip([self._last] + stamps, stamps))
+            if stamps:
+                self._last = stamps[-1]
+
+
+class ArchiveSidecar:
+    """压缩日志的旁路索引"""
+    
+    def __init__(self, data: Dict[str, Any]):
+        self.data = data
+    
+    @property
+    def sorted(self) -> bool:
+        """整个文件中的时间戳是否非递减"""
+        return self.data["sorted"]
+    
+    @property
+    def checkpointed(self) -> bool:
+        """是否按 gzip 检查点分段（段的偏移和长度是解压后的字节数）"""
+        return self.data.get("checkpointed", False)
+    
+    @property
+    def segments(self) -> List[List[Any]]:
+        """
+        [偏移, 长度, 起始行号, 最早时间戳, 最晚时间戳, 最后一个时间戳]，每段由一个或多个完整的行组成
+        
+        偏移和长度是压缩文件中成员的位置；按 gzip 检查点分段时是解压后的位置。
+        """
+        return self.data["segments"]
+    
+    @property
+    def latest(self) -> Optional[float]:
+        """文件中最晚的时间戳"""
+        stamps = [segment[4] for segment in self.segments if segment[4] is not None]
+        return max(stamps) if stamps else None
+    
+    @classmethod
+    def build(cls, path: str, cancel_event: Optional[threading.Event] = None) -> Optional["ArchiveSidecar"]:
+        """解压整个文件一次，记录每段的位置、行号和时间范围；被取消时返回 None"""
+        if uses_checkpoints(path):
+            return cls._build_checkpointed(path, cancel_event)
+        return cls._build_members(path, cancel_event)
+    
+    @classmethod
+    def _build_members(cls, path: str, cancel_event: Optional[threading.Event]) -> Optional["ArchiveSidecar"]:
+        """按压缩成员分段"""
+        kind = compression_of(path)
+        segments = []
+        line_no = 1
+        order = _StampOrder()
+        # 当前段的起始压缩偏移、起始行号和时间范围（最早、最晚、最后一个）；carry 是尚未结束的行
+        seg_start, seg_line, seg_range = 0, 1, [None, None, None]
+        carry = b""
+        
+        def scan(complete: bytes) -> None:
+            min_ts, max_ts, last_ts = block_time_range(complete)
+            if min_ts is not None:
+                seg_range[0] = min_ts if seg_range[0] is None else min(seg_range[0], min_ts)
+                seg_range[1] = max_ts if seg_range[1] is None else max(seg_range[1], max_ts)
+                seg_range[2] = last_ts
+            order.feed(complete)
+        
+        with open(path, "rb") as f:
+            for output, member_end in _iter_members(f, kind):
+                if cancel_event is not None and cancel_event.is_set():
+                    return None
+                if output:
+                    data = carry + output
+                    cut = data.rfind(b"\n") + 1
+                    complete, carry = data[:cut], data[cut:]
+                    if complete:
+                        scan(complete)
+                        line_no += complete.count(b"\n")
+                # 行跨越成员边界时和下一个成员合并为一段
+                if member_end is not None and not carry:
+                    segments.append([seg_start, member_end - seg_start, seg_line, *seg_range])
+                    seg_start, seg_line, seg_range = member_end, line_no, [None, None, None]
+            size = os.fstat(f.fileno()).st_size
+        if carry:
+            scan(carry)
+            line_no += 1
+        if seg_start < size:
+            segments.append([seg_start, size - seg_start, seg_line, *seg_range])
+        return cls({"version": SIDECAR_VERSION, "sorted": order.sorted, "lines": line_no - 1, "segments": segments})
+    
+    @classmethod
+    def _build_checkpointed(cls, path: str, cancel_event: Optional[threading.Event]) -> Optional["ArchiveSidecar"]:
+        """建立 gzip 检查点（保存到 .gzidx 文件），按解压后约 GZIP_SEGMENT_BYTES 字节分段"""
+        segments = []
+        line_no = 1
+        offset = 0
+        order = _StampOrder()
+        pending = b""
+        with indexed_gzip.IndexedGzipFile(path, spacing=GZIP_CHECKPOINT_SPACING) as f:
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    return None
+                chunk = f.read(GZIP_SEGMENT_BYTES)
+                pending += chunk
+                while pending and (len(pending) >= GZIP_SEGMENT_BYTES or not chunk):
+                    cut = pending.rfind(b"\n") + 1 if chunk else len(pending)
+                    if cut == 0:
+                        # 一行超过了段的大小，继续读到行尾
+                        break
+                    block, pending = pending[:cut], pending[cut:]
+                    segments.append([offset, len(block), line_no, *block_time_range(block)])
+                    order.feed(block)
+                    offset += len(block)
+                    line_no += block.count(b"\n") + (0 if block.endswith(b"\n") else 1)
+                if not chunk:
+                    break
+            checkpoint_file = _checkpoint_path(path)
+            try:
+                checkpoint_file.parent.mkdir(parents=True, exist_ok=True)
+                tmp_file = checkpoint_file.with_suffix(".tmp")
+                f.export_index(str(tmp_file))
+                os.replace(tmp_file, checkpoint_file)
+            except (OSError, ValueError) as e:
+                logger.debug(f"Failed to save gzip checkpoints for {path}: {str(e)}")
+        return cls({"version": SIDECAR_VERSION, "sorted": order.sorted, "checkpointed": True,
+                    "lines": line_no - 1, "segments": segments})
+
+
+# 进程内的旁路索引缓存：路径 -> (文件标识, 旁路索引)
+_sidecars: Dict[str, Tuple[Tuple[int, int], ArchiveSidecar]] = {}
+_sidecar_lock = threading.Lock()
+
+
+def _sidecar_path(path: str, identity: Tuple[int, int], suffix: str = ".json") -> Path:
+    key = hashlib.sha1(f"{os.path.abspath(path)}:{identity[0]}:{identity[1]}".encode("utf-8")).hexdigest()
+    return default_index_dir() / "log_archives" / f"{key}{suffix}"
+
+
+def _checkpoint_path(path: str) -> Path:
+    """gzip 检查点文件的路径（和旁路索引使用相同的键）"""
+    st = os.stat(path)
+    return _sidecar_path(path, (st.st_size, st.st_mtime_ns), ".gzidx")
+
+
+def _open_checkpointed(path: str):
+    """打开 gzip 文件并载入检查点（检查点文件丢失时退化为从头解压）"""
+    f = indexed_gzip.IndexedGzipFile(path, spacing=GZIP_CHECKPOINT_SPACING)
+    try:
+        f.import_index(str(_checkpoint_path(path)))
+    except Exception as e:
+        logger.debug(f"Failed to load gzip checkpoints for {path}: {str(e)}")
+    return f
+
+
+def get_sidecar(path: str, cancel_event: Optional[threading.Event] = None,
+                build: bool = True) -> Optional[ArchiveSidecar]:
+    """
+    获取压缩日志的旁路索引（依次查找内存、磁盘，都没有时建立并保存）
+    
+    Args:
+        path: 压缩日志文件路径
+        cancel_event: 取消事件（建立索引需要解压整个文件）
+        build: 内存和磁盘中都没有时是否建立
+        
+    Returns:
+        旁路索引；没有建立或建立被取消时返回 None
+    """
+    st = os.stat(path)
+    identity = (st.st_size, st.st_mtime_ns)
+    with _sidecar_lock:
+        cached = _sidecars.get(path)
+    if cached is not None and cached[0] == identity:
+        return cached[1]
+    
+    sidecar_file = _sidecar_path(path, identity)
+    sidecar = None
+    try:
+        data = json.loads(sidecar_file.read_text(encoding="utf-8"))
+        # 安装或卸载 indexed_gzip 后重建
+        if data.get("version") == SIDECAR_VERSION and data.get("checkpointed", False) == uses_checkpoints(path):
+            sidecar = ArchiveSidecar(data)
+    except (OSError, ValueError):
+        pass
+    if sidecar is None:
+        if not build:
+            return None
+        sidecar = ArchiveSidecar.build(path, cancel_event)
+        if sidecar is None:
+            return None
+        try:
+            sidecar_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = sidecar_file.with_suffix(".tmp")
+            tmp_file.write_text(json.dumps(sidecar.data, separators=(",", ":")), encoding="utf-8")
+            os.replace(tmp_file, sidecar_file)
+        except OSError as e:
+            logger.debug(f"Failed to save sidecar index for {path}: {str(e)}")
+        logger.info(f"Built sidecar index for {path}: {len(sidecar.segments)} segments")
+    with _sidecar_lock:
+        _sidecars[path] = (identity, sidecar)
+    return sidecar
+
+
+def iter_archive_window(
+    path: str,
+    start_ts: Optional[float] = None,
+    end_ts: Optional[float] = None,
+    cancel_event: Optional[threading.Event] = None,
+) -> Iterator[Tuple[int, str]]:
+    """
+    逐行读取压缩日志中可能位于时间窗口内的行
+    
+    只解压时间范围和窗口重叠的段；时间有序的文件遇到晚于 end_ts 的行后停止。
+    不带时间戳的行（异常堆栈等）沿用前面最近的时间戳（段开头的这类行沿用前一段的最后一个时间戳），
+    时间在窗口外的行不返回。返回的行仍需调用方按查询过滤。
+    
+    Yields:
+        (行号, 行内容)
+    """
+    if start_ts is None and end_ts is None:
+        yield from iter_compressed_lines(path)
+        return
+    sidecar = get_sidecar(path, cancel_event)
+    if sidecar is None:
+        return
+    kind = compression_of(path)
+    carried = None
+    with (_open_checkpointed(path) if sidecar.checkpointed else open(path, "rb")) as f:
+        for offset, length, first_line, min_ts, max_ts, last_ts in sidecar.segments:
+            # 开头不带时间戳的行沿用 carried，段的时间范围按包含 carried 计算
+            low = min_ts if carried is None else carried if min_ts is None else min(carried, min_ts)
+            high = carried if max_ts is None else max_ts
+            skip = low is not None and ((start_ts is not None and high < start_ts)
+                                        or (end_ts is not None and low > end_ts))
+            if skip:
+                carried = last_ts if last_ts is not None else carried
+                continue
+            if sidecar.checkpointed:
+                # 从 offset 之前最近的检查点开始解压
+                f.seek(offset)
+                chunks = iter([f.read(length)])
+            else:
+                chunks = (output for output, _ in _iter_members(f, kind, offset, offset + length))
+            for line_no, line in enumerate(_iter_lines(chunks), first_line):
+                text = line.decode("utf-8", errors="ignore")
+                ts = line_timestamp(text)
+                if ts is None:
+                    ts = carried
+                else:
+                    carried = ts
+                if ts is not None:
+                    if end_ts is not None and ts > end_ts:
+                        if sidecar.sorted:
+                            return
+                        continue
+                    if start_ts is not None and ts < start_ts:
+                        continue
+                yield line_no, text
+
+
+def warm_sidecars(paths: Iterable[str], cancel_event: Optional[threading.Event] = None) -> int:
+    """
+    为压缩日志预先建立旁路索引（后台索引线程调用）
+    
+    Returns:
+        处理的文件数
+    """
+    count = 0
+    for path in paths:
+        if cancel_event is not None and cancel_event.is_set():
+            break
+        if compression_of(path) is None:
+            continue
+        try:
+            get_sidecar(path, cancel_event)
+            count += 1
+        except Exception as e:
+            logger.debug(f"Failed to build sidecar index for {path}: {str(e)}")
+    return count
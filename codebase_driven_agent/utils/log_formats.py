@@ -0,0 +1,548 @@
+"""日志格式注册表和结构化解析
+
+FileLogQuery 原先对每一条命中的行临时编译两个正则，只取时间戳和级别，取不到时用当前时间和
+INFO 代替，返回的字段并不可信。这里按格式解析日志行，返回带类型的字段
+（timestamp、level、logger、trace_id、message），取不到的字段为 None：
+- 内置格式：JSON lines、logfmt、Java（logback/log4j/Spring Boot）、Python logging、nginx
+  （access/error），以及兜底的通用格式（任意位置的时间戳和级别）
+- 用户自定义格式：LOG_FORMAT_PATTERNS 中的 grok 风格模式，如
+  %{TIMESTAMP_ISO8601:timestamp} %{LOGLEVEL:level} %{GREEDYDATA:message}
+- 每个文件取开头的样本行自动识别格式（LOG_FORMAT 可以指定固定格式）
+- 正则在注册时编译一次；批量解析时把多行拼成一段文本，用多行模式的正则一次扫描，
+  不再逐行调用 Python 代码
+"""
+import json
+import os
+import re
+import threading
+from datetime import datetime
+from itertools import islice
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from codebase_driven_agent.config import settings
+from codebase_driven_agent.utils.logger import setup_logger
+
+logger = setup_logger("codebase_driven_agent.utils.log_formats")
+
+# 识别格式时读取的样本
+SAMPLE_BYTES = 64 * 1024
+SAMPLE_LINES = 100
+
+# 样本中至少有这个比例的行能被解析才认为是该格式（Java 日志中常有大量堆栈行）
+MIN_DETECT_SCORE = 0.2
+
+_ISO_TIMESTAMP = r'\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(?:[.,]\d{1,9})?(?:Z|[+-]\d{2}:?\d{2})?'
+_LEVEL = r'(?i:TRACE|DEBUG|INFO|NOTICE|WARNING|WARN|ERROR|CRITICAL|FATAL|SEVERE)'
+
+# 级别的统一写法
+_LEVEL_ALIASES = {"WARNING": "WARN", "ERR": "ERROR", "CRIT": "CRITICAL", "EMERG": "FATAL", "ALERT": "FATAL"}
+
+# 非结构化日志中的 trace id（如 traceId=abc、trace_id: abc、[TraceID abc]）
+_TRACE_ID_PATTERN = re.compile(r'(?i)\btrace[_-]?id[=:\s]+\[?([\w-]{6,})')
+
+# fromisoformat 之外支持的时间格式
+_TIMESTAMP_FORMATS = ("%d/%b/%Y:%H:%M:%S %z", "%Y/%m/%d %H:%M:%S", "%d/%b/%Y:%H:%M:%S")
+
+# 字符串形式的 Unix 时间（秒或毫秒，如 logfmt 中的 ts=1704103200.123）
+_EPOCH_PATTERN = re.compile(r'\d{9,13}(?:\.\d+)?')
+
+
+class LogRecord(NamedTuple):
+    """解析后的日志行，取不到的字段为 None"""
+    timestamp: Optional[datetime]
+    level: Optional[str]
+    logger: Optional[str]
+    trace_id: Optional[str]
+    message: str
+
+
+def parse_log_timestamp(value: Any) -> Optional[datetime]:
+    """
+    解析日志中的时间
+    
+    Args:
+        value: ISO 8601 字符串、nginx 等格式的字符串，或 Unix 时间（秒或毫秒）
+        
+    Returns:
+        时间（带时区的时间保留时区），无法解析时返回 None
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        seconds = value / 1000 if value > 1e11 else value
+        try:
+            return datetime.fromtimestamp(seconds)
+        except (OverflowError, OSError, ValueError):
+            return None
+    if not isinstance(value, str) or not value:
+        return None
+    if _EPOCH_PATTERN.fullmatch(value):
+        return parse_log_timestamp(float(value))
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    for fmt in _TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def normalize_level(value: Any) -> Optional[str]:
+    """统一级别的写法（大写，WARNING -> WARN）"""
+    if not value or not isinstance(value, str):
+        return None
+    level = value.strip().upper()
+    return _LEVEL_ALIASES.get(level, level) or None
+
+
+class LogFormat:
+    """日志格式基类"""
+    
+    # 格式名称（LOG_FORMAT 和 /logs 结果中使用）
+    name = "base"
+    
+    # 时间戳是否为行首的 ISO 8601 时间（日志索引和时间定位只识别这种时间戳）
+    iso_timestamps = True
+    
+    def parse(self, line: str) -> Optional[LogRecord]:
+        """解析一行，不属于该格式时返回 None"""
+        return self.parse_many([line])[0]
+    
+    def parse_many(self, lines: Sequence[str]) -> List[Optional[LogRecord]]:
+        """批量解析多行"""
+        raise NotImplementedError
+    
+    def score(self, sample: Sequence[str]) -> float:
+        """样本中能被解析的行的比例"""
+        if not sample:
+            return 0.0
+        return sum(1 for record in self.parse_many(sample) if record is not None) / len(sample)
+    
+    def timestamp_of(self, line: str) -> Optional[float]:
+        """行的时间戳（Unix 时间），没有时返回 None"""
+        record = self.parse(line)
+        return record.timestamp.timestamp() if record and record.timestamp else None
+    
+    def _record(self, fields: Dict[str, Any], line: str) -> LogRecord:
+        """由解析出的字段构造 LogRecord"""
+        message = fields.get("message")
+        trace_id = fields.get("trace_id")
+        if trace_id is None and ("race" in line or "RACE" in line):
+            match = _TRACE_ID_PATTERN.search(line)
+            trace_id = match.group(1) if match else None
+        return LogRecord(
+            timestamp=parse_log_timestamp(fields.get("timestamp")),
+            level=normalize_level(fields.get("level")),
+            logger=fields.get("logger") or None,
+            trace_id=str(trace_id) if trace_id is not None else None,
+            message=message if isinstance(message, str) and message else line,
+        )
+
+
+class RegexFormat(LogFormat):
+    """由一个或多个正则描述的格式（依次尝试，命名分组即字段）"""
+    
+    def __init__(self, name: str, patterns: Sequence[str], iso_timestamps: bool = True,
+                 derive: Optional[Any] = None):
+        """
+        Args:
+            name: 格式名称
+            patterns: 匹配整行的正则（不需要 ^ 和 $），分组名 timestamp、level、logger、trace_id、message
+                      对应 LogRecord 的字段
+            iso_timestamps: 时间戳是否为 ISO 8601 格式
+            derive: 可选的函数，根据分组补充字段（如根据 HTTP 状态码推断级别）
+        """
+        self.name = name
+        self.iso_timestamps = iso_timestamps
+        self._derive = derive
+        self._line_patterns = [re.compile(f"^(?:{pattern})$") for pattern in patterns]
+        # 多行模式：一次扫描拼接后的整段文本
+        self._chunk_patterns = [re.compile(f"^(?:{pattern})$", re.MULTILINE) for pattern in patterns]
+    
+    def _fields(self, match: "re.Match") -> Dict[str, Any]:
+        fields = {key: value for key, value in match.groupdict().items() if value is not None}
+        if self._derive is not None:
+            self._derive(fields)
+        return fields
+    
+    def parse_many(self, lines: Sequence[str]) -> List[Optional[LogRecord]]:
+        cleaned = [line.rstrip("\r\n") for line in lines]
+        records: List[Optional[LogRecord]] = [None] * len(cleaned)
+        pending = [i for i, line in enumerate(cleaned) if line.strip()]
+        for chunk_pattern, line_pattern in zip(self._chunk_patterns, self._line_patterns):
+            if not pending:
+                break
+            starts: Dict[int, int] = {}
+            pos = 0
+            for i in pending:
+                starts[pos] = i
+                pos += len(cleaned[i]) + 1
+            text = "\n".join(cleaned[i] for i in pending)
+            for match in chunk_pattern.finditer(text):
+                i = starts.get(match.start())
+                if i is None:
+                    continue
+                if match.end() - match.start() != len(cleaned[i]):
+                    # 匹配跨越了多行（模式中的 \s 等可以匹配换行），改为单独匹配这一行
+                    match = line_pattern.match(cleaned[i])
+                    if match is None:
+                        continue
+                records[i] = self._record(self._fields(match), cleaned[i])
+            pending = [i for i in pending if records[i] is None]
+        return records
+
+
+class JsonLinesFormat(LogFormat):
+    """每行一个 JSON 对象（logstash、structlog、zap、bunyan 等）"""
+    
+    name = "json"
+    iso_timestamps = False
+    
+    _KEYS = {
+        "timestamp": ("timestamp", "@timestamp", "time", "ts", "asctime", "datetime", "date"),
+        "level": ("level", "levelname", "severity", "lvl", "log.level", "loglevel"),
+        "logger": ("logger", "logger_name", "loggerName", "name", "log.logger", "caller"),
+        "trace_id": ("trace_id", "traceId", "traceID", "trace.id", "dd.trace_id", "trace"),
+        "message": ("message", "msg", "log", "text"),
+    }
+    
+    def _from_object(self, obj: Any, line: str) -> Optional[LogRecord]:
+        if not isinstance(obj, dict):
+            return None
+        fields = {}
+        for field, keys in self._KEYS.items():
+            for key in keys:
+                value = obj.get(key)
+                if value is None and "." in key:
+                    # 嵌套字段，如 {"log": {"level": "error"}}
+                    outer, inner = key.split(".", 1)
+                    value = obj.get(outer, {}).get(inner) if isinstance(obj.get(outer), dict) else None
+                if value is not None:
+                    fields[field] = value
+                    break
+        if fields.get("level") is not None and not isinstance(fields["level"], str):
+            # bunyan/pino 的数字级别
+            fields["level"] = {10: "TRACE", 20: "DEBUG", 30: "INFO", 40: "WARN", 50: "ERROR", 60: "FATAL"}.get(
+                fields["level"])
+        if fields.get("logger") is not None and not isinstance(fields["logger"], str):
+            fields["logger"] = str(fields["logger"])
+        return self._record(fields, line)
+    
+    def parse_many(self, lines: Sequence[str]) -> List[Optional[LogRecord]]:
+        cleaned = [line.strip() for line in lines]
+        candidates = [i for i, line in enumerate(cleaned) if line.startswith("{") and line.endswith("}")]
+        records: List[Optional[LogRecord]] = [None] * len(cleaned)
+        if not candidates:
+            return records
+        try:
+            # 整段一次解析；有无法解析的行时逐行解析
+            objects = json.loads("[" + ",".join(cleaned[i] for i in candidates) + "]")
+        except ValueError:
+            objects = []
+            for i in candidates:
+                try:
+                    objects.append(json.loads(cleaned[i]))
+                except ValueError:
+                    objects.append(None)
+        for i, obj in zip(candidates, objects):
+            records[i] = self._from_object(obj, cleaned[i])
+        return records
+
+
+class LogfmtFormat(LogFormat):
+    """logfmt（key=value 对，如 time=... level=error msg="..."）"""
+    
+    name = "logfmt"
+    iso_timestamps = False
+    
+    _PAIR_PATTERN = re.compile(r'([\w.\-]+)=("(?:[^"\\]|\\.)*"|\S*)')
+    _KEYS = {
+        "timestamp": ("time", "ts", "timestamp", "t", "at"),
+        "level": ("level", "lvl", "severity"),
+        "logger": ("logger", "caller", "component", "module", "source"),
+        "trace_id": ("trace_id", "traceID", "traceId", "trace"),
+        "message": ("msg", "message"),
+    }
+    
+    def parse_many(self, lines: Sequence[str]) -> List[Optional[LogRecord]]:
+        records: List[Optional[LogRecord]] = []
+        for line in lines:
+            line = line.strip()
+            if not line or "=" not in line or not self._PAIR_PATTERN.match(line):
+                records.append(None)
+                continue
+            pairs = {}
+            for key, value in self._PAIR_PATTERN.findall(line):
+                if value.startswith('"') and len(value) >= 2:
+                    value = value[1:-1].replace('\\"', '"')
+                pairs[key] = value
+            fields = {}
+            for field, keys in self._KEYS.items():
+                value = next((pairs[key] for key in keys if pairs.get(key)), None)
+                if value is not None:
+                    fields[field] = value
+            # 至少有两个键值对，且包含时间、级别或消息之一
+            if len(pairs) < 2 or not ({"timestamp", "level", "message"} & fields.keys()):
+                records.append(None)
+                continue
+            records.append(self._record(fields, line))
+        return records
+
+
+class GenericFormat(LogFormat):
+    """兜底格式：行中任意位置的时间戳和级别（无法识别格式时使用）"""
+    
+    name = "generic"
+    
+    _TIMESTAMP_PATTERN = re.compile(_ISO_TIMESTAMP)
+    _LEVEL_PATTERN = re.compile(rf'\b({_LEVEL})\b')
+    
+    def parse_many(self, lines: Sequence[str]) -> List[Optional[LogRecord]]:
+        records: List[Optional[LogRecord]] = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                records.append(None)
+                continue
+            timestamp = self._TIMESTAMP_PATTERN.search(line)
+            level = self._LEVEL_PATTERN.search(line)
+            records.append(self._record({
+                "timestamp": timestamp.group(0) if timestamp else None,
+                "level": level.group(1) if level else None,
+            }, line))
+        return records
+    
+    def score(self, sample: Sequence[str]) -> float:
+        # 通用格式不参与自动识别
+        return 0.0
+
+
+def _nginx_level(fields: Dict[str, Any]) -> None:
+    """nginx access 日志按 HTTP 状态码推断级别"""
+    status = fields.get("status")
+    if status and "level" not in fields:
+        fields["level"] = "ERROR" if status.startswith("5") else "WARN" if status.startswith("4") else "INFO"
+
+
+def builtin_formats() -> List[LogFormat]:
+    """内置格式（按自动识别的优先级排列）"""
+    ts = f"(?P<timestamp>{_ISO_TIMESTAMP})"
+    level = f"(?P<level>{_LEVEL})"
+    return [
+        JsonLinesFormat(),
+        LogfmtFormat(),
+        RegexFormat("nginx", [
+            # access 日志（combined/main），末尾可以有 $request_id 等扩展字段
+            r'(?P<client>\S+) \S+ \S+ \[(?P<timestamp>[^\]\n]+)\] "(?P<request>[^"\n]*)" (?P<status>\d{3}) \S+'
+            r'(?: "[^"\n]*" "[^"\n]*")?(?: (?P<trace_id>[0-9a-f]{16,}))?.*',
+            # error 日志
+            r'(?P<timestamp>\d{4}/\d{2}/\d{2} \d{2}:\d{2}:\d{2}) \[(?P<level>\w+)\] \d+#\d+: (?P<message>.*)',
+        ], iso_timestamps=False, derive=_nginx_level),
+        RegexFormat("java", [
+            # logback：%d [%thread] %-5level %logger - %msg
+            rf'{ts}[ \t]+\[(?P<thread>[^\]\n]*)\][ \t]+{level}[ \t]+(?P<logger>[\w.$]+)[ \t]+-[ \t](?P<message>.*)',
+            # log4j：%d %-5p [%t] %c{1}:%L - %m
+            rf'{ts}[ \t]+{level}[ \t]+\[(?P<thread>[^\]\n]*)\][ \t]+(?P<logger>[\w.$]+)(?::\d+)?[ \t]*[-:][ \t](?P<message>.*)',
+            # Spring Boot：%d %5p PID --- [thread] logger : msg
+            rf'{ts}[ \t]+{level}[ \t]+\d+[ \t]+---[ \t]+\[[ \t]*(?P<thread>[^\]\n]*)\][ \t]+(?P<logger>[\w.$\[\]/-]+)[ \t]*:[ \t](?P<message>.*)',
+        ]),
+        RegexFormat("python", [
+            # %(asctime)s - %(name)s - %(levelname)s - %(message)s
+            rf'{ts}[ \t]+-[ \t]+(?P<logger>\S+)[ \t]+-[ \t]+{level}[ \t]+-[ \t](?P<message>.*)',
+            # %(asctime)s [%(levelname)s] %(name)s: %(message)s
+            rf'{ts}[ \t]+\[{level}\][ \t]+(?P<logger>[\w.]+):[ \t](?P<message>.*)',
+            # %(asctime)s %(levelname)s %(message)s（级别可以带方括号）
+            rf'{ts}[ \t]+\[?{level}\]?:?[ \t]+(?P<message>.*)',
+            # basicConfig 默认格式：%(levelname)s:%(name)s:%(message)s
+            rf'{level}:(?P<logger>[\w.]+):(?P<message>.*)',
+        ]),
+    ]
+
+
+# ==================== grok 风格的自定义格式 ====================
+
+GROK_PATTERNS: Dict[str, str] = {
+    "TIMESTAMP_ISO8601": _ISO_TIMESTAMP,
+    "HTTPDATE": r'\d{2}/\w{3}/\d{4}:\d{2}:\d{2}:\d{2} [+-]\d{4}',
+    "LOGLEVEL": _LEVEL,
+    "WORD": r'\w+',
+    "NOTSPACE": r'\S+',
+    "SPACE": r'[ \t]*',
+    "DATA": r'.*?',
+    "GREEDYDATA": r'.*',
+    "INT": r'[+-]?\d+',
+    "POSINT": r'\d+',
+    "NUMBER": r'[+-]?\d+(?:\.\d+)?',
+    "IP": r'(?:\d{1,3}\.){3}\d{1,3}|[0-9a-fA-F:]+:[0-9a-fA-F:]*',
+    "UUID": r'[0-9a-fA-F]{8}-(?:[0-9a-fA-F]{4}-){3}[0-9a-fA-F]{12}',
+    "JAVACLASS": r'(?:[a-zA-Z$_][\w$]*\.)*[a-zA-Z$_][\w$]*',
+    "QUOTEDSTRING": r'"(?:[^"\\\n]|\\.)*"',
+}
+
+_GROK_REFERENCE = re.compile(r'%\{(\w+)(?::(\w+))?\}')
+
+
+def compile_grok(pattern: str) -> str:
+    """
+    把 grok 风格的模式转换为正则
+    
+    Args:
+        pattern: 如 "%{TIMESTAMP_ISO8601:timestamp} %{LOGLEVEL:level} %{GREEDYDATA:message}"，
+                 模式之外的部分按正则处理
+                 
+    Raises:
+        ValueError: 引用了未知的模式
+    """
+    def replace(match: "re.Match") -> str:
+        name, field = match.group(1), match.group(2)
+        if name not in GROK_PATTERNS:
+            raise ValueError(f"Unknown grok pattern: {name}")
+        body = GROK_PATTERNS[name]
+        return f"(?P<{field}>{body})" if field else f"(?:{body})"
+    
+    return _GROK_REFERENCE.sub(replace, pattern)
+
+
+class LogFormatRegistry:
+    """日志格式注册表（线程安全）"""
+    
+    def __init__(self, formats: Optional[Iterable[LogFormat]] = None):
+        self._formats: Dict[str, LogFormat] = {}
+        self._lock = threading.Lock()
+        self.generic = GenericFormat()
+        for log_format in formats or ():
+            self.register(log_format)
+    
+    def register(self, log_format: LogFormat, first: bool = False) -> None:
+        """
+        注册格式（同名格式被替换）
+        
+        Args:
+            log_format: 格式
+            first: 是否排在最前面（自动识别时得分相同的格式靠前者优先）
+        """
+        with self._lock:
+            self._formats.pop(log_format.name, None)
+            if first:
+                self._formats = {log_format.name: log_format, **self._formats}
+            else:
+                self._formats[log_format.name] = log_format
+    
+    def register_grok(self, name: str, pattern: str) -> None:
+        """注册 grok 风格的自定义格式（优先于内置格式）"""
+        self.register(RegexFormat(name, [compile_grok(pattern)], iso_timestamps=False), first=True)
+    
+    def get(self, name: str) -> LogFormat:
+        """按名称获取格式，不存在时返回通用格式"""
+        with self._lock:
+            return self._formats.get(name, self.generic)
+    
+    def names(self) -> List[str]:
+        with self._lock:
+            return list(self._formats) + [self.generic.name]
+    
+    def detect(self, sample: Sequence[str]) -> LogFormat:
+        """
+        根据样本行识别格式
+        
+        Args:
+            sample: 样本行（空行被忽略）
+            
+        Returns:
+            得分最高的格式；没有格式达到 MIN_DETECT_SCORE 时返回通用格式
+        """
+        sample = [line for line in sample if line.strip()]
+        with self._lock:
+            formats = list(self._formats.values())
+        best, best_score = self.generic, MIN_DETECT_SCORE
+        for log_format in formats:
+            score = log_format.score(sample)
+            if score > best_score:
+                best, best_score = log_format, score
+            if best_score >= 1.0:
+                break
+        return best
+
+
+_registry: Optional[LogFormatRegistry] = None
+_registry_lock = threading.Lock()
+
+# 文件 -> ((设备号, inode), 格式)
+_file_formats: Dict[str, Tuple[Tuple[int, int], LogFormat]] = {}
+_file_formats_lock = threading.Lock()
+
+
+def get_format_registry() -> LogFormatRegistry:
+    """获取日志格式注册表（单例，包含内置格式和 LOG_FORMAT_PATTERNS 中的自定义格式）"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            registry = LogFormatRegistry(builtin_formats())
+            for name, pattern in (settings.log_format_patterns or {}).items():
+                try:
+                    registry.register_grok(name, pattern)
+                except (ValueError, re.error) as e:
+                    logger.warning(f"Ignoring invalid log format pattern {name!r}: {str(e)}")
+            _registry = registry
+        return _registry
+
+
+def _read_sample(path: str) -> List[str]:
+    """读取文件开头的样本行（压缩文件流式解压）"""
+    from codebase_driven_agent.utils.log_archive import compression_of, iter_compressed_lines
+    
+    if compression_of(path) is not None:
+        return [line for _, line in islice(iter_compressed_lines(path), SAMPLE_LINES)]
+    with open(path, "rb") as f:
+        data = f.read(SAMPLE_BYTES)
+    lines = data.decode("utf-8", errors="ignore").split("\n")
+    if len(data) == SAMPLE_BYTES and len(lines) > 1:
+        lines.pop()  # 最后一行可能不完整
+    return lines[:SAMPLE_LINES]
+
+
+def detect_file_format(path: str) -> LogFormat:
+    """
+    识别日志文件的格式（结果按文件缓存）
+    
+    LOG_FORMAT 不是 auto 时直接返回指定的格式。
+    """
+    registry = get_format_registry()
+    if settings.log_format and settings.log_format != "auto":
+        return registry.get(settings.log_format)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return registry.generic
+    identity = (st.st_dev, st.st_ino)
+    with _file_formats_lock:
+        cached = _file_formats.get(path)
+    if cached is not None and cached[0] == identity:
+        return cached[1]
+    try:
+        log_format = registry.detect(_read_sample(path))
+    except Exception as e:
+        logger.debug(f"Failed to detect log format of {path}: {str(e)}")
+        log_format = registry.generic
+    logger.debug(f"Detected log format of {path}: {log_format.name}")
+    with _file_formats_lock:
+        _file_formats[path] = (identity, log_format)
+    return log_format
+
+
+def parse_lines(log_format: LogFormat, lines: Sequence[str]) -> List[LogRecord]:
+    """
+    批量解析同一个文件中的行，不符合格式的行（如异常堆栈）用通用格式解析
+    
+    Returns:
+        与 lines 一一对应的解析结果
+    """
+    registry = get_format_registry()
+    records = log_format.parse_many(lines) if log_format is not registry.generic else [None] * len(lines)
+    missing = [i for i, record in enumerate(records) if record is None]
+    if missing:
+        for i, record in zip(missing, registry.generic.parse_many([lines[i] for i in missing])):
+            records[i] = record or LogRecord(None, None, None, None, lines[i].strip())
+    return records
+
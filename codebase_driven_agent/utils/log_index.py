@@ -0,0 +1,703 @@
+"""本地日志的倒排索引和时间范围索引（持久化）
+
+FileLogQuery 原先对每个查询逐行扫描日志文件，日志目录很大时一次查询需要很长时间。
+这里把日志文件按行边界切分成块（约 BLOCK_BYTES 字节），持久化到 SQLite 中：
+- 倒排索引：词 -> 包含该词的块（文件 + 字节偏移）
+- 时间范围索引：每个块和每个文件中出现的最早、最晚时间戳
+
+查询时先用查询中的词求候选块的交集，再按时间窗口排除不重叠的块，只读取剩下的块逐行确认，
+结果和逐行扫描完全一致（索引只用来缩小范围）。
+
+索引随文件增长增量更新：只处理上次索引位置之后新增的完整行。文件按 (设备号, inode) 识别，
+轮转改名的文件沿用已有索引；被截断或替换的文件（大小变小或文件头变化）重新索引。
+尚未索引的文件尾部在查询时直接扫描，新写入的日志也能立即查到。
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from codebase_driven_agent.config import settings
+from codebase_driven_agent.utils.logger import setup_logger
+
+logger = setup_logger("codebase_driven_agent.utils.log_index")
+
+# 每个索引块的目标大小（字节），块总是在行边界结束
+BLOCK_BYTES = 64 * 1024
+
+# 用于识别文件是否被替换的文件头长度
+HEAD_BYTES = 256
+
+# 索引的词：小写字母、数字和下划线组成，长度 2-64
+_TOKEN_PATTERN = re.compile(rb'[a-z0-9_]{2,}')
+_QUERY_TOKEN_PATTERN = re.compile(r'[a-z0-9_]+')
+MAX_TOKEN_LENGTH = 64
+
+# 更长的词（哈希、base64 等）不建立索引，包含这种词的块记录这个标记词：
+# 查询中的词可能是长词的一部分，这些块总是作为候选（标记词不会和任何查询的词匹配）
+LONG_TOKEN_MARKER = b"~long~"
+
+# 日志行中的时间戳（与 FileLogQuery._parse_log_line 一致）
+_TIMESTAMP_PATTERN = re.compile(rb'(\d{4}-\d{2}-\d{2})[ T](\d{2}:\d{2}:\d{2})')
+_LINE_TIMESTAMP_PATTERN = re.compile(r'(\d{4}-\d{2}-\d{2})[ T](\d{2}:\d{2}:\d{2})')
+
+# 一次提交的块数（提交后查询即可使用这些块）
+_COMMIT_BLOCKS = 64
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE,
+    dev INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    head TEXT NOT NULL,
+    indexed_size INTEGER NOT NULL,
+    indexed_lines INTEGER NOT NULL,
+    min_ts REAL,
+    max_ts REAL
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_id INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    first_line INTEGER NOT NULL,
+    min_ts REAL,
+    max_ts REAL,
+    last_ts REAL
+);
+CREATE TABLE IF NOT EXISTS tokens (
+    id INTEGER PRIMARY KEY,
+    token TEXT UNIQUE NOT NULL,
+    rev TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    token_id INTEGER NOT NULL,
+    block_id INTEGER NOT NULL,
+    PRIMARY KEY (token_id, block_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_files_inode ON files(dev, inode);
+CREATE INDEX IF NOT EXISTS idx_blocks_file ON blocks(file_id, offset);
+CREATE INDEX IF NOT EXISTS idx_tokens_rev ON tokens(rev);
+CREATE INDEX IF NOT EXISTS idx_postings_block ON postings(block_id);
+"""
+
+
+@lru_cache(maxsize=4096)
+def parse_timestamp(date_part: str, time_part: str) -> Optional[float]:
+    """把日志中的日期和时间解析为时间戳（按本地时间；相邻的行时间相同，缓存解析结果）"""
+    try:
+        return datetime.strptime(f"{date_part} {time_part}", "%Y-%m-%d %H:%M:%S").timestamp()
+    except ValueError:
+        return None
+
+
+def line_timestamp(line: str) -> Optional[float]:
+    """日志行中的时间戳，没有时返回 None"""
+    match = _LINE_TIMESTAMP_PATTERN.search(line)
+    return parse_timestamp(match.group(1), match.group(2)) if match else None
+
+
+def block_time_range(block: bytes) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+    """
+    块中出现的最早、最晚和最后一个时间戳（同一格式的时间字符串按字典序比较即可）
+    
+    最后一个时间戳由后面块开头不带时间戳的行（异常堆栈等）沿用。
+    """
+    stamps = [date + b" " + clock for date, clock in _TIMESTAMP_PATTERN.findall(block)]
+    if not stamps:
+        return None, None, None
+    return tuple(parse_timestamp(*stamp.decode().split(" ")) for stamp in (min(stamps), max(stamps), stamps[-1]))
+
+
+def _read_head(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.md5(f.read(HEAD_BYTES)).hexdigest()
+
+
+def default_index_dir() -> Path:
+    """日志索引目录（默认与符号索引放在同一个目录）"""
+    return Path(settings.log_index_dir or settings.symbol_index_dir or
+                Path.home() / ".cache" / "codebase_driven_agent" / "index")
+
+
+def _default_index_path(base_path: Path) -> Path:
+    """根据日志目录生成索引文件路径"""
+    base_key = hashlib.sha1(str(base_path.resolve()).encode("utf-8")).hexdigest()[:16]
+    return default_index_dir() / f"logs_{base_key}.db"
+
+
+class LogIndex:
+    """日志目录的持久化索引
+    
+    写入（增量建立索引）和查询使用不同的数据库连接，查询不会被正在进行的索引阻塞。
+    """
+    
+    SCHEMA_VERSION = "4"
+    
+    def __init__(self, base_path: str, index_path: Optional[Path] = None):
+        """
+        Args:
+            base_path: 日志目录
+            index_path: 索引文件路径，默认根据日志目录生成
+        """
+        self.base_path = Path(base_path)
+        self.index_path = Path(index_path) if index_path else _default_index_path(self.base_path)
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._writer: Optional[sqlite3.Connection] = None
+        self._reader: Optional[sqlite3.Connection] = None
+        self._token_ids: Dict[bytes, int] = {}
+        self._last_refresh: float = 0.0
+    
+    def _connect(self) -> sqlite3.Connection:
+        """创建数据库连接（第一次连接时初始化表结构）"""
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.index_path), check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+    
+    def _get_writer(self) -> sqlite3.Connection:
+        if self._writer is None:
+            conn = self._connect()
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            row = conn.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+            if row and row[0] != self.SCHEMA_VERSION:
+                logger.info(f"Log index schema changed ({row[0]} -> {self.SCHEMA_VERSION}), rebuilding")
+                for table in ("postings", "tokens", "blocks", "files"):
+                    conn.execute(f"DROP TABLE IF EXISTS {table}")
+            conn.executescript(_SCHEMA)
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('schema_version', ?)",
+                (self.SCHEMA_VERSION,),
+            )
+            conn.commit()
+            self._writer = conn
+        return self._writer
+    
+    def _get_reader(self) -> sqlite3.Connection:
+        if self._reader is None:
+            with self._write_lock:
+                self._get_writer()
+            self._reader = self._connect()
+        return self._reader
+    
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._write_lock, self._read_lock:
+            for conn in (self._writer, self._reader):
+                if conn is not None:
+                    conn.close()
+            self._writer = self._reader = None
+    
+    # ==================== 建立索引 ====================
+    
+    def iter_log_files(self, compressed: bool = False) -> Iterable[str]:
+        """
+        遍历日志目录中的日志文件（包括轮转后的文件）
+        
+        Args:
+            compressed: 为 True 时返回压缩的日志文件，否则返回未压缩的日志文件（只有后者建立索引）
+        """
+        from codebase_driven_agent.utils.log_archive import compression_of, is_log_file
+        
+        for root, dirs, files in os.walk(self.base_path):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            for name in files:
+                if is_log_file(name) and (compression_of(name) is not None) == compressed:
+                    yield os.path.join(root, name)
+    
+    def refresh(self, paths: Optional[Iterable[str]] = None,
+                cancel_event: Optional[threading.Event] = None) -> Dict[str, int]:
+        """
+        增量更新索引
+        
+        Args:
+            paths: 需要更新的日志文件；为 None 时更新整个日志目录，并删除已经不存在的文件
+            cancel_event: 取消事件，设置后中断（已经提交的块保留在索引中）
+            
+        Returns:
+            更新统计信息
+        """
+        full = paths is None
+        paths = sorted(self.iter_log_files()) if full else list(paths)
+        stats = {"files": 0, "blocks": 0, "bytes": 0, "reset": 0, "renamed": 0, "removed": 0}
+        with self._write_lock:
+            conn = self._get_writer()
+            for path in paths:
+                if cancel_event is not None and cancel_event.is_set():
+                    logger.warning("Log index refresh cancelled")
+                    break
+                try:
+                    self._refresh_file(conn, path, stats, cancel_event)
+                except OSError as e:
+                    logger.debug(f"Failed to index log file {path}: {str(e)}")
+                stats["files"] += 1
+            # 轮转后不再有路径的文件，以及（完整更新时）已经删除的文件
+            stale = [row[0] for row in conn.execute("SELECT id FROM files WHERE path IS NULL")]
+            if full:
+                stale += [file_id for file_id, path in conn.execute("SELECT id, path FROM files WHERE path IS NOT NULL")
+                          if not os.path.exists(path)]
+            for file_id in stale:
+                self._remove_file(conn, file_id)
+                stats["removed"] += 1
+            conn.commit()
+            self._last_refresh = time.time()
+        if stats["blocks"] or stats["removed"]:
+            logger.info(f"Log index updated for {self.base_path}: {stats}")
+        return stats
+    
+    def ensure_fresh(self, paths: Iterable[str], max_age: Optional[float] = None) -> None:
+        """
+        超过 max_age 未刷新时增量更新指定文件；其他线程正在建立索引时直接返回
+        
+        未索引的文件尾部在查询时直接扫描，所以跳过更新不影响结果的完整性。
+        """
+        if max_age is None:
+            max_age = settings.log_index_refresh_interval
+        if time.time() - self._last_refresh < max_age or self._write_lock.locked():
+            return
+        self.refresh(paths)
+    
+    def _refresh_file(self, conn: sqlite3.Connection, path: str, stats: Dict[str, int],
+                      cancel_event: Optional[threading.Event]) -> None:
+        st = os.stat(path)
+        row = conn.execute(
+            "SELECT id, dev, inode, head, indexed_size, indexed_lines FROM files WHERE path = ?", (path,)
+        ).fetchone()
+        if row is not None and (row[1], row[2]) != (st.st_dev, st.st_ino):
+            # 路径指向了新文件（原文件被轮转改名或删除），原记录等待按 inode 匹配新路径
+            conn.execute("UPDATE files SET path = NULL WHERE id = ?", (row[0],))
+            row = None
+        if row is None:
+            row = conn.execute(
+                "SELECT id, dev, inode, head, indexed_size, indexed_lines FROM files WHERE dev = ? AND inode = ?",
+                (st.st_dev, st.st_ino),
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE files SET path = NULL WHERE path = ? AND id != ?", (path, row[0]))
+                conn.execute("UPDATE files SET path = ? WHERE id = ?", (path, row[0]))
+                stats["renamed"] += 1
+        if row is None:
+            cursor = conn.execute(
+                "INSERT INTO files (path, dev, inode, head, indexed_size, indexed_lines) VALUES (?, ?, ?, '', 0, 0)",
+                (path, st.st_dev, st.st_ino),
+            )
+            row = (cursor.lastrowid, st.st_dev, st.st_ino, "", 0, 0)
+        
+        file_id, _, _, head, indexed_size, indexed_lines = row
+        if indexed_size > 0 and (st.st_size < indexed_size or _read_head(path) != head):
+            # 文件被截断或内容被替换，重新建立索引
+            self._clear_blocks(conn, file_id)
+            conn.execute(
+                "UPDATE files SET indexed_size = 0, indexed_lines = 0, min_ts = NULL, max_ts = NULL WHERE id = ?",
+                (file_id,),
+            )
+            indexed_size, indexed_lines = 0, 0
+            stats["reset"] += 1
+        if st.st_size > indexed_size:
+            self._index_tail(conn, file_id, path, indexed_size, indexed_lines, stats, cancel_event)
+    
+    def _index_tail(self, conn: sqlite3.Connection, file_id: int, path: str, offset: int, line_no: int,
+                    stats: Dict[str, int], cancel_event: Optional[threading.Event]) -> None:
+        """索引文件中 offset 之后的完整行"""
+        pending = 0
+        with open(path, "rb") as f:
+            if offset == 0:
+                conn.execute("UPDATE files SET head = ? WHERE id = ?",
+                             (hashlib.md5(f.read(HEAD_BYTES)).hexdigest(), file_id))
+            f.seek(offset)
+            buffer = b""
+            while cancel_event is None or not cancel_event.is_set():
+                chunk = f.read(BLOCK_BYTES)
+                if not chunk:
+                    break
+                buffer += chunk
+                end = buffer.rfind(b"\n")
+                if end < 0:
+                    continue
+                block, buffer = buffer[:end + 1], buffer[end + 1:]
+                self._add_block(conn, file_id, offset, block, line_no + 1)
+                offset += len(block)
+                line_no += block.count(b"\n")
+                stats["blocks"] += 1
+                stats["bytes"] += len(block)
+                pending += 1
+                if pending >= _COMMIT_BLOCKS:
+                    self._update_progress(conn, file_id, offset, line_no)
+                    conn.commit()
+                    pending = 0
+        self._update_progress(conn, file_id, offset, line_no)
+        conn.commit()
+    
+    @staticmethod
+    def _update_progress(conn: sqlite3.Connection, file_id: int, offset: int, line_no: int) -> None:
+        conn.execute(
+            "UPDATE files SET indexed_size = ?, indexed_lines = ?, "
+            "min_ts = (SELECT MIN(min_ts) FROM blocks WHERE file_id = ?), "
+            "max_ts = (SELECT MAX(max_ts) FROM blocks WHERE file_id = ?) WHERE id = ?",
+            (offset, line_no, file_id, file_id, file_id),
+        )
+    
+    def _add_block(self, conn: sqlite3.Connection, file_id: int, offset: int, block: bytes, first_line: int) -> None:
+        min_ts, max_ts, last_ts = block_time_range(block)
+        block_id = conn.execute(
+            "INSERT INTO blocks (file_id, offset, length, first_line, min_ts, max_ts, last_ts) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (file_id, offset, len(block), first_line, min_ts, max_ts, last_ts),
+        ).lastrowid
+        tokens = set(_TOKEN_PATTERN.findall(block.lower()))
+        long_tokens = {token for token in tokens if len(token) > MAX_TOKEN_LENGTH}
+        if long_tokens:
+            tokens = (tokens - long_tokens) | {LONG_TOKEN_MARKER}
+        conn.executemany(
+            "INSERT OR IGNORE INTO postings (token_id, block_id) VALUES (?, ?)",
+            [(self._token_id(conn, token), block_id) for token in tokens],
+        )
+    
+    def _token_id(self, conn: sqlite3.Connection, token: bytes) -> int:
+        token_id = self._token_ids.get(token)
+        if token_id is None:
+            text = token.decode("ascii")
+            row = conn.execute("SELECT id FROM tokens WHERE token = ?", (text,)).fetchone()
+            if row is None:
+                token_id = conn.execute("INSERT INTO tokens (token, rev) VALUES (?, ?)", (text, text[::-1])).lastrowid
+            else:
+                token_id = row[0]
+            if len(self._token_ids) >= 200000:
+                self._token_ids.clear()
+            self._token_ids[token] = token_id
+        return token_id
+    
+    @staticmethod
+    def _clear_blocks(conn: sqlite3.Connection, file_id: int) -> None:
+        conn.execute("DELETE FROM postings WHERE block_id IN (SELECT id FROM blocks WHERE file_id = ?)", (file_id,))
+        conn.execute("DELETE FROM blocks WHERE file_id = ?", (file_id,))
+    
+    def _remove_file(self, conn: sqlite3.Connection, file_id: int) -> None:
+        self._clear_blocks(conn, file_id)
+        conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+    
+    # ==================== 查询 ====================
+    
+    def _candidate_tokens(self, conn: sqlite3.Connection, query: str) -> Optional[List[Set[int]]]:
+        """
+        查询中每个词可能对应的索引词 ID
+        
+        查询是子串匹配，开头的词可能是日志中某个词的后缀，结尾的词可能是前缀，
+        只有一个词时可能出现在日志中某个词的中间；中间的词必须完全相同。
+        不要求完全相同的词还可能是没有建立索引的长词的一部分，候选中包含长词标记。
+        
+        Returns:
+            每个词对应的索引词 ID 集合；某个词在索引中不存在时返回 None（没有匹配）
+        """
+        query = query.lower()
+        candidates = []
+        marker = conn.execute("SELECT id FROM tokens WHERE token = ?", (LONG_TOKEN_MARKER.decode(),)).fetchone()
+        for match in _QUERY_TOKEN_PATTERN.finditer(query):
+            token = match.group(0)
+            if len(token) < 2 or len(token) > MAX_TOKEN_LENGTH:
+                continue
+            open_left, open_right = match.start() == 0, match.end() == len(query)
+            if open_left and open_right:
+                rows = conn.execute("SELECT id FROM tokens WHERE instr(token, ?) > 0", (token,))
+            elif open_right:
+                rows = conn.execute("SELECT id FROM tokens WHERE token >= ? AND token < ?", (token, token + "~"))
+            elif open_left:
+                rev = token[::-1]
+                rows = conn.execute("SELECT id FROM tokens WHERE rev >= ? AND rev < ?", (rev, rev + "~"))
+            else:
+                rows = conn.execute("SELECT id FROM tokens WHERE token = ?", (token,))
+            ids = {row[0] for row in rows}
+            if marker is not None and (open_left or open_right):
+                ids.add(marker[0])
+            if not ids:
+                return None
+            candidates.append(ids)
+        return candidates
+    
+    @staticmethod
+    def _blocks_with_tokens(conn: sqlite3.Connection, token_ids: Set[int]) -> Set[int]:
+        blocks: Set[int] = set()
+        token_ids = list(token_ids)
+        for start in range(0, len(token_ids), 500):
+            chunk = token_ids[start:start + 500]
+            blocks.update(row[0] for row in conn.execute(
+                f"SELECT block_id FROM postings WHERE token_id IN ({','.join('?' * len(chunk))})", chunk
+            ))
+        return blocks
+    
+    def plan(self, query: str) -> "SearchPlan":
+        """
+        根据倒排索引计算查询的候选块（同一个查询在多个文件中复用）
+        
+        Args:
+            query: 查询的子串，为空时匹配所有行
+        """
+        with self._read_lock:
+            conn = self._get_reader()
+            # 在同一个读事务中读取，后台索引线程的提交不会混入
+            conn.execute("BEGIN")
+            try:
+                max_block_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM blocks").fetchone()[0]
+                token_sets = self._candidate_tokens(conn, query)
+                if token_sets is None:
+                    return SearchPlan(query, set(), max_block_id)
+                allowed: Optional[Set[int]] = None
+                # 从候选最少的词开始求交集
+                for token_ids in sorted(token_sets, key=len):
+                    blocks = self._blocks_with_tokens(conn, token_ids)
+                    allowed = blocks if allowed is None else allowed & blocks
+                    if not allowed:
+                        break
+            finally:
+                conn.commit()
+        return SearchPlan(query, allowed, max_block_id)
+    
+    def iter_matches(
+        self,
+        path: str,
+        plan: "SearchPlan",
+        start_ts: Optional[float] = None,
+        end_ts: Optional[float] = None,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> Iterator[Tuple[int, str]]:
+        """
+        逐个返回文件中包含查询且时间在窗口内的行
+        
+        先读取索引中和查询、时间窗口都匹配的块，再直接扫描尚未索引的尾部。
+        不带时间戳的行沿用前面最近一条带时间戳的行的时间（块开头的这类行沿用前一个块的最后一个时间戳）。
+        
+        Args:
+            path: 日志文件
+            plan: plan() 的返回值
+            start_ts: 开始时间戳（包含）
+            end_ts: 结束时间戳（包含）
+            cancel_event: 取消事件
+            
+        Yields:
+            (行号, 行内容)
+        """
+        with self._read_lock:
+            conn = self._get_reader()
+            # 文件的索引进度和块在同一个读事务中读取：两次读取之间提交的块既不会被遗漏，
+            # 也不会在扫描未索引的尾部时重复
+            conn.execute("BEGIN")
+            try:
+                row = conn.execute(
+                    "SELECT id, indexed_size, indexed_lines, min_ts, max_ts FROM files WHERE path = ?", (path,)
+                ).fetchone()
+                blocks = []
+                carried = None
+                if row is not None and _overlaps(row[3], row[4], start_ts, end_ts):
+                    rows = conn.execute(
+                        "SELECT id, offset, length, first_line, min_ts, max_ts, last_ts FROM blocks "
+                        "WHERE file_id = ? AND offset < ? ORDER BY offset", (row[0], row[1])
+                    )
+                    for block_id, offset, length, first_line, min_ts, max_ts, last_ts in rows:
+                        # 开头不带时间戳的行沿用 carried，块的时间范围按包含 carried 计算
+                        low = min_ts if carried is None else carried if min_ts is None else min(carried, min_ts)
+                        high = carried if max_ts is None else max_ts
+                        if plan.may_contain(block_id) and _overlaps(low, high, start_ts, end_ts):
+                            blocks.append((offset, length, first_line, carried))
+                        if last_ts is not None:
+                            carried = last_ts
+                elif row is not None:
+                    carried = row[4]
+            finally:
+                conn.commit()
+        indexed_size, indexed_lines = (row[1], row[2]) if row is not None else (0, 0)
+        
+        matcher = _LineMatcher(plan.query, start_ts, end_ts)
+        with open(path, "rb") as f:
+            for offset, length, first_line, block_carried in blocks:
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                f.seek(offset)
+                yield from matcher.matches(f.read(length), first_line, block_carried)
+            # 尚未索引的尾部直接扫描
+            f.seek(indexed_size)
+            tail = f.read()
+            if tail:
+                yield from matcher.matches(tail, indexed_lines + 1, carried)
+    
+    def search(
+        self,
+        paths: List[str],
+        query: str,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        limit: int = 100,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> List[Tuple[str, int, str]]:
+        """
+        查询包含 query（不区分大小写）且时间在窗口内的日志行
+        
+        Args:
+            paths: 日志文件（按顺序返回结果）
+            query: 查询的子串，为空时匹配所有行
+            start_time: 开始时间（包含）
+            end_time: 结束时间（包含）
+            limit: 最多返回的行数
+            cancel_event: 取消事件
+            
+        Returns:
+            (文件路径, 行号, 行内容) 列表
+        """
+        start_ts = start_time.timestamp() if start_time else None
+        end_ts = end_time.timestamp() if end_time else None
+        plan = self.plan(query)
+        results: List[Tuple[str, int, str]] = []
+        for path in paths:
+            try:
+                for line_no, line in self.iter_matches(path, plan, start_ts, end_ts, cancel_event):
+                    results.append((path, line_no, line))
+                    if len(results) >= limit:
+                        return results
+            except OSError as e:
+                logger.debug(f"Failed to read log file {path}: {str(e)}")
+            if cancel_event is not None and cancel_event.is_set():
+                break
+        return results
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """索引统计信息"""
+        with self._read_lock:
+            conn = self._get_reader()
+            files, indexed = conn.execute("SELECT COUNT(*), COALESCE(SUM(indexed_size), 0) FROM files").fetchone()
+            blocks = conn.execute("SELECT COUNT(*) FROM blocks").fetchone()[0]
+            tokens = conn.execute("SELECT COUNT(*) FROM tokens").fetchone()[0]
+        return {
+            "index_path": str(self.index_path),
+            "files": files,
+            "indexed_bytes": indexed,
+            "blocks": blocks,
+            "tokens": tokens,
+            "last_refresh": self._last_refresh,
+        }
+
+
+def _overlaps(min_ts: Optional[float], max_ts: Optional[float],
+              start_ts: Optional[float], end_ts: Optional[float]) -> bool:
+    """时间范围是否和查询窗口重叠（没有时间戳的范围视为可能重叠）"""
+    if start_ts is not None and max_ts is not None and max_ts < start_ts:
+        return False
+    if end_ts is not None and min_ts is not None and min_ts > end_ts:
+        return False
+    return True
+
+
+class _LineMatcher:
+    """在读取的块中逐行确认查询和时间窗口"""
+    
+    def __init__(self, query: str, start_ts: Optional[float], end_ts: Optional[float]):
+        self.query = query.lower()
+        self.start_ts = start_ts
+        self.end_ts = end_ts
+    
+    def matches(self, data: bytes, first_line: int, carried: Optional[float] = None) -> Iterator[Tuple[int, str]]:
+        """
+        data 中匹配的行：(行号, 行内容)
+        
+        Args:
+            data: 由完整的行组成的数据
+            first_line: 第一行的行号
+            carried: data 之前最后一个时间戳，由开头不带时间戳的行沿用
+        """
+        text = data.decode("utf-8", errors="ignore")
+        if self.query and self.query not in text.lower():
+            return
+        lines = text.split("\n")
+        window = self.start_ts is not None or self.end_ts is not None
+        # 已经确定时间的最后一行及其时间（向前查找时间戳时不会越过这一行）
+        known_index, known_ts = -1, carried
+        for index, line in enumerate(lines):
+            if not line.strip() or self.query not in line.lower():
+                continue
+            if window:
+                ts = line_timestamp(line)
+                # 不带时间戳的行（例如异常堆栈）沿用前面最近的时间戳
+                previous = index - 1
+                while ts is None and previous > known_index:
+                    ts = line_timestamp(lines[previous])
+                    previous -= 1
+                if ts is None:
+                    ts = known_ts
+                known_index, known_ts = index, ts
+                if ts is not None and ((self.start_ts is not None and ts < self.start_ts)
+                                       or (self.end_ts is not None and ts > self.end_ts)):
+                    continue
+            yield first_line + index, line
+
+
+class SearchPlan(NamedTuple):
+    """查询计划"""
+    query: str
+    # 包含查询中所有词的块 ID，None 表示不限制（查询中没有可以索引的词）
+    allowed: Optional[Set[int]]
+    # 计算查询计划时最大的块 ID（块 ID 单调递增），之后新索引的块不在 allowed 中，需要读取确认
+    max_block_id: int = 0
+    
+    def may_contain(self, block_id: int) -> bool:
+        """块中是否可能有匹配的行"""
+        return self.allowed is None or block_id > self.max_block_id or block_id in self.allowed
+
+
+# 全局索引实例（日志目录 -> LogIndex）
+_log_indexes: Dict[str, LogIndex] = {}
+_log_index_lock = threading.Lock()
+
+
+def get_log_index(base_path: Optional[str] = None) -> LogIndex:
+    """
+    获取日志目录对应的索引实例（单例模式）
+    
+    Args:
+        base_path: 日志目录，默认读取 LOG_FILE_BASE_PATH
+    """
+    key = str(Path(base_path or settings.log_file_base_path or ".").resolve())
+    with _log_index_lock:
+        index = _log_indexes.get(key)
+        if index is None:
+            index = LogIndex(key)
+            _log_indexes[key] = index
+        return index
+
+
+def start_log_indexer(stop_event: threading.Event, interval: Optional[float] = None) -> threading.Thread:
+    """
+    启动后台索引线程：定期增量更新整个日志目录的索引，直到 stop_event 被设置
+    
+    Args:
+        stop_event: 停止事件（服务关闭时设置）
+        interval: 更新间隔（秒），默认读取 LOG_INDEX_REFRESH_INTERVAL
+    """
+    index = get_log_index()
+    interval = interval or settings.log_index_refresh_interval
+    
+    def run():
+        while not stop_event.is_set():
+            try:
+                index.refresh(cancel_event=stop_event)
+                # 压缩的轮转日志不建立倒排索引，预先建立旁路索引供按时间范围查询
+                from codebase_driven_agent.utils.log_archive import warm_sidecars
+                warm_sidecars(index.iter_log_files(compressed=True), cancel_event=stop_event)
+            except Exception as e:
+                logger.error(f"Log index refresh failed: {str(e)}", exc_info=True)
+            stop_event.wait(interval)
+    
+    thread = threading.Thread(target=run, name="log-indexer", daemon=True)
+    thread.start()
+    logger.info(f"Log indexer started for {index.base_path}")
+    return thread
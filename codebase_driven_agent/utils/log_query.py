@@ -1,11 +1,14 @@
 """日志查询抽象接口和实现"""
 from abc import ABC, abstractmethod
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple, Callable, Iterable, Iterator
 from datetime import datetime
+from functools import partial
 from pydantic import BaseModel, Field
+import os
 import threading
 
 from codebase_driven_agent.config import settings
+from codebase_driven_agent.utils.log_archive import compression_of
 from codebase_driven_agent.utils.logger import setup_logger
 
 logger = setup_logger("codebase_driven_agent.utils.log_query")
@@ -49,7 +52,7 @@ class LogQueryInterface(ABC):
             end_time: 结束时间
             limit: 返回记录数限制
             offset: 偏移量
-        
+            
         Returns:
             日志查询结果
         """
@@ -63,7 +66,7 @@ class LogQueryInterface(ABC):
         Args:
             query: 查询语句
             appname: 应用名称（可选，某些实现可能需要）
-        
+            
         Returns:
             (is_valid, error_message)
         """
@@ -359,7 +362,7 @@ class LogyiLogQuery(LogQueryInterface):
             start_time: 开始时间
             end_time: 结束时间
             max_lines: 最大返回条数
-        
+            
         Returns:
             搜索ID (sid)，如果失败返回 None
         """
@@ -460,7 +463,7 @@ class LogyiLogQuery(LogQueryInterface):
             
             logger.info(f"  Search task submitted successfully, sid: {sid}")
             return sid
-            
+        
         except Exception as e:
             logger.error(f"  Error submitting search task: {str(e)}", exc_info=True)
             return None
@@ -482,7 +485,7 @@ class LogyiLogQuery(LogQueryInterface):
             offset: 偏移量
             max_wait_time: 最大等待时间（毫秒）
             poll_interval: 轮询间隔（毫秒）
-        
+            
         Returns:
             (logs列表, 总数)
         """
@@ -603,7 +606,7 @@ class LogyiLogQuery(LogQueryInterface):
             total_elapsed = int(time.time() * 1000 - start_time)
             logger.error(f"  Polling timeout after {total_elapsed}ms ({poll_count} polls)")
             return [], 0
-            
+        
         except asyncio.CancelledError:
             logger.warning("  Polling cancelled")
             raise
@@ -624,7 +627,7 @@ class LogyiLogQuery(LogQueryInterface):
             response_data: API 响应数据
             limit: 返回记录数限制
             offset: 偏移量
-        
+            
         Returns:
             (logs列表, 总数)
         """
@@ -736,20 +739,26 @@ class FileLogQuery(LogQueryInterface):
         if not base.exists():
             return []
         
-        log_files = []
+        from codebase_driven_agent.utils.log_archive import is_log_file
         
-        # 查找匹配的日志文件
-        # 假设日志文件命名格式：{appname}.log 或 {appname}-*.log
-        for file_path in base.rglob(f"{appname}*.log"):
-            log_files.append(str(file_path))
-        
-        # 也查找通用日志文件
-        for file_path in base.rglob("*.log"):
-            if appname in str(file_path):
-                if str(file_path) not in log_files:
-                    log_files.append(str(file_path))
+        # 假设日志文件命名格式：{appname}.log 或 {appname}-*.log，排在前面；
+        # 路径中包含 appname 的其他日志文件排在后面（只遍历一次目录）。
+        # 轮转和压缩后的文件（app.log.1、app.log.2.gz、app-2026-10-15.log.zst）同样查找，
+        # 每组按修改时间从新到旧排列，沿轮转链从最新的日志开始搜索
+        prefixed, others = [], []
+        for file_path in base.rglob("*"):
+            if not is_log_file(file_path.name) or not file_path.is_file():
+                continue
+            try:
+                entry = (-file_path.stat().st_mtime, str(file_path))
+            except OSError:
+                continue
+            if file_path.name.startswith(appname):
+                prefixed.append(entry)
+            elif appname in str(file_path):
+                others.append(entry)
         
-        return log_files
+        return [path for _, path in sorted(prefixed)] + [path for _, path in sorted(others)]
     
     def validate_query(self, query: str, appname: Optional[str] = None) -> tuple[bool, Optional[str]]:
         """
@@ -795,28 +804,21 @@ class FileLogQuery(LogQueryInterface):
                 query=query,
             )
         
-        # 搜索日志
-        results = []
-        query_lower = query.lower()
-        
-        for log_file in log_files[:5]:  # 限制搜索文件数量
-            try:
-                with open(log_file, 'r', encoding='utf-8', errors='ignore') as f:
-                    for line_num, line in enumerate(f, 1):
-                        if query_lower in line.lower():
-                            # 尝试解析日志行
-                            log_entry = self._parse_log_line(line, log_file, line_num)
-                            if log_entry:
-                                results.append(log_entry)
-                                
-                                if len(results) >= limit:
-                                    break
-            except Exception as e:
-                logger.error(f"Error reading log file {log_file}: {str(e)}")
-                continue
+        start_ts = start_time.timestamp() if start_time else None
+        end_ts = end_time.timestamp() if end_time else None
+        if start_ts is not None or end_ts is not None:
+            # 跳过文件名或修改时间与时间窗口不重叠的文件
+            from codebase_driven_agent.utils.log_seek import file_may_overlap
             
-            if len(results) >= limit:
-                break
+            log_files = [log_file for log_file in log_files if file_may_overlap(log_file, start_ts, end_ts)]
+        
+        # 所有候选文件并行扫描，按时间从新到旧合并，多取一条用于判断是否还有更多结果
+        from codebase_driven_agent.utils.log_scanner import scan_log_sources
+        
+        sources = self._build_sources(log_files, query, start_ts, end_ts)
+        matches = scan_log_sources(sources, offset + limit + 1, cancel_event=_shutdown_event)
+        
+        results = self._parse_matches(matches)
         
         return LogQueryResult(
             logs=results[offset:offset+limit],
@@ -825,29 +827,153 @@ class FileLogQuery(LogQueryInterface):
             query=query,
         )
     
-    def _parse_log_line(self, line: str, file_path: str, line_num: int) -> Optional[Dict[str, Any]]:
-        """解析日志行"""
-        line = line.strip()
-        if not line:
-            return None
+    def _build_sources(
+        self,
+        log_files: List[str],
+        query: str,
+        start_ts: Optional[float],
+        end_ts: Optional[float],
+    ) -> List[Any]:
+        """
+        为每个日志文件选择读取方式
         
-        # 简单的日志解析（可以根据实际格式扩展）
-        import re
+        - 未压缩的文件优先通过倒排索引和时间范围索引查询（索引不可用时回退到逐行扫描，
+          指定时间范围时先二分查找窗口在文件中的位置）
+        - 压缩文件通过旁路索引只解压和窗口重叠的部分
+        - 时间戳不是 ISO 8601 格式的文件（nginx、JSON 中的 Unix 时间等），索引和时间定位无法识别
+          其中的时间，改为按文件格式解析出的时间过滤和排序
+        """
+        from codebase_driven_agent.utils.log_archive import get_sidecar, iter_archive_window
+        from codebase_driven_agent.utils.log_formats import detect_file_format
+        from codebase_driven_agent.utils.log_scanner import LogSource
+        from codebase_driven_agent.utils.log_seek import CLOCK_SKEW, iter_time_window, latest_timestamp
+        
+        plain_files = [log_file for log_file in log_files if compression_of(log_file) is None]
+        index, plan = None, None
+        if settings.log_index_enabled and plain_files:
+            try:
+                from codebase_driven_agent.utils.log_index import get_log_index
+                
+                index = get_log_index(self.base_path)
+                index.ensure_fresh(plain_files)
+                plan = index.plan(query)
+            except Exception as e:
+                logger.warning(f"Log index unavailable, falling back to linear scan: {str(e)}")
+                index = None
         
-        # 尝试匹配常见日志格式：时间戳 级别 消息
-        timestamp_pattern = r'(\d{4}-\d{2}-\d{2}[\sT]\d{2}:\d{2}:\d{2})'
-        level_pattern = r'\b(ERROR|WARN|INFO|DEBUG|FATAL)\b'
+        sources = []
+        for log_file in log_files:
+            try:
+                log_format = detect_file_format(log_file)
+                # 非 ISO 时间戳的文件中，索引和时间定位认出的“时间”不可信，窗口交给 _filter_window 按格式过滤
+                iso = log_format.iso_timestamps
+                begin, end = (start_ts, end_ts) if iso else (None, None)
+                if compression_of(log_file) is not None:
+                    sidecar = get_sidecar(log_file, build=False)
+                    latest = sidecar.latest if sidecar else os.path.getmtime(log_file) + CLOCK_SKEW
+                    lines = partial(self._match_lines, partial(
+                        iter_archive_window, log_file, begin, end, cancel_event=_shutdown_event,
+                    ), query, begin, end)
+                elif index is not None:
+                    # 按时间顺序追加写入的文件，最后一条带时间戳的行就是最晚的
+                    latest = latest_timestamp(log_file) if iso else None
+                    lines = partial(index.iter_matches, log_file, plan, begin, end, _shutdown_event)
+                else:
+                    latest = latest_timestamp(log_file) if iso else None
+                    lines = partial(self._match_lines, partial(iter_time_window, log_file, begin, end),
+                                    query, begin, end)
+            except OSError as e:
+                logger.error(f"Error reading log file {log_file}: {str(e)}")
+                continue
+            if iso:
+                sources.append(LogSource(log_file, latest, lines))
+            else:
+                sources.append(LogSource(
+                    log_file, None, partial(self._filter_window, lines, log_format.timestamp_of, start_ts, end_ts),
+                    log_format.timestamp_of,
+                ))
+        return sources
+    
+    @staticmethod
+    def _filter_window(
+        read_lines: Callable[[], Iterable[Tuple[int, str]]],
+        timestamp_of: Callable[[str], Optional[float]],
+        start_ts: Optional[float],
+        end_ts: Optional[float],
+    ) -> Iterator[Tuple[int, str]]:
+        """按文件格式解析出的时间过滤时间窗口之外的行（没有时间的行保留）"""
+        for line_num, line in read_lines():
+            if start_ts is not None or end_ts is not None:
+                ts = timestamp_of(line)
+                if ts is not None and ((start_ts is not None and ts < start_ts)
+                                       or (end_ts is not None and ts > end_ts)):
+                    continue
+            yield line_num, line
+    
+    @staticmethod
+    def _match_lines(
+        read_lines: Callable[[], Iterable[Tuple[int, str]]],
+        query: str,
+        start_ts: Optional[float],
+        end_ts: Optional[float],
+    ) -> Iterator[Tuple[int, str]]:
+        """逐行过滤包含查询（不区分大小写）且时间在窗口内的行"""
+        from codebase_driven_agent.utils.log_index import line_timestamp
         
-        timestamp_match = re.search(timestamp_pattern, line)
-        level_match = re.search(level_pattern, line, re.IGNORECASE)
+        query_lower = query.lower()
+        for line_num, line in read_lines():
+            if _shutdown_event.is_set():
+                return
+            if not line.strip() or query_lower not in line.lower():
+                continue
+            if start_ts is not None or end_ts is not None:
+                ts = line_timestamp(line)
+                if ts is not None and ((start_ts is not None and ts < start_ts)
+                                       or (end_ts is not None and ts > end_ts)):
+                    continue
+            yield line_num, line
+    
+    def _parse_matches(self, matches: List[Tuple[str, int, str]]) -> List[Dict[str, Any]]:
+        """按文件的日志格式批量解析命中的行，保持原有顺序"""
+        from codebase_driven_agent.utils.log_formats import detect_file_format, parse_lines
+        
+        by_file: Dict[str, List[int]] = {}
+        for i, (log_file, _, line) in enumerate(matches):
+            if line.strip():
+                by_file.setdefault(log_file, []).append(i)
+        
+        entries: List[Optional[Dict[str, Any]]] = [None] * len(matches)
+        for log_file, indexes in by_file.items():
+            records = parse_lines(detect_file_format(log_file), [matches[i][2] for i in indexes])
+            for i, record in zip(indexes, records):
+                entries[i] = self._log_entry(record, matches[i][2], log_file, matches[i][1])
+        return [entry for entry in entries if entry]
+    
+    def _parse_log_line(self, line: str, file_path: str, line_num: int) -> Optional[Dict[str, Any]]:
+        """解析日志行"""
+        return next(iter(self._parse_matches([(file_path, line_num, line)])), None)
+    
+    @staticmethod
+    def _log_entry(record: Any, line: str, file_path: str, line_num: int) -> Dict[str, Any]:
+        """
+        由解析结果构造日志条目
         
-        return {
-            "timestamp": timestamp_match.group(1) if timestamp_match else datetime.now().isoformat(),
-            "level": level_match.group(1) if level_match else "INFO",
-            "message": line,
+        timestamp、level、logger、trace_id 只在能从行中解析出时出现，不再用当前时间和 INFO 代替。
+        """
+        entry: Dict[str, Any] = {}
+        if record.timestamp is not None:
+            entry["timestamp"] = record.timestamp.isoformat()
+        for field in ("level", "logger", "trace_id"):
+            value = getattr(record, field)
+            if value is not None:
+                entry[field] = value
+        entry.update({
+            "message": record.message,
+            "raw_message": line.strip(),
             "file": file_path,
             "line": line_num,
-        }
+        })
+        return entry
 
 
 def get_log_query_instance() -> LogQueryInterface:
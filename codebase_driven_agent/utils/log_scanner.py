@@ -0,0 +1,147 @@
+"""并行扫描多个日志文件并按时间合并结果
+
+FileLogQuery 原先只搜索前 5 个日志文件，之后的文件完全不可见。这里把每个候选文件交给
+共享线程池并行扫描（文件读取、mmap 查找和解压都会释放 GIL），命中的行按时间戳从新到旧
+放入有界堆，只保留最新的 capacity 条：
+- 没有时间戳的行（异常堆栈等）沿用同一文件中前一条命中行的时间戳
+- 时间戳相同时，排在前面的文件（更新的轮转文件）和行号较小的行优先
+- 堆满后，最晚时间戳早于堆中最旧一条的文件不再扫描，正在扫描的文件也随即停止；
+  所有文件都扫描完成或被跳过时结果即已确定
+- 服务关闭（cancel_event）时所有扫描立即停止
+"""
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Iterator, List, NamedTuple, Optional, Tuple
+
+from codebase_driven_agent.config import settings
+from codebase_driven_agent.utils.log_index import line_timestamp
+from codebase_driven_agent.utils.logger import setup_logger
+
+logger = setup_logger("codebase_driven_agent.utils.log_scanner")
+
+# 扫描多少行检查一次是否可以提前停止
+_CHECK_INTERVAL = 256
+
+# 扫描日志文件的共享线程池
+_scan_executor: Optional[ThreadPoolExecutor] = None
+_scan_executor_lock = threading.Lock()
+
+
+def get_log_scan_executor() -> ThreadPoolExecutor:
+    """获取扫描日志文件的共享线程池（首次调用时创建）"""
+    global _scan_executor
+    with _scan_executor_lock:
+        if _scan_executor is None:
+            workers = max(1, settings.log_scan_workers)
+            _scan_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="log-scan")
+            logger.info(f"Log scan thread pool started with {workers} workers")
+        return _scan_executor
+
+
+def shutdown_log_scan_executor() -> None:
+    """关闭共享线程池（应用关闭时调用）"""
+    global _scan_executor
+    with _scan_executor_lock:
+        if _scan_executor is not None:
+            _scan_executor.shutdown(wait=False, cancel_futures=True)
+            _scan_executor = None
+
+
+class LogSource(NamedTuple):
+    """一个待扫描的日志文件"""
+    path: str
+    # 文件中最晚时间戳的上界，未知时为 None（不会被跳过）
+    latest: Optional[float]
+    # 返回匹配行 (行号, 行内容) 的迭代器（已按查询和时间窗口过滤）
+    lines: Callable[[], Iterator[Tuple[int, str]]]
+    # 解析行时间戳的函数，为 None 时识别行首的 ISO 8601 时间
+    timestamp: Optional[Callable[[str], Optional[float]]] = None
+
+
+class TopHits:
+    """线程安全的有界堆：保留排序键最大（时间最新）的 capacity 条命中"""
+    
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        # 小顶堆，堆顶是当前保留的最旧一条
+        self._heap: List[Tuple[Tuple[float, int, int], Tuple[str, int, str]]] = []
+        self._lock = threading.Lock()
+    
+    def offer(self, key: Tuple[float, int, int], item: Tuple[str, int, str]) -> None:
+        with self._lock:
+            if len(self._heap) < self.capacity:
+                heapq.heappush(self._heap, (key, item))
+            elif key > self._heap[0][0]:
+                heapq.heapreplace(self._heap, (key, item))
+    
+    def threshold(self) -> Optional[float]:
+        """堆满时最旧一条的时间戳（更旧的命中不会再被保留），未满时返回 None"""
+        with self._lock:
+            return self._heap[0][0][0] if len(self._heap) >= self.capacity else None
+    
+    def results(self) -> List[Tuple[str, int, str]]:
+        """按时间从新到旧排列的命中"""
+        with self._lock:
+            return [item for _, item in sorted(self._heap, reverse=True)]
+
+
+def scan_log_sources(
+    sources: List[LogSource],
+    capacity: int,
+    cancel_event: Optional[threading.Event] = None,
+) -> List[Tuple[str, int, str]]:
+    """
+    并行扫描日志文件，返回时间最新的 capacity 条命中
+    
+    Args:
+        sources: 待扫描的文件（顺序用于时间戳相同时排序，越靠前越优先）
+        capacity: 需要的命中数（offset + limit，多取一条可判断是否还有更多）
+        cancel_event: 取消事件（服务关闭）
+        
+    Returns:
+        (文件路径, 行号, 行内容) 列表，按时间从新到旧排列
+    """
+    top = TopHits(capacity)
+    stop = threading.Event()
+    
+    def cancelled() -> bool:
+        return stop.is_set() or (cancel_event is not None and cancel_event.is_set())
+    
+    def superseded(source: LogSource) -> bool:
+        threshold = top.threshold()
+        return threshold is not None and source.latest is not None and source.latest < threshold
+    
+    def run(rank: int, source: LogSource) -> None:
+        if cancelled() or superseded(source):
+            return
+        last_ts = float("-inf")
+        timestamp_of = source.timestamp or line_timestamp
+        try:
+            for count, (line_no, line) in enumerate(source.lines(), 1):
+                ts = timestamp_of(line)
+                if ts is None:
+                    ts = last_ts
+                else:
+                    last_ts = ts
+                top.offer((ts, -rank, -line_no), (source.path, line_no, line))
+                if count % _CHECK_INTERVAL == 0 and (cancelled() or superseded(source)):
+                    return
+        except Exception as e:
+            logger.error(f"Error reading log file {source.path}: {str(e)}")
+    
+    if len(sources) <= 1 or settings.log_scan_workers <= 1:
+        for rank, source in enumerate(sources):
+            run(rank, source)
+        return top.results()
+    
+    executor = get_log_scan_executor()
+    futures = [executor.submit(run, rank, source) for rank, source in enumerate(sources)]
+    try:
+        wait(futures)
+    finally:
+        # 调用方被中断时停止仍在进行的扫描
+        stop.set()
+        for future in futures:
+            future.cancel()
+    return top.results()
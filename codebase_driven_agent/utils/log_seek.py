@@ -0,0 +1,230 @@
+"""按时间范围定位日志文件中的字节区间
+
+应用日志按时间顺序追加写入，查询某个时间窗口时不需要从第一行开始扫描：
+- 文件级剪枝：文件最后修改时间早于窗口开始，或文件名中的日期与窗口不重叠时整个文件跳过
+- 文件内定位：用 mmap 映射文件，在字节偏移上二分查找，每次从中点对齐到下一行的行首，
+  读取之后第一条带时间戳的行进行比较，找到窗口的开始和结束位置
+
+没有时间戳的行（异常堆栈等）归属于前面最近的带时间戳的行。
+二分查找要求文件中的时间戳非递减；首尾时间戳逆序的文件不做定位，返回整个文件。
+"""
+import mmap
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Iterator, Optional, Tuple
+
+from codebase_driven_agent.utils.log_index import parse_timestamp
+from codebase_driven_agent.utils.logger import setup_logger
+
+logger = setup_logger("codebase_driven_agent.utils.log_seek")
+
+# 只在行首这么多字节内查找时间戳（时间戳一般位于行首，消息中引用的时间不参与定位）
+TIMESTAMP_PREFIX_BYTES = 64
+
+# 文件修改时间和日志时间戳可能属于不同时区（日志按本地时间解析），比较时留出的余量（秒）
+CLOCK_SKEW = 14 * 3600
+
+# 统计行号时每次读取的字节数
+_COUNT_CHUNK = 16 * 1024 * 1024
+
+# 查找最后一条带时间戳的行时只向前搜索文件末尾这么多字节
+LATEST_TAIL_BYTES = 1024 * 1024
+
+_TIMESTAMP_PATTERN = re.compile(rb'(\d{4}-\d{2}-\d{2})[ T](\d{2}:\d{2}:\d{2})')
+
+# 文件名中的日期，如 app-2024-01-01.log、app.20240101.log
+_NAME_DATE_PATTERN = re.compile(r'(?<!\d)(\d{4})-?(\d{2})-?(\d{2})(?!\d)')
+
+
+def _line_timestamp(data, start: int, end: int) -> Optional[float]:
+    """行首的时间戳，没有时返回 None"""
+    match = _TIMESTAMP_PATTERN.search(data[start:min(end, start + TIMESTAMP_PREFIX_BYTES)])
+    return parse_timestamp(match.group(1).decode(), match.group(2).decode()) if match else None
+
+
+def _line_end(data, start: int, size: int) -> int:
+    """从 start 开始的行的结束位置（下一行的行首）"""
+    newline = data.find(b"\n", start)
+    return size if newline < 0 else newline + 1
+
+
+def _next_stamped_line(data, start: int, size: int) -> Optional[Tuple[int, int, float]]:
+    """从行首 start 开始的第一条带时间戳的行：(行首, 行尾, 时间戳)"""
+    while start < size:
+        end = _line_end(data, start, size)
+        ts = _line_timestamp(data, start, end)
+        if ts is not None:
+            return start, end, ts
+        start = end
+    return None
+
+
+def _prev_stamped_line(data, end: int, floor: int = 0) -> Optional[Tuple[int, int, float]]:
+    """在 end 之前（不早于 floor 所在行）的最后一条带时间戳的行：(行首, 行尾, 时间戳)"""
+    while end > floor:
+        start = data.rfind(b"\n", 0, end - 1) + 1
+        ts = _line_timestamp(data, start, end)
+        if ts is not None:
+            return start, end, ts
+        end = start
+    return None
+
+
+def seek_timestamp(data, target: float) -> int:
+    """
+    第一条时间戳不早于 target 的行的行首（没有时返回数据长度）
+    
+    Args:
+        data: 文件内容（mmap 或 bytes），时间戳非递减
+        target: 目标时间戳
+    """
+    size = len(data)
+    lo, hi = 0, size
+    while lo < hi:
+        mid = (lo + hi) // 2
+        # 对齐到 mid 所在行的下一行行首（lo 总是行首）
+        start = lo if mid == lo else _line_end(data, mid - 1, size)
+        found = _next_stamped_line(data, start, size)
+        if found is None or found[2] >= target:
+            hi = mid
+        else:
+            lo = found[1]
+    # lo 之前的带时间戳的行都早于 target，向后找到第一条不早于 target 的行
+    while lo < size:
+        found = _next_stamped_line(data, lo, size)
+        if found is None:
+            return size
+        if found[2] >= target:
+            return found[0]
+        lo = found[1]
+    return size
+
+
+def seek_time_range(data, start_ts: Optional[float], end_ts: Optional[float]) -> Tuple[int, int]:
+    """
+    时间窗口 [start_ts, end_ts] 对应的字节区间
+    
+    Args:
+        data: 文件内容（mmap 或 bytes）
+        start_ts: 开始时间戳（包含），None 表示不限制
+        end_ts: 结束时间戳（包含），None 表示不限制
+        
+    Returns:
+        (开始偏移, 结束偏移)，区间为空时两者相等
+    """
+    size = len(data)
+    first = _next_stamped_line(data, 0, size)
+    last = _prev_stamped_line(data, size)
+    if first is None or last is None or first[2] > last[2]:
+        # 没有时间戳或者不是按时间排序的文件，不能定位
+        return 0, size
+    begin = seek_timestamp(data, start_ts) if start_ts is not None and start_ts > first[2] else 0
+    if end_ts is None or end_ts >= last[2]:
+        return begin, size
+    # 结束位置：第一条晚于 end_ts 的行（时间戳精确到秒）
+    return begin, max(begin, seek_timestamp(data, end_ts + 1))
+
+
+def latest_timestamp(path: str) -> Optional[float]:
+    """
+    未压缩日志文件中最后一条带时间戳的行的时间戳
+    
+    只搜索文件末尾 LATEST_TAIL_BYTES 字节，末尾没有带时间戳的行（或者整个文件都没有）时返回 None，
+    调用方按时间未知处理。
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            last = _prev_stamped_line(data, size, max(0, size - LATEST_TAIL_BYTES))
+    return last[2] if last else None
+
+
+def _name_date_end(path: str) -> Optional[float]:
+    """文件名中日期对应的内容时间上界
+    
+    按日期滚动的日志可能以内容日期命名（log4j/logback），也可能以轮转日期命名
+    （logrotate dateext），所以上界取当天结束。按周或按月轮转时文件中会有更早的日志，
+    文件名日期不能作为下界。
+    """
+    for match in _NAME_DATE_PATTERN.finditer(os.path.basename(path)):
+        try:
+            day = datetime(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+        except ValueError:
+            continue
+        return (day + timedelta(days=1)).timestamp()
+    return None
+
+
+def file_may_overlap(path: str, start_ts: Optional[float], end_ts: Optional[float]) -> bool:
+    """
+    根据文件名和修改时间判断文件是否可能包含时间窗口内的日志
+    
+    Args:
+        path: 日志文件路径
+        start_ts: 开始时间戳（包含），None 表示不限制
+        end_ts: 结束时间戳（包含），None 表示不限制
+    """
+    if start_ts is None and end_ts is None:
+        return True
+    if start_ts is not None:
+        try:
+            # 最后一次写入早于窗口开始：文件中所有日志都早于窗口
+            if os.path.getmtime(path) + CLOCK_SKEW < start_ts:
+                return False
+        except OSError:
+            return False
+    if start_ts is not None:
+        # 文件名日期当天结束早于窗口开始：文件中所有日志都早于窗口
+        name_end = _name_date_end(path)
+        if name_end is not None and name_end <= start_ts:
+            return False
+    return True
+
+
+def _count_lines(data, end: int) -> int:
+    """data[:end] 中的行数（分块统计，不复制整个文件）"""
+    count = 0
+    for pos in range(0, end, _COUNT_CHUNK):
+        count += data[pos:min(pos + _COUNT_CHUNK, end)].count(b"\n")
+    return count
+
+
+def iter_time_window(
+    path: str,
+    start_ts: Optional[float] = None,
+    end_ts: Optional[float] = None,
+) -> Iterator[Tuple[int, str]]:
+    """
+    逐行读取日志文件中位于时间窗口内的字节区间
+    
+    区间边界由二分查找确定，区间内的行仍需调用方按行过滤（例如不带时间戳的行）。
+    
+    Args:
+        path: 日志文件路径
+        start_ts: 开始时间戳（包含）
+        end_ts: 结束时间戳（包含）
+        
+    Yields:
+        (行号, 行内容)
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if start_ts is None and end_ts is None:
+                begin, end = 0, size
+            else:
+                begin, end = seek_time_range(data, start_ts, end_ts)
+            if begin >= end:
+                return
+            line_no = _count_lines(data, begin) + 1
+            pos = begin
+            while pos < end:
+                line_end = _line_end(data, pos, end)
+                yield line_no, data[pos:line_end].decode("utf-8", errors="ignore")
+                line_no += 1
+                pos = line_end
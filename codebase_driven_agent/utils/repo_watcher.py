@@ -0,0 +1,464 @@
+"""代码仓库变更监听服务
+
+监听 CODE_REPO_PATH 下的文件变更，将去抖、合并后的失效通知推送给已注册的缓存（文件目录、符号索引等）：
+- 优先使用 watchdog 监听文件系统事件；watchdog 不可用时定期比较文件的修改时间和大小（轮询）
+- 通过 Git 仓库句柄检测 HEAD 变化（git pull、checkout 等），将两个提交之间变更的文件加入失效队列
+- 事件进入队列后等待 debounce 时间内没有新事件（或批次等待超过上限）再统一分发
+- 队列深度和分发延迟写入指标收集器，可通过 /api/v1/metrics 查看
+"""
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Callable, Iterable, Set, Tuple
+
+from codebase_driven_agent.config import settings
+from codebase_driven_agent.utils.file_catalog import SKIP_DIRS
+from codebase_driven_agent.utils.logger import setup_logger
+from codebase_driven_agent.utils.metrics import get_metrics_collector
+
+logger = setup_logger("codebase_driven_agent.utils.repo_watcher")
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    WATCHDOG_AVAILABLE = False
+    FileSystemEventHandler = object
+    Observer = None
+    logger.debug("watchdog not available, repository watcher will use polling")
+
+# 一次 HEAD 变化涉及的文件超过该数量时，直接通知整个仓库失效
+MAX_HEAD_DIFF_PATHS = 1000
+
+# 一个批次从第一个事件开始最多等待的时间（debounce 的倍数），避免持续写入时一直不分发
+MAX_BATCH_DELAY_FACTOR = 10
+
+# 失效回调：参数为变更的文件路径（相对于仓库根目录），None 表示整个仓库失效
+InvalidationCallback = Callable[[Optional[List[str]]], None]
+
+
+def _is_ignored(rel_path: str, directory: bool = False) -> bool:
+    """
+    路径是否位于隐藏目录或跳过的目录中（这些目录不在任何索引中）
+    
+    Args:
+        rel_path: 仓库相对路径
+        directory: 路径本身是否为目录（新建的 __pycache__、node_modules 等目录本身也要忽略）
+    """
+    parts = rel_path.split('/')
+    if not directory:
+        parts = parts[:-1]
+    return any(part.startswith('.') or part in SKIP_DIRS for part in parts)
+
+
+class _EventHandler(FileSystemEventHandler):
+    """watchdog 事件处理器：转换为仓库相对路径后放入监听服务的队列"""
+    
+    def __init__(self, watcher: "RepoWatcher"):
+        super().__init__()
+        self.watcher = watcher
+    
+    def on_any_event(self, event):
+        if event.event_type in ("opened", "closed", "closed_no_write"):
+            return
+        if event.is_directory:
+            # 文件变更会同时产生所在目录的 modified 事件，可以忽略；目录的增删和移动影响其下所有文件
+            if event.event_type != "modified":
+                self.watcher.notify_paths([event.src_path], directory=True)
+            return
+        paths = [event.src_path]
+        dest_path = getattr(event, "dest_path", None)
+        if dest_path:
+            paths.append(dest_path)
+        self.watcher.notify_paths(paths)
+
+
+class RepoWatcher:
+    """代码仓库变更监听服务"""
+    
+    def __init__(
+        self,
+        repo_path: Path,
+        git_repo=None,
+        debounce: Optional[float] = None,
+        poll_interval: Optional[float] = None,
+        use_watchdog: Optional[bool] = None,
+    ):
+        """
+        初始化监听服务
+        
+        Args:
+            repo_path: 代码仓库路径
+            git_repo: GitPython 仓库对象（CodeTool.git_repo），为 None 时不检测 HEAD 变化
+            debounce: 去抖时间（秒），默认读取 REPO_WATCH_DEBOUNCE
+            poll_interval: 轮询和 HEAD 检测间隔（秒），默认读取 REPO_WATCH_POLL_INTERVAL
+            use_watchdog: 是否使用 watchdog，默认在可用时使用
+        """
+        self.repo_path = Path(repo_path).resolve()
+        self.git_repo = git_repo
+        self.debounce = debounce if debounce is not None else settings.repo_watch_debounce
+        self.poll_interval = poll_interval if poll_interval is not None else settings.repo_watch_poll_interval
+        self.use_watchdog = WATCHDOG_AVAILABLE if use_watchdog is None else (use_watchdog and WATCHDOG_AVAILABLE)
+        
+        self._targets: Dict[str, InvalidationCallback] = {}
+        self._targets_lock = threading.Lock()
+        # 队列元素：(入队时间, 相对路径)，路径为 None 表示整个仓库失效
+        self._queue: "queue.Queue[Tuple[float, Optional[str]]]" = queue.Queue()
+        self._stop_event = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._observer = None
+        self._head: Optional[str] = None
+        self._poll_snapshot: Dict[str, Tuple[int, int]] = {}
+        
+        self._pending_count = 0
+        self._oldest_pending: Optional[float] = None
+        # 已入队和已分发（或丢弃）的事件数，用于 flush 判断是否处理完毕
+        self._enqueued = 0
+        self._processed = 0
+        self._counter_lock = threading.Lock()
+        self._stats = {"events": 0, "batches": 0, "full_invalidations": 0, "head_changes": 0, "last_lag_seconds": 0.0}
+    
+    @property
+    def backend(self) -> str:
+        """事件来源：watchdog 或 polling"""
+        return "watchdog" if self.use_watchdog else "polling"
+    
+    def register(self, name: str, callback: InvalidationCallback) -> None:
+        """
+        注册失效回调（同名回调会被替换）
+        
+        Args:
+            name: 目标名称（用于日志和统计）
+            callback: 失效回调，参数为变更的相对路径列表，None 表示整个仓库失效
+        """
+        with self._targets_lock:
+            self._targets[name] = callback
+    
+    def unregister(self, name: str) -> None:
+        """注销失效回调"""
+        with self._targets_lock:
+            self._targets.pop(name, None)
+    
+    def notify(self, rel_paths: Optional[Iterable[str]] = None) -> None:
+        """
+        将变更放入失效队列
+        
+        Args:
+            rel_paths: 变更的文件路径（相对于仓库根目录）；为 None 时表示整个仓库失效
+        """
+        now = time.time()
+        if rel_paths is None:
+            items = [None]
+        else:
+            items = [p for p in (Path(rel_path).as_posix() for rel_path in rel_paths) if not _is_ignored(p)]
+        with self._counter_lock:
+            self._enqueued += len(items)
+        for item in items:
+            self._queue.put((now, item))
+        self._update_gauges()
+    
+    def notify_paths(self, abs_paths: Iterable[str], directory: bool = False) -> None:
+        """
+        将绝对路径的变更放入失效队列（仓库外的路径被忽略）
+        
+        Args:
+            abs_paths: 变更的绝对路径
+            directory: 是否为目录的增删或移动（目录下所有文件都受影响，按整个仓库失效处理）
+        """
+        rel_paths = []
+        for abs_path in abs_paths:
+            if isinstance(abs_path, bytes):
+                abs_path = os.fsdecode(abs_path)
+            try:
+                rel_path = Path(abs_path).relative_to(self.repo_path).as_posix()
+            except ValueError:
+                continue
+            if not _is_ignored(rel_path, directory):
+                rel_paths.append(rel_path)
+        if not rel_paths:
+            return
+        self.notify(None if directory else rel_paths)
+    
+    def start(self) -> None:
+        """启动监听（文件事件或轮询线程、HEAD 检测和分发线程）"""
+        if self._threads:
+            return
+        self._stop_event.clear()
+        self._head = self._read_head()
+        
+        if self.use_watchdog:
+            try:
+                observer = Observer()
+                observer.schedule(_EventHandler(self), str(self.repo_path), recursive=True)
+                observer.daemon = True
+                observer.start()
+                self._observer = observer
+            except Exception as e:
+                # inotify 句柄数不足等情况下回退到轮询
+                logger.warning(f"Failed to start filesystem observer: {str(e)}, falling back to polling")
+                self.use_watchdog = False
+        
+        for target, name in ((self._dispatch_loop, "repo-watcher-dispatch"), (self._poll_loop, "repo-watcher-poll")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Repository watcher started for {self.repo_path} (backend: {self.backend})")
+    
+    def stop(self, timeout: float = 2.0) -> None:
+        """停止监听，丢弃尚未分发的事件"""
+        self._stop_event.set()
+        if self._observer is not None:
+            try:
+                self._observer.stop()
+                self._observer.join(timeout)
+            except Exception as e:
+                logger.debug(f"Error stopping filesystem observer: {str(e)}")
+            self._observer = None
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        logger.info("Repository watcher stopped")
+    
+    def _read_head(self) -> Optional[str]:
+        """读取当前 HEAD 指向的提交"""
+        if self.git_repo is None:
+            return None
+        try:
+            return self.git_repo.head.commit.hexsha
+        except Exception as e:
+            logger.debug(f"Failed to read git HEAD: {str(e)}")
+            return None
+    
+    def check_head(self) -> bool:
+        """
+        检测 HEAD 是否变化，变化时将两个提交之间变更的文件放入失效队列
+        
+        Returns:
+            HEAD 是否变化
+        """
+        head = self._read_head()
+        if head is None or head == self._head:
+            return False
+        previous, self._head = self._head, head
+        self._stats["head_changes"] += 1
+        if previous is None:
+            self.notify(None)
+            return True
+        
+        try:
+            output = self.git_repo.git.diff("--name-only", previous, head)
+            changed = [line for line in output.splitlines() if line]
+        except Exception as e:
+            logger.debug(f"Failed to diff {previous[:8]}..{head[:8]}: {str(e)}")
+            changed = None
+        
+        logger.info(f"Git HEAD changed: {previous[:8]} -> {head[:8]}")
+        if changed is None or len(changed) > MAX_HEAD_DIFF_PATHS:
+            self.notify(None)
+            return True
+        # git diff 输出的路径相对于工作区根目录，仓库可能是工作区的子目录
+        work_tree = Path(self.git_repo.working_tree_dir).resolve()
+        self.notify_paths(str(work_tree / path) for path in changed)
+        return True
+    
+    def _scan_mtimes(self) -> Dict[str, Tuple[int, int]]:
+        """轮询模式：记录所有文件的修改时间和大小"""
+        snapshot = {}
+        for root, dirs, files in os.walk(self.repo_path):
+            # 跳过隐藏目录和常见忽略目录
+            dirs[:] = [d for d in dirs if not d.startswith('.') and d not in SKIP_DIRS]
+            for file in files:
+                full_path = os.path.join(root, file)
+                try:
+                    stat_result = os.stat(full_path)
+                except OSError:
+                    continue
+                rel_path = Path(full_path).relative_to(self.repo_path).as_posix()
+                snapshot[rel_path] = (stat_result.st_mtime_ns, stat_result.st_size)
+        return snapshot
+    
+    def poll_once(self) -> List[str]:
+        """
+        轮询模式：比较文件快照，将变更的文件放入失效队列
+        
+        Returns:
+            变更的文件路径
+        """
+        snapshot = self._scan_mtimes()
+        previous = self._poll_snapshot
+        changed = [path for path, value in snapshot.items() if previous.get(path) != value]
+        changed.extend(path for path in previous if path not in snapshot)
+        self._poll_snapshot = snapshot
+        if changed:
+            self.notify(changed)
+        return changed
+    
+    def _poll_loop(self) -> None:
+        """轮询线程：检测 HEAD 变化，watchdog 不可用时比较文件快照"""
+        if not self.use_watchdog:
+            self._poll_snapshot = self._scan_mtimes()
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                self.check_head()
+                if not self.use_watchdog:
+                    self.poll_once()
+            except Exception as e:
+                logger.warning(f"Repository poll error: {str(e)}", exc_info=True)
+    
+    def _dispatch_loop(self) -> None:
+        """分发线程：收集事件，去抖后批量通知失效回调"""
+        batch: Set[str] = set()
+        batch_events = 0
+        full = False
+        first_event = None
+        last_event = None
+        
+        while not self._stop_event.is_set():
+            try:
+                enqueued_at, rel_path = self._queue.get(timeout=min(self.debounce, 0.5) or 0.05)
+                self._stats["events"] += 1
+                batch_events += 1
+                if first_event is None:
+                    first_event = enqueued_at
+                last_event = time.time()
+                if rel_path is None:
+                    full = True
+                else:
+                    batch.add(rel_path)
+                self._pending_count = len(batch) + (1 if full else 0)
+                self._oldest_pending = first_event
+            except queue.Empty:
+                pass
+            
+            if first_event is not None:
+                now = time.time()
+                quiet = now - last_event >= self.debounce
+                overdue = now - first_event >= self.debounce * MAX_BATCH_DELAY_FACTOR
+                if quiet or overdue:
+                    self._dispatch(None if full else sorted(batch), first_event)
+                    with self._counter_lock:
+                        self._processed += batch_events
+                    batch = set()
+                    batch_events = 0
+                    full = False
+                    first_event = None
+                    last_event = None
+                    self._pending_count = 0
+                    self._oldest_pending = None
+            self._update_gauges()
+    
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        等待队列中的事件全部分发（用于测试和手动刷新）
+        
+        Returns:
+            是否在超时前分发完成
+        """
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self._counter_lock:
+                if self._processed >= self._enqueued:
+                    return True
+            time.sleep(0.01)
+        return False
+    
+    def _dispatch(self, paths: Optional[List[str]], first_event: float) -> None:
+        """将一个批次的失效通知分发给所有回调"""
+        with self._targets_lock:
+            targets = list(self._targets.items())
+        for name, callback in targets:
+            try:
+                callback(None if paths is None else list(paths))
+            except Exception as e:
+                logger.warning(f"Invalidation target '{name}' failed: {str(e)}", exc_info=True)
+        
+        lag = time.time() - first_event
+        self._stats["batches"] += 1
+        self._stats["last_lag_seconds"] = round(lag, 3)
+        if paths is None:
+            self._stats["full_invalidations"] += 1
+        
+        collector = get_metrics_collector()
+        collector.increment("repo_watcher_batches_total", labels={"scope": "full" if paths is None else "files"})
+        collector.record_duration("repo_watcher_lag_seconds", lag)
+        logger.debug(f"Dispatched invalidation batch ({'full' if paths is None else len(paths)} paths) to {len(targets)} targets, lag {lag:.3f}s")
+    
+    def _update_gauges(self) -> None:
+        """更新队列深度和当前延迟指标"""
+        collector = get_metrics_collector()
+        collector.set_gauge("repo_watcher_queue_depth", self._queue.qsize() + self._pending_count)
+        oldest = self._oldest_pending
+        collector.set_gauge("repo_watcher_pending_lag_seconds", round(time.time() - oldest, 3) if oldest else 0.0)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取监听服务统计信息"""
+        oldest = self._oldest_pending
+        with self._targets_lock:
+            targets = list(self._targets)
+        return {
+            "repo_path": str(self.repo_path),
+            "backend": self.backend,
+            "running": bool(self._threads),
+            "head": self._head,
+            "targets": targets,
+            "queue_depth": self._queue.qsize() + self._pending_count,
+            "pending_lag_seconds": round(time.time() - oldest, 3) if oldest else 0.0,
+            **self._stats,
+        }
+
+
+# 全局监听服务实例
+_repo_watcher: Optional[RepoWatcher] = None
+_repo_watcher_lock = threading.Lock()
+
+
+def get_repo_watcher() -> Optional[RepoWatcher]:
+    """获取正在运行的监听服务（未启动时返回 None）"""
+    return _repo_watcher
+
+
+def start_repo_watcher(repo_path: Optional[Path] = None, git_repo=None) -> Optional[RepoWatcher]:
+    """
+    启动全局监听服务，并注册文件目录、符号索引和工具结果缓存的失效回调
+    
+    Args:
+        repo_path: 代码仓库路径，默认读取 CODE_REPO_PATH
+        git_repo: GitPython 仓库对象（用于检测 HEAD 变化）
+        
+    Returns:
+        监听服务实例；未配置代码仓库或仓库不存在时返回 None
+    """
+    global _repo_watcher
+    repo_path = repo_path or settings.code_repo_path
+    if not repo_path or not Path(repo_path).is_dir():
+        logger.info("Code repository not configured, repository watcher not started")
+        return None
+    repo_path = Path(repo_path)
+    
+    from codebase_driven_agent.utils.file_catalog import get_file_catalog
+    from codebase_driven_agent.tools.symbol_index import get_symbol_index
+    from codebase_driven_agent.utils.tool_cache import get_tool_result_cache
+    
+    with _repo_watcher_lock:
+        if _repo_watcher is not None:
+            return _repo_watcher
+        watcher = RepoWatcher(repo_path, git_repo=git_repo)
+        watcher.register("file_catalog", get_file_catalog(repo_path).invalidate)
+        if settings.symbol_index_enabled:
+            watcher.register("symbol_index", get_symbol_index(repo_path).invalidate)
+        watcher.register("tool_cache", get_tool_result_cache().invalidate_repo)
+        watcher.start()
+        _repo_watcher = watcher
+        return watcher
+
+
+def stop_repo_watcher() -> None:
+    """停止全局监听服务（应用关闭时调用）"""
+    global _repo_watcher
+    with _repo_watcher_lock:
+        if _repo_watcher is not None:
+            _repo_watcher.stop()
+            _repo_watcher = None
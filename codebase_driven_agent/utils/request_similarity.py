@@ -0,0 +1,227 @@
+"""分析请求的规范化和近似重复匹配
+
+同一个错误被多次粘贴时，时间戳、请求 ID、内存地址、行号或末尾多出的一行日志往往不同，
+按原文 hash 的缓存键无法命中。这里在本地完成两步处理（不调用任何外部服务）：
+- 规范化：用 InputParser 的时间戳、请求 ID、行号模式把易变的片段替换为占位符
+- 近似匹配：对规范化文本的词 shingle 计算 MinHash 签名，用 LSH 分桶找到候选条目，
+  估算的 Jaccard 相似度达到阈值时视为同一个问题
+"""
+import functools
+import hashlib
+import re
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from codebase_driven_agent.agent.input_parser import InputParser
+
+# MinHash 使用的梅森素数（2^61 - 1）
+_MERSENNE_PRIME = (1 << 61) - 1
+
+# 源文件扩展名（只替换这些文件名后的 :行号）
+_SOURCE_EXTENSIONS = (
+    "py|pyx|java|kt|kts|scala|groovy|js|jsx|mjs|cjs|ts|tsx|vue|go|rb|php|cs|fs|vb|c|cc|cpp|cxx|h|hh|hpp|"
+    "rs|swift|m|mm|dart|lua|pl|pm|sh|sql|erl|ex|exs|clj|jsp|html|xml|yaml|yml"
+)
+
+# 易变片段的替换规则（按顺序应用）
+_VOLATILE_PATTERNS: List[Tuple["re.Pattern", str]] = [
+    # ISO 8601 时间（带 T 分隔符、毫秒和时区）
+    (re.compile(r'\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?'), '<TS>'),
+    *[(re.compile(pattern), '<TS>') for pattern in InputParser.TIMESTAMP_PATTERNS],
+    (re.compile(r'\b\d{2}:\d{2}:\d{2}(?:[.,]\d+)?\b'), '<TS>'),
+    # UUID 和 request_id/trace_id 的值
+    (re.compile(InputParser.REQUEST_ID_PATTERNS[2], re.IGNORECASE), '<UUID>'),
+    (re.compile(r'(?i)\b((?:request|trace|span)[_-]?id[:\s=]+)[a-zA-Z0-9-]+'), r'\1<ID>'),
+    # 内存地址、长十六进制串（对象 hash、提交号等）
+    (re.compile(r'\b0x[0-9a-fA-F]+\b'), '<HEX>'),
+    (re.compile(r'\b[0-9a-fA-F]{12,}\b'), '<HEX>'),
+    # 行号：line 123、:123:、(123)、源文件名后的 :123
+    # 错误码（MySQL error 1062、ORA-00942）和端口（127.0.0.1:5432、db:6379）区分不同的问题，不替换
+    (re.compile(r'(?i)\bline\s+\d+'), 'line <N>'),
+    (re.compile(r':\d+:'), ':<N>:'),
+    (re.compile(r'\(\d+\)'), '(<N>)'),
+    (re.compile(rf'(\w\.(?:{_SOURCE_EXTENSIONS})):\d+\b'), r'\1:<N>'),
+]
+
+_TOKEN_PATTERN = re.compile(r'<\w+>|\w+|[^\w\s]')
+
+
+def canonicalize_input(text: str) -> str:
+    """
+    规范化用户输入：替换易变片段并合并空白
+    
+    Args:
+        text: 用户输入
+        
+    Returns:
+        规范化后的文本
+    """
+    for pattern, replacement in _VOLATILE_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return " ".join(text.split())
+
+
+def _shingles(text: str, size: int) -> Set[bytes]:
+    """规范化文本的词 shingle（连续 size 个词）"""
+    tokens = _TOKEN_PATTERN.findall(text.lower())
+    if len(tokens) <= size:
+        return {" ".join(tokens).encode("utf-8")} if tokens else set()
+    return {" ".join(tokens[i:i + size]).encode("utf-8") for i in range(len(tokens) - size + 1)}
+
+
+class MinHasher:
+    """MinHash 签名生成器"""
+    
+    def __init__(self, num_perm: int = 64, shingle_size: int = 3, seed: int = 1):
+        """
+        Args:
+            num_perm: 签名长度（哈希函数个数），越大相似度估算越准确
+            shingle_size: 每个 shingle 包含的词数
+            seed: 生成哈希函数参数的种子（同一个索引中必须一致）
+        """
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        # 哈希函数 h_i(x) = (a_i * x + b_i) mod p，参数由种子确定性地生成
+        self._params: List[Tuple[int, int]] = []
+        for i in range(num_perm):
+            digest = hashlib.blake2b(f"{seed}:{i}".encode(), digest_size=16).digest()
+            a = int.from_bytes(digest[:8], "little") % (_MERSENNE_PRIME - 1) + 1
+            b = int.from_bytes(digest[8:], "little") % _MERSENNE_PRIME
+            self._params.append((a, b))
+    
+    def signature(self, canonical_text: str) -> Tuple[int, ...]:
+        """计算规范化文本的 MinHash 签名"""
+        hashes = [
+            int.from_bytes(hashlib.blake2b(shingle, digest_size=8).digest(), "little")
+            for shingle in _shingles(canonical_text, self.shingle_size)
+        ]
+        if not hashes:
+            return tuple([_MERSENNE_PRIME] * self.num_perm)
+        return tuple(
+            min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+            for a, b in self._params
+        )
+    
+    @staticmethod
+    def similarity(sig1: Tuple[int, ...], sig2: Tuple[int, ...]) -> float:
+        """由两个签名估算 Jaccard 相似度"""
+        if not sig1 or len(sig1) != len(sig2):
+            return 0.0
+        return sum(1 for x, y in zip(sig1, sig2) if x == y) / len(sig1)
+
+
+class SimilarityMatch:
+    """近似匹配结果"""
+    
+    def __init__(self, key: str, similarity: float, match_type: str):
+        self.key = key
+        self.similarity = similarity
+        self.match_type = match_type  # "normalized"（规范化后完全相同）或 "similar"
+
+
+class SimilarityIndex:
+    """请求签名的 LSH 索引（线程安全）
+    
+    签名按 bands 段分桶，任意一段完全相同的条目成为候选，再用完整签名估算相似度。
+    不同 scope（例如不同的 context_files）的条目互不匹配。
+    """
+    
+    def __init__(self, threshold: float = 0.85, num_perm: int = 128, bands: int = 32, shingle_size: int = 3):
+        """
+        Args:
+            threshold: 判定为近似重复的最低相似度（0-1）
+            num_perm: MinHash 签名长度
+            bands: LSH 分段数（num_perm 必须能被整除），段越多越容易找到相似度较低的候选
+            shingle_size: 每个 shingle 包含的词数
+        """
+        if num_perm % bands != 0:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm=num_perm, shingle_size=shingle_size)
+        # key -> (签名, 规范化文本 hash, 所在的桶)
+        self._entries: Dict[str, Tuple[Tuple[int, ...], str, List[Tuple]]] = {}
+        self._buckets: Dict[Tuple, Set[str]] = {}
+        self._lock = threading.Lock()
+        # 同一个输入在查找和写入缓存时各需要一次签名，保留最近的计算结果
+        self.fingerprint = functools.lru_cache(maxsize=64)(self._fingerprint)
+    
+    def _fingerprint(self, text: str) -> Tuple[Tuple[int, ...], str]:
+        """计算输入的签名和规范化文本 hash（不修改索引，可以在锁外调用）"""
+        canonical = canonicalize_input(text)
+        return self.hasher.signature(canonical), hashlib.md5(canonical.encode("utf-8")).hexdigest()
+    
+    def _bucket_keys(self, scope: str, signature: Tuple[int, ...]) -> List[Tuple]:
+        return [
+            (scope, band, signature[band * self.rows:(band + 1) * self.rows])
+            for band in range(self.bands)
+        ]
+    
+    def add(self, key: str, scope: str, fingerprint: Tuple[Tuple[int, ...], str]) -> None:
+        """
+        加入索引
+        
+        Args:
+            key: 缓存键
+            scope: 匹配范围（只和同一 scope 的条目匹配）
+            fingerprint: fingerprint() 的返回值
+        """
+        signature, canonical_hash = fingerprint
+        bucket_keys = self._bucket_keys(scope, signature)
+        with self._lock:
+            self._remove_locked(key)
+            self._entries[key] = (signature, canonical_hash, bucket_keys)
+            for bucket_key in bucket_keys:
+                self._buckets.setdefault(bucket_key, set()).add(key)
+    
+    def remove(self, key: str) -> None:
+        """从索引中删除"""
+        with self._lock:
+            self._remove_locked(key)
+    
+    def _remove_locked(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for bucket_key in entry[2]:
+            bucket = self._buckets.get(bucket_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[bucket_key]
+    
+    def query(self, scope: str, fingerprint: Tuple[Tuple[int, ...], str]) -> Optional[SimilarityMatch]:
+        """
+        查找最相似的条目
+        
+        Args:
+            scope: 匹配范围
+            fingerprint: fingerprint() 的返回值
+            
+        Returns:
+            相似度达到阈值的最佳匹配；没有时返回 None
+        """
+        signature, canonical_hash = fingerprint
+        best: Optional[SimilarityMatch] = None
+        with self._lock:
+            candidates: Set[str] = set()
+            for bucket_key in self._bucket_keys(scope, signature):
+                candidates.update(self._buckets.get(bucket_key, ()))
+            for key in candidates:
+                other_signature, other_hash, _ = self._entries[key]
+                if other_hash == canonical_hash:
+                    return SimilarityMatch(key, 1.0, "normalized")
+                similarity = self.hasher.similarity(signature, other_signature)
+                if similarity >= self.threshold and (best is None or similarity > best.similarity):
+                    best = SimilarityMatch(key, similarity, "similar")
+        return best
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
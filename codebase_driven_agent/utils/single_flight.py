@@ -0,0 +1,69 @@
+"""相同请求的并发合并（single-flight）
+
+事故发生时多人会在短时间内提交同一个错误。请求缓存只在执行前后查找，并发到达的相同请求
+都会完整执行一次 Agent 分析，重复消耗 LLM 配额。SingleFlight 按 RequestCache 的缓存键登记
+正在执行的分析，后到的相同请求挂到已有的执行上等待同一个结果；执行结束（无论成功与否）后
+登记随即删除，之后的请求走缓存或重新执行。
+
+合并只在同一个事件循环（同一个 worker 进程）内生效。
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from codebase_driven_agent.utils.logger import setup_logger
+from codebase_driven_agent.utils.metrics import get_metrics_collector
+
+logger = setup_logger("codebase_driven_agent.utils.single_flight")
+
+
+class SingleFlight:
+    """按键合并并发执行的协程（只能在事件循环中使用）"""
+
+    def __init__(self):
+        # 键 -> 正在执行的任务
+        self._flights: Dict[str, asyncio.Task] = {}
+
+    async def run(
+        self,
+        key: str,
+        factory: Callable[[], Awaitable[Any]],
+        endpoint: str = "",
+    ) -> Tuple[Any, bool]:
+        """
+        执行协程；相同键的协程正在执行时等待它的结果
+
+        执行在独立的任务中进行，某个等待方被取消（例如客户端断开）不会影响其他等待方。
+
+        Args:
+            key: 合并键（RequestCache 的缓存键）
+            factory: 创建协程的函数，只有第一个请求会调用
+            endpoint: 发起请求的接口（用于指标标签）
+
+        Returns:
+            (执行结果, 是否复用了其他请求发起的执行)
+        """
+        task = self._flights.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.create_task(factory())
+            self._flights[key] = task
+            task.add_done_callback(lambda done: self._discard(key, done))
+        else:
+            logger.info(f"Attached to in-flight analysis {key[:8]}... ({endpoint})")
+            get_metrics_collector().increment("analysis_coalesced_total", labels={"endpoint": endpoint})
+        return await asyncio.shield(task), shared
+
+    def _discard(self, key: str, task: asyncio.Task) -> None:
+        """执行结束后删除登记"""
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        # 所有等待方都已取消时由这里读取异常，避免 "exception was never retrieved" 警告
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"In-flight analysis {key[:8]}... failed: {task.exception()}")
+
+    def in_flight(self, key: str) -> bool:
+        """相同键的执行是否正在进行"""
+        return key in self._flights
+
+    def __len__(self) -> int:
+        return len(self._flights)
@@ -0,0 +1,304 @@
+"""异步分析任务存储
+
+支持两种存储（由 TASK_STORAGE_TYPE 选择）：
+- memory：进程内存储，按更新时间维护最小堆，过期清理和超量淘汰只处理堆顶的任务
+- redis：任务保存在 Redis 中并使用原生的键过期，多个 worker 共享同一份任务状态
+"""
+import heapq
+import itertools
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from codebase_driven_agent.config import settings
+from codebase_driven_agent.utils.logger import setup_logger
+
+logger = setup_logger("codebase_driven_agent.utils.task_store")
+
+# Redis 中任务数据和任务索引的键前缀
+REDIS_KEY_PREFIX = "codebase_agent:task:"
+REDIS_INDEX_KEY = "codebase_agent:tasks"
+
+
+def _new_task(task_id: str, status: str) -> Dict[str, Any]:
+    """创建新的任务数据"""
+    now = datetime.now()
+    return {
+        "task_id": task_id,
+        "status": status,
+        "created_at": now,
+        "updated_at": now,
+        "result": None,
+        "error": None,
+        "execution_time": None,
+    }
+
+
+class TaskStore(ABC):
+    """任务存储接口"""
+    
+    def __init__(self, ttl: int, max_tasks: int):
+        """
+        Args:
+            ttl: 任务过期时间（秒），从最后一次更新开始计算
+            max_tasks: 最多保留的任务数，超出时淘汰最久未更新的任务
+        """
+        self.ttl = ttl
+        self.max_tasks = max_tasks
+    
+    @abstractmethod
+    def create(self, task_id: str, status: str = "pending") -> Dict[str, Any]:
+        """创建任务"""
+        pass
+    
+    @abstractmethod
+    def update(self, task_id: str, **kwargs) -> Optional[Dict[str, Any]]:
+        """更新任务字段，任务不存在时返回 None"""
+        pass
+    
+    @abstractmethod
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务，不存在或已过期时返回 None"""
+        pass
+    
+    @abstractmethod
+    def cleanup(self) -> int:
+        """清理过期和超出数量限制的任务，返回清理的数量"""
+        pass
+    
+    def close(self) -> None:
+        """释放存储占用的资源"""
+        pass
+
+
+class MemoryTaskStore(TaskStore):
+    """进程内任务存储（线程安全）
+    
+    堆中保存 (更新时间, 版本号, task_id)，任务每次更新都会压入新的条目，
+    旧条目在出堆时按版本号识别并跳过，清理的开销与实际清理的任务数成正比。
+    """
+    
+    def __init__(self, ttl: int, max_tasks: int):
+        super().__init__(ttl, max_tasks)
+        self._tasks: Dict[str, Dict[str, Any]] = {}
+        # task_id -> (最后更新时间, 版本号)
+        self._versions: Dict[str, Tuple[float, int]] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+    
+    def _touch(self, task_id: str) -> None:
+        """记录任务更新时间并压入堆（需要持有锁）"""
+        entry = (time.time(), next(self._counter), task_id)
+        self._versions[task_id] = entry[:2]
+        heapq.heappush(self._heap, entry)
+        # 频繁更新会留下大量旧条目，超过有效条目数的两倍时重建堆
+        if len(self._heap) > 2 * len(self._tasks) + 64:
+            self._heap = [(ts, version, tid) for tid, (ts, version) in self._versions.items()]
+            heapq.heapify(self._heap)
+    
+    def _pop_oldest(self) -> Optional[Tuple[float, str]]:
+        """弹出最久未更新的任务（需要持有锁），返回 (更新时间, task_id)"""
+        while self._heap:
+            updated, version, task_id = self._heap[0]
+            if self._versions.get(task_id) != (updated, version):
+                heapq.heappop(self._heap)
+                continue
+            return updated, task_id
+        return None
+    
+    def _remove(self, task_id: str) -> None:
+        """删除任务（需要持有锁）"""
+        heapq.heappop(self._heap)
+        del self._tasks[task_id]
+        del self._versions[task_id]
+    
+    def create(self, task_id: str, status: str = "pending") -> Dict[str, Any]:
+        task = _new_task(task_id, status)
+        with self._lock:
+            self._tasks[task_id] = task
+            self._touch(task_id)
+        return dict(task)
+    
+    def update(self, task_id: str, **kwargs) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return None
+            task.update(kwargs)
+            task["updated_at"] = datetime.now()
+            self._touch(task_id)
+            return dict(task)
+    
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None or self._versions[task_id][0] + self.ttl < time.time():
+                return None
+            return dict(task)
+    
+    def cleanup(self) -> int:
+        removed = 0
+        with self._lock:
+            expire_before = time.time() - self.ttl
+            while True:
+                oldest = self._pop_oldest()
+                if oldest is None:
+                    break
+                updated, task_id = oldest
+                if updated < expire_before:
+                    self._remove(task_id)
+                    logger.info(f"Cleaned up expired task: {task_id}")
+                elif len(self._tasks) > self.max_tasks:
+                    self._remove(task_id)
+                    logger.info(f"Removed excess task: {task_id}")
+                else:
+                    break
+                removed += 1
+        return removed
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._tasks)
+
+
+class RedisTaskStore(TaskStore):
+    """Redis 任务存储
+    
+    每个任务保存为一个带过期时间的 JSON 字符串，过期由 Redis 负责；
+    另外用一个有序集合按更新时间索引任务，用于限制最大任务数。
+    """
+    
+    def __init__(self, ttl: int, max_tasks: int, client: Any = None, redis_url: Optional[str] = None):
+        """
+        Args:
+            ttl: 任务过期时间（秒）
+            max_tasks: 最多保留的任务数
+            client: Redis 客户端（不提供时根据 redis_url 创建）
+            redis_url: Redis 连接 URL，默认使用配置
+        """
+        super().__init__(ttl, max_tasks)
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(
+                redis_url or settings.redis_url,
+                decode_responses=True,
+                socket_timeout=5,
+                socket_connect_timeout=5,
+            )
+        self.client = client
+    
+    @staticmethod
+    def _key(task_id: str) -> str:
+        return REDIS_KEY_PREFIX + task_id
+    
+    @staticmethod
+    def _dumps(task: Dict[str, Any]) -> str:
+        """序列化任务（时间转为 ISO 格式，分析结果转为字典）"""
+        data = dict(task)
+        for field in ("created_at", "updated_at"):
+            if isinstance(data.get(field), datetime):
+                data[field] = data[field].isoformat()
+        result = data.get("result")
+        if hasattr(result, "model_dump"):
+            data["result"] = result.model_dump(mode="json")
+        return json.dumps(data, ensure_ascii=False)
+    
+    @staticmethod
+    def _loads(raw: str) -> Dict[str, Any]:
+        """反序列化任务"""
+        task = json.loads(raw)
+        for field in ("created_at", "updated_at"):
+            if task.get(field):
+                task[field] = datetime.fromisoformat(task[field])
+        return task
+    
+    def _save(self, task: Dict[str, Any]) -> None:
+        """写入任务并刷新过期时间和索引"""
+        pipe = self.client.pipeline()
+        pipe.set(self._key(task["task_id"]), self._dumps(task), ex=self.ttl)
+        pipe.zadd(REDIS_INDEX_KEY, {task["task_id"]: time.time()})
+        pipe.execute()
+    
+    def create(self, task_id: str, status: str = "pending") -> Dict[str, Any]:
+        task = _new_task(task_id, status)
+        self._save(task)
+        return task
+    
+    def update(self, task_id: str, **kwargs) -> Optional[Dict[str, Any]]:
+        # 任务只由执行它的 worker 更新，读取-修改-写入不需要额外加锁
+        task = self.get(task_id)
+        if task is None:
+            return None
+        task.update(kwargs)
+        task["updated_at"] = datetime.now()
+        self._save(task)
+        return task
+    
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        raw = self.client.get(self._key(task_id))
+        if raw is None:
+            return None
+        return self._loads(raw)
+    
+    def cleanup(self) -> int:
+        # 任务数据由 Redis 自动过期，这里只需要清理索引并淘汰超出数量的任务
+        removed = self.client.zremrangebyscore(REDIS_INDEX_KEY, "-inf", time.time() - self.ttl)
+        excess = self.client.zcard(REDIS_INDEX_KEY) - self.max_tasks
+        if excess > 0:
+            task_ids = [task_id for task_id, _ in self.client.zpopmin(REDIS_INDEX_KEY, excess)]
+            if task_ids:
+                self.client.delete(*[self._key(task_id) for task_id in task_ids])
+                logger.info(f"Removed {len(task_ids)} excess tasks")
+            removed += len(task_ids)
+        return removed
+    
+    def close(self) -> None:
+        self.client.close()
+
+
+# 全局任务存储实例
+_task_store: Optional[TaskStore] = None
+_task_store_lock = threading.Lock()
+
+
+def _create_task_store() -> TaskStore:
+    """根据配置创建任务存储（Redis 不可用时回退到内存存储）"""
+    storage_type = settings.task_storage_type.lower()
+    
+    if storage_type == "redis":
+        if not settings.redis_url:
+            logger.warning("TASK_STORAGE_TYPE=redis but REDIS_URL is not set, using memory task store")
+        else:
+            try:
+                store = RedisTaskStore(settings.task_ttl, settings.max_tasks)
+                store.client.ping()
+                logger.info("Using Redis task store")
+                return store
+            except Exception as e:
+                logger.error(f"Failed to connect to Redis task store, using memory task store: {str(e)}")
+    elif storage_type != "memory":
+        logger.warning(f"Unknown task storage type: {storage_type}, defaulting to memory")
+    
+    return MemoryTaskStore(settings.task_ttl, settings.max_tasks)
+
+
+def get_task_store() -> TaskStore:
+    """获取全局任务存储实例"""
+    global _task_store
+    with _task_store_lock:
+        if _task_store is None:
+            _task_store = _create_task_store()
+        return _task_store
+
+
+def close_task_store() -> None:
+    """关闭全局任务存储（服务器关闭时调用）"""
+    global _task_store
+    with _task_store_lock:
+        store, _task_store = _task_store, None
+    if store is not None:
+        store.close()
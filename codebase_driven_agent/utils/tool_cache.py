@@ -0,0 +1,284 @@
+"""跨请求的工具结果缓存
+
+不同请求（例如多个用户排查同一个故障）经常重复执行相同的 code_search、grep、read 和数据库 schema 查询。
+BaseCodebaseTool 在执行前按「工具名 + 规范化参数 + 数据版本」查找缓存，命中时直接返回上次的输出。
+
+数据版本由各工具提供（BaseCodebaseTool._cache_version），数据变化时版本随之变化，旧条目不会再被命中：
+- 代码工具：Git HEAD + 仓库变更代数（仓库监听服务分发失效通知时递增）；read 使用文件的修改时间和大小
+- 日志工具：时间桶（最近的日志持续写入，缓存最多复用一个时间桶）
+- 数据库工具：schema 版本（只缓存 schema 查询）
+返回 None 表示当前无法确定数据版本，不使用缓存。
+
+每个工具有独立的 TTL、条目数和字节数上限（见 DEFAULT_POLICIES，可通过 TOOL_CACHE_POLICIES 覆盖），
+命中率等统计按工具写入指标收集器。
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from codebase_driven_agent.config import settings
+from codebase_driven_agent.utils.logger import setup_logger
+from codebase_driven_agent.utils.metrics import get_metrics_collector
+
+logger = setup_logger("codebase_driven_agent.utils.tool_cache")
+
+# 各工具默认的缓存策略：ttl（秒）、max_entries（条目数）、max_bytes（输出字节数）
+# 未列出的工具（bash、webfetch、websearch 等有副作用或依赖外部状态的工具）不缓存
+DEFAULT_POLICIES: Dict[str, Dict[str, int]] = {
+    "code_search": {"ttl": 1800, "max_entries": 256, "max_bytes": 8 * 1024 * 1024},
+    "grep": {"ttl": 1800, "max_entries": 512, "max_bytes": 8 * 1024 * 1024},
+    "glob": {"ttl": 1800, "max_entries": 256, "max_bytes": 4 * 1024 * 1024},
+    "read": {"ttl": 1800, "max_entries": 1024, "max_bytes": 16 * 1024 * 1024},
+    "database_query": {"ttl": 3600, "max_entries": 128, "max_bytes": 2 * 1024 * 1024},
+    "log_search": {"ttl": 300, "max_entries": 256, "max_bytes": 8 * 1024 * 1024},
+}
+
+
+class _ToolCacheShard:
+    """单个工具的 LRU 缓存（条目按最近访问排序）"""
+    
+    def __init__(self, ttl: int, max_entries: int, max_bytes: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> (过期时间, 字节数, 输出)
+        self._entries: "OrderedDict[str, Tuple[float, int, str]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.time():
+                self._pop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+    
+    def set(self, key: str, output: str) -> bool:
+        size = len(output.encode("utf-8"))
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (time.time() + self.ttl, size, output)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+                self.evictions += 1
+        return True
+    
+    def _pop(self, key: str) -> None:
+        """删除条目（需要持有锁）"""
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "ttl": self.ttl,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
+
+
+class ToolResultCache:
+    """跨请求的工具结果缓存（线程安全，每个工具一个分片）"""
+    
+    def __init__(self, policies: Optional[Dict[str, Dict[str, int]]] = None):
+        """
+        Args:
+            policies: 工具名 -> 缓存策略（ttl、max_entries、max_bytes），与默认策略合并；ttl 为 0 表示不缓存该工具
+        """
+        self.policies: Dict[str, Dict[str, int]] = {name: dict(policy) for name, policy in DEFAULT_POLICIES.items()}
+        for name, policy in (policies or {}).items():
+            self.policies.setdefault(name, {"ttl": 0, "max_entries": 256, "max_bytes": 4 * 1024 * 1024}).update(policy)
+        self._shards: Dict[str, _ToolCacheShard] = {}
+        self._lock = threading.Lock()
+        # 仓库变更代数：仓库监听服务分发失效通知时递增
+        self._repo_generation = 0
+    
+    def is_enabled(self, tool_name: str) -> bool:
+        """工具是否启用缓存"""
+        policy = self.policies.get(tool_name)
+        return bool(policy and policy.get("ttl", 0) > 0 and policy.get("max_entries", 0) > 0)
+    
+    def _shard(self, tool_name: str) -> _ToolCacheShard:
+        shard = self._shards.get(tool_name)
+        if shard is None:
+            with self._lock:
+                shard = self._shards.get(tool_name)
+                if shard is None:
+                    policy = self.policies[tool_name]
+                    shard = _ToolCacheShard(policy["ttl"], policy["max_entries"], policy["max_bytes"])
+                    self._shards[tool_name] = shard
+        return shard
+    
+    @staticmethod
+    def make_key(arguments: Dict[str, Any], version: str) -> str:
+        """
+        生成缓存键
+        
+        Args:
+            arguments: 工具参数（已绑定默认值）
+            version: 数据版本
+            
+        Returns:
+            缓存键（SHA1 hash）
+        """
+        normalized = {
+            name: value.strip() if isinstance(value, str) else value
+            for name, value in arguments.items()
+        }
+        json_str = json.dumps([version, normalized], sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(json_str.encode("utf-8")).hexdigest()
+    
+    def get(self, tool_name: str, key: str) -> Optional[str]:
+        """获取缓存的工具输出，不存在或已过期时返回 None"""
+        shard = self._shard(tool_name)
+        output = shard.get(key)
+        metrics = get_metrics_collector()
+        labels = {"tool": tool_name}
+        metrics.increment("tool_cache_hits_total" if output is not None else "tool_cache_misses_total", labels=labels)
+        metrics.set_gauge("tool_cache_hit_rate", shard.hits / (shard.hits + shard.misses), labels=labels)
+        if output is not None:
+            logger.debug(f"Tool cache hit: {tool_name} {key[:8]}...")
+        return output
+    
+    def set(self, tool_name: str, key: str, output: str) -> None:
+        """缓存工具输出（超过该工具字节数上限的输出不缓存）"""
+        shard = self._shard(tool_name)
+        if shard.set(key, output):
+            get_metrics_collector().set_gauge("tool_cache_bytes", shard.get_stats()["bytes"], labels={"tool": tool_name})
+    
+    @property
+    def repo_generation(self) -> int:
+        return self._repo_generation
+    
+    def invalidate_repo(self, rel_paths: Optional[Any] = None) -> None:
+        """仓库文件变更（仓库监听服务的失效回调），代码工具的数据版本随之变化"""
+        with self._lock:
+            self._repo_generation += 1
+    
+    def clear(self) -> None:
+        """清空所有工具的缓存"""
+        with self._lock:
+            shards = list(self._shards.values())
+        for shard in shards:
+            shard.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取各工具的缓存统计信息"""
+        with self._lock:
+            shards = dict(self._shards)
+        return {
+            "repo_generation": self._repo_generation,
+            "tools": {name: shard.get_stats() for name, shard in shards.items()},
+        }
+
+
+def read_git_head(repo_path: Path) -> Optional[str]:
+    """
+    读取仓库当前 HEAD 指向的提交（直接读取 .git 中的文件，不启动 git 进程）
+    
+    Args:
+        repo_path: 代码仓库路径
+        
+    Returns:
+        提交哈希；不是 Git 仓库或读取失败时返回 None
+    """
+    git_dir = Path(repo_path) / ".git"
+    try:
+        head = (git_dir / "HEAD").read_text().strip()
+        if not head.startswith("ref: "):
+            return head
+        ref = head[5:]
+        ref_file = git_dir / ref
+        if ref_file.is_file():
+            return ref_file.read_text().strip()
+        packed_refs = git_dir / "packed-refs"
+        if packed_refs.is_file():
+            for line in packed_refs.read_text().splitlines():
+                if line.endswith(" " + ref):
+                    return line.split(" ", 1)[0]
+        return ref
+    except OSError:
+        return None
+
+
+def get_repo_version(repo_path: Optional[str]) -> Optional[str]:
+    """
+    代码仓库的数据版本（用于 code_search、grep、glob）
+    
+    只有仓库监听服务运行时才能及时感知未提交的修改，未运行时返回 None（不缓存）。
+    
+    Args:
+        repo_path: 代码仓库路径
+        
+    Returns:
+        数据版本；无法确定时返回 None
+    """
+    from codebase_driven_agent.utils.repo_watcher import get_repo_watcher
+    
+    if not repo_path or get_repo_watcher() is None:
+        return None
+    repo_path = Path(repo_path).resolve()
+    head = read_git_head(repo_path) or "-"
+    return f"{repo_path}:{head}:{get_tool_result_cache().repo_generation}"
+
+
+def get_file_version(path: Path) -> Optional[str]:
+    """
+    单个文件的数据版本（用于 read）：修改时间和大小
+    
+    Args:
+        path: 文件路径
+        
+    Returns:
+        数据版本；文件不存在时返回 None
+    """
+    try:
+        stat_result = path.stat()
+    except OSError:
+        return None
+    return f"{path.resolve()}:{stat_result.st_mtime_ns}:{stat_result.st_size}"
+
+
+# 全局缓存实例
+_tool_result_cache: Optional[ToolResultCache] = None
+_tool_cache_lock = threading.Lock()
+
+
+def get_tool_result_cache() -> ToolResultCache:
+    """获取全局工具结果缓存实例"""
+    global _tool_result_cache
+    if _tool_result_cache is None:
+        with _tool_cache_lock:
+            if _tool_result_cache is None:
+                _tool_result_cache = ToolResultCache(settings.tool_cache_policies)
+    return _tool_result_cache
+
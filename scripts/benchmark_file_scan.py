@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+文件内容扫描基准测试：对比原串行扫描方式与并行扫描引擎
+
+在临时目录生成合成代码仓库，分别测量：
+- legacy：原 _search_in_files 的方式（逐个读取整个文件并 lower() 后查找）
+- serial：扫描引擎，当前进程串行（workers=1）
+- parallel：扫描引擎，进程池并行
+
+使用方法:
+    python scripts/benchmark_file_scan.py [--files 100000] [--workers 8] [--query needle]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from codebase_driven_agent.utils.file_scanner import scan_files, shutdown_scan_pool
+
+
+WORDS = ["process", "payment", "order", "user", "session", "cache", "request", "handler", "config", "value"]
+
+
+def generate_tree(root: Path, file_count: int, hit_ratio: float, lines_per_file: int) -> None:
+    """生成合成代码仓库（每个目录 100 个文件）"""
+    rng = random.Random(42)
+    for i in range(file_count):
+        directory = root / f"pkg_{i // 100:04d}"
+        if i % 100 == 0:
+            directory.mkdir(parents=True, exist_ok=True)
+        lines = []
+        for j in range(lines_per_file):
+            a, b = rng.choice(WORDS), rng.choice(WORDS)
+            lines.append(f"def {a}_{b}_{j}(arg):\n    return {b}_{a}(arg)  # {a} {b}\n")
+        if rng.random() < hit_ratio:
+            lines.insert(rng.randrange(len(lines) + 1), "    raise RuntimeError('Needle not found')\n")
+        (directory / f"module_{i:06d}.py").write_text("".join(lines))
+
+
+def list_files(root: Path):
+    """列出仓库中的所有 Python 文件"""
+    paths = []
+    for current, dirs, files in os.walk(root):
+        dirs.sort()
+        for file in sorted(files):
+            if file.endswith(".py"):
+                paths.append(Path(current) / file)
+    return paths
+
+
+def legacy_scan(paths, query: str, max_results: int):
+    """原串行实现：读取整个文件，lower() 后查找，再逐行匹配"""
+    results = []
+    query_lower = query.lower()
+    for path in paths:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            content = f.read()
+        if query_lower in content.lower():
+            matching = [
+                (i, line.strip()) for i, line in enumerate(content.split("\n"), 1)
+                if query_lower in line.lower()
+            ][:5]
+            results.append((path, matching))
+            if len(results) >= max_results:
+                break
+    return results
+
+
+def measure(name: str, func, repeat: int):
+    """多次运行取最短耗时"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<10} {best * 1000:>10.1f} ms   results: {len(result)}")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文件内容扫描基准测试")
+    parser.add_argument("--files", type=int, default=100000, help="合成文件数量")
+    parser.add_argument("--lines", type=int, default=20, help="每个文件的函数数量")
+    parser.add_argument("--hit-ratio", type=float, default=0.001, help="包含查询字符串的文件比例")
+    parser.add_argument("--query", default="needle", help="查询字符串（忽略大小写）")
+    parser.add_argument("--max-results", type=int, default=1000000, help="最大返回文件数（较小时测试提前终止）")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="并行进程数")
+    parser.add_argument("--repeat", type=int, default=3, help="每种方式的运行次数")
+    parser.add_argument("--dir", help="使用已有目录（不存在时生成，结束后保留）")
+    args = parser.parse_args()
+    
+    root = Path(args.dir) if args.dir else Path(tempfile.mkdtemp(prefix="scan_bench_"))
+    try:
+        if not root.exists() or not any(root.iterdir()):
+            print(f"Generating {args.files} files in {root} ...")
+            start = time.perf_counter()
+            generate_tree(root, args.files, args.hit_ratio, args.lines)
+            print(f"Generated in {time.perf_counter() - start:.1f}s")
+        
+        paths = list_files(root)
+        print(f"Files: {len(paths)}, workers: {args.workers}, query: {args.query!r}\n")
+        
+        legacy = measure("legacy", lambda: legacy_scan(paths, args.query, args.max_results), args.repeat)
+        serial = measure("serial", lambda: scan_files(
+            paths, args.query, ignore_case=True, max_files=args.max_results,
+            max_matches_per_file=5, skip_binary=False, workers=1,
+        ), args.repeat)
+        parallel = measure("parallel", lambda: scan_files(
+            paths, args.query, ignore_case=True, max_files=args.max_results,
+            max_matches_per_file=5, skip_binary=False, workers=args.workers,
+        ), args.repeat)
+        
+        print(f"\nserial speedup:   {legacy / serial:.2f}x")
+        print(f"parallel speedup: {legacy / parallel:.2f}x")
+    finally:
+        shutdown_scan_pool()
+        if not args.dir:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+LLM 并发基准测试：对比图节点异步调用 LLM 与阻塞调用 LLM 时单个事件循环的并发能力
+
+启动一个 OpenAI 兼容的桩 LLM 服务（每次请求固定延迟后返回计划、决策或结论），
+在同一个事件循环中并发运行多个完整的分析流程（计划 -> 执行步骤 -> 决策 -> 综合），分别测量：
+- blocking：节点在线程池中调用同步的 llm.invoke（改造前 LangGraph 执行同步节点的方式），并发受线程池大小限制
+- async：节点直接 await llm.ainvoke，等待响应期间不占用线程
+
+使用方法:
+    python scripts/benchmark_llm_concurrency.py [--concurrency 50] [--latency 0.5]
+"""
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import socket
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import uvicorn
+from fastapi import FastAPI, Request
+from langchain_core.tools import BaseTool
+
+from codebase_driven_agent.agent.graph_executor import GraphExecutor
+from codebase_driven_agent.agent.utils import close_llm_clients, get_llm
+from codebase_driven_agent.config import settings
+
+
+class EchoTool(BaseTool):
+    """返回输入文本的工具（不访问文件系统，只测量 LLM 调用的并发）"""
+    name: str = "echo"
+    description: str = "Echo the input text"
+    
+    def _run(self, text: str) -> str:
+        return f"echo: {text}"
+
+
+class StubStats:
+    """桩服务的请求统计"""
+    
+    def __init__(self):
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+    
+    def reset(self):
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+
+def stub_response(prompt: str) -> str:
+    """根据 prompt 类型返回计划、结论或决策"""
+    if "判断是否需要用户提供更多信息" in prompt:
+        return json.dumps({
+            "action": "continue",
+            "reasoning": "start",
+            "next_steps": [{"step": 1, "action": "echo", "tool_name": "echo", "tool_params": {"text": "hello"}}],
+        })
+    if "生成最终的分析结论" in prompt:
+        return json.dumps({"root_cause": "stub", "suggestions": [], "confidence": 0.9})
+    return json.dumps({"action": "synthesize", "reasoning": "enough information"})
+
+
+def create_stub_app(latency: float, stats: StubStats) -> FastAPI:
+    """创建 OpenAI 兼容的桩 LLM 服务"""
+    app = FastAPI()
+    
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats.requests += 1
+        stats.in_flight += 1
+        stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+        try:
+            await asyncio.sleep(latency)
+        finally:
+            stats.in_flight -= 1
+        return {
+            "id": f"chatcmpl-{stats.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": stub_response(body["messages"][-1]["content"])},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        }
+    
+    return app
+
+
+def start_stub_server(app: FastAPI) -> tuple:
+    """在后台线程启动桩服务，返回 (server, port)"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="error", backlog=4096)
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, port
+
+
+class BlockingLLM:
+    """在线程池中调用同步 invoke 的 LLM 包装（模拟改造前同步节点的执行方式）"""
+    
+    def __init__(self, llm):
+        self.llm = llm
+    
+    async def ainvoke(self, messages):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(self.llm.invoke, messages))
+
+
+async def measure_loop_lag(stop: asyncio.Event, lags: list, interval: float = 0.01):
+    """测量事件循环的调度延迟"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def run_analyses(mode: str, concurrency: int) -> dict:
+    """并发运行多个完整的分析流程"""
+    llm = get_llm()
+    if mode == "blocking":
+        llm = BlockingLLM(llm)
+    with patch("codebase_driven_agent.agent.graph_executor.get_llm", return_value=llm), \
+            patch("codebase_driven_agent.agent.graph_executor.get_tools", return_value=[EchoTool()]):
+        executors = [GraphExecutor() for _ in range(concurrency)]
+    
+    durations = []
+    
+    async def run_one(executor):
+        start = time.perf_counter()
+        async for _ in executor.run("benchmark"):
+            pass
+        durations.append(time.perf_counter() - start)
+    
+    stop = asyncio.Event()
+    lags = []
+    lag_task = asyncio.create_task(measure_loop_lag(stop, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(run_one(executor) for executor in executors))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await lag_task
+    
+    durations.sort()
+    return {
+        "elapsed": elapsed,
+        "p50": statistics.median(durations),
+        "p95": durations[int(len(durations) * 0.95) - 1] if len(durations) > 1 else durations[0],
+        "max_lag": max(lags) if lags else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM 并发基准测试")
+    parser.add_argument("--concurrency", type=int, default=50, help="并发分析数")
+    parser.add_argument("--latency", type=float, default=0.5, help="桩 LLM 每次请求的延迟（秒）")
+    parser.add_argument("--modes", default="blocking,async", help="测试的模式（逗号分隔）")
+    args = parser.parse_args()
+    
+    # 关闭执行器的详细日志，避免日志输出影响测量
+    logging.disable(logging.INFO)
+    stats = StubStats()
+    server, port = start_stub_server(create_stub_app(args.latency, stats))
+    settings.llm_base_url = f"http://127.0.0.1:{port}/v1"
+    settings.llm_api_key = "benchmark-api-key"
+    settings.llm_max_connections = max(settings.llm_max_connections, args.concurrency)
+    settings.llm_max_keepalive_connections = max(settings.llm_max_keepalive_connections, args.concurrency)
+    
+    # 三次 LLM 调用（计划、决策、综合）串行执行的理论下限
+    print(f"Concurrency: {args.concurrency}, stub latency: {args.latency}s, "
+          f"ideal per analysis: {3 * args.latency:.2f}s\n")
+    print(f"{'mode':<10} {'total':>9} {'analyses/s':>11} {'p50':>8} {'p95':>8} {'llm in-flight':>14} {'loop lag':>9}")
+    
+    async def run_all():
+        results = {}
+        for mode in args.modes.split(","):
+            stats.reset()
+            result = await run_analyses(mode, args.concurrency)
+            results[mode] = result
+            print(
+                f"{mode:<10} {result['elapsed']:>8.2f}s {args.concurrency / result['elapsed']:>11.1f} "
+                f"{result['p50']:>7.2f}s {result['p95']:>7.2f}s {stats.max_in_flight:>14} "
+                f"{result['max_lag'] * 1000:>7.1f}ms"
+            )
+        await close_llm_clients()
+        return results
+    
+    try:
+        results = asyncio.run(run_all())
+        if "blocking" in results and "async" in results:
+            print(f"\nasync speedup: {results['blocking']['elapsed'] / results['async']['elapsed']:.2f}x")
+    finally:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+按时间范围查询日志的基准测试：对比逐行扫描与二分查找定位
+
+在临时目录生成按时间排序的合成日志（默认共 4GB，按天分为多个文件），分别测量：
+- legacy：原 FileLogQuery 的方式（从第一行开始逐行扫描，再按时间过滤）
+- seek：按文件名/修改时间跳过文件，文件内二分查找时间窗口后只扫描窗口内的行
+
+使用方法:
+    python scripts/benchmark_log_seek.py [--size-gb 4] [--files 4] [--window 600] [--query error]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from codebase_driven_agent.utils.log_index import line_timestamp
+from codebase_driven_agent.utils.log_seek import file_may_overlap, iter_time_window
+
+
+LEVELS = ["INFO"] * 8 + ["WARN", "ERROR"]
+WORDS = ["order", "payment", "user", "session", "cache", "request", "handler", "timeout", "retry", "db"]
+BASE = datetime(2024, 1, 1)
+
+
+def generate_logs(root: Path, size_gb: float, file_count: int) -> None:
+    """生成按天滚动的合成日志，每个文件覆盖一天，修改时间设为当天结束"""
+    rng = random.Random(42)
+    file_bytes = int(size_gb * 1024 ** 3 / file_count)
+    for day in range(file_count):
+        start = BASE + timedelta(days=day)
+        path = root / f"app-{start:%Y-%m-%d}.log"
+        # 先估算一行的平均长度，使时间均匀覆盖一整天
+        per_second = max(1, file_bytes // (86400 * 90))
+        written = 0
+        with open(path, "w", buffering=8 * 1024 * 1024) as f:
+            for second in range(86400):
+                stamp = f"{start + timedelta(seconds=second):%Y-%m-%d %H:%M:%S}"
+                chunk = []
+                for _ in range(per_second):
+                    words = " ".join(rng.choice(WORDS) for _ in range(6))
+                    chunk.append(f"{stamp} {rng.choice(LEVELS)} [worker-{rng.randrange(16)}] {words}\n")
+                    if rng.random() < 0.02:
+                        chunk.append("    at com.example.Handler.process(Handler.java:128)\n")
+                data = "".join(chunk)
+                f.write(data)
+                written += len(data)
+                if written >= file_bytes:
+                    break
+        end = (start + timedelta(days=1)).timestamp()
+        os.utime(path, (end, end))
+
+
+def legacy_query(paths, query: str, start_ts: float, end_ts: float):
+    """原实现：逐行扫描所有文件，按关键词和时间过滤"""
+    results = []
+    query_lower = query.lower()
+    for path in paths:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            for line_num, line in enumerate(f, 1):
+                if query_lower not in line.lower():
+                    continue
+                ts = line_timestamp(line)
+                if ts is not None and (ts < start_ts or ts > end_ts):
+                    continue
+                results.append((path, line_num))
+    return results
+
+
+def seek_query(paths, query: str, start_ts: float, end_ts: float):
+    """跳过不重叠的文件，文件内二分查找时间窗口"""
+    results = []
+    query_lower = query.lower()
+    for path in paths:
+        if not file_may_overlap(path, start_ts, end_ts):
+            continue
+        for line_num, line in iter_time_window(path, start_ts, end_ts):
+            if query_lower not in line.lower():
+                continue
+            ts = line_timestamp(line)
+            if ts is not None and (ts < start_ts or ts > end_ts):
+                continue
+            results.append((path, line_num))
+    return results
+
+
+def measure(name: str, func, repeat: int):
+    """多次运行取最短耗时"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<10} {best * 1000:>10.1f} ms   results: {len(result)}")
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按时间范围查询日志的基准测试")
+    parser.add_argument("--size-gb", type=float, default=4.0, help="合成日志总大小（GB）")
+    parser.add_argument("--files", type=int, default=4, help="日志文件数量（每个文件一天）")
+    parser.add_argument("--window", type=int, default=600, help="查询时间窗口长度（秒）")
+    parser.add_argument("--query", default="error", help="查询关键词（忽略大小写）")
+    parser.add_argument("--repeat", type=int, default=1, help="每种方式的运行次数")
+    parser.add_argument("--skip-legacy", action="store_true", help="不运行逐行扫描（日志很大时耗时较长）")
+    parser.add_argument("--dir", help="使用已有目录（不存在时生成，结束后保留）")
+    args = parser.parse_args()
+    
+    root = Path(args.dir) if args.dir else Path(tempfile.mkdtemp(prefix="log_seek_bench_"))
+    try:
+        root.mkdir(parents=True, exist_ok=True)
+        if not any(root.iterdir()):
+            print(f"Generating {args.size_gb}GB of logs in {root} ...")
+            start = time.perf_counter()
+            generate_logs(root, args.size_gb, args.files)
+            print(f"Generated in {time.perf_counter() - start:.1f}s")
+        
+        paths = sorted(str(path) for path in root.glob("*.log"))
+        total = sum(os.path.getsize(path) for path in paths)
+        # 窗口位于最后一个文件的中间
+        window_start = (BASE + timedelta(days=len(paths) - 1, hours=12)).timestamp()
+        window_end = window_start + args.window
+        print(f"Files: {len(paths)}, size: {total / 1024 ** 3:.2f}GB, window: {args.window}s, "
+              f"query: {args.query!r}\n")
+        
+        seek, seek_results = measure("seek", lambda: seek_query(paths, args.query, window_start, window_end), args.repeat)
+        if not args.skip_legacy:
+            legacy, legacy_results = measure(
+                "legacy", lambda: legacy_query(paths, args.query, window_start, window_end), args.repeat,
+            )
+            assert legacy_results == seek_results, "seek results differ from linear scan"
+            print(f"\nspeedup: {legacy / seek:.1f}x")
+    finally:
+        if not args.dir:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+请求缓存微基准测试：对比改造前后 RequestCache 在缓存满载时的写入、读取和过期清理耗时
+
+- legacy：改造前的实现，满载写入时对所有条目的访问时间取 min() 找 LRU 条目，过期清理遍历整个字典
+- sharded：当前的 RequestCache（分片锁 + OrderedDict LRU + 过期时间堆）
+
+每种规模先把缓存写满，然后测量：
+- 满载写入（每次写入都要淘汰一个条目）的平均耗时
+- 命中读取的平均耗时
+- 过期清理（1% 的条目过期）占用锁的时间
+
+使用方法:
+    python scripts/benchmark_request_cache.py [--sizes 10000,100000] [--ops 2000]
+"""
+import argparse
+import heapq
+import logging
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from codebase_driven_agent.utils.cache import RequestCache
+
+
+class LegacyRequestCache(RequestCache):
+    """改造前的实现（只保留 get/set/cleanup_expired 的核心逻辑）"""
+    
+    def __init__(self, ttl: int = 3600, max_size: int = 1000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._cache = {}
+        self._access_times = {}
+        self._lock = threading.Lock()
+    
+    def get(self, request_data):
+        cache_key = self._generate_key(request_data)
+        with self._lock:
+            if cache_key not in self._cache:
+                return None
+            cached_item = self._cache[cache_key]
+            if datetime.now() - cached_item["created_at"] > timedelta(seconds=self.ttl):
+                del self._cache[cache_key]
+                self._access_times.pop(cache_key, None)
+                return None
+            self._access_times[cache_key] = datetime.now()
+            return cached_item["result"]
+    
+    def set(self, request_data, result):
+        cache_key = self._generate_key(request_data)
+        with self._lock:
+            if len(self._cache) >= self.max_size and cache_key not in self._cache:
+                lru_key = min(self._access_times.keys(), key=lambda k: self._access_times[k])
+                del self._cache[lru_key]
+                del self._access_times[lru_key]
+            self._cache[cache_key] = {"result": result, "created_at": datetime.now()}
+            self._access_times[cache_key] = datetime.now()
+    
+    def cleanup_expired(self):
+        now = datetime.now()
+        with self._lock:
+            expired_keys = [
+                key for key, item in self._cache.items()
+                if now - item["created_at"] > timedelta(seconds=self.ttl)
+            ]
+            for key in expired_keys:
+                del self._cache[key]
+                self._access_times.pop(key, None)
+        return len(expired_keys)
+    
+    def expire_oldest(self, count: int):
+        """把最早写入的 count 个条目标记为已过期"""
+        expired_at = datetime.now() - timedelta(seconds=self.ttl + 1)
+        for key in list(self._cache)[:count]:
+            self._cache[key]["created_at"] = expired_at
+
+
+def expire_oldest(cache: RequestCache, count: int) -> None:
+    """把最早写入的 count 个条目标记为已过期（修改过期时间并重新压入过期时间堆）"""
+    expired_at = time.time() - 1
+    per_shard = max(1, count // len(cache._shards))
+    for shard in cache._shards:
+        for key in list(shard.entries)[:per_shard]:
+            shard.entries[key].expires_at = expired_at
+            heapq.heappush(shard.expiry_heap, (expired_at, key))
+
+
+def request(i: int) -> dict:
+    return {"input": f"NullPointerException at OrderService.java:{i}", "context_files": []}
+
+
+RESULT = {"root_cause": "x" * 200, "suggestions": ["restart"], "confidence": 0.8}
+
+
+def run(name: str, cache, size: int, ops: int) -> None:
+    for i in range(size):
+        cache.set(request(i), RESULT)
+    
+    # 满载写入：每次写入都会淘汰一个条目
+    write_ops = min(ops, 200) if name == "legacy" and size >= 100000 else ops
+    start = time.perf_counter()
+    for i in range(size, size + write_ops):
+        cache.set(request(i), RESULT)
+    write_us = (time.perf_counter() - start) / write_ops * 1e6
+    
+    # 命中读取
+    start = time.perf_counter()
+    for i in range(size + write_ops - ops, size + write_ops):
+        cache.get(request(i))
+    read_us = (time.perf_counter() - start) / ops * 1e6
+    
+    # 过期清理：1% 的条目过期
+    if name == "legacy":
+        cache.expire_oldest(size // 100)
+    else:
+        expire_oldest(cache, size // 100)
+    start = time.perf_counter()
+    removed = cache.cleanup_expired()
+    cleanup_ms = (time.perf_counter() - start) * 1000
+    
+    print(
+        f"{name:8s} entries={size:>7d}  set@capacity={write_us:9.1f} us/op  "
+        f"get={read_us:6.1f} us/op  cleanup={cleanup_ms:8.2f} ms ({removed} expired)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="请求缓存微基准测试")
+    parser.add_argument("--sizes", default="10000,100000", help="缓存条目数，逗号分隔")
+    parser.add_argument("--ops", type=int, default=2000, help="每项测量的操作次数")
+    args = parser.parse_args()
+    
+    logging.getLogger("codebase_driven_agent.utils.cache").setLevel(logging.WARNING)
+    
+    for size in [int(s) for s in args.sizes.split(",")]:
+        run("legacy", LegacyRequestCache(ttl=3600, max_size=size), size, args.ops)
+        run("sharded", RequestCache(ttl=3600, max_size=size, max_bytes=1 << 40), size, args.ops)
+
+
+if __name__ == "__main__":
+    main()
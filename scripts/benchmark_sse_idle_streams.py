@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+SSE 空闲流基准测试：对比轮询队列与等待队列唤醒时，空闲 SSE 连接占用的 CPU
+
+在同一个事件循环中打开若干个 SSE 流，Agent 发送计划后一直不再产生消息（例如等待用户回复），
+测量一段时间内进程消耗的 CPU 时间和事件循环唤醒次数：
+- polling：改造前的实现，每个流循环 get_nowait() + asyncio.sleep(0.01)
+- bridge：SSEMessageQueue，入队时通过 call_soon_threadsafe 唤醒，空闲时只有心跳定时器
+
+使用方法:
+    python scripts/benchmark_sse_idle_streams.py [--streams 1,10,50,200] [--duration 5]
+"""
+import argparse
+import asyncio
+import logging
+import queue
+import sys
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from codebase_driven_agent.api import sse
+from codebase_driven_agent.api.models import AnalyzeRequest
+
+
+class WakeupCounter:
+    """统计事件循环执行的回调数（每次协程被唤醒都对应一个回调）"""
+    
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.count = 0
+        self._original = loop._run_once
+        
+        def run_once():
+            self.count += len(loop._ready)
+            self._original()
+        
+        loop._run_once = run_once
+
+
+async def idle_agent(executor, input_text, context_files, message_queue):
+    """发送计划后不再产生消息的 Agent"""
+    message_queue.put_nowait({"event": "plan", "data": {"steps": []}})
+
+
+async def polling_stream(message_queue: queue.Queue):
+    """改造前的消息处理循环（只保留轮询和心跳部分）"""
+    loop = asyncio.get_running_loop()
+    last_progress_time = loop.time()
+    while True:
+        try:
+            msg = message_queue.get_nowait()
+        except queue.Empty:
+            await asyncio.sleep(0.01)
+            current_time = loop.time()
+            if current_time - last_progress_time > sse.HEARTBEAT_INTERVAL:
+                yield sse.SSEMessage.progress("等待中...", progress=0.5, step="waiting")
+                last_progress_time = current_time
+            continue
+        yield sse.SSEMessage.format(msg.get("event", "progress"), msg.get("data", {}))
+
+
+async def consume(stream, received: list):
+    """消费 SSE 流直到被取消"""
+    async for _ in stream:
+        received[0] += 1
+
+
+async def run_streams(mode: str, streams: int, duration: float) -> dict:
+    """打开指定数量的空闲流，测量 CPU 时间和唤醒次数"""
+    loop = asyncio.get_running_loop()
+    counter = WakeupCounter(loop)
+    received = [0]
+    if mode == "polling":
+        queues = [queue.Queue() for _ in range(streams)]
+        for message_queue in queues:
+            message_queue.put_nowait({"event": "plan", "data": {"steps": []}})
+        generators = [polling_stream(message_queue) for message_queue in queues]
+    else:
+        generators = [sse._execute_analysis_stream(AnalyzeRequest(input="benchmark")) for _ in range(streams)]
+    
+    tasks = [asyncio.create_task(consume(generator, received)) for generator in generators]
+    # 等待所有流进入空闲状态后再开始测量
+    await asyncio.sleep(0.5)
+    wakeups_before = counter.count
+    cpu_before = time.process_time()
+    await asyncio.sleep(duration)
+    cpu = time.process_time() - cpu_before
+    wakeups = counter.count - wakeups_before
+    
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    for generator in generators:
+        await generator.aclose()
+    return {
+        "cpu_percent": cpu / duration * 100,
+        "wakeups_per_second": wakeups / duration,
+        "messages": received[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SSE 空闲流 CPU 基准测试")
+    parser.add_argument("--streams", default="1,10,50,200", help="空闲流数量（逗号分隔）")
+    parser.add_argument("--duration", type=float, default=5.0, help="每组测量时长（秒）")
+    parser.add_argument("--modes", default="polling,bridge", help="测试的模式（逗号分隔）")
+    args = parser.parse_args()
+    
+    # 关闭流处理的详细日志，避免日志输出影响测量
+    logging.disable(logging.INFO)
+    print(f"Duration: {args.duration}s per run, heartbeat interval: {sse.HEARTBEAT_INTERVAL}s\n")
+    print(f"{'mode':<8} {'streams':>8} {'cpu':>8} {'wakeups/s':>11} {'messages':>9}")
+    
+    with patch("codebase_driven_agent.agent.graph_executor.GraphExecutorWrapper"), \
+            patch.object(sse, "_run_graph_executor_stream", idle_agent):
+        for streams in [int(n) for n in args.streams.split(",")]:
+            for mode in args.modes.split(","):
+                result = asyncio.run(run_streams(mode, streams, args.duration))
+                print(
+                    f"{mode:<8} {streams:>8} {result['cpu_percent']:>7.1f}% "
+                    f"{result['wakeups_per_second']:>11.0f} {result['messages']:>9}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+符号索引管理工具：构建、查看和查询代码仓库的持久化符号索引
+
+使用方法:
+    python scripts/symbol_index.py build [--repo PATH] [--full]
+    python scripts/symbol_index.py stats [--repo PATH]
+    python scripts/symbol_index.py lookup NAME [--repo PATH] [--kind definition] [--limit 20]
+    python scripts/symbol_index.py callers NAME [--repo PATH] [--file PATH] [--depth 3] [--fanout 20]
+    python scripts/symbol_index.py callees NAME [--repo PATH] [--file PATH] [--depth 3] [--fanout 20]
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from codebase_driven_agent.tools.symbol_index import SymbolIndex, get_symbol_index
+from codebase_driven_agent.tools.call_graph import RepoCallGraph
+
+
+def main():
+    parser = argparse.ArgumentParser(description="代码符号索引管理工具")
+    parser.add_argument("--repo", help="代码仓库路径（默认读取 CODE_REPO_PATH）")
+    parser.add_argument("--index", help="索引文件路径（默认根据仓库路径生成）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    build_parser = subparsers.add_parser("build", help="构建或增量更新索引")
+    build_parser.add_argument("--full", action="store_true", help="丢弃现有索引完全重建")
+    
+    subparsers.add_parser("stats", help="查看索引统计信息")
+    
+    lookup_parser = subparsers.add_parser("lookup", help="按名称查询符号")
+    lookup_parser.add_argument("name", help="符号名称")
+    lookup_parser.add_argument("--kind", choices=["definition", "call", "reference", "class", "import"], help="符号类别")
+    lookup_parser.add_argument("--limit", type=int, default=20, help="最大返回记录数")
+    
+    for command, help_text in (("callers", "查询调用了该函数的函数"), ("callees", "查询该函数调用的函数")):
+        graph_parser = subparsers.add_parser(command, help=help_text)
+        graph_parser.add_argument("name", help="函数名")
+        graph_parser.add_argument("--file", help="限定函数定义所在文件")
+        graph_parser.add_argument("--depth", type=int, default=3, help="最大追踪深度")
+        graph_parser.add_argument("--fanout", type=int, default=20, help="每个函数最多展开的数量")
+    
+    args = parser.parse_args()
+    
+    if args.index:
+        index = SymbolIndex(Path(args.repo or "."), index_path=Path(args.index))
+    else:
+        index = get_symbol_index(Path(args.repo) if args.repo else None)
+    
+    if args.command == "build":
+        result = index.build(full=args.full)
+    elif args.command == "stats":
+        result = index.get_stats()
+    elif args.command in ("callers", "callees"):
+        index.ensure_fresh()
+        graph = RepoCallGraph(index)
+        query = graph.callers_of if args.command == "callers" else graph.callees_of
+        result = query(args.name, file_path=args.file, max_depth=args.depth, max_fanout=args.fanout)
+    else:
+        result = index.lookup(args.name, kinds=[args.kind] if args.kind else None, limit=args.limit)
+    
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""测试用的进程内 Redis 替身
+
+实现代码中用到的 redis-py 命令子集（字符串、键过期、有序集合、pipeline、发布/订阅），
+数据保存在内存中，过期时间由可控的时钟决定，测试不需要真实的 Redis 服务。
+共享同一个 FakeRedis 实例的多个客户端对象即可模拟多个 worker。
+"""
+import threading
+import time
+
+
+class FakeRedis:
+    """进程内 Redis 替身（decode_responses=True 语义，值保存为字符串）"""
+    
+    def __init__(self, clock=None):
+        """
+        Args:
+            clock: 返回当前时间（秒）的函数，默认 time.time
+        """
+        self.clock = clock or time.time
+        self._data = {}
+        self._expires = {}
+        self._lock = threading.RLock()
+        self._pubsubs = []
+        self.closed = False
+    
+    def _expire_if_needed(self, name):
+        expires_at = self._expires.get(name)
+        if expires_at is not None and expires_at <= self.clock():
+            self._data.pop(name, None)
+            self._expires.pop(name, None)
+    
+    def _zset(self, name):
+        self._expire_if_needed(name)
+        return self._data.setdefault(name, {})
+    
+    def ping(self):
+        return True
+    
+    def get(self, name):
+        with self._lock:
+            self._expire_if_needed(name)
+            return self._data.get(name)
+    
+    def set(self, name, value, ex=None, nx=False):
+        with self._lock:
+            self._expire_if_needed(name)
+            if nx and name in self._data:
+                return None
+            self._data[name] = value if isinstance(value, str) else str(value)
+            self._expires.pop(name, None)
+            if ex is not None:
+                self._expires[name] = self.clock() + ex
+            return True
+    
+    def delete(self, *names):
+        with self._lock:
+            removed = 0
+            for name in names:
+                self._expire_if_needed(name)
+                if self._data.pop(name, None) is not None:
+                    removed += 1
+                self._expires.pop(name, None)
+            return removed
+    
+    def exists(self, *names):
+        with self._lock:
+            count = 0
+            for name in names:
+                self._expire_if_needed(name)
+                count += name in self._data
+            return count
+    
+    def expire(self, name, seconds):
+        with self._lock:
+            self._expire_if_needed(name)
+            if name not in self._data:
+                return False
+            self._expires[name] = self.clock() + seconds
+            return True
+    
+    def ttl(self, name):
+        with self._lock:
+            self._expire_if_needed(name)
+            if name not in self._data:
+                return -2
+            if name not in self._expires:
+                return -1
+            return int(round(self._expires[name] - self.clock()))
+    
+    def zadd(self, name, mapping):
+        with self._lock:
+            zset = self._zset(name)
+            added = sum(1 for member in mapping if member not in zset)
+            zset.update({member: float(score) for member, score in mapping.items()})
+            return added
+    
+    def zcard(self, name):
+        with self._lock:
+            self._expire_if_needed(name)
+            return len(self._data.get(name, {}))
+    
+    def zrem(self, name, *members):
+        with self._lock:
+            zset = self._zset(name)
+            return sum(1 for member in members if zset.pop(member, None) is not None)
+    
+    def zremrangebyscore(self, name, min, max):
+        with self._lock:
+            zset = self._zset(name)
+            low, high = float(min), float(max)
+            members = [member for member, score in zset.items() if low <= score <= high]
+            for member in members:
+                del zset[member]
+            return len(members)
+    
+    def zpopmin(self, name, count=None):
+        with self._lock:
+            zset = self._zset(name)
+            items = sorted(zset.items(), key=lambda item: (item[1], item[0]))[:count or 1]
+            for member, _ in items:
+                del zset[member]
+            return items
+    
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+    
+    def publish(self, channel, message):
+        """同步调用所有订阅者的处理函数，返回接收者数量"""
+        with self._lock:
+            handlers = [
+                pubsub._channels[channel] for pubsub in self._pubsubs
+                if pubsub._channels.get(channel) is not None
+            ]
+        for handler in handlers:
+            handler({"type": "message", "pattern": None, "channel": channel, "data": message})
+        return len(handlers)
+    
+    def pubsub(self, ignore_subscribe_messages=False):
+        pubsub = FakePubSub(self)
+        with self._lock:
+            self._pubsubs.append(pubsub)
+        return pubsub
+    
+    def close(self):
+        self.closed = True
+
+
+class FakePipeline:
+    """缓存命令，execute() 时在锁内依次执行"""
+    
+    def __init__(self, redis):
+        self._redis = redis
+        self._commands = []
+    
+    def __getattr__(self, name):
+        method = getattr(self._redis, name)
+        
+        def queue_command(*args, **kwargs):
+            self._commands.append((method, args, kwargs))
+            return self
+        
+        return queue_command
+    
+    def execute(self):
+        with self._redis._lock:
+            results = [method(*args, **kwargs) for method, args, kwargs in self._commands]
+        self._commands = []
+        return results
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._commands = []
+
+
+class FakePubSub:
+    """订阅对象：只支持带处理函数的订阅，消息由 publish 直接投递"""
+    
+    def __init__(self, redis):
+        self._redis = redis
+        self._channels = {}
+    
+    def subscribe(self, *channels, **handlers):
+        with self._redis._lock:
+            for channel in channels:
+                self._channels[channel] = None
+            self._channels.update(handlers)
+    
+    def unsubscribe(self, *channels):
+        with self._redis._lock:
+            for channel in channels or list(self._channels):
+                self._channels.pop(channel, None)
+    
+    def run_in_thread(self, sleep_time=0, daemon=False):
+        return FakePubSubWorker()
+    
+    def close(self):
+        with self._redis._lock:
+            self._channels.clear()
+            if self in self._redis._pubsubs:
+                self._redis._pubsubs.remove(self)
+
+
+class FakePubSubWorker:
+    """run_in_thread 返回的线程替身"""
+    
+    def stop(self):
+        pass
+    
+    def join(self, timeout=None):
+        pass
@@ -0,0 +1,117 @@
+"""测试 AST 代码分析器"""
+import pytest
+from codebase_driven_agent.tools.ast_parser import AST_AVAILABLE, get_ast_config
+from codebase_driven_agent.tools.ast_analyzer import ASTCodeAnalyzer
+
+pytestmark = pytest.mark.skipif(not AST_AVAILABLE, reason="tree-sitter not installed")
+
+
+PYTHON_SOURCE = """import os
+from pkg import helper
+
+class Service(Base):
+    def run(self):
+        return process(os.getcwd())
+
+def process(path):
+    helper()
+    return path
+"""
+
+JS_SOURCE = """import { util } from './util';
+
+class Service extends Base {
+    run() {
+        return this.client.process(util(1));
+    }
+}
+
+function process(value) {
+    return util(value);
+}
+"""
+
+
+@pytest.fixture
+def analyzer():
+    """创建 AST 分析器"""
+    return ASTCodeAnalyzer()
+
+
+def test_collect_nodes_is_preorder(analyzer):
+    """测试单次遍历按先序收集多种节点类型"""
+    tree = get_ast_config().parse_file("order.py", PYTHON_SOURCE)
+    
+    collected = analyzer._collect_nodes(tree.root_node, ("function_definition", "call"))
+    
+    assert [line for _, line, _ in collected["function_definition"]] == [5, 8]
+    assert [line for _, line, _ in collected["call"]] == [6, 6, 9]
+
+
+def test_node_index_is_reused(analyzer, monkeypatch):
+    """测试同一棵语法树上的多次分析只遍历一次"""
+    walks = []
+    original = analyzer._collect_nodes
+    
+    def counting_collect(node, node_types):
+        walks.append(node_types)
+        return original(node, node_types)
+    
+    monkeypatch.setattr(analyzer, "_collect_nodes", counting_collect)
+    
+    analyzer.extract_symbols("reuse.py", PYTHON_SOURCE)
+    analyzer.build_call_graph("reuse.py", PYTHON_SOURCE)
+    analyzer.find_variable_usage("reuse.py", PYTHON_SOURCE, "path")
+    
+    assert len(walks) == 1
+
+
+def test_python_analysis(analyzer):
+    """测试 Python 定义、调用、继承和调用关系图"""
+    definitions = analyzer.find_function_definition("svc.py", PYTHON_SOURCE, "process")
+    assert [d["line"] for d in definitions] == [8]
+    
+    calls = analyzer.find_function_calls("svc.py", PYTHON_SOURCE, "getcwd")
+    assert [c["line"] for c in calls] == [6]
+    
+    classes = analyzer.analyze_class_inheritance("svc.py", PYTHON_SOURCE)
+    assert classes[0]["class_name"] == "Service"
+    assert classes[0]["parent_classes"] == ["Base"]
+    
+    graph = analyzer.build_call_graph("svc.py", PYTHON_SOURCE)
+    assert {(e["from_function"], e["to_function"]) for e in graph["edges"]} == {("run", "process")}
+
+
+def test_javascript_methods_and_member_calls(analyzer):
+    """测试 JavaScript 类方法定义和 obj.method() 调用"""
+    definitions = analyzer._extract_all_functions("svc.js", JS_SOURCE)
+    assert [d["name"] for d in definitions] == ["process", "run"]
+    
+    calls = analyzer.find_function_calls("svc.js", JS_SOURCE, "process")
+    assert [c["line"] for c in calls] == [5]
+    
+    graph = analyzer.build_call_graph("svc.js", JS_SOURCE)
+    assert {(e["from_function"], e["to_function"]) for e in graph["edges"]} == {("run", "process")}
+
+
+def test_java_method_invocation_name(analyzer):
+    """测试 Java obj.method() 调用提取方法名而不是对象名"""
+    source = """class A {
+    void run() { client.process(); }
+    void process() {}
+}
+"""
+    calls = analyzer.find_function_calls("A.java", source, "process")
+    assert [c["line"] for c in calls] == [2]
+
+
+def test_deeply_nested_source(analyzer):
+    """测试深度嵌套的生成代码不会触发递归上限"""
+    depth = 3000
+    source = "function outer() { return " + "f(" * depth + "0" + ")" * depth + "; }\n"
+    
+    calls = analyzer.find_function_calls("generated.js", source, "f")
+    graph = analyzer.build_call_graph("generated.js", source)
+    
+    assert len(calls) == depth
+    assert graph["nodes"][0]["name"] == "outer"
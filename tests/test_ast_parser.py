@@ -0,0 +1,85 @@
+"""测试 AST 解析树缓存"""
+import pytest
+from codebase_driven_agent.tools.ast_parser import ASTParserConfig, AST_AVAILABLE
+from codebase_driven_agent.utils.metrics import get_metrics_collector
+
+pytestmark = pytest.mark.skipif(not AST_AVAILABLE, reason="tree-sitter not installed")
+
+
+SOURCE = """def main():
+    print("你好")
+    process_data()
+
+def process_data():
+    return True
+"""
+
+
+def _counter(name):
+    return get_metrics_collector().get_metrics()["counters"].get(name, 0)
+
+
+@pytest.fixture
+def config():
+    """创建独立的解析器配置（不共享全局缓存）"""
+    ast_config = ASTParserConfig(max_cache_bytes=1024 * 1024)
+    if not ast_config.initialize() or not ast_config.is_language_supported("python"):
+        pytest.skip("tree-sitter-python not installed")
+    return ast_config
+
+
+def test_cache_hit_for_same_content(config):
+    """测试相同路径和内容只解析一次"""
+    hits = _counter("ast_tree_cache_hits_total")
+    misses = _counter("ast_tree_cache_misses_total")
+    
+    first = config.parse_file("src/main.py", SOURCE)
+    second = config.parse_file("src/main.py", SOURCE)
+    
+    assert first is second
+    assert _counter("ast_tree_cache_hits_total") == hits + 1
+    assert _counter("ast_tree_cache_misses_total") == misses + 1
+
+
+def test_incremental_reparse_matches_full_parse(config):
+    """测试文件变化时增量解析的结果与完整解析一致"""
+    incremental = _counter("ast_tree_cache_incremental_parses_total")
+    config.parse_file("src/main.py", SOURCE)
+    
+    changed = SOURCE.replace("process_data()\n\ndef", "process_data()\n    cleanup()\n\ndef")
+    tree = config.parse_file("src/main.py", changed)
+    
+    fresh = ASTParserConfig(max_cache_bytes=0)
+    fresh.initialize()
+    expected = fresh.parse_file("src/main.py", changed)
+    
+    assert _counter("ast_tree_cache_incremental_parses_total") == incremental + 1
+    assert str(tree.root_node) == str(expected.root_node)
+    assert config.get_cache_stats()["entries"] == 1  # 旧版本被替换
+    assert b"cleanup" in tree.root_node.text
+
+
+def test_lru_eviction_by_bytes(config):
+    """测试按源码字节数淘汰最久未使用的条目"""
+    config.max_cache_bytes = len(SOURCE.encode("utf-8")) * 2
+    
+    config.parse_file("a.py", SOURCE)
+    config.parse_file("b.py", SOURCE)
+    config.parse_file("a.py", SOURCE)  # a.py 变为最近使用
+    config.parse_file("c.py", SOURCE)  # 淘汰 b.py
+    
+    cached_paths = {key[0] for key in config._tree_cache}
+    assert cached_paths == {"a.py", "c.py"}
+    assert config.get_cache_stats()["bytes"] <= config.max_cache_bytes
+
+
+def test_invalidate_cache(config):
+    """测试按文件和全部清除缓存"""
+    config.parse_file("a.py", SOURCE)
+    config.parse_file("b.py", SOURCE)
+    
+    config.invalidate_cache("a.py")
+    assert {key[0] for key in config._tree_cache} == {"b.py"}
+    
+    config.invalidate_cache()
+    assert config.get_cache_stats() == {"entries": 0, "bytes": 0, "max_bytes": config.max_cache_bytes}
@@ -0,0 +1,121 @@
+"""测试仓库级函数调用关系图"""
+import os
+import pytest
+import tempfile
+import shutil
+from pathlib import Path
+from codebase_driven_agent.tools.ast_parser import AST_AVAILABLE
+from codebase_driven_agent.tools.symbol_index import SymbolIndex
+from codebase_driven_agent.tools.call_graph import RepoCallGraph
+
+pytestmark = pytest.mark.skipif(not AST_AVAILABLE, reason="tree-sitter not installed")
+
+
+@pytest.fixture
+def temp_repo():
+    """创建跨文件调用的临时代码仓库"""
+    temp_dir = tempfile.mkdtemp()
+    repo_path = Path(temp_dir)
+    
+    (repo_path / "app").mkdir()
+    (repo_path / "app" / "__init__.py").write_text("")
+    (repo_path / "app" / "api.py").write_text("""from app.service import handle
+
+def endpoint():
+    return handle(1)
+
+endpoint()
+""")
+    (repo_path / "app" / "service.py").write_text("""from .db import save
+
+def handle(value):
+    return save(value)
+""")
+    (repo_path / "app" / "db.py").write_text("""def save(value):
+    return connect()
+
+def connect():
+    pass
+""")
+    # 同名函数，未被导入，不应出现在调用关系中
+    (repo_path / "app" / "other.py").write_text("""def save(value):
+    pass
+""")
+
+    yield repo_path
+    
+    shutil.rmtree(temp_dir)
+
+
+@pytest.fixture
+def graph(temp_repo, tmp_path):
+    """创建基于临时索引的调用关系图"""
+    index = SymbolIndex(temp_repo, index_path=tmp_path / "symbols.db")
+    index.build()
+    yield RepoCallGraph(index)
+    index.close()
+
+
+def test_callers_across_files(graph):
+    """测试跨文件向上追踪调用者，模块级调用作为叶子节点"""
+    result = graph.callers_of("connect", max_depth=5)
+    
+    chain = [(e["from_function"], e["to_function"], e["depth"]) for e in result["edges"]]
+    assert chain == [
+        ("save", "connect", 1),
+        ("handle", "save", 2),
+        ("endpoint", "handle", 3),
+        (RepoCallGraph.MODULE_CALLER, "endpoint", 4),
+    ]
+    assert result["truncated"] is False
+
+
+def test_callees_resolved_through_imports(graph):
+    """测试被调用函数通过导入关系解析到正确的文件"""
+    result = graph.callees_of("handle", max_depth=1)
+    
+    assert [(e["to_function"], e["to_file"]) for e in result["edges"]] == [
+        ("save", os.path.join("app", "db.py"))
+    ]
+    assert result["edges"][0]["ambiguous"] is False
+
+
+def test_depth_limit(graph):
+    """测试深度限制"""
+    result = graph.callees_of("endpoint", max_depth=2)
+    
+    assert max(e["depth"] for e in result["edges"]) == 2
+    assert "connect" not in {n["name"] for n in result["nodes"]}
+
+
+def test_fanout_cap(temp_repo, tmp_path):
+    """测试扇出上限截断"""
+    callees = "\n".join(f"def f{i}():\n    pass\n" for i in range(5))
+    calls = "\n".join(f"    f{i}()" for i in range(5))
+    (temp_repo / "fan.py").write_text(f"{callees}\ndef hub():\n{calls}\n")
+    
+    index = SymbolIndex(temp_repo, index_path=tmp_path / "fan.db")
+    try:
+        index.build()
+        result = RepoCallGraph(index).callees_of("hub", max_fanout=3)
+    finally:
+        index.close()
+    
+    assert len(result["edges"]) == 3
+    assert result["truncated"] is True
+
+
+def test_code_tool_repo_call_graph(temp_repo, tmp_path, monkeypatch):
+    """测试 code_search 的 call_graph 类型按函数名返回跨文件调用关系"""
+    from codebase_driven_agent.config import settings
+    from codebase_driven_agent.tools.code_tool import CodeTool
+    
+    monkeypatch.setattr(settings, "code_repo_path", str(temp_repo))
+    monkeypatch.setattr(settings, "symbol_index_dir", str(tmp_path / "index"))
+    
+    result = CodeTool()._execute(query="save", search_type="call_graph", file_path=os.path.join("app", "db.py"))
+    
+    assert result.success is True
+    assert "other.py" not in result.data
+    assert "save <- handle" in result.data
+    assert "save -> connect" in result.data
@@ -23,17 +23,17 @@ def process_data():
     # 处理数据
     return True
 """)
-    
+
     (repo_path / "src" / "utils.py").write_text("""def helper_function():
     # 辅助函数
     pass
 """)
-    
+
     (repo_path / "tests").mkdir()
     (repo_path / "tests" / "test_main.py").write_text("""def test_main():
     assert True
 """)
-    
+
     (repo_path / "README.md").write_text("# Test Repository")
     
     yield repo_path
@@ -175,16 +175,95 @@ def test_create_summary(code_tool):
 
 def test_search_with_ripgrep(code_tool):
     """测试使用 ripgrep 搜索（如果可用）"""
-    try:
-        import importlib.util
-        if importlib.util.find_spec("ripgrepy") is None:
-            pytest.skip("ripgrep-py not available")
-        result = code_tool._execute(query="process_data", use_ripgrep=True)
-        
-        assert result.success is True
-        assert "process_data" in result.data.lower()
-    except ImportError:
-        pytest.skip("ripgrep-py not available")
+    if shutil.which("rg") is None:
+        pytest.skip("ripgrep not available")
+    result = code_tool._execute(query="process_data", use_ripgrep=True)
+    
+    assert result.success is True
+    assert "process_data" in result.data.lower()
+
+
+def _rg_match(path, line_number, text):
+    """构造一条 rg --json 的 match 输出"""
+    import json
+    return json.dumps({
+        "type": "match",
+        "data": {"path": {"text": str(path)}, "lines": {"text": text + "\n"}, "line_number": line_number},
+    })
+
+
+def test_rank_ripgrep_matches(code_tool):
+    """测试单次 ripgrep 输出按模式和策略排名"""
+    repo = code_tool.repo_path
+    candidates = code_tool._build_ripgrep_candidates(["def\\s+Save", "Save"])
+    lines = [
+        '{"type": "begin", "data": {}}',
+        _rg_match(repo / "a.py", 3, "    save()"),
+        _rg_match(repo / "b.py", 1, "def save():"),
+        _rg_match(repo / "c.py", 7, "def Save():"),
+        _rg_match(repo / "a.py", 9, "    Save()"),
+        _rg_match(repo / ".git" / "x", 1, "def Save():"),
+    ]
+    
+    results = code_tool._rank_ripgrep_matches(lines, candidates, max_results=10)
+    
+    # b.py、c.py 命中第一个模式（同排名保持输出顺序），a.py 只命中第二个模式
+    assert [r["file"] for r in results] == ["b.py", "c.py", "a.py"]
+    assert results[0]["strategy"] == "regex_case_insensitive"
+    # a.py 保留排名最高的一行（大小写一致的 Save）
+    assert results[2]["matches"] == [{"line": 9, "content": "Save()"}]
+    assert results[2]["strategy"] == "literal_fixed_case"
+
+
+def test_search_code_element_single_ripgrep_run(code_tool, monkeypatch):
+    """测试代码元素搜索只运行一次 rg，所有模式通过多个 -e 传入"""
+    import codebase_driven_agent.tools.code_tool as code_tool_module
+    monkeypatch.setattr(code_tool_module, "RIPGREP_AVAILABLE", True)
+    calls = []
+    
+    def fake_iter(rg_patterns):
+        calls.append(rg_patterns)
+        return iter([_rg_match(code_tool.repo_path / "src" / "main.py", 5, "def process_data():")])
+    
+    monkeypatch.setattr(code_tool, "_iter_ripgrep_json", fake_iter)
+    results = code_tool._search_code_element("process_data", "function", max_results=5)
+    
+    assert len(calls) == 1
+    assert any(p.startswith("def") for p in calls[0])
+    assert "process_data" in calls[0]
+    assert results[0]["file"] == str(Path("src") / "main.py")
+    assert results[0]["matches"][0]["line"] == 5
+
+
+def test_ripgrep_rejected_regex_falls_back_to_literals(code_tool, monkeypatch):
+    """测试 rg 不支持的正则（Python re 可以编译）导致 rg 失败时，只用字面量策略重新搜索"""
+    import codebase_driven_agent.tools.code_tool as code_tool_module
+    monkeypatch.setattr(code_tool_module, "RIPGREP_AVAILABLE", True)
+    query = "process_data(?=\\()"
+    calls = []
+    
+    def fake_iter(rg_patterns):
+        calls.append(rg_patterns)
+        if query in rg_patterns:
+            raise code_tool_module.RipgrepPatternError("regex parse error: look-around is not supported")
+        return iter([_rg_match(code_tool.repo_path / "src" / "main.py", 3, "process_data(?=\\()")])
+    
+    monkeypatch.setattr(code_tool, "_iter_ripgrep_json", fake_iter)
+    results = code_tool._search_with_ripgrep(query)
+    
+    assert len(calls) == 2 and query not in calls[1]
+    assert results[0]["file"] == str(Path("src") / "main.py")
+    assert results[0]["strategy"] == "literal_fixed_case"
+
+
+def test_ripgrep_lookaround_query_keeps_literal_results(code_tool):
+    """测试真实 rg 拒绝环视正则时仍返回字面量策略的结果"""
+    from codebase_driven_agent.tools.code_tool import RIPGREP_AVAILABLE
+    if not RIPGREP_AVAILABLE:
+        pytest.skip("ripgrep not available")
+    (code_tool.repo_path / "src" / "lookaround.py").write_text("pattern = 'main(?=x)'\n")
+    results = code_tool._search_with_ripgrep("main(?=x)")
+    assert [r["file"] for r in results] == [str(Path("src") / "lookaround.py")]
 
 
 def test_get_git_info(code_tool):
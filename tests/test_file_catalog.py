@@ -0,0 +1,128 @@
+"""测试仓库文件目录"""
+import glob
+import os
+import pytest
+from pathlib import Path
+from codebase_driven_agent.utils.file_catalog import FileCatalog
+
+
+@pytest.fixture
+def repo(tmp_path):
+    """创建测试仓库"""
+    files = [
+        "main.py",
+        "README.md",
+        ".env",
+        "src/app.py",
+        "src/utils/helpers.py",
+        "src/utils/data.json",
+        "web/index.ts",
+        "build/out.py",
+        ".git/config",
+        "node_modules/pkg/index.js",
+        "src/__pycache__/app.cpython-311.pyc",
+    ]
+    for rel_path in files:
+        path = tmp_path / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f"# {rel_path}\n")
+    return tmp_path
+
+
+def _bump_mtime(path: Path):
+    """确保目录的修改时间发生变化（避免文件系统时间精度导致的误判）"""
+    stat_result = os.stat(path)
+    os.utime(path, ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns + 10_000_000))
+
+
+def test_files_and_metadata(repo):
+    """测试文件列表、跳过目录和元数据"""
+    catalog = FileCatalog(repo)
+    paths = [entry.path for entry in catalog.files()]
+    
+    assert paths == sorted(paths)
+    assert "src/utils/helpers.py" in paths and ".env" in paths
+    assert not any(p.startswith((".git/", "node_modules/")) or "__pycache__" in p for p in paths)
+    
+    entry = next(e for e in catalog.files() if e.path == "web/index.ts")
+    assert entry.language == "typescript"
+    assert entry.size == len("# web/index.ts\n")
+    
+    assert [e.path for e in catalog.files(subdir="src", extensions=(".py",))] == ["src/app.py", "src/utils/helpers.py"]
+    assert "build/out.py" not in [e.path for e in catalog.files(skip_dirs=("build",))]
+    # 显式指定被跳过的目录时直接遍历
+    assert [e.path for e in catalog.files(subdir="node_modules")] == ["node_modules/pkg/index.js"]
+
+
+@pytest.mark.parametrize("pattern", ["*.py", "**/*.py", "src/**", "src/*/*.py", "**/*.[jt]s", "*", ".*", "**/helpers.py"])
+def test_glob_matches_glob_module(repo, pattern):
+    """测试 glob 匹配结果与 glob.glob(recursive=True) 一致（不含被跳过的目录）"""
+    catalog = FileCatalog(repo)
+    expected = sorted(
+        Path(p).relative_to(repo).as_posix()
+        for p in glob.glob(str(repo / pattern), recursive=True)
+        if Path(p).is_file() and "node_modules" not in p and "__pycache__" not in p
+    )
+    
+    assert [entry.path for entry in catalog.glob(pattern)] == expected
+
+
+def test_glob_with_base_and_skipped_dir(repo):
+    """测试基础目录和指向被跳过目录的模式"""
+    catalog = FileCatalog(repo)
+    
+    assert [e.path for e in catalog.glob("*.py", base="src")] == ["src/app.py"]
+    assert [e.path for e in catalog.glob("node_modules/**/*.js")] == ["node_modules/pkg/index.js"]
+
+
+def test_incremental_refresh(repo):
+    """测试增量刷新：只重新列出修改时间变化的目录"""
+    catalog = FileCatalog(repo)
+    catalog.refresh()
+    listed = catalog.get_stats()["rescanned_dirs"]
+    
+    (repo / "src" / "new.py").write_text("x = 1\n")
+    (repo / "src" / "app.py").unlink()
+    (repo / "pkg" / "sub").mkdir(parents=True)
+    (repo / "pkg" / "sub" / "mod.py").write_text("y = 2\n")
+    _bump_mtime(repo / "src")
+    _bump_mtime(repo)
+    catalog.refresh()
+    
+    paths = [entry.path for entry in catalog.files()]
+    assert "src/new.py" in paths and "pkg/sub/mod.py" in paths
+    assert "src/app.py" not in paths
+    # 重新列出 src、根目录以及新增的 pkg、pkg/sub
+    assert catalog.get_stats()["rescanned_dirs"] - listed == 4
+    
+    (repo / "src" / "utils" / "helpers.py").unlink()
+    (repo / "src" / "utils" / "data.json").unlink()
+    (repo / "src" / "utils").rmdir()
+    _bump_mtime(repo / "src")
+    catalog.refresh()
+    assert not any(p.startswith("src/utils/") for p in (e.path for e in catalog.files()))
+
+
+def test_invalidate_and_find_by_name(repo):
+    """测试文件级失效（内容修改不改变目录修改时间）和按文件名查找"""
+    catalog = FileCatalog(repo)
+    assert [e.path for e in catalog.find_by_name("helpers.py")] == ["src/utils/helpers.py"]
+    
+    (repo / "src" / "utils" / "helpers.py").write_text("def helper():\n    return 1\n")
+    catalog.invalidate(["src/utils/helpers.py"])
+    entry = catalog.find_by_name("helpers.py")[0]
+    
+    assert entry.size == len("def helper():\n    return 1\n")
+    assert catalog.get_stats()["pending_invalidations"] == 0
+
+
+def test_binary_flag(repo):
+    """测试二进制标记按需检测"""
+    (repo / "blob.bin").write_bytes(b"\x00\x01\x02")
+    catalog = FileCatalog(repo)
+    entries = {e.path: e for e in catalog.files()}
+    
+    assert entries["blob.bin"].binary is None
+    assert catalog.is_binary(entries["blob.bin"]) is True
+    assert catalog.is_binary(entries["main.py"]) is False
+    assert entries["blob.bin"].binary is True
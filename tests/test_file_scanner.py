@@ -0,0 +1,88 @@
+"""测试并行文件扫描引擎"""
+import pytest
+from codebase_driven_agent.utils import file_scanner
+from codebase_driven_agent.utils.file_scanner import scan_files, shutdown_scan_pool
+
+
+@pytest.fixture
+def files(tmp_path):
+    """创建测试文件"""
+    paths = []
+    for i in range(20):
+        path = tmp_path / f"module_{i:02d}.py"
+        path.write_text(f"import os\n\ndef handler_{i}():\n    raise ValueError('Payment failed {i}')\n")
+        paths.append(path)
+    return paths
+
+
+def test_literal_ignore_case(files):
+    """测试字面量忽略大小写匹配，返回行号和行内容"""
+    results = scan_files(files, "payment FAILED", ignore_case=True, workers=1)
+    
+    assert len(results) == 20
+    assert results[0]["path"] == files[0]
+    assert results[0]["matches"] == [{"line": 4, "content": "    raise ValueError('Payment failed 0')"}]
+
+
+def test_regex_and_non_ascii(tmp_path):
+    """测试正则表达式（逐行语义）和非 ASCII 查询"""
+    path = tmp_path / "a.py"
+    path.write_text("# 支付失败\ndef pay():\n    pass\n", encoding="utf-8")
+    
+    assert scan_files([path], r"^def \w+", regex=True, workers=1)[0]["matches"][0]["line"] == 2
+    assert scan_files([path], "支付", workers=1)[0]["matches"][0]["line"] == 1
+    assert scan_files([path], r"pay\(\)\n", regex=True, workers=1) == []
+
+
+@pytest.mark.parametrize("pattern, lines", [
+    (r"foo\Z", [1, 3]),
+    (r"\Afoo", [1, 3]),
+    (r"foo(?!\w)", [1, 3]),
+    (r"(?<!\w)foo", [1, 3]),
+])
+def test_context_sensitive_regex_keeps_line_semantics(tmp_path, pattern, lines):
+    """测试含 \\A、\\Z 或环视的正则仍按逐行语义匹配，不被整体预检查跳过"""
+    path = tmp_path / "a.txt"
+    path.write_text("foo\nbar\nfoo\nbar\n")
+    
+    results = scan_files([path], pattern, regex=True, workers=1)
+    assert [m["line"] for m in results[0]["matches"]] == lines
+
+
+def test_binary_files_are_skipped(tmp_path):
+    """测试二进制文件被跳过"""
+    path = tmp_path / "blob.bin"
+    path.write_bytes(b"\x00\x01Payment failed\n")
+    
+    assert scan_files([path], "Payment", workers=1) == []
+    assert len(scan_files([path], "Payment", skip_binary=False, workers=1)) == 1
+
+
+def test_large_file_uses_mmap(tmp_path, monkeypatch):
+    """测试大文件通过 mmap 扫描，行号正确"""
+    monkeypatch.setattr(file_scanner, "MMAP_THRESHOLD", 16)
+    path = tmp_path / "large.log"
+    path.write_text("line\n" * 100 + "needle here\n" + "line\n" * 10)
+    
+    results = scan_files([path], "needle", workers=1)
+    assert results[0]["matches"] == [{"line": 101, "content": "needle here"}]
+
+
+def test_early_termination(files):
+    """测试达到 max_files / max_matches 后提前终止"""
+    assert [r["path"] for r in scan_files(files, "raise", max_files=3, workers=1)] == files[:3]
+    
+    results = scan_files(files, r"import|raise", regex=True, max_matches=5, workers=1)
+    assert sum(len(r["matches"]) for r in results) == 5
+    assert [r["path"] for r in results] == files[:3]
+
+
+def test_parallel_scan_keeps_order(files, monkeypatch):
+    """测试进程池并行扫描与串行扫描结果一致"""
+    monkeypatch.setattr(file_scanner, "PARALLEL_MIN_FILES", 1)
+    try:
+        parallel = scan_files(files, "Payment", max_files=15, workers=2)
+    finally:
+        shutdown_scan_pool()
+    
+    assert parallel == scan_files(files, "Payment", max_files=15, workers=1)
@@ -0,0 +1,223 @@
+"""测试 GraphExecutor 的执行流程"""
+import asyncio
+import json
+import queue
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+import pytest
+from langchain_core.tools import BaseTool
+from codebase_driven_agent.agent.graph_executor import GraphExecutor
+from codebase_driven_agent.utils.metrics import get_metrics_collector
+
+
+class EchoTool(BaseTool):
+    """返回输入文本的测试工具"""
+    name: str = "echo"
+    description: str = "Echo the input text"
+    
+    def _run(self, text: str) -> str:
+        return f"echo: {text}"
+
+
+class SleepTool(BaseTool):
+    """休眠指定时间的测试工具，记录同时执行的调用数"""
+    name: str = "sleep"
+    description: str = "Sleep for the given seconds"
+    
+    def _run(self, seconds: float) -> str:
+        with _sleep_lock:
+            _sleep_stats["running"] += 1
+            _sleep_stats["max_running"] = max(_sleep_stats["max_running"], _sleep_stats["running"])
+        time.sleep(seconds)
+        with _sleep_lock:
+            _sleep_stats["running"] -= 1
+        return f"slept {seconds}"
+
+
+_sleep_lock = threading.Lock()
+_sleep_stats = {"running": 0, "max_running": 0}
+
+
+class FakeLLM:
+    """按 prompt 类型返回固定响应的异步 LLM，记录同时进行的调用数"""
+    
+    def __init__(self, latency: float = 0.0, next_steps=None, decisions=None):
+        self.latency = latency
+        self.decisions = list(decisions or [])
+        self.next_steps = next_steps or [
+            {"step": 1, "action": "echo", "tool_name": "echo", "tool_params": {"text": "hello"}},
+        ]
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+    
+    def _respond(self, prompt: str) -> str:
+        if "判断是否需要用户提供更多信息" in prompt:
+            return json.dumps({
+                "action": "continue",
+                "reasoning": "start",
+                "next_steps": self.next_steps,
+            })
+        if "生成最终的分析结论" in prompt:
+            return json.dumps({"root_cause": "found", "suggestions": ["fix it"], "confidence": 0.9})
+        if self.decisions:
+            return json.dumps(self.decisions.pop(0))
+        return json.dumps({"action": "synthesize", "reasoning": "enough information"})
+    
+    async def ainvoke(self, messages):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+        return SimpleNamespace(content=self._respond(messages[-1].content))
+    
+    def invoke(self, messages):
+        raise AssertionError("graph nodes must not call the blocking invoke()")
+
+
+@pytest.fixture
+def make_executor():
+    """使用假 LLM 和测试工具创建执行器"""
+    def _make(llm, message_queue=None):
+        with patch("codebase_driven_agent.agent.graph_executor.get_llm", return_value=llm), \
+                patch("codebase_driven_agent.agent.graph_executor.get_tools", return_value=[EchoTool(), SleepTool()]):
+            return GraphExecutor(message_queue=message_queue)
+    return _make
+
+
+def _drain(message_queue):
+    """取出消息队列中的所有事件"""
+    events = []
+    while not message_queue.empty():
+        events.append(message_queue.get_nowait())
+    return events
+
+
+async def _run(executor, text="问题"):
+    """运行执行器直到结束"""
+    async for _ in executor.run(text):
+        pass
+
+
+def test_run_end_to_end(make_executor):
+    """测试计划、执行、决策、综合的完整流程"""
+    llm = FakeLLM()
+    message_queue = queue.Queue()
+    executor = make_executor(llm, message_queue)
+    
+    asyncio.run(_run(executor))
+    
+    events = _drain(message_queue)
+    assert [e["event"] for e in events] == ["plan", "progress", "step_execution", "progress", "result", "done"]
+    assert events[2]["data"]["result"] == "echo: hello"
+    assert events[4]["data"] == {"root_cause": "found", "suggestions": ["fix it"], "confidence": 0.9}
+    assert llm.calls == 3
+
+
+def test_concurrent_runs_share_event_loop(make_executor):
+    """测试并发分析的 LLM 调用在同一个事件循环中同时等待，不受线程池大小限制"""
+    llm = FakeLLM(latency=0.2)
+    queues = [queue.Queue() for _ in range(20)]
+    executors = [make_executor(llm, message_queue) for message_queue in queues]
+    
+    async def run_all():
+        await asyncio.gather(*(_run(executor) for executor in executors))
+    
+    asyncio.run(run_all())
+    
+    assert all(_drain(message_queue)[-1]["event"] == "done" for message_queue in queues)
+    assert llm.max_in_flight == 20
+
+
+def test_batch_steps_run_concurrently(make_executor):
+    """测试同一批次的步骤并发执行、按完成顺序发送事件，整批完成后只决策一次"""
+    _sleep_stats.update(running=0, max_running=0)
+    llm = FakeLLM(next_steps=[
+        {"step": 1, "action": "slow", "tool_name": "sleep", "tool_params": {"seconds": 0.6}, "batch": 1},
+        {"step": 2, "action": "fast", "tool_name": "sleep", "tool_params": {"seconds": 0.1}, "batch": 1},
+        {"step": 3, "action": "medium", "tool_name": "sleep", "tool_params": {"seconds": 0.3}, "batch": 1},
+    ])
+    message_queue = queue.Queue()
+    executor = make_executor(llm, message_queue)
+    
+    asyncio.run(_run(executor))
+    
+    events = _drain(message_queue)
+    step_events = [e["data"] for e in events if e["event"] == "step_execution"]
+    assert [e["step"] for e in step_events] == [2, 3, 1]
+    assert _sleep_stats["max_running"] == 3
+    # 计划、一次决策、综合
+    assert llm.calls == 3
+    assert events[-1]["event"] == "done"
+
+
+def test_step_batches(make_executor):
+    """测试批次划分：只合并 batch 相同的连续步骤，不同轮次的相同编号不会合并"""
+    executor = make_executor(FakeLLM())
+    plan = [
+        {"step": 1, "tool_name": "echo", "tool_params": {}, "batch": 1},
+        {"step": 2, "tool_name": "echo", "tool_params": {}, "batch": 1},
+        {"step": 3, "tool_name": "echo", "tool_params": {}},
+        {"step": 4, "tool_name": "echo", "tool_params": {}, "batch": "a"},
+        {"step": 5, "tool_name": "user_input", "tool_params": {}, "batch": "a"},
+    ]
+    executor._normalize_step_batches(plan, 0)
+    
+    assert executor._get_step_batch(plan, 0) == [0, 1]
+    assert executor._get_step_batch(plan, 1) == [1]
+    assert executor._get_step_batch(plan, 2) == [2]
+    assert executor._get_step_batch(plan, 3) == [3]
+    
+    plan = plan[:2] + [{"step": 3, "tool_name": "echo", "tool_params": {}, "batch": 1}]
+    executor._normalize_step_batches(plan, 2)
+    assert executor._get_step_batch(plan, 0) == [0, 1]
+
+
+def test_prefetch_during_decision(make_executor, tmp_path, monkeypatch):
+    """测试决策期间预读搜索结果中的文件，下一步 read 直接使用预取结果"""
+    from codebase_driven_agent.config import settings
+    (tmp_path / "app.py").write_text("x = 1\n")
+    monkeypatch.setattr(settings, "code_repo_path", str(tmp_path))
+    reads = []
+    
+    class FakeGrep(BaseTool):
+        name: str = "grep"
+        description: str = "grep"
+        
+        def _run(self, pattern: str) -> str:
+            return "文件: app.py\n     1 | x = 1"
+    
+    class FakeRead(BaseTool):
+        name: str = "read"
+        description: str = "read"
+        
+        def _run(self, file_path: str) -> str:
+            reads.append(file_path)
+            return f"content of {file_path}"
+    
+    llm = FakeLLM(
+        latency=0.1,
+        next_steps=[{"step": 1, "action": "grep", "tool_name": "grep", "tool_params": {"pattern": "x"}}],
+        decisions=[{
+            "action": "continue",
+            "reasoning": "read it",
+            "next_steps": [{"step": 2, "action": "read", "tool_name": "read", "tool_params": {"file_path": "app.py"}}],
+        }],
+    )
+    message_queue = queue.Queue()
+    with patch("codebase_driven_agent.agent.graph_executor.get_llm", return_value=llm), \
+            patch("codebase_driven_agent.agent.graph_executor.get_tools", return_value=[FakeGrep(), FakeRead()]):
+        executor = GraphExecutor(message_queue=message_queue)
+    
+    asyncio.run(_run(executor))
+    
+    step_events = [e["data"] for e in _drain(message_queue) if e["event"] == "step_execution"]
+    assert step_events[1]["result"] == "content of app.py"
+    assert reads == ["app.py"]
+    counters = get_metrics_collector().get_metrics()["counters"]
+    assert counters.get("agent_prefetch_hits_total{tool=read}", 0) >= 1
@@ -0,0 +1,129 @@
+"""测试进程级共享的 LLM 客户端"""
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from codebase_driven_agent.config import settings
+from codebase_driven_agent.agent import utils as agent_utils
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """记录连接数的测试服务"""
+    protocol_version = "HTTP/1.1"
+    connections = 0
+    
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+    
+    def do_GET(self):
+        self.send_response(404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+    
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def llm_settings(monkeypatch):
+    """配置 OpenAI 兼容接口，测试结束后关闭连接池"""
+    monkeypatch.setattr(settings, "llm_base_url", "http://127.0.0.1:9/v1")
+    monkeypatch.setattr(settings, "llm_api_key", "test-key-1234567890")
+    monkeypatch.setattr(settings, "llm_max_connections", 7)
+    monkeypatch.setattr(settings, "llm_max_keepalive_connections", 3)
+    asyncio.run(agent_utils.close_llm_clients())
+    yield
+    asyncio.run(agent_utils.close_llm_clients())
+
+
+def test_get_llm_reuses_instance(llm_settings, monkeypatch):
+    """测试 LLM 实例和 HTTP 连接池在多次调用和多个线程之间复用"""
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(agent_utils.get_llm())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert len({id(llm) for llm in results}) == 1
+    llm = results[0]
+    http_client, http_async_client = agent_utils.get_llm_http_clients()
+    assert llm.http_client is http_client
+    assert llm.http_async_client is http_async_client
+    pool = http_client._transport._pool
+    assert pool._max_connections == 7 and pool._max_keepalive_connections == 3
+    
+    # 配置变化时创建新的实例
+    monkeypatch.setattr(settings, "llm_model", "other-model")
+    assert agent_utils.get_llm() is not llm
+    assert agent_utils.get_llm().model_name == "other-model"
+
+
+def test_prewarm_keeps_connection(llm_settings, monkeypatch):
+    """测试预热建立的长连接被后续请求复用"""
+    _Handler.connections = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+        monkeypatch.setattr(settings, "llm_base_url", base_url)
+        
+        assert agent_utils.prewarm_llm() is True
+        http_client, _ = agent_utils.get_llm_http_clients()
+        for _ in range(3):
+            http_client.get(base_url)
+        
+        assert _Handler.connections == 1
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_prewarm_without_llm_config(monkeypatch):
+    """测试未配置 LLM 时预热直接跳过"""
+    for name in ("llm_base_url", "llm_api_key", "openai_api_key", "anthropic_api_key"):
+        monkeypatch.setattr(settings, name, None)
+    
+    assert agent_utils.prewarm_llm() is False
+
+
+def test_shutdown_cancels_agent_tasks_before_closing_clients(monkeypatch):
+    """测试服务关闭时先取消正在执行的分析，再关闭 LLM 连接池等共享资源"""
+    from codebase_driven_agent import main
+    from codebase_driven_agent.agent import graph_executor, session_manager
+    from codebase_driven_agent.api import sse
+    from codebase_driven_agent.utils import cache, file_scanner, log_query, log_scanner, repo_watcher, task_store
+    
+    for name in ("llm_prewarm", "cache_disk_enabled", "log_index_enabled", "repo_watch_enabled"):
+        monkeypatch.setattr(settings, name, False)
+    monkeypatch.setattr(log_query, "_shutdown_event", threading.Event())
+    order = []
+    
+    async def cancel_all_agent_tasks():
+        order.append("cancel_agent_tasks")
+    
+    async def close_llm_clients():
+        order.append("close_llm_clients")
+    
+    class _SessionManager:
+        def close(self):
+            order.append("close_session_store")
+    
+    monkeypatch.setattr(sse, "cancel_all_agent_tasks", cancel_all_agent_tasks)
+    monkeypatch.setattr(agent_utils, "close_llm_clients", close_llm_clients)
+    monkeypatch.setattr(task_store, "close_task_store", lambda: order.append("close_task_store"))
+    monkeypatch.setattr(cache, "close_request_cache", lambda: order.append("close_request_cache"))
+    monkeypatch.setattr(session_manager, "get_session_manager", _SessionManager)
+    for module, name in ((file_scanner, "shutdown_scan_pool"), (graph_executor, "shutdown_step_executor"),
+                         (log_scanner, "shutdown_log_scan_executor"), (repo_watcher, "stop_repo_watcher")):
+        monkeypatch.setattr(module, name, lambda: None)
+    
+    async def run():
+        async with main.lifespan(main.app):
+            pass
+    
+    asyncio.run(run())
+    assert order[0] == "cancel_agent_tasks"
+    assert sorted(order[1:]) == ["close_llm_clients", "close_request_cache", "close_session_store", "close_task_store"]
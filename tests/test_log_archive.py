@@ -0,0 +1,136 @@
+"""测试轮转和压缩日志的读取"""
+import bz2
+import gzip
+import lzma
+import os
+import pytest
+from datetime import datetime
+from codebase_driven_agent.config import settings
+from codebase_driven_agent.utils import log_archive
+from codebase_driven_agent.utils.log_archive import ArchiveSidecar, get_sidecar, is_log_file, iter_archive_window
+from codebase_driven_agent.utils.log_query import FileLogQuery
+
+
+LINES = [f"2024-01-01 10:{minute:02d}:00 ERROR event {minute}\n" for minute in range(60)]
+
+
+@pytest.fixture(autouse=True)
+def index_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "log_index_dir", str(tmp_path / "index"))
+    monkeypatch.setattr(log_archive, "_sidecars", {})
+
+
+def write_members(path, members):
+    """每组行写成一个独立的 gzip 成员"""
+    with open(path, "wb") as f:
+        for lines in members:
+            f.write(gzip.compress("".join(lines).encode()))
+
+
+def test_log_file_names():
+    """测试识别轮转和压缩后的日志文件名"""
+    for name in ["app.log", "app.log.1", "app.log.2.gz", "app.log-20261015", "app-2026-10-15.log.bz2", "app.log.xz"]:
+        assert is_log_file(name), name
+    for name in ["app.logger.py", "app.log.bak", "catalog.txt", "app.log.tar"]:
+        assert not is_log_file(name), name
+    assert is_log_file("app-2026-10-15.log.zst") == log_archive.ZSTD_AVAILABLE
+
+
+def test_sidecar_segments_and_window(tmp_path, monkeypatch):
+    """测试旁路索引按成员记录行号和时间范围，查询只返回重叠成员中的行"""
+    monkeypatch.setattr(log_archive, "GZIP_CHECKPOINTS_AVAILABLE", False)
+    path = tmp_path / "app.log.1.gz"
+    # 第二个成员以半行结束，和第三个成员合并为一段
+    write_members(path, [LINES[:20], LINES[20:30] + [LINES[30][:10]], [LINES[30][10:]] + LINES[31:40], LINES[40:]])
+    sidecar = ArchiveSidecar.build(str(path))
+    assert sidecar.sorted and sidecar.data["lines"] == 60
+    assert [segment[2] for segment in sidecar.segments] == [1, 21, 41]
+    
+    start = datetime(2024, 1, 1, 10, 25).timestamp()
+    window = list(iter_archive_window(str(path), start, start + 120))
+    assert [line_no for line_no, _ in window] == [26, 27, 28]
+    assert all(LINES[line_no - 1] == line for line_no, line in window)
+    assert len(list(iter_archive_window(str(path)))) == 60
+
+
+def test_sidecar_persisted_and_rebuilt(tmp_path, monkeypatch):
+    """测试旁路索引保存到磁盘后复用，文件变化后重建"""
+    monkeypatch.setattr(log_archive, "GZIP_CHECKPOINTS_AVAILABLE", False)
+    path = tmp_path / "app.log.1.gz"
+    write_members(path, [LINES[:30], LINES[30:]])
+    get_sidecar(str(path))
+    monkeypatch.setattr(log_archive, "_sidecars", {})
+    monkeypatch.setattr(ArchiveSidecar, "build", classmethod(lambda cls, *args: pytest.fail("rebuilt")))
+    assert len(get_sidecar(str(path)).segments) == 2
+    
+    monkeypatch.undo()
+    monkeypatch.setattr(settings, "log_index_dir", str(tmp_path / "index"))
+    monkeypatch.setattr(log_archive, "GZIP_CHECKPOINTS_AVAILABLE", False)
+    write_members(path, [LINES[:10], LINES[10:20], LINES[20:]])
+    assert len(get_sidecar(str(path)).segments) == 3
+
+
+@pytest.mark.parametrize("suffix, compress", [(".bz2", bz2.compress), (".xz", lzma.compress)])
+def test_multi_stream_bz2_and_xz(tmp_path, suffix, compress):
+    """测试 bz2 和 xz 的多个连续压缩流"""
+    path = tmp_path / f"app.log.2{suffix}"
+    path.write_bytes(compress("".join(LINES[:30]).encode()) + compress("".join(LINES[30:]).encode()))
+    assert len(ArchiveSidecar.build(str(path)).segments) == 2
+    assert [line for _, line in iter_archive_window(str(path))] == LINES
+
+
+def test_file_log_query_searches_rotation_chain_newest_first(tmp_path, monkeypatch):
+    """测试文件日志查询包含压缩的轮转文件，按修改时间从新到旧搜索"""
+    (tmp_path / "app.log").write_text("2024-01-03 10:00:00 ERROR current\n")
+    (tmp_path / "app.log.1").write_text("2024-01-02 10:00:00 ERROR yesterday\n")
+    write_members(tmp_path / "app.log.2.gz", [LINES])
+    for age, name in enumerate(["app.log", "app.log.1", "app.log.2.gz"]):
+        mtime = datetime(2024, 1, 3 - age, 23).timestamp()
+        os.utime(tmp_path / name, (mtime, mtime))
+    monkeypatch.setattr(settings, "log_file_base_path", str(tmp_path))
+    monkeypatch.setattr(settings, "log_index_enabled", False)
+    
+    query = FileLogQuery()
+    assert [os.path.basename(path) for path in query._find_log_files("app")] == ["app.log", "app.log.1", "app.log.2.gz"]
+    
+    result = query.query("app", "error", limit=3)
+    assert [log["message"] for log in result.logs] == ["current", "yesterday", "event 59"]
+    assert result.has_more
+    
+    result = query.query("app", "error", start_time=datetime(2024, 1, 1, 10, 5), end_time=datetime(2024, 1, 1, 10, 6))
+    assert [(os.path.basename(log["file"]), log["line"]) for log in result.logs] == [("app.log.2.gz", 7), ("app.log.2.gz", 6)]
+
+
+def test_untimestamped_lines_follow_previous_timestamp(tmp_path):
+    """测试不带时间戳的行按前面最近的时间戳过滤，包括位于下一个压缩成员开头的行"""
+    path = tmp_path / "app.log.1.gz"
+    members = []
+    for hour in range(24):
+        members.append([f"2024-01-01 {hour:02d}:00:00 ERROR job {hour} failed\n"])
+        members.append(["    at com.example.Bar.run(Bar.java:7)\n", f"2024-01-01 {hour:02d}:30:00 INFO job {hour} retried\n"])
+    write_members(path, members)
+    window = iter_archive_window(str(path), datetime(2024, 1, 1, 5).timestamp(), datetime(2024, 1, 1, 6, 30).timestamp())
+    assert [line_no for line_no, line in window if "Bar.java" in line] == [17, 20]
+
+
+def test_gzip_checkpoints_for_single_member(tmp_path, monkeypatch):
+    """测试单个成员的 gzip 文件按检查点分段，查询从窗口前最近的检查点开始解压"""
+    pytest.importorskip("indexed_gzip")
+    monkeypatch.setattr(log_archive, "GZIP_SEGMENT_BYTES", 4096)
+    monkeypatch.setattr(log_archive, "GZIP_CHECKPOINT_SPACING", 65536)
+    lines = [f"2024-01-01 {minute // 60:02d}:{minute % 60:02d}:00 INFO event {minute} {'x' * 200}\n" for minute in range(1440)]
+    path = tmp_path / "app.log.1.gz"
+    path.write_bytes(gzip.compress("".join(lines).encode()))
+    
+    sidecar = get_sidecar(str(path))
+    assert sidecar.checkpointed and len(sidecar.segments) > 10
+    assert sidecar.data["lines"] == 1440 and sidecar.sorted
+    
+    # 从磁盘载入旁路索引和检查点
+    monkeypatch.setattr(log_archive, "_sidecars", {})
+    monkeypatch.setattr(ArchiveSidecar, "build", classmethod(lambda cls, *args: pytest.fail("rebuilt")))
+    start = datetime(2024, 1, 1, 20).timestamp()
+    window = list(iter_archive_window(str(path), start, start + 120))
+    assert [line_no for line_no, _ in window] == [1201, 1202, 1203]
+    assert [line for _, line in window] == lines[1200:1203]
+    assert [line for _, line in iter_archive_window(str(path))] == lines
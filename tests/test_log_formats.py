@@ -0,0 +1,140 @@
+"""测试日志格式识别和结构化解析"""
+import gzip
+import json
+import pytest
+from datetime import datetime, timedelta, timezone
+from codebase_driven_agent.config import settings
+from codebase_driven_agent.utils import log_formats, log_seek
+from codebase_driven_agent.utils.log_formats import (
+    LogFormatRegistry,
+    builtin_formats,
+    compile_grok,
+    detect_file_format,
+    parse_lines,
+)
+from codebase_driven_agent.utils.log_query import FileLogQuery
+
+
+@pytest.fixture(autouse=True)
+def fresh_registry(monkeypatch):
+    monkeypatch.setattr(log_formats, "_registry", None)
+    monkeypatch.setattr(log_formats, "_file_formats", {})
+    monkeypatch.setattr(settings, "log_format", "auto")
+    monkeypatch.setattr(settings, "log_format_patterns", {})
+
+
+@pytest.mark.parametrize("name, line, expected", [
+    ("json", '{"@timestamp": "2024-01-01T10:00:00Z", "level": "error", "logger": "svc.db", "traceId": "abc123", "msg": "boom"}',
+     (datetime(2024, 1, 1, 10, tzinfo=timezone.utc), "ERROR", "svc.db", "abc123", "boom")),
+    ("logfmt", 'ts=2024-01-01T10:00:00 level=warning caller=disk.go:12 trace_id=deadbeef msg="disk almost full"',
+     (datetime(2024, 1, 1, 10), "WARN", "disk.go:12", "deadbeef", "disk almost full")),
+    ("java", "2024-01-01 10:00:00.123 [main] ERROR com.example.Foo - failed traceId=1234abcd",
+     (datetime(2024, 1, 1, 10, 0, 0, 123000), "ERROR", "com.example.Foo", "1234abcd", "failed traceId=1234abcd")),
+    ("java", "2024-01-01 10:00:00.123  INFO 1234 --- [           main] o.s.b.Application : Started",
+     (datetime(2024, 1, 1, 10, 0, 0, 123000), "INFO", "o.s.b.Application", None, "Started")),
+    ("python", "2024-01-01 10:00:00,123 - codebase_driven_agent.api - WARNING - slow request",
+     (datetime(2024, 1, 1, 10, 0, 0, 123000), "WARN", "codebase_driven_agent.api", None, "slow request")),
+    ("nginx", '10.0.0.1 - - [01/Jan/2024:10:00:00 +0800] "GET /api HTTP/1.1" 502 157 "-" "curl/8.0"',
+     (datetime(2024, 1, 1, 10, tzinfo=timezone(timedelta(hours=8))), "ERROR", None, None, None)),
+    ("nginx", "2024/01/01 10:00:00 [warn] 123#0: *1 upstream timed out",
+     (datetime(2024, 1, 1, 10), "WARN", None, None, "*1 upstream timed out")),
+])
+def test_builtin_formats_detected_and_parsed(name, line, expected):
+    """测试内置格式的识别和字段解析"""
+    registry = LogFormatRegistry(builtin_formats())
+    log_format = registry.detect([line])
+    assert log_format.name == name
+    record = log_format.parse(line)
+    assert (record.timestamp, record.level, record.logger, record.trace_id) == expected[:4]
+    assert record.message == (expected[4] or line)
+
+
+def test_unknown_fields_are_none():
+    """测试解析不出的字段为 None，不再用当前时间和 INFO 代替"""
+    registry = LogFormatRegistry(builtin_formats())
+    assert registry.detect(["something happened"]).name == "generic"
+    record = parse_lines(registry.generic, ["something happened"])[0]
+    assert record.timestamp is None and record.level is None and record.message == "something happened"
+
+
+def test_parse_many_matches_line_by_line():
+    """测试批量解析和逐行解析结果一致，不符合格式的行（堆栈）用通用格式解析"""
+    java = LogFormatRegistry(builtin_formats()).get("java")
+    lines = []
+    for i in range(50):
+        lines.append(f"2024-01-01 10:00:{i:02d}.000 [worker-{i}] {'ERROR' if i % 3 else 'INFO'} com.example.Job - step {i}\n")
+        lines.append("\tat com.example.Job.run(Job.java:42)\n")
+    assert java.parse_many(lines) == [java.parse(line) for line in lines]
+    records = parse_lines(java, lines)
+    assert records[2].message == "step 1" and records[2].level == "ERROR"
+    assert records[3].message == "at com.example.Job.run(Job.java:42)" and records[3].logger is None
+
+
+def test_grok_pattern_from_settings(monkeypatch):
+    """测试 LOG_FORMAT_PATTERNS 中的自定义格式优先于内置格式"""
+    monkeypatch.setattr(settings, "log_format_patterns", {
+        "myapp": r"%{TIMESTAMP_ISO8601:timestamp} \[%{DATA:trace_id}\] %{LOGLEVEL:level} %{JAVACLASS:logger}: %{GREEDYDATA:message}",
+        "broken": "%{NO_SUCH_PATTERN:x}",
+    })
+    registry = log_formats.get_format_registry()
+    assert "broken" not in registry.names()
+    line = "2024-01-01 10:00:00 [req-42] error app.views: not found"
+    log_format = registry.detect([line])
+    assert log_format.name == "myapp"
+    assert log_format.parse(line)[1:] == ("ERROR", "app.views", "req-42", "not found")
+    with pytest.raises(ValueError):
+        compile_grok("%{NO_SUCH_PATTERN}")
+
+
+def test_detect_file_format_samples_file(tmp_path, monkeypatch):
+    """测试按文件开头的样本识别格式（包括压缩文件），LOG_FORMAT 可以指定固定格式"""
+    records = [{"time": 1704103200 + i, "level": "info", "msg": f"event {i}"} for i in range(10)]
+    (tmp_path / "app.log").write_text("".join(json.dumps(r) + "\n" for r in records))
+    (tmp_path / "app.log.1.gz").write_bytes(gzip.compress(b"level=error msg=old ts=2024-01-01T09:00:00\n"))
+    assert detect_file_format(str(tmp_path / "app.log")).name == "json"
+    assert detect_file_format(str(tmp_path / "app.log.1.gz")).name == "logfmt"
+    
+    monkeypatch.setattr(settings, "log_format", "python")
+    assert detect_file_format(str(tmp_path / "app.log")).name == "python"
+
+
+def test_file_log_query_returns_typed_fields(tmp_path, monkeypatch):
+    """测试文件日志查询返回结构化字段，按格式解析出的时间过滤时间窗口"""
+    start = datetime(2024, 1, 1, 10)
+    lines = [
+        f'10.0.0.{i} - - [{start + timedelta(minutes=i):%d/%b/%Y:%H:%M:%S} +0000] "GET /api/{i} HTTP/1.1" '
+        f'{500 if i % 2 else 200} 10 "-" "curl" 0123456789abcdef{i:04d}\n'
+        for i in range(10)
+    ]
+    (tmp_path / "nginx-access.log").write_text("".join(lines))
+    monkeypatch.setattr(settings, "log_file_base_path", str(tmp_path))
+    monkeypatch.setattr(settings, "log_index_dir", str(tmp_path / "index"))
+    monkeypatch.setattr(settings, "log_index_enabled", False)
+    # 非 ISO 时间戳的文件不查找最后的时间戳
+    monkeypatch.setattr(log_seek, "latest_timestamp", lambda path: pytest.fail("latest_timestamp called"))
+    
+    utc = timezone.utc
+    window_start = (start + timedelta(minutes=3)).replace(tzinfo=utc).astimezone().replace(tzinfo=None)
+    result = FileLogQuery().query("nginx", "/api/", start_time=window_start, end_time=window_start + timedelta(minutes=4))
+    assert [log["line"] for log in result.logs] == [8, 7, 6, 5, 4]
+    first = result.logs[0]
+    assert first["timestamp"] == "2024-01-01T10:07:00+00:00"
+    assert first["level"] == "ERROR" and first["trace_id"] == "0123456789abcdef0007"
+    assert "logger" not in first and first["raw_message"] == lines[7].strip()
+
+
+@pytest.mark.parametrize("index_enabled", [False, True])
+def test_logfmt_epoch_time_window(tmp_path, monkeypatch, index_enabled):
+    """测试 logfmt 中 Unix 时间（ts=秒）按格式解析出的时间过滤时间窗口"""
+    start = 1704103200
+    (tmp_path / "app.log").write_text("".join(
+        f'ts={start + i * 60} level=error msg="boom {i}"\n' for i in range(200)
+    ))
+    monkeypatch.setattr(settings, "log_file_base_path", str(tmp_path))
+    monkeypatch.setattr(settings, "log_index_dir", str(tmp_path / "index"))
+    monkeypatch.setattr(settings, "log_index_enabled", index_enabled)
+    
+    window_start = datetime.fromtimestamp(start + 50 * 60)
+    result = FileLogQuery().query("app", "boom", start_time=window_start, end_time=window_start + timedelta(minutes=10))
+    assert [log["line"] for log in result.logs] == list(range(61, 50, -1))
+    assert result.logs[0]["timestamp"] == datetime.fromtimestamp(start + 60 * 60).isoformat()
@@ -0,0 +1,151 @@
+"""测试文件日志的倒排索引和时间范围索引"""
+import os
+import pytest
+from datetime import datetime
+from codebase_driven_agent.utils import log_index as log_index_module
+from codebase_driven_agent.utils.log_index import LogIndex
+
+
+@pytest.fixture
+def log_dir(tmp_path):
+    directory = tmp_path / "logs"
+    directory.mkdir()
+    (directory / "app.log").write_text(
+        "2024-01-01 10:00:00 INFO Application started\n"
+        "2024-01-01 10:05:00 ERROR Database connection failed\n"
+        "    at com.example.Pool.connect(Pool.java:42)\n"
+        "2024-01-01 11:00:00 WARN Slow request /api/orders\n"
+        "2024-01-02 09:00:00 ERROR NullPointerException in OrderService\n"
+    )
+    return directory
+
+
+@pytest.fixture
+def index(log_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(log_index_module, "BLOCK_BYTES", 64)
+    instance = LogIndex(str(log_dir), index_path=tmp_path / "index" / "logs.db")
+    yield instance
+    instance.close()
+
+
+def lines(results):
+    return [(os.path.basename(path), line_no) for path, line_no, _ in results]
+
+
+def test_search_matches_substrings_and_time_window(index, log_dir):
+    """测试子串匹配（包括词的一部分）、空查询和时间窗口与逐行扫描一致"""
+    path = str(log_dir / "app.log")
+    stats = index.refresh()
+    assert stats["blocks"] > 1
+    
+    assert lines(index.search([path], "error")) == [("app.log", 2), ("app.log", 5)]
+    assert lines(index.search([path], "connection fail")) == [("app.log", 2)]
+    assert lines(index.search([path], "PointerExc")) == [("app.log", 5)]
+    assert lines(index.search([path], "pool.java:42")) == [("app.log", 3)]
+    assert index.search([path], "timeout") == []
+    assert len(index.search([path], "")) == 5
+    assert len(index.search([path], "", limit=2)) == 2
+    
+    window = index.search([path], "", datetime(2024, 1, 1, 10, 1), datetime(2024, 1, 1, 12, 0))
+    assert lines(window) == [("app.log", 2), ("app.log", 3), ("app.log", 4)]
+    assert lines(index.search([path], "error", start_time=datetime(2024, 1, 2))) == [("app.log", 5)]
+
+
+def test_incremental_append_and_unindexed_tail(index, log_dir):
+    """测试追加的内容在索引更新前也能查到，更新时只索引新增部分"""
+    path = log_dir / "app.log"
+    index.refresh()
+    with open(path, "a") as f:
+        f.write("2024-01-03 08:00:00 ERROR Disk full on /var\n")
+    
+    assert lines(index.search([str(path)], "disk full")) == [("app.log", 6)]
+    
+    stats = index.refresh()
+    assert stats["reset"] == 0 and stats["bytes"] == len("2024-01-03 08:00:00 ERROR Disk full on /var\n")
+    assert lines(index.search([str(path)], "disk full")) == [("app.log", 6)]
+
+
+def test_rotation_and_truncation(index, log_dir):
+    """测试轮转改名的文件沿用已有索引，截断后的文件重新索引"""
+    path = log_dir / "app.log"
+    index.refresh()
+    rotated = log_dir / "app.1.log"
+    os.rename(path, rotated)
+    path.write_text("2024-01-04 00:00:00 INFO Fresh file\n")
+    
+    stats = index.refresh()
+    assert stats["renamed"] == 1
+    assert lines(index.search([str(rotated), str(path)], "nullpointer")) == [("app.1.log", 5)]
+    assert lines(index.search([str(rotated), str(path)], "fresh")) == [("app.log", 1)]
+    
+    path.write_text("short\n")
+    assert index.refresh()["reset"] == 1
+    assert lines(index.search([str(path)], "short")) == [("app.log", 1)]
+    assert index.search([str(path)], "fresh") == []
+    
+    os.remove(rotated)
+    assert index.refresh()["removed"] == 1
+    assert index.get_stats()["files"] == 1
+
+
+def test_long_tokens_match_linear_scan(tmp_path, monkeypatch):
+    """测试超过 MAX_TOKEN_LENGTH 的词中间的子串也能查到，结果和不使用索引时一致"""
+    from codebase_driven_agent.config import settings
+    from codebase_driven_agent.utils.log_query import FileLogQuery
+    
+    log_dir = tmp_path / "logs"
+    log_dir.mkdir()
+    digest = "9f8e7d6c5b4a" * 3 + "c3d4a1b2" + "0a1b2c3d" * 4
+    (log_dir / "app.log").write_text(
+        "2024-01-01 10:00:00 INFO request started\n"
+        f"2024-01-01 10:00:01 ERROR checksum mismatch sha={digest}\n"
+        "2024-01-01 10:00:02 INFO request finished\n"
+    )
+    monkeypatch.setattr(settings, "log_file_base_path", str(log_dir))
+    monkeypatch.setattr(settings, "log_index_dir", str(tmp_path / "index"))
+    
+    results = {}
+    for enabled in (True, False):
+        monkeypatch.setattr(settings, "log_index_enabled", enabled)
+        for query in ("c3d4a1b2", "sha=9f8e7d", "2c3d0a1b2c3d", "mismatch sha"):
+            logs = FileLogQuery().query("app", query, limit=10).logs
+            results.setdefault(query, []).append([log["line"] for log in logs])
+    assert all(indexed == linear == [2] for indexed, linear in results.values()), results
+
+
+def test_untimestamped_lines_follow_previous_timestamp(tmp_path, monkeypatch):
+    """测试不带时间戳的行按前一条带时间戳的行过滤时间窗口，结果和不使用索引时一致"""
+    from codebase_driven_agent.config import settings
+    from codebase_driven_agent.utils.log_query import FileLogQuery
+    
+    log_dir = tmp_path / "logs"
+    log_dir.mkdir()
+    with open(log_dir / "app.log", "w") as f:
+        for hour in range(24):
+            f.write(f"2024-01-01 {hour:02d}:00:00 ERROR job {hour} failed\n")
+            f.write("    at com.example.Bar.run(Bar.java:7)\n")
+            f.write(f"2024-01-01 {hour:02d}:30:00 INFO job {hour} retried\n")
+    monkeypatch.setattr(log_index_module, "BLOCK_BYTES", 200)
+    monkeypatch.setattr(settings, "log_file_base_path", str(log_dir))
+    monkeypatch.setattr(settings, "log_index_dir", str(tmp_path / "index"))
+    
+    results = []
+    for enabled in (True, False):
+        monkeypatch.setattr(settings, "log_index_enabled", enabled)
+        logs = FileLogQuery().query(
+            "app", "Bar.java", start_time=datetime(2024, 1, 1, 5), end_time=datetime(2024, 1, 1, 6, 30), limit=50,
+        ).logs
+        results.append(sorted(log["line"] for log in logs))
+    assert results == [[17, 20], [17, 20]]
+
+
+def test_plan_sees_blocks_indexed_later(index, log_dir):
+    """测试查询计划之后新索引的块仍会被读取，且不和未索引的尾部重复"""
+    path = log_dir / "app.log"
+    index.refresh()
+    plan = index.plan("error")
+    with open(path, "a") as f:
+        for day in range(3, 9):
+            f.write(f"2024-01-{day:02d} 08:00:00 ERROR Disk full on /var/{day}\n")
+    index.refresh()
+    assert [line_no for line_no, _ in index.iter_matches(str(path), plan)] == [2, 5, 6, 7, 8, 9, 10, 11]
@@ -0,0 +1,86 @@
+"""测试多个日志文件的并行扫描和按时间合并"""
+import threading
+import time
+import pytest
+from datetime import datetime, timedelta
+from codebase_driven_agent.config import settings
+from codebase_driven_agent.utils.log_query import FileLogQuery
+from codebase_driven_agent.utils.log_scanner import LogSource, TopHits, scan_log_sources
+
+
+BASE = datetime(2024, 1, 1)
+
+
+def stamp(minutes):
+    return f"{BASE + timedelta(minutes=minutes):%Y-%m-%d %H:%M:%S}"
+
+
+def source(path, minutes, calls=None, delay=0.0):
+    """每个时间点生成一行匹配的日志"""
+    def lines():
+        if calls is not None:
+            calls.append(path)
+        for line_no, minute in enumerate(minutes, 1):
+            time.sleep(delay)
+            yield line_no, f"{stamp(minute)} ERROR {path} {minute}"
+    latest = (BASE + timedelta(minutes=max(minutes))).timestamp() if minutes else None
+    return LogSource(path, latest, lines)
+
+
+def test_top_hits_keeps_newest():
+    """测试有界堆只保留最新的命中，按时间从新到旧返回"""
+    top = TopHits(2)
+    for ts, line_no in [(3, 1), (1, 2), (5, 3), (4, 4)]:
+        top.offer((ts, 0, -line_no), ("a.log", line_no, ""))
+    assert [line_no for _, line_no, _ in top.results()] == [3, 4]
+    assert top.threshold() == 4
+
+
+def test_merge_by_timestamp_across_files():
+    """测试多个文件的命中按时间合并，没有时间戳的行跟随前一行，相同时间时靠前的文件优先"""
+    def with_trace():
+        yield 1, f"{stamp(5)} ERROR b.log 5"
+        yield 2, "    at Foo.bar(Foo.java:1) error"
+    
+    sources = [source("a.log", [1, 5, 9]), LogSource("b.log", None, with_trace), source("c.log", [2, 7])]
+    results = scan_log_sources(sources, capacity=10)
+    assert [(path, line_no) for path, line_no, _ in results] == [
+        ("a.log", 3), ("c.log", 2), ("a.log", 2), ("b.log", 1), ("b.log", 2), ("c.log", 1), ("a.log", 1),
+    ]
+
+
+def test_superseded_files_skipped(monkeypatch):
+    """测试堆满后最晚时间早于堆中最旧一条的文件不再扫描"""
+    monkeypatch.setattr(settings, "log_scan_workers", 1)
+    calls = []
+    sources = [source("new.log", list(range(100, 110)), calls), source("old.log", list(range(10)), calls)]
+    results = scan_log_sources(sources, capacity=5)
+    assert calls == ["new.log"]
+    assert [line.split()[-1] for _, _, line in results] == ["109", "108", "107", "106", "105"]
+
+
+def test_shutdown_stops_scanning():
+    """测试取消事件设置后所有扫描停止"""
+    cancel = threading.Event()
+    threading.Timer(0.05, cancel.set).start()
+    started = time.perf_counter()
+    sources = [source(f"{i}.log", list(range(2000)), delay=0.001) for i in range(4)]
+    scan_log_sources(sources, capacity=10000, cancel_event=cancel)
+    assert time.perf_counter() - started < 1.5
+
+
+@pytest.mark.parametrize("index_enabled", [True, False])
+def test_file_log_query_covers_all_files(tmp_path, monkeypatch, index_enabled):
+    """测试超过 5 个日志文件时所有文件都能查到，分页按时间从新到旧"""
+    for i in range(8):
+        (tmp_path / f"app-part{i}.log").write_text(f"{stamp(i)} ERROR in part {i}\n{stamp(i)} INFO ok\n")
+    monkeypatch.setattr(settings, "log_file_base_path", str(tmp_path))
+    monkeypatch.setattr(settings, "log_index_dir", str(tmp_path / "index"))
+    monkeypatch.setattr(settings, "log_index_enabled", index_enabled)
+    
+    query = FileLogQuery()
+    first = query.query("app", "error", limit=5)
+    second = query.query("app", "error", limit=5, offset=5)
+    assert [log["message"][-1] for log in first.logs] == ["7", "6", "5", "4", "3"]
+    assert [log["message"][-1] for log in second.logs] == ["2", "1", "0"]
+    assert first.has_more and not second.has_more
@@ -0,0 +1,129 @@
+"""测试按时间范围定位日志文件中的字节区间"""
+import os
+import random
+from datetime import datetime, timedelta
+from codebase_driven_agent.config import settings
+from codebase_driven_agent.utils.log_query import FileLogQuery
+from codebase_driven_agent.utils import log_seek
+from codebase_driven_agent.utils.log_seek import (
+    file_may_overlap,
+    iter_time_window,
+    latest_timestamp,
+    seek_time_range,
+)
+
+
+BASE = datetime(2024, 1, 1)
+
+
+def make_log(count, seed=1):
+    """生成时间非递减、夹杂堆栈行的日志，返回 (内容, 每行的时间戳或 None)"""
+    rng = random.Random(seed)
+    lines, stamps = [], []
+    moment = BASE
+    for i in range(count):
+        moment += timedelta(seconds=rng.choice([0, 1, 7]))
+        lines.append(f"{moment:%Y-%m-%d %H:%M:%S} INFO event {i}\n")
+        stamps.append(moment.timestamp())
+        if rng.random() < 0.2:
+            lines.append("    at com.example.Handler.run(Handler.java:10)\n")
+            stamps.append(None)
+    return "".join(lines).encode(), stamps
+
+
+def expected_range(data, stamps, start_ts, end_ts):
+    """逐行计算时间窗口对应的字节区间"""
+    offsets, pos = [], 0
+    for line in data.splitlines(keepends=True):
+        offsets.append(pos)
+        pos += len(line)
+    offsets.append(pos)
+    stamped = [i for i, ts in enumerate(stamps) if ts is not None]
+    begin = next((i for i in stamped if ts_ge(stamps[i], start_ts)), len(stamps))
+    end = next((i for i in stamped if end_ts is not None and stamps[i] > end_ts), len(stamps))
+    return offsets[begin], max(offsets[begin], offsets[end])
+
+
+def ts_ge(ts, start_ts):
+    return start_ts is None or ts >= start_ts
+
+
+def test_seek_matches_linear_scan():
+    """测试二分查找得到的区间与逐行扫描一致"""
+    data, stamps = make_log(2000)
+    first, last = stamps[0], max(ts for ts in stamps if ts is not None)
+    rng = random.Random(7)
+    windows = [(None, None), (first - 10, None), (None, last + 10), (last + 1, None), (None, first - 1)]
+    for _ in range(200):
+        start_ts = rng.uniform(first - 30, last + 30)
+        windows.append((start_ts // 1, start_ts // 1 + rng.choice([0, 5, 60, 600])))
+    for start_ts, end_ts in windows:
+        assert seek_time_range(data, start_ts, end_ts) == expected_range(data, stamps, start_ts, end_ts)
+
+
+def test_unsorted_file_returns_whole_range():
+    """测试首尾时间逆序的文件不做定位"""
+    data = b"2024-01-02 00:00:00 late\n2024-01-01 00:00:00 early\n"
+    assert seek_time_range(data, BASE.timestamp() + 3600, None) == (0, len(data))
+
+
+def test_iter_time_window_line_numbers(tmp_path):
+    """测试读取的行号与文件中的实际行号一致，空文件不报错"""
+    data, _ = make_log(500)
+    path = tmp_path / "app.log"
+    path.write_bytes(data)
+    all_lines = data.decode().splitlines()
+    start = BASE + timedelta(minutes=10)
+    window = list(iter_time_window(str(path), start.timestamp(), start.timestamp() + 60))
+    assert window
+    for line_no, line in window:
+        assert all_lines[line_no - 1] == line.rstrip("\n")
+    
+    (tmp_path / "empty.log").write_bytes(b"")
+    assert list(iter_time_window(str(tmp_path / "empty.log"), 0, 1)) == []
+
+
+def test_latest_timestamp_searches_tail_only(tmp_path, monkeypatch):
+    """测试只在文件末尾查找最后一条带时间戳的行，末尾没有时按时间未知处理"""
+    data, stamps = make_log(500)
+    path = tmp_path / "app.log"
+    path.write_bytes(data + b"    at com.example.Handler.run(Handler.java:10)\n" * 3)
+    monkeypatch.setattr(log_seek, "LATEST_TAIL_BYTES", 1024)
+    assert latest_timestamp(str(path)) == max(ts for ts in stamps if ts is not None)
+    
+    path.write_bytes(data + b"    at com.example.Handler.run(Handler.java:10)\n" * 100)
+    assert latest_timestamp(str(path)) is None
+
+
+def test_file_may_overlap_by_name_and_mtime(tmp_path):
+    """测试文件名日期和修改时间早于窗口的文件被跳过，文件名日期晚于窗口的文件不跳过（按周、按月轮转）"""
+    window = (datetime(2024, 3, 10, 12).timestamp(), datetime(2024, 3, 10, 13).timestamp())
+    for name, expected in [("app-2024-03-10.log", True), ("app.20240311.log", True), ("app-2024-03-09.log", False),
+                           ("app-2024-03-08.log", False), ("app.log-20240317", True), ("app-2024-04-01.log", True),
+                           ("app.log", True)]:
+        path = tmp_path / name
+        path.write_text("x\n")
+        os.utime(path, (window[1], window[1]))
+        assert file_may_overlap(str(path), *window) is expected, name
+    
+    stale = tmp_path / "stale.log"
+    stale.write_text("x\n")
+    os.utime(stale, (window[0] - 86400, window[0] - 86400))
+    assert not file_may_overlap(str(stale), *window)
+    assert file_may_overlap(str(stale), None, window[1])
+
+
+def test_file_log_query_time_window_without_index(tmp_path, monkeypatch):
+    """测试不使用索引时文件日志查询按时间窗口过滤"""
+    (tmp_path / "app.log").write_text(
+        "2024-01-01 10:00:00 ERROR first\n"
+        "2024-01-01 10:30:00 ERROR second\n"
+        "    at Foo.bar(Foo.java:1) error cause\n"
+        "2024-01-01 11:00:00 ERROR third\n"
+    )
+    monkeypatch.setattr(settings, "log_file_base_path", str(tmp_path))
+    monkeypatch.setattr(settings, "log_index_enabled", False)
+    result = FileLogQuery().query(
+        "app", "error", start_time=datetime(2024, 1, 1, 10, 15), end_time=datetime(2024, 1, 1, 10, 45),
+    )
+    assert [log["line"] for log in result.logs] == [2, 3]
@@ -0,0 +1,116 @@
+"""测试推测预取"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from codebase_driven_agent.config import settings
+from codebase_driven_agent.agent.prefetch import SpeculativePrefetcher
+from codebase_driven_agent.utils.metrics import get_metrics_collector
+
+
+@pytest.fixture
+def pool():
+    """执行预取的线程池"""
+    executor = ThreadPoolExecutor(max_workers=2)
+    yield executor
+    executor.shutdown(wait=True)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    """包含几个文件的代码仓库"""
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "a.py").write_text("a = 1\n")
+    (tmp_path / "src" / "b.py").write_text("b = 1\n")
+    (tmp_path / "README.md").write_text("# readme\n")
+    return tmp_path
+
+
+def _make(pool, repo, tool_names=("grep", "read", "log_search"), block=None):
+    """创建预取器，记录实际执行的工具调用"""
+    calls = []
+    
+    def call_tool(tool_name, tool_input):
+        if block is not None:
+            block.wait(5)
+        calls.append((tool_name, tool_input))
+        return f"{tool_name}:{sorted(tool_input.items())}"
+    
+    prefetcher = SpeculativePrefetcher(call_tool, list(tool_names), lambda: pool, repo_path=str(repo))
+    return prefetcher, calls
+
+
+def _counter(name, labels=""):
+    return get_metrics_collector().get_metrics()["counters"].get(name + labels, 0)
+
+
+def test_prefetch_search_results(pool, repo, monkeypatch):
+    """测试搜索结果中的文件被预读，命中时直接使用预取结果"""
+    monkeypatch.setattr(settings, "agent_prefetch_max_calls", 2)
+    prefetcher, calls = _make(pool, repo)
+    plan_steps = [{"tool_name": "grep", "tool_params": {"pattern": "x"}}]
+    step_results = [{
+        "step": 0,
+        "status": "completed",
+        "result": "文件: src/b.py\n  1 | b = 1\n文件: ./src/a.py\n  1 | a\nmissing.py README.md",
+    }]
+    hits = _counter("agent_prefetch_hits_total", "{tool=read}")
+    
+    assert prefetcher.start(plan_steps, step_results) == 2
+    # 同样的结果不会重复预取
+    assert prefetcher.start(plan_steps, step_results) == 0
+    
+    future = prefetcher.take("read", {"file_path": "src/b.py"})
+    assert future.result(timeout=5) == "read:[('file_path', 'src/b.py')]"
+    assert prefetcher.take("read", {"file_path": "src/b.py"}) is None
+    assert prefetcher.take("read", {"file_path": "src/b.py", "offset": 1}) is None
+    assert _counter("agent_prefetch_hits_total", "{tool=read}") == hits + 1
+    
+    prefetcher.cancel()
+    assert ("read", {"file_path": "src/b.py"}) in calls
+    assert prefetcher.get_stats()["pending"] == 0
+
+
+def test_prefetch_log_next_page(pool, repo):
+    """测试日志结果提示有下一页时预取下一页"""
+    prefetcher, calls = _make(pool, repo)
+    params = {"query": "error", "limit": 50, "offset": 0}
+    plan_steps = [{"tool_name": "log_search", "tool_params": params}]
+    step_results = [{
+        "step": 0,
+        "status": "completed",
+        "result": "...\n[Note: More results available, use offset=50 to get next page]\n",
+    }]
+    
+    assert prefetcher.start(plan_steps, step_results) == 1
+    assert prefetcher.take("log_search", {"query": "error", "offset": 50, "limit": 50}) is not None
+
+
+def test_retain_cancels_unrelated(pool, repo, monkeypatch):
+    """测试决策完成后取消与下一步无关的预取"""
+    monkeypatch.setattr(settings, "agent_prefetch_max_calls", 3)
+    block = threading.Event()
+    prefetcher, calls = _make(pool, repo, block=block)
+    plan_steps = [{"tool_name": "grep", "tool_params": {"pattern": "x"}}]
+    step_results = [{"step": 0, "status": "completed", "result": "src/a.py src/b.py README.md"}]
+    wasted = _counter("agent_prefetch_wasted_total")
+    
+    assert prefetcher.start(plan_steps, step_results) == 3
+    prefetcher.retain([{"tool_name": "read", "tool_params": {"file_path": "src/a.py"}}])
+    block.set()
+    
+    assert prefetcher.get_stats()["pending"] == 1
+    assert _counter("agent_prefetch_wasted_total") == wasted + 2
+    assert prefetcher.take("read", {"file_path": "src/a.py"}).result(timeout=5)
+    # README.md 尚未开始执行，已被取消
+    pool.shutdown(wait=True)
+    assert ("read", {"file_path": "README.md"}) not in calls
+
+
+def test_prefetch_disabled(pool, repo, monkeypatch):
+    """测试关闭预取"""
+    monkeypatch.setattr(settings, "agent_prefetch_enabled", False)
+    prefetcher, calls = _make(pool, repo)
+    step_results = [{"step": 0, "status": "completed", "result": "src/a.py"}]
+    
+    assert prefetcher.start([{"tool_name": "grep", "tool_params": {}}], step_results) == 0
+    assert calls == []
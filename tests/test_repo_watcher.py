@@ -0,0 +1,137 @@
+"""测试代码仓库变更监听服务"""
+import time
+import pytest
+from codebase_driven_agent.utils.metrics import get_metrics_collector
+from codebase_driven_agent.utils.repo_watcher import RepoWatcher, WATCHDOG_AVAILABLE
+
+
+def _collect(watcher):
+    """注册记录批次的失效回调"""
+    batches = []
+    watcher.register("test", batches.append)
+    return batches
+
+
+def _wait_for(predicate, timeout=5.0):
+    """等待条件成立"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_debounced_batch(tmp_path):
+    """测试连续事件去抖后合并为一个批次，忽略隐藏目录和跳过的目录"""
+    watcher = RepoWatcher(tmp_path, debounce=0.1, poll_interval=60, use_watchdog=False)
+    batches = _collect(watcher)
+    watcher.start()
+    try:
+        watcher.notify(["src/a.py", "src/b.py"])
+        watcher.notify(["src/a.py", ".git/index", "node_modules/x/index.js"])
+        assert watcher.flush()
+    finally:
+        watcher.stop()
+    
+    assert batches == [["src/a.py", "src/b.py"]]
+    stats = watcher.get_stats()
+    assert stats["batches"] == 1 and stats["queue_depth"] == 0
+    metrics = get_metrics_collector().get_metrics()
+    assert "repo_watcher_queue_depth" in metrics["gauges"]
+    assert "repo_watcher_lag_seconds" in metrics["histograms"]
+
+
+def test_full_invalidation(tmp_path):
+    """测试整个仓库失效的事件覆盖同一批次中的文件事件"""
+    watcher = RepoWatcher(tmp_path, debounce=0.05, poll_interval=60, use_watchdog=False)
+    batches = _collect(watcher)
+    watcher.start()
+    try:
+        watcher.notify(["a.py"])
+        watcher.notify(None)
+        assert watcher.flush()
+    finally:
+        watcher.stop()
+    
+    assert batches == [None]
+
+
+def test_ignored_directory_events(tmp_path):
+    """测试新建 __pycache__、node_modules 等目录的事件被忽略，不触发整个仓库失效"""
+    watcher = RepoWatcher(tmp_path, debounce=0.05, poll_interval=60, use_watchdog=False)
+    batches = _collect(watcher)
+    watcher.start()
+    try:
+        for name in ("pkg/__pycache__", "node_modules", ".pytest_cache", "pkg/.mypy_cache"):
+            watcher.notify_paths([str(tmp_path / name)], directory=True)
+        watcher.notify_paths([str(tmp_path / "pkg" / "__pycache__" / "mod.cpython-311.pyc")])
+        assert watcher.flush()
+        assert batches == []
+        
+        watcher.notify_paths([str(tmp_path / "pkg" / "sub")], directory=True)
+        assert watcher.flush()
+    finally:
+        watcher.stop()
+    
+    assert batches == [None]
+
+
+def test_polling_backend(tmp_path):
+    """测试轮询模式检测新增、修改和删除的文件"""
+    (tmp_path / "keep.py").write_text("x = 1\n")
+    (tmp_path / "gone.py").write_text("y = 1\n")
+    watcher = RepoWatcher(tmp_path, debounce=0.05, poll_interval=60, use_watchdog=False)
+    watcher._poll_snapshot = watcher._scan_mtimes()
+    
+    (tmp_path / "keep.py").write_text("x = 22\n")
+    (tmp_path / "gone.py").unlink()
+    (tmp_path / "new.py").write_text("z = 1\n")
+    
+    assert sorted(watcher.poll_once()) == ["gone.py", "keep.py", "new.py"]
+    assert watcher.poll_once() == []
+
+
+def test_git_head_change(tmp_path):
+    """测试 HEAD 变化时将两个提交之间变更的文件加入失效队列"""
+    git = pytest.importorskip("git")
+    repo = git.Repo.init(tmp_path)
+    with repo.config_writer() as config:
+        config.set_value("user", "name", "test")
+        config.set_value("user", "email", "test@example.com")
+    (tmp_path / "a.py").write_text("a = 1\n")
+    (tmp_path / "b.py").write_text("b = 1\n")
+    repo.index.add(["a.py", "b.py"])
+    repo.index.commit("initial")
+    
+    watcher = RepoWatcher(tmp_path, git_repo=repo, debounce=0.05, poll_interval=60, use_watchdog=False)
+    batches = _collect(watcher)
+    watcher.start()
+    try:
+        assert watcher.check_head() is False
+        (tmp_path / "b.py").write_text("b = 2\n")
+        repo.index.add(["b.py"])
+        repo.index.commit("update b")
+        assert watcher.check_head() is True
+        assert watcher.flush()
+    finally:
+        watcher.stop()
+    
+    assert batches == [["b.py"]]
+    assert watcher.get_stats()["head_changes"] == 1
+
+
+@pytest.mark.skipif(not WATCHDOG_AVAILABLE, reason="watchdog not available")
+def test_watchdog_backend(tmp_path):
+    """测试 watchdog 文件事件"""
+    (tmp_path / "src").mkdir()
+    watcher = RepoWatcher(tmp_path, debounce=0.05, poll_interval=60, use_watchdog=True)
+    batches = _collect(watcher)
+    watcher.start()
+    try:
+        (tmp_path / "src" / "main.py").write_text("print(1)\n")
+        assert _wait_for(lambda: any(b and "src/main.py" in b for b in batches))
+    finally:
+        watcher.stop()
+    
+    assert watcher.backend == "watchdog"
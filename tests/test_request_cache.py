@@ -0,0 +1,255 @@
+"""测试请求缓存"""
+import asyncio
+import pytest
+from codebase_driven_agent.api import routes
+from codebase_driven_agent.api.models import AnalysisResult, AnalyzeRequest
+from codebase_driven_agent.utils import cache as cache_module
+from codebase_driven_agent.utils.cache import RequestCache
+from codebase_driven_agent.utils.request_similarity import SimilarityIndex, canonicalize_input
+
+
+class FakeClock:
+    """可以手动推进的时钟"""
+    
+    def __init__(self):
+        self.now = 1_000_000.0
+    
+    def time(self):
+        return self.now
+    
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """替换缓存使用的时钟"""
+    fake = FakeClock()
+    monkeypatch.setattr(cache_module, "time", fake)
+    return fake
+
+
+def _request(text):
+    return {"input": text, "context_files": []}
+
+
+def test_lru_eviction_by_entries():
+    """测试超出条目数时淘汰最久未使用的条目"""
+    cache = RequestCache(max_size=2, shards=1)
+    cache.set(_request("a"), {"root_cause": "a"})
+    cache.set(_request("b"), {"root_cause": "b"})
+    assert cache.get(_request("a")) == {"root_cause": "a"}
+    
+    cache.set(_request("c"), {"root_cause": "c"})
+    
+    assert cache.get(_request("b")) is None
+    assert cache.get(_request("a")) is not None
+    assert cache.get(_request("c")) is not None
+    stats = cache.get_stats()
+    assert stats["size"] == 2 and stats["evictions"] == 1
+    assert stats["hits"] == 3 and stats["misses"] == 1
+
+
+def test_eviction_by_bytes():
+    """测试按结果字节数计算容量，超过单个分片上限的结果不缓存"""
+    result = AnalysisResult(root_cause="x" * 100, suggestions=[], confidence=0.9)
+    size = len(result.model_dump_json())
+    cache = RequestCache(max_size=0, max_bytes=size * 2, shards=1)
+    
+    for text in ("a", "b", "c"):
+        cache.set(_request(text), result)
+    
+    assert len(cache) == 2
+    assert cache.get(_request("a")) is None
+    assert cache.get_stats()["bytes"] == size * 2
+    
+    cache.set(_request("big"), AnalysisResult(root_cause="x" * size * 2, suggestions=[], confidence=0.9))
+    assert cache.get(_request("big")) is None
+
+
+def test_ttl_expiry_and_cleanup(clock):
+    """测试过期条目在读取和清理时删除，覆盖写入会刷新过期时间"""
+    cache = RequestCache(ttl=60, shards=4)
+    for text in ("a", "b", "c"):
+        cache.set(_request(text), {"root_cause": text})
+    clock.advance(30)
+    cache.set(_request("a"), {"root_cause": "a2"})
+    
+    clock.advance(31)
+    assert cache.get(_request("b")) is None
+    assert cache.cleanup_expired() == 1  # 只剩 c 过期，a 已被覆盖写入
+    assert cache.get(_request("a")) == {"root_cause": "a2"}
+    
+    clock.advance(30)
+    assert cache.cleanup_expired() == 1
+    assert len(cache) == 0
+
+
+def test_same_key_normalization():
+    """测试输入首尾空白不影响缓存键"""
+    cache = RequestCache()
+    cache.set(_request(" error "), {"root_cause": "r"})
+    assert cache.get(_request("error")) == {"root_cause": "r"}
+    cache.clear()
+    assert cache.get(_request("error")) is None
+    assert cache.get_stats()["bytes"] == 0
+
+
+STACK_TRACE = """2024-01-15 10:23:45 ERROR [request_id=abc-123] NullPointerException: order is null
+    at com.shop.OrderService.process(OrderService.java:142)
+    at com.shop.OrderController.create(OrderController.java:57)
+    at com.shop.http.Dispatcher.dispatch(Dispatcher.java:311)
+    at sun.reflect.NativeMethodAccessorImpl.invoke0(Native Method)
+object 0x7f3a2b1c released after 5321 ms"""
+
+
+def _similar_cache(**kwargs):
+    return RequestCache(similarity=SimilarityIndex(threshold=0.8), **kwargs)
+
+
+def test_canonicalize_volatile_tokens():
+    """测试规范化替换时间戳、请求 ID、地址和行号"""
+    canonical = canonicalize_input(STACK_TRACE)
+    
+    assert "10:23:45" not in canonical and "abc-123" not in canonical
+    assert "0x7f3a2b1c" not in canonical and "142" not in canonical
+    assert "OrderService.java:<N>" in canonical
+    assert canonicalize_input(STACK_TRACE.replace("2024-01-15 10:23:45", "2024-02-01 08:00:01")) == canonical
+
+
+@pytest.mark.parametrize("first, second", [
+    ("MySQL error 1062: Duplicate entry", "MySQL error 1045: Duplicate entry"),
+    ("ORA-00942: table or view does not exist", "ORA-01017: table or view does not exist"),
+    ("could not connect to 127.0.0.1:5432", "could not connect to 127.0.0.1:6379"),
+])
+def test_canonicalize_keeps_error_codes_and_ports(first, second):
+    """测试错误码和端口不作为易变内容替换，不同的问题不会规范化为同一个请求"""
+    assert canonicalize_input(first) != canonicalize_input(second)
+    cache = _similar_cache()
+    cache.set(_request(first), {"root_cause": "a"})
+    hit = cache.lookup(_request(second))
+    assert hit is None or hit.match_type != "normalized"
+
+
+def test_near_duplicate_hit_with_provenance():
+    """测试易变内容不同或多出一行日志的请求命中近似重复的缓存条目"""
+    cache = _similar_cache()
+    cache.set(_request(STACK_TRACE), {"root_cause": "order is null"})
+    
+    renamed = STACK_TRACE.replace("10:23:45", "11:02:13").replace("abc-123", "f00-999").replace("0x7f3a2b1c", "0x1")
+    hit = cache.lookup(_request(renamed))
+    assert hit.match_type == "normalized" and hit.similarity == 1.0
+    assert hit.input_preview == STACK_TRACE[:200]
+    
+    hit = cache.lookup(_request(renamed + "\n    at com.shop.Main.run(Main.java:12)"))
+    assert hit.match_type == "similar" and 0.8 <= hit.similarity < 1.0
+    assert hit.result == {"root_cause": "order is null"}
+    
+    assert cache.lookup(_request("Connection refused: redis://cache-01:6379")) is None
+    other_context = {"input": renamed, "context_files": [{"type": "log", "content": "x"}]}
+    assert cache.lookup(other_context) is None
+    assert cache.get_stats()["similar_hits"] == 2
+
+
+def test_evicted_entries_leave_similarity_index():
+    """测试淘汰和清空的条目从近似重复索引中删除"""
+    cache = _similar_cache(max_size=1, shards=1)
+    cache.set(_request(STACK_TRACE), {"root_cause": "a"})
+    cache.set(_request("Connection refused: redis://cache-01:6379"), {"root_cause": "b"})
+    
+    assert len(cache.similarity) == 1
+    assert cache.lookup(_request(STACK_TRACE.replace("abc-123", "xyz"))) is None
+    cache.clear()
+    assert len(cache.similarity) == 0
+
+
+def test_analyze_returns_cache_provenance(monkeypatch):
+    """测试 /analyze 命中近似重复的缓存时返回匹配信息"""
+    cache = _similar_cache()
+    monkeypatch.setattr(cache_module, "_request_cache", cache)
+    result = AnalysisResult(root_cause="order is null", suggestions=["检查订单参数"], confidence=0.9)
+    cache.set(_request(STACK_TRACE), result)
+    
+    response = asyncio.run(routes.analyze_sync(AnalyzeRequest(input=STACK_TRACE.replace("abc-123", "q-1"))))
+    
+    assert response.status == "completed"
+    assert response.result == result
+    assert response.cache.match_type == "normalized"
+    assert response.cache.cached_input.startswith("2024-01-15 10:23:45")
+
+
+def _disk_cache(path, **kwargs):
+    from codebase_driven_agent.utils.cache_store import DiskCacheStore
+    return RequestCache(disk=DiskCacheStore(str(path)), **kwargs)
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    """测试结果写入磁盘层，新的缓存实例（重启或其他 worker）从磁盘命中并提升到内存"""
+    result = AnalysisResult(root_cause="order is null", suggestions=["检查订单参数"], confidence=0.9)
+    _disk_cache(tmp_path / "cache.db").set(_request(STACK_TRACE), result)
+    
+    cache = _disk_cache(tmp_path / "cache.db")
+    hit = cache.lookup(_request(STACK_TRACE))
+    assert hit.result == result and isinstance(hit.result, AnalysisResult)
+    assert hit.input_preview == STACK_TRACE[:200]
+    assert cache.get(_request(STACK_TRACE)) == result
+    
+    tiers = cache.get_stats()["tiers"]
+    assert (tiers["memory"]["hits"], tiers["memory"]["misses"]) == (1, 1)
+    assert tiers["disk"]["hits"] == 1 and tiers["disk"]["hit_rate"] == 1.0
+    assert tiers["disk"]["entries"] == 1
+    
+    cache.clear()
+    assert _disk_cache(tmp_path / "cache.db").get(_request(STACK_TRACE)) is None
+
+
+def test_warm_load_fills_memory_and_similarity_index(tmp_path):
+    """测试启动时预加载最近使用的条目，近似重复匹配也能命中预加载的条目"""
+    writer = _disk_cache(tmp_path / "cache.db")
+    writer.set(_request(STACK_TRACE), {"root_cause": "order is null"})
+    writer.set(_request("Connection refused: redis://cache-01:6379"), {"root_cause": "redis down"})
+    
+    from codebase_driven_agent.utils.cache_store import DiskCacheStore
+    cache = RequestCache(similarity=SimilarityIndex(threshold=0.8), disk=DiskCacheStore(str(tmp_path / "cache.db")))
+    assert cache.warm_load() == 2
+    
+    hit = cache.lookup(_request(STACK_TRACE.replace("abc-123", "q-1")))
+    assert hit.match_type == "normalized" and hit.result == {"root_cause": "order is null"}
+    assert cache.get_stats()["tiers"]["disk"]["hits"] == 0
+
+
+def test_disk_store_compact_encoding_and_pruning(tmp_path):
+    """测试结果序列化去掉空字段并压缩，超过字节数上限时删除最久未使用的条目"""
+    from codebase_driven_agent.utils.cache_store import DiskCacheStore, decode_result, encode_result
+    result = AnalysisResult(root_cause="x" * 1000, suggestions=["a"], confidence=0.5)
+    payload = encode_result(result)
+    assert len(payload) < len(result.model_dump_json()) // 4
+    assert decode_result(payload) == result
+    
+    store = DiskCacheStore(str(tmp_path / "cache.db"), max_bytes=len(payload) * 3)
+    now = cache_module.time.time()
+    for key in ("a", "b", "c", "d"):
+        store.put(key, "", key, result, now, now + 60)
+    store.get("a")
+    store.delete_expired()
+    
+    assert store.get_stats()["entries"] <= 3
+    assert store.get("a") is not None and store.get("b") is None
+
+
+def test_memory_hits_refresh_disk_access_time(tmp_path):
+    """测试内存层命中也更新磁盘中的最近访问时间，最常用的条目在重启后优先预加载"""
+    import time
+    from codebase_driven_agent.utils.cache_store import DiskCacheStore
+    cache = _disk_cache(tmp_path / "cache.db")
+    cache.set(_request(STACK_TRACE), {"root_cause": "order is null"})
+    time.sleep(0.01)
+    cache.set(_request("Connection refused: redis://cache-01:6379"), {"root_cause": "redis down"})
+    time.sleep(0.01)
+    
+    assert cache.lookup(_request(STACK_TRACE)).result == {"root_cause": "order is null"}
+    assert cache.get_stats()["tiers"]["memory"]["hits"] == 1
+    cache.disk.close()
+    
+    recent = DiskCacheStore(str(tmp_path / "cache.db")).load_recent(1)
+    assert [entry.input_text for entry in recent] == [STACK_TRACE.strip()]
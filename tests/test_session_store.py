@@ -0,0 +1,148 @@
+"""测试会话存储和跨 worker 恢复会话"""
+import asyncio
+import queue
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from fake_redis import FakeRedis
+from codebase_driven_agent.agent import session_manager as session_manager_module
+from codebase_driven_agent.agent.session_manager import SessionManager
+from codebase_driven_agent.agent.session_store import (
+    RedisSessionStore,
+    SessionEventRelay,
+    SqliteSessionStore,
+    deserialize_state,
+    serialize_state,
+)
+from codebase_driven_agent.api import routes
+from codebase_driven_agent.api.models import UserReplyRequest
+from codebase_driven_agent.api.sse import SSEMessageQueue
+
+
+def _state():
+    return {
+        "messages": [HumanMessage(content="问题"), AIMessage(content="需要更多信息")],
+        "plan_steps": [
+            {"step": 1, "action": "搜索", "tool_name": "grep", "tool_params": {"pattern": "x"}},
+            {"step": 2, "action": "请求用户输入", "tool_name": "user_input", "tool_params": {}},
+        ],
+        "current_step": 1,
+        "step_results": [{"step": 0, "status": "completed", "result": "文件: a.py"}],
+        "should_continue": True,
+        "original_input": "问题",
+        "user_input_question": "请提供错误日志",
+    }
+
+
+class FakeExecutor:
+    """恢复会话时创建的执行器：决策后直接综合"""
+    
+    def __init__(self, message_queue):
+        self.message_queue = message_queue
+        self.decision_states = []
+    
+    async def _decision_node(self, state):
+        self.decision_states.append(state)
+        return {"should_continue": False}
+    
+    def _should_continue(self, state):
+        return "synthesize"
+    
+    async def _synthesize_node(self, state):
+        self.message_queue.put_nowait({"event": "result", "data": {"root_cause": "found"}})
+        self.message_queue.put_nowait({"event": "done", "data": {"message": "Analysis completed"}})
+        return {}
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def workers(request, tmp_path):
+    """共享同一个会话存储后端的两个 worker"""
+    if request.param == "sqlite":
+        db_path = str(tmp_path / "sessions.db")
+        stores = [SqliteSessionStore(db_path, poll_interval=0.02) for _ in range(2)]
+    else:
+        client = FakeRedis()
+        stores = [RedisSessionStore(client=client) for _ in range(2)]
+    executors = []
+    
+    def factory(message_queue):
+        executors.append(FakeExecutor(message_queue))
+        return executors[-1]
+    
+    managers = [SessionManager(store=store, executor_factory=factory) for store in stores]
+    yield managers[0], managers[1], executors
+    for manager in managers:
+        manager.close()
+
+
+def _receive(message_queue, count, timeout=5):
+    """等待本地 SSE 队列收到指定数量的事件"""
+    async def receive():
+        return [await message_queue.get_async(timeout) for _ in range(count)]
+    return asyncio.run(receive())
+
+
+def test_state_round_trip():
+    """测试 AgentState 序列化后恢复消息历史和计划"""
+    state = deserialize_state(serialize_state(_state()))
+    
+    assert state["messages"] == _state()["messages"]
+    assert isinstance(state["messages"][1], AIMessage)
+    assert state["plan_steps"] == _state()["plan_steps"]
+    assert state["step_results"] == _state()["step_results"]
+
+
+def test_resume_on_other_worker(workers):
+    """测试其他 worker 恢复会话，事件转发回原始 SSE 流"""
+    worker_a, worker_b, executors = workers
+    message_queue = SSEMessageQueue()
+    worker_a.create_session(_state(), executor=object(), message_queue=message_queue, request_id="r1")
+    
+    session = worker_b.get_session("r1")
+    assert session is not None
+    assert session.state["messages"] == _state()["messages"]
+    assert session.state["current_step"] == 1
+    assert isinstance(session.message_queue, SessionEventRelay)
+    assert executors[0].message_queue is session.message_queue
+    
+    session.message_queue.put_nowait({"event": "progress", "data": {"message": "继续"}})
+    session.message_queue.put_nowait({"event": "done", "data": {}})
+    events = _receive(message_queue, 2)
+    assert [e["event"] for e in events] == ["progress", "done"]
+    
+    # 其他 worker 结束会话后，原 worker 不会再次处理
+    assert worker_b.remove_session("r1") is True
+    assert worker_a.get_session("r1") is None
+
+
+def test_reply_routed_to_other_worker(workers, monkeypatch):
+    """测试回复请求被分配到其他 worker 时继续执行并把结果发送到原始 SSE 流"""
+    worker_a, worker_b, executors = workers
+    message_queue = SSEMessageQueue()
+    worker_a.create_session(_state(), executor=object(), message_queue=message_queue, request_id="r2")
+    monkeypatch.setattr(session_manager_module, "_session_manager", worker_b)
+    
+    async def reply_and_receive():
+        response = await routes.reply_to_agent(UserReplyRequest(request_id="r2", reply="ERROR timeout"))
+        events = [await message_queue.get_async(5) for _ in range(4)]
+        return response, events
+    
+    response, events = asyncio.run(reply_and_receive())
+    
+    assert response.success is True
+    assert [e["event"] for e in events] == ["step_execution", "user_reply", "result", "done"]
+    assert events[1]["data"]["reply"] == "ERROR timeout"
+    assert executors[0].decision_states[0]["messages"][-1].content == "用户回复：ERROR timeout"
+    assert worker_a.get_session("r2") is None
+
+
+def test_plain_queue_session_stays_local():
+    """测试单 worker（内存存储）时会话仍使用本地的执行器和队列"""
+    manager = SessionManager()
+    message_queue = queue.Queue()
+    executor = object()
+    manager.create_session(_state(), executor=executor, message_queue=message_queue, request_id="r3")
+    
+    session = manager.get_session("r3")
+    assert session.executor is executor and session.message_queue is message_queue
+    assert manager.remove_session("r3") is True
+    assert manager.get_session("r3") is None
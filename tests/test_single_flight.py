@@ -0,0 +1,146 @@
+"""测试相同分析请求的并发合并"""
+import asyncio
+import pytest
+from unittest.mock import patch
+from codebase_driven_agent.api import routes, sse
+from codebase_driven_agent.api.models import AnalysisResult, AnalyzeRequest
+from codebase_driven_agent.config import settings
+from codebase_driven_agent.utils import cache as cache_module
+from codebase_driven_agent.utils.cache import RequestCache
+from codebase_driven_agent.utils.single_flight import SingleFlight
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    """使用独立的请求缓存实例"""
+    instance = RequestCache()
+    monkeypatch.setattr(cache_module, "_request_cache", instance)
+    return instance
+
+
+def slow_analysis(monkeypatch, delay=0.2):
+    """替换分析执行，统计实际执行的次数"""
+    calls = []
+    
+    async def execute(request):
+        calls.append(request.input)
+        await asyncio.sleep(delay)
+        return AnalysisResult(root_cause=f"cause of {request.input}", suggestions=[], confidence=0.9)
+    
+    monkeypatch.setattr(routes, "_execute_analysis", execute)
+    return calls
+
+
+def test_single_flight_shares_result_and_cleans_up():
+    """测试相同键只执行一次，执行结束后删除登记"""
+    flights = SingleFlight()
+    calls = []
+    
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+    
+    async def main():
+        results = await asyncio.gather(*[flights.run("k", work) for _ in range(3)])
+        assert not flights.in_flight("k") and len(flights) == 0
+        return results
+    
+    results = asyncio.run(main())
+    assert [result for result, _ in results] == ["result"] * 3
+    assert [shared for _, shared in results] == [False, True, True]
+    assert len(calls) == 1
+
+
+def test_single_flight_survives_cancelled_waiter():
+    """测试第一个等待方被取消时其他等待方仍然得到结果"""
+    flights = SingleFlight()
+    
+    async def work():
+        await asyncio.sleep(0.1)
+        return "result"
+    
+    async def main():
+        first = asyncio.create_task(flights.run("k", work))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(flights.run("k", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+    
+    assert asyncio.run(main()) == ("result", True)
+
+
+def test_sync_and_async_requests_coalesced(cache, monkeypatch):
+    """测试 /analyze 和 /analyze/async 的相同并发请求共用一次执行，结果写入缓存"""
+    calls = slow_analysis(monkeypatch)
+    task_id = routes._generate_task_id()
+    routes._create_task(task_id)
+    
+    async def main():
+        return await asyncio.gather(
+            routes.analyze_sync(AnalyzeRequest(input="NullPointerException")),
+            routes.analyze_sync(AnalyzeRequest(input=" NullPointerException ")),
+            routes._execute_analysis_async(task_id, AnalyzeRequest(input="NullPointerException")),
+            routes.analyze_sync(AnalyzeRequest(input="Connection refused")),
+        )
+    
+    first, second, _, other = asyncio.run(main())
+    
+    assert calls == ["NullPointerException", "Connection refused"]
+    # 缓存查找在线程中执行，哪个请求先发起执行不确定，但相同的请求中至多一个不是合并的
+    assert (first.coalesced or second.coalesced) and not other.coalesced
+    assert first.result == second.result
+    assert routes._get_task(task_id)["result"] == first.result
+    
+    response = asyncio.run(routes.analyze_sync(AnalyzeRequest(input="NullPointerException")))
+    assert response.cache.match_type == "exact"
+    assert len(calls) == 2
+
+
+def test_coalescing_disabled(monkeypatch):
+    """测试关闭合并后相同的并发请求各自执行"""
+    monkeypatch.setattr(settings, "cache_enabled", False)
+    monkeypatch.setattr(settings, "request_coalescing_enabled", False)
+    calls = slow_analysis(monkeypatch, delay=0.05)
+    
+    async def main():
+        return await asyncio.gather(*[routes.analyze_sync(AnalyzeRequest(input="error")) for _ in range(2)])
+    
+    responses = asyncio.run(main())
+    assert len(calls) == 2
+    assert not any(response.coalesced for response in responses)
+
+
+def test_stream_replays_events_to_later_subscriber():
+    """测试后到的 SSE 流先收到已经发出的事件，再接收同一个分析的实时事件"""
+    runs = []
+    
+    async def fake_run(executor, input_text, context_files, message_queue):
+        runs.append(input_text)
+        message_queue.put_nowait({"event": "plan", "data": {"steps": [{"step": 1}]}})
+        await asyncio.sleep(0.3)
+        message_queue.put_nowait({"event": "step_execution", "data": {"step": 1, "status": "completed"}})
+        message_queue.put_nowait({"event": "done", "data": {"message": "Analysis completed"}})
+    
+    async def collect(delay):
+        await asyncio.sleep(delay)
+        events = []
+        stream = sse._execute_analysis_stream(AnalyzeRequest(input="问题"))
+        async for message in stream:
+            events.append(message.split("\n", 1)[0])
+            if message.startswith("event: done"):
+                break
+        await stream.aclose()
+        return [event for event in events if event != "event: progress"]
+    
+    async def main():
+        return await asyncio.gather(collect(0), collect(0.2))
+    
+    with patch("codebase_driven_agent.agent.graph_executor.GraphExecutorWrapper"), \
+            patch.object(sse, "_run_graph_executor_stream", fake_run):
+        leader, follower = asyncio.run(main())
+    
+    assert runs == ["问题"]
+    assert leader == follower == ["event: plan", "event: step_execution", "event: done"]
+    assert sse._stream_flights == {}
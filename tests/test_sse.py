@@ -0,0 +1,97 @@
+"""测试 SSE 消息队列和流式分析的消息处理"""
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+import pytest
+from codebase_driven_agent.api import sse
+from codebase_driven_agent.api.models import AnalyzeRequest
+from codebase_driven_agent.api.sse import SSEMessageQueue
+
+
+def test_get_async_wakes_on_put_from_thread():
+    """测试其他线程入队时立即唤醒等待中的协程"""
+    message_queue = SSEMessageQueue()
+    
+    async def consume():
+        loop = asyncio.get_running_loop()
+        timer = threading.Timer(0.1, message_queue.put_nowait, args=({"event": "progress"},))
+        start = loop.time()
+        timer.start()
+        msg = await message_queue.get_async(timeout=5)
+        return msg, loop.time() - start
+    
+    msg, elapsed = asyncio.run(consume())
+    assert msg == {"event": "progress"}
+    assert elapsed < 1.0
+
+
+def test_get_async_timeout_and_order():
+    """测试没有消息时超时，已有消息按顺序立即返回"""
+    message_queue = SSEMessageQueue()
+    
+    async def consume():
+        with pytest.raises(TimeoutError):
+            await message_queue.get_async(timeout=0.05)
+        message_queue.put_nowait(1)
+        message_queue.put_nowait(2)
+        return [await message_queue.get_async(0), await message_queue.get_async(0)]
+    
+    assert asyncio.run(consume()) == [1, 2]
+    assert message_queue.qsize() == 0
+
+
+def test_get_async_many_producers():
+    """测试多个线程并发入队时消息不丢失"""
+    message_queue = SSEMessageQueue()
+    
+    def produce(offset):
+        for i in range(200):
+            message_queue.put_nowait(offset + i)
+            if i % 50 == 0:
+                time.sleep(0.001)
+    
+    async def consume():
+        threads = [threading.Thread(target=produce, args=(n * 1000,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        received = [await message_queue.get_async(timeout=5) for _ in range(800)]
+        for thread in threads:
+            thread.join()
+        return received
+    
+    assert len(set(asyncio.run(consume()))) == 800
+
+
+def test_stream_delivers_messages_and_heartbeats(monkeypatch):
+    """测试流式分析等待队列消息，空闲时按心跳间隔发送心跳"""
+    monkeypatch.setattr(sse, "HEARTBEAT_INTERVAL", 0.2)
+    
+    async def fake_run(executor, input_text, context_files, message_queue):
+        # 模拟工具线程中产生的消息，中间空闲一段时间
+        await asyncio.sleep(0.5)
+        threading.Thread(
+            target=message_queue.put_nowait,
+            args=({"event": "step_execution", "data": {"step": 1, "status": "completed"}},),
+        ).start()
+        await asyncio.sleep(0.05)
+        message_queue.put_nowait({"event": "done", "data": {"message": "Analysis completed"}})
+    
+    async def collect():
+        messages = []
+        stream = sse._execute_analysis_stream(AnalyzeRequest(input="问题"))
+        async for message in stream:
+            messages.append(message)
+            if message.startswith("event: done"):
+                break
+        await stream.aclose()
+        return messages
+    
+    with patch("codebase_driven_agent.agent.graph_executor.GraphExecutorWrapper"), \
+            patch.object(sse, "_run_graph_executor_stream", fake_run):
+        messages = asyncio.run(collect())
+    
+    events = [message.split("\n", 1)[0] for message in messages]
+    assert events[-2:] == ["event: step_execution", "event: done"]
+    heartbeats = [message for message in messages if '"step": "waiting"' in message]
+    assert 1 <= len(heartbeats) <= 3
@@ -0,0 +1,158 @@
+"""测试代码符号索引"""
+import os
+import pytest
+import tempfile
+import shutil
+from pathlib import Path
+from codebase_driven_agent.tools.ast_parser import AST_AVAILABLE
+from codebase_driven_agent.tools.symbol_index import SymbolIndex
+
+pytestmark = pytest.mark.skipif(not AST_AVAILABLE, reason="tree-sitter not installed")
+
+
+@pytest.fixture
+def temp_repo():
+    """创建临时代码仓库用于测试"""
+    temp_dir = tempfile.mkdtemp()
+    repo_path = Path(temp_dir)
+    
+    (repo_path / "src").mkdir()
+    (repo_path / "src" / "main.py").write_text("""import os
+from src.utils import helper_function
+
+class Service(BaseService):
+    def run(self):
+        return process_data(os.getcwd())
+
+def process_data(path):
+    helper_function()
+    return path
+""")
+
+    (repo_path / "src" / "utils.py").write_text("""def helper_function():
+    pass
+""")
+
+    (repo_path / "node_modules").mkdir()
+    (repo_path / "node_modules" / "lib.js").write_text("function process_data() {}\n")
+    
+    yield repo_path
+    
+    shutil.rmtree(temp_dir)
+
+
+@pytest.fixture
+def index(temp_repo, tmp_path):
+    """创建使用临时索引文件的符号索引"""
+    symbol_index = SymbolIndex(temp_repo, index_path=tmp_path / "symbols.db")
+    yield symbol_index
+    symbol_index.close()
+
+
+def test_build_and_lookup(index):
+    """测试构建索引并按名称查询"""
+    stats = index.build()
+    
+    assert stats["scanned"] == 2  # node_modules 被跳过
+    assert stats["parsed"] == 2
+    
+    definitions = index.lookup("process_data", kinds=["definition"])
+    assert len(definitions) == 1
+    assert definitions[0]["file"] == os.path.join("src", "main.py")
+    assert definitions[0]["line"] == 8
+    
+    calls = index.lookup("process_data", kinds=["call"])
+    assert [c["line"] for c in calls] == [6]
+    
+    classes = index.lookup("Service", kinds=["class"])
+    assert classes[0]["parents"] == ["BaseService"]
+    
+    imports = index.lookup("os", kinds=["import"])
+    assert imports[0]["import_type"] == "import"
+
+
+def test_search_groups_by_file(index):
+    """测试搜索结果按文件分组，定义排在调用之前"""
+    index.build()
+    
+    results = index.search("helper_function", ["definition", "call"], max_results=10)
+    
+    files = {item["file"]: item["matches"] for item in results}
+    assert set(files) == {os.path.join("src", "main.py"), os.path.join("src", "utils.py")}
+    assert files[os.path.join("src", "utils.py")][0]["content"].startswith("def helper_function")
+
+
+def test_incremental_update(index, temp_repo):
+    """测试增量更新：未变化文件跳过，修改和删除的文件被同步"""
+    index.build()
+    
+    stats = index.build()
+    assert stats["unchanged"] == 2
+    assert stats["parsed"] == 0
+    
+    utils_file = temp_repo / "src" / "utils.py"
+    utils_file.write_text("""def renamed_function():
+    pass
+""")
+    os.utime(utils_file, ns=(utils_file.stat().st_atime_ns, utils_file.stat().st_mtime_ns + 10**9))
+    (temp_repo / "src" / "main.py").unlink()
+    
+    stats = index.build()
+    assert stats["parsed"] == 1
+    assert stats["removed"] == 1
+    assert index.lookup("helper_function") == []
+    assert len(index.lookup("renamed_function", kinds=["definition"])) == 1
+
+
+def test_touched_file_is_not_reparsed(index, temp_repo):
+    """测试 mtime 变化但内容未变化时只更新元数据"""
+    index.build()
+    
+    utils_file = temp_repo / "src" / "utils.py"
+    os.utime(utils_file, ns=(utils_file.stat().st_atime_ns, utils_file.stat().st_mtime_ns + 10**9))
+    
+    stats = index.build()
+    assert stats["touched"] == 1
+    assert stats["parsed"] == 0
+
+
+def test_index_is_persistent(index, temp_repo):
+    """测试索引持久化：新实例直接复用已有索引"""
+    index.build()
+    index.close()
+    
+    reopened = SymbolIndex(temp_repo, index_path=index.index_path)
+    try:
+        assert reopened.is_empty() is False
+        stats = reopened.build()
+        assert stats["parsed"] == 0
+        assert len(reopened.lookup("process_data", kinds=["definition"])) == 1
+    finally:
+        reopened.close()
+
+
+def test_invalidate_paths(index, temp_repo):
+    """测试按文件失效后 ensure_fresh 只更新失效文件"""
+    index.ensure_fresh(max_age=3600)
+    
+    (temp_repo / "src" / "new_module.py").write_text("def brand_new():\n    pass\n")
+    index.invalidate([os.path.join("src", "new_module.py")])
+    index.ensure_fresh(max_age=3600)
+    
+    assert len(index.lookup("brand_new", kinds=["definition"])) == 1
+
+
+def test_code_tool_uses_symbol_index(temp_repo, tmp_path, monkeypatch):
+    """测试 CodeTool 的 AST 搜索通过符号索引返回结果"""
+    from codebase_driven_agent.config import settings
+    from codebase_driven_agent.tools.code_tool import CodeTool
+    
+    monkeypatch.setattr(settings, "code_repo_path", str(temp_repo))
+    monkeypatch.setattr(settings, "symbol_index_dir", str(tmp_path / "index"))
+    
+    tool = CodeTool()
+    results = tool._search_with_ast("process_data", "function", max_results=10)
+    
+    assert results[0]["file"] == os.path.join("src", "main.py")
+    assert results[0]["matches"][0]["content"].startswith("def process_data")
+    assert (tmp_path / "index").exists()
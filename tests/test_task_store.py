@@ -0,0 +1,123 @@
+"""测试异步任务存储"""
+import asyncio
+import pytest
+from fake_redis import FakeRedis
+from codebase_driven_agent.api import routes
+from codebase_driven_agent.api.models import AnalysisResult
+from codebase_driven_agent.config import settings
+from codebase_driven_agent.utils import task_store
+from codebase_driven_agent.utils.task_store import MemoryTaskStore, RedisTaskStore
+
+
+class FakeClock:
+    """可以手动推进的时钟"""
+    
+    def __init__(self):
+        self.now = 1_000_000.0
+    
+    def time(self):
+        return self.now
+    
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """替换任务存储使用的时钟"""
+    fake = FakeClock()
+    monkeypatch.setattr(task_store, "time", fake)
+    return fake
+
+
+def test_memory_store_ttl_and_eviction(clock):
+    """测试内存存储按最后更新时间过期，超出数量时淘汰最久未更新的任务"""
+    store = MemoryTaskStore(ttl=60, max_tasks=2)
+    for task_id in ("a", "b", "c"):
+        store.create(task_id)
+        clock.advance(1)
+    store.update("a", status="running")
+    
+    assert store.cleanup() == 1
+    assert store.get("b") is None
+    assert store.get("a")["status"] == "running"
+    assert store.update("missing", status="running") is None
+    
+    clock.advance(59.5)
+    # c 已经过期，a 在 c 之后更新过
+    assert store.get("c") is None
+    assert store.get("a") is not None
+    assert store.cleanup() == 1
+    assert len(store) == 1
+
+
+def test_memory_store_many_updates(clock):
+    """测试频繁更新时堆中的旧条目不会无限增长"""
+    store = MemoryTaskStore(ttl=60, max_tasks=10)
+    store.create("a")
+    for i in range(1000):
+        store.update("a", progress=i)
+    
+    assert len(store._heap) <= 2 * len(store) + 65
+    assert store.get("a")["progress"] == 999
+    assert store.cleanup() == 0
+
+
+def test_redis_store_shared_between_workers(clock):
+    """测试多个 worker 通过 Redis 共享任务，任务由 Redis 过期"""
+    client = FakeRedis(clock=clock.time)
+    worker_a = RedisTaskStore(ttl=60, max_tasks=10, client=client)
+    worker_b = RedisTaskStore(ttl=60, max_tasks=10, client=client)
+    
+    worker_a.create("t1")
+    result = AnalysisResult(root_cause="bug", suggestions=["fix"], confidence=0.8)
+    worker_a.update("t1", status="completed", result=result, execution_time=1.5)
+    
+    task = worker_b.get("t1")
+    assert task["status"] == "completed"
+    assert AnalysisResult.model_validate(task["result"]) == result
+    assert task["updated_at"] >= task["created_at"]
+    assert client.ttl(task_store.REDIS_KEY_PREFIX + "t1") == 60
+    
+    clock.advance(61)
+    assert worker_b.get("t1") is None
+    assert worker_b.update("t1", status="running") is None
+    # 过期任务的索引在清理时移除
+    assert worker_b.cleanup() == 1
+    assert client.zcard(task_store.REDIS_INDEX_KEY) == 0
+
+
+def test_redis_store_max_tasks(clock):
+    """测试 Redis 存储淘汰最久未更新的任务"""
+    client = FakeRedis(clock=clock.time)
+    store = RedisTaskStore(ttl=60, max_tasks=2, client=client)
+    for task_id in ("a", "b", "c"):
+        store.create(task_id)
+        clock.advance(1)
+    store.update("a", status="running")
+    
+    assert store.cleanup() == 1
+    assert store.get("b") is None
+    assert store.get("a") is not None and store.get("c") is not None
+
+
+def test_task_status_route_uses_store(monkeypatch):
+    """测试任务状态接口从配置的任务存储读取"""
+    store = RedisTaskStore(ttl=60, max_tasks=10, client=FakeRedis())
+    monkeypatch.setattr(task_store, "_task_store", store)
+    
+    routes._create_task("t1")
+    routes._update_task("t1", status="failed", error="boom")
+    response = asyncio.run(routes.get_task_status("t1"))
+    
+    assert response.status == "failed" and response.error == "boom"
+    with pytest.raises(routes.HTTPException):
+        asyncio.run(routes.get_task_status("missing"))
+
+
+def test_fallback_without_redis_url(monkeypatch):
+    """测试未配置 REDIS_URL 时回退到内存存储"""
+    monkeypatch.setattr(settings, "task_storage_type", "redis")
+    monkeypatch.setattr(settings, "redis_url", None)
+    
+    assert isinstance(task_store._create_task_store(), MemoryTaskStore)
@@ -0,0 +1,125 @@
+"""测试跨请求的工具结果缓存"""
+import functools
+import pytest
+from codebase_driven_agent.config import settings
+from codebase_driven_agent.tools import database_tool as database_tool_module
+from codebase_driven_agent.tools.base import ToolResult
+from codebase_driven_agent.tools.database_tool import DatabaseTool
+from codebase_driven_agent.tools.grep_tool import GrepTool
+from codebase_driven_agent.tools.read_tool import ReadTool
+from codebase_driven_agent.utils import repo_watcher, tool_cache
+from codebase_driven_agent.utils.tool_cache import ToolResultCache
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    """使用独立的全局缓存实例"""
+    instance = ToolResultCache()
+    monkeypatch.setattr(tool_cache, "_tool_result_cache", instance)
+    return instance
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    (tmp_path / "main.py").write_text("def main():\n    process_data()\n")
+    monkeypatch.setattr(settings, "code_repo_path", str(tmp_path))
+    return tmp_path
+
+
+def count_executions(monkeypatch, tool_class, result=None):
+    """统计工具实际执行的次数（可以替换执行结果）"""
+    calls = []
+    original = tool_class._execute
+    
+    @functools.wraps(original)
+    def execute(self, *args, **kwargs):
+        calls.append((args, kwargs))
+        return result if result is not None else original(self, *args, **kwargs)
+    
+    monkeypatch.setattr(tool_class, "_execute", execute)
+    return calls
+
+
+def test_read_cached_until_file_changes(cache, repo, monkeypatch):
+    """测试 read 结果跨工具实例复用，文件修改后重新读取"""
+    calls = count_executions(monkeypatch, ReadTool)
+    
+    first = ReadTool()._run(file_path="main.py")
+    assert ReadTool()._run(file_path=" main.py ", offset=None) == first
+    assert len(calls) == 1
+    
+    (repo / "main.py").write_text("def main():\n    process_data()\n    cleanup()\n")
+    assert "cleanup()" in ReadTool()._run(file_path="main.py")
+    assert len(calls) == 2
+    
+    stats = cache.get_stats()["tools"]["read"]
+    assert stats["hits"] == 1 and stats["misses"] == 2
+    assert stats["hit_rate"] == pytest.approx(1 / 3)
+
+
+def test_repo_tools_need_watcher(cache, repo, monkeypatch):
+    """测试 grep 只在仓库监听服务运行时缓存，仓库变更后失效"""
+    calls = count_executions(monkeypatch, GrepTool)
+    tool = GrepTool()
+    
+    monkeypatch.setattr(repo_watcher, "_repo_watcher", None)
+    tool._run(pattern="process_data")
+    tool._run(pattern="process_data")
+    assert len(calls) == 2
+    
+    monkeypatch.setattr(repo_watcher, "_repo_watcher", object())
+    tool._run(pattern="process_data")
+    tool._run(pattern="process_data")
+    assert len(calls) == 3
+    
+    cache.invalidate_repo(["main.py"])
+    tool._run(pattern="process_data")
+    assert len(calls) == 4
+
+
+def test_database_caches_schema_only(cache, monkeypatch):
+    """测试数据库工具只缓存 schema 查询，schema 版本变化后失效"""
+    result = ToolResult(success=True, data="Table: users")
+    calls = count_executions(monkeypatch, DatabaseTool, result=result)
+    versions = iter(["v1", "v1", "v2"])
+    monkeypatch.setattr(database_tool_module, "get_schema_version", lambda: next(versions))
+    tool = DatabaseTool()
+    
+    tool._run(action="schema", table_name="users")
+    tool._run(action="schema", table_name="users")
+    assert len(calls) == 1
+    tool._run(action="schema", table_name="users")
+    assert len(calls) == 2
+    
+    tool._run(action="query", sql="SELECT 1")
+    tool._run(action="query", sql="SELECT 1")
+    assert len(calls) == 4
+
+
+def test_failed_results_not_cached(cache, monkeypatch):
+    """测试执行失败的结果不缓存"""
+    calls = count_executions(monkeypatch, DatabaseTool, result=ToolResult(success=False, error="timeout"))
+    monkeypatch.setattr(database_tool_module, "get_schema_version", lambda: "v1")
+    tool = DatabaseTool()
+    
+    assert "timeout" in tool._run(action="schema")
+    tool._run(action="schema")
+    assert len(calls) == 2
+
+
+def test_per_tool_policies():
+    """测试按工具的条目数、字节数上限和关闭缓存"""
+    cache = ToolResultCache({"read": {"max_entries": 2}, "grep": {"max_bytes": 10}, "log_search": {"ttl": 0}})
+    
+    for key in ("a", "b", "c"):
+        cache.set("read", key, key)
+    assert cache.get("read", "a") is None
+    assert cache.get("read", "c") == "c"
+    assert cache.get_stats()["tools"]["read"]["evictions"] == 1
+    
+    cache.set("grep", "big", "x" * 11)
+    assert cache.get("grep", "big") is None
+    
+    assert cache.is_enabled("read")
+    assert not cache.is_enabled("log_search")
+    assert not cache.is_enabled("bash")
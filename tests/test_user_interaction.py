@@ -100,7 +100,7 @@ class TestGraphExecutorUserInteraction:
             "question": "请提供错误日志",
             "context": "当前分析显示可能是数据库连接问题"
         }):
-            # Mock LLM.invoke 调用（使用 MagicMock 包装整个 llm 对象）
+            # Mock LLM.ainvoke 调用（使用 MagicMock 包装整个 llm 对象）
             from langchain_core.messages import AIMessage
             mock_response = Mock()
             mock_response.content = '{"action": "request_input", "reasoning": "需要更多信息", "question": "请提供错误日志"}'
@@ -108,11 +108,11 @@ class TestGraphExecutorUserInteraction:
             # 使用 patch 整个 llm 对象
             original_llm = executor.llm
             mock_llm = Mock()
-            mock_llm.invoke = Mock(return_value=mock_response)
+            mock_llm.ainvoke = AsyncMock(return_value=mock_response)
             executor.llm = mock_llm
             
             try:
-                result = executor._decision_node(state)
+                result = asyncio.run(executor._decision_node(state))
                 
                 # 验证决策结果
                 assert result.get("decision") == "request_input"
@@ -177,7 +177,7 @@ class TestUserReplyAPI:
         request_id, executor, message_queue = mock_session
         
         # Mock executor 的方法
-        executor.executor._decision_node = Mock(return_value={"decision": "continue"})
+        executor.executor._decision_node = AsyncMock(return_value={"decision": "continue"})
         executor.executor._should_continue = Mock(return_value="continue")
         
         request_data = {